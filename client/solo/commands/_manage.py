@@ -526,9 +526,13 @@ class SoloManage(SoloCommand):
         return run_queue, removal_queue
 
     def _download_packages(self, entropy_client, package_matches,
-                           downdata, multifetch=1):
+                           downdata, multifetch=1, opts=None,
+                           downloaded_callback=None):
         """
         Download packages from mirrors, essentially.
+        If provided, downloaded_callback is called with the list of
+        package matches that have been downloaded, as soon as they are
+        available.
         """
         # read multifetch parameter from config if needed.
         client_settings = entropy_client.ClientSettings()
@@ -566,7 +570,7 @@ class SoloManage(SoloCommand):
                 try:
                     pkg = action_factory.get(
                         action_factory.MULTI_FETCH_ACTION,
-                        matches)
+                        matches, opts=opts)
 
                     xterm_header = "equo (%s) :: %d of %d ::" % (
                         _("download"), count, total)
@@ -589,6 +593,9 @@ class SoloManage(SoloCommand):
                     if pkg is not None:
                         pkg.finalize()
 
+                if downloaded_callback is not None:
+                    downloaded_callback(matches)
+
             return 0
 
         total = len(package_matches)
@@ -609,7 +616,7 @@ class SoloManage(SoloCommand):
 
                 pkg = action_factory.get(
                     action_factory.FETCH_ACTION,
-                    match)
+                    match, opts=opts)
 
                 xterm_header = "equo (%s) :: %d of %d ::" % (
                     _("download"), count, total)
@@ -628,6 +635,9 @@ class SoloManage(SoloCommand):
                 if pkg is not None:
                     pkg.finalize()
 
+            if downloaded_callback is not None:
+                downloaded_callback([match])
+
         return 0
 
     def _advise_repository_update(self, entropy_client):
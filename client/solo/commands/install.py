@@ -12,9 +12,11 @@
 import argparse
 import os
 import sys
+import threading
 
 from entropy.i18n import _
 from entropy.const import etpConst, const_convert_to_unicode
+from entropy.exceptions import InterruptError
 from entropy.locks import UpdatesNotificationResourceLock
 from entropy.misc import ParallelTask
 from entropy.output import brown, purple, darkred, red, \
@@ -27,6 +29,153 @@ from solo.utils import enlightenatom
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands._manage import SoloManage
 
+class _UnpackPipeline(object):
+    """
+    Unpack downloaded packages on worker threads while the following ones
+    are still being downloaded. Packages are handed out in installation
+    order and at most "lookahead" of them can be unpacked and waiting to
+    be merged at the same time, to bound disk usage.
+    """
+
+    def __init__(self, actions, workers, lookahead):
+        """
+        Object constructor.
+
+        @param actions: list of (package match, install PackageAction)
+            tuples, in installation order
+        @type actions: list
+        @param workers: number of unpack threads
+        @type workers: int
+        @param lookahead: maximum number of unpacked, not yet merged,
+            packages
+        @type lookahead: int
+        """
+        self._actions = actions
+        self._lookahead = lookahead
+        self._cond = threading.Condition()
+        self._downloaded = set()
+        self._download_st = None
+        self._prepared = {}
+        self._errors = {}
+        self._next = 0
+        self._merged = 0
+        self._stop = False
+        self._threads = []
+        for _count in range(workers):
+            th = ParallelTask(self._worker)
+            th.daemon = True
+            th.name = "UnpackThread"
+            self._threads.append(th)
+
+    def start(self):
+        """
+        Start the unpack threads.
+        """
+        for th in self._threads:
+            th.start()
+
+    def stop(self):
+        """
+        Stop the unpack threads and any running download, then wait for
+        the unpack threads to terminate.
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        for th in self._threads:
+            th.join()
+
+    def abort_check(self):
+        """
+        Download abort function, raise InterruptError once stopped.
+        """
+        if self._stop:
+            raise InterruptError("install pipeline stopped")
+
+    def downloaded(self, package_matches):
+        """
+        Signal that the given package matches have been downloaded.
+        """
+        with self._cond:
+            self._downloaded.update(package_matches)
+            self._cond.notify_all()
+
+    def download_completed(self, exit_st):
+        """
+        Signal that the download activity is over.
+        """
+        with self._cond:
+            self._download_st = exit_st
+            self._cond.notify_all()
+
+    def _unavailable(self, package_match):
+        """
+        Return whether the package will never be downloaded.
+        Must be called with the condition held.
+        """
+        return self._download_st is not None and \
+            package_match not in self._downloaded
+
+    def wait(self, index):
+        """
+        Wait for the package at the given position to be ready for
+        merging. Return False if the package could not be downloaded.
+        An exception raised by the unpack thread is raised here.
+        Unpack errors are reported by the package action start().
+        """
+        package_match, _action = self._actions[index]
+        with self._cond:
+            while index not in self._prepared:
+                if self._stop or self._unavailable(package_match):
+                    return False
+                # timeout makes KeyboardInterrupt work
+                self._cond.wait(1.0)
+            error = self._errors.pop(index, None)
+        if error is not None:
+            raise error
+        return True
+
+    def merged(self, index):
+        """
+        Signal that the package at the given position has been merged.
+        """
+        with self._cond:
+            self._merged = index + 1
+            self._cond.notify_all()
+
+    def _worker(self):
+        """
+        Unpack thread body.
+        """
+        while True:
+            with self._cond:
+                if self._stop or self._next >= len(self._actions):
+                    return
+                index = self._next
+                self._next += 1
+                package_match, action = self._actions[index]
+
+                while package_match not in self._downloaded or \
+                        index >= self._merged + self._lookahead:
+                    if self._stop or self._unavailable(package_match):
+                        return
+                    self._cond.wait()
+
+            error = None
+            try:
+                exit_st = action.prepare()
+            except Exception as err:
+                # raised by wait(), in the main thread
+                error = err
+                exit_st = 1
+
+            with self._cond:
+                self._prepared[index] = exit_st
+                if error is not None:
+                    self._errors[index] = error
+                self._cond.notify_all()
+
+
 class SoloInstall(SoloManage):
     """
     Main Solo Install command.
@@ -514,7 +663,6 @@ Install or update packages or package files.
         Solo Install action implementation.
         """
         inst_repo = entropy_client.installed_repository()
-        action_factory = entropy_client.PackageActionFactory()
 
         with inst_repo.shared():
 
@@ -565,34 +713,110 @@ Install or update packages or package files.
             if exit_st != 0:
                 return 1, False
 
-        ugc_thread = None
         down_data = {}
-        exit_st = self._download_packages(
-            entropy_client, run_queue, down_data, multifetch)
-        if exit_st == 0:
-            ugc_thread = ParallelTask(
-                self._signal_ugc, entropy_client, down_data)
-            ugc_thread.name = "UgcThread"
-            ugc_thread.start()
+        unpack_workers = entropy_client.ClientSettings()['misc'][
+            'unpack_workers']
+        if fetch or unpack_workers < 1 or len(run_queue) < 2:
+            exit_st = self._download_packages(
+                entropy_client, run_queue, down_data, multifetch)
+            if exit_st != 0:
+                return 1, False
 
-        elif exit_st != 0:
-            return 1, False
+            ugc_thread = self._start_ugc_thread(entropy_client, down_data)
 
-        # is --fetch on? then quit.
-        if fetch:
-            if ugc_thread is not None:
+            # is --fetch on? then quit.
+            if fetch:
                 ugc_thread.join()
-            entropy_client.output(
-                "%s." % (
-                    blue(_("Download complete")),),
-                header=darkred(" @@ "))
-            return 0, False
+                entropy_client.output(
+                    "%s." % (
+                        blue(_("Download complete")),),
+                    header=darkred(" @@ "))
+                return 0, False
+
+            exit_st = self._install_packages(
+                entropy_client, run_queue, packages, onlydeps,
+                config_files)
+            ugc_thread.join()
+
+        else:
+            exit_st = self._pipeline_install_packages(
+                entropy_client, run_queue, packages, onlydeps,
+                config_files, down_data, multifetch, unpack_workers)
+
+        if exit_st == 1:
+            return 1, False
+        elif exit_st != 0:
+            return 1, True
+
+        entropy_client.output(
+            "%s." % (
+                blue(_("Installation complete")),),
+            header=darkred(" @@ "))
+        return 0, True
+
+    def _start_ugc_thread(self, entropy_client, down_data):
+        """
+        Signal the downloaded packages to the UGC service in background.
+        """
+        ugc_thread = ParallelTask(
+            self._signal_ugc, entropy_client, down_data)
+        ugc_thread.name = "UgcThread"
+        ugc_thread.start()
+        return ugc_thread
+
+    def _get_install_actions(self, entropy_client, run_queue, packages,
+                             onlydeps, config_files):
+        """
+        Return a list of (package match, install PackageAction) tuples,
+        one per package in run_queue.
+        """
+        action_factory = entropy_client.PackageActionFactory()
+        package_set = set(packages)
+        actions = []
+
+        for pkg_match in run_queue:
+
+            metaopts = {
+                'removeconfig': config_files,
+            }
+
+            if onlydeps:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
+            elif pkg_match in package_set:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['user']
+            else:
+                metaopts['install_source'] = \
+                    etpConst['install_sources']['automatic_dependency']
+
+            actions.append((pkg_match, action_factory.get(
+                action_factory.INSTALL_ACTION,
+                pkg_match, opts=metaopts)))
+
+        return actions
+
+    def _install_packages(self, entropy_client, run_queue, packages,
+                          onlydeps, config_files, pipeline=None,
+                          actions=None):
+        """
+        Install the packages in run_queue, in order. Return 0 on success,
+        1 if nothing has been installed due to a download failure and 2
+        if an installation failed.
+        If pipeline is provided, every package is merged once the
+        pipeline has downloaded and unpacked it. In this case, the caller
+        must stop the pipeline and then finalize the actions left behind,
+        which may still be in use by the pipeline threads.
+        """
+        if actions is None:
+            actions = self._get_install_actions(
+                entropy_client, run_queue, packages, onlydeps, config_files)
 
         notification_lock = UpdatesNotificationResourceLock(
             output=entropy_client)
-        package_set = set(packages)
         total = len(run_queue)
 
+        started = 0
         notif_acquired = False
         try:
             # this is a best effort, we will not sleep if the lock
@@ -606,32 +830,20 @@ Install or update packages or package files.
             # state.
             notif_acquired = notification_lock.try_acquire_shared()
 
-            for count, pkg_match in enumerate(run_queue, 1):
-
-                metaopts = {
-                    'removeconfig': config_files,
-                }
+            for count, (pkg_match, pkg) in enumerate(actions, 1):
 
-                if onlydeps:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
-                elif pkg_match in package_set:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['user']
-                else:
-                    metaopts['install_source'] = \
-                        etpConst['install_sources']['automatic_dependency']
+                if pipeline is not None:
+                    if not pipeline.wait(count - 1):
+                        if count == 1:
+                            return 1
+                        return 2
 
                 package_id, repository_id = pkg_match
                 atom = entropy_client.open_repository(
                     repository_id).retrieveAtom(package_id)
 
-                pkg = None
+                started = count
                 try:
-                    pkg = action_factory.get(
-                        action_factory.INSTALL_ACTION,
-                        pkg_match, opts=metaopts)
-
                     xterm_header = "equo (%s) :: %d of %d ::" % (
                         _("install"), count, total)
 
@@ -644,26 +856,70 @@ Install or update packages or package files.
 
                     exit_st = pkg.start()
                     if exit_st != 0:
-                        if ugc_thread is not None:
-                            ugc_thread.join()
-                        return 1, True
+                        return 2
 
                 finally:
-                    if pkg is not None:
-                        pkg.finalize()
+                    pkg.finalize()
+                    if pipeline is not None:
+                        pipeline.merged(count - 1)
 
         finally:
             if notif_acquired:
                 notification_lock.release()
+            if pipeline is None:
+                # release the resources of the packages left behind
+                for _pkg_match, pkg in actions[started:]:
+                    pkg.finalize()
 
-        if ugc_thread is not None:
-            ugc_thread.join()
+        return 0
 
-        entropy_client.output(
-            "%s." % (
-                blue(_("Installation complete")),),
-            header=darkred(" @@ "))
-        return 0, True
+    def _pipeline_install_packages(self, entropy_client, run_queue,
+                                   packages, onlydeps, config_files,
+                                   down_data, multifetch, unpack_workers):
+        """
+        Install the packages in run_queue, downloading and unpacking them
+        in background. Only the merge into the live filesystem is
+        serialized. Return values are the same of _install_packages().
+        """
+        actions = self._get_install_actions(
+            entropy_client, run_queue, packages, onlydeps, config_files)
+        pipeline = _UnpackPipeline(
+            actions, unpack_workers, unpack_workers * 2)
+        ugc_threads = []
+
+        def _download():
+            exit_st = 1
+            try:
+                exit_st = self._download_packages(
+                    entropy_client, run_queue, down_data, multifetch,
+                    opts={'fetch_abort_function': pipeline.abort_check},
+                    downloaded_callback=pipeline.downloaded)
+                if exit_st == 0:
+                    ugc_threads.append(
+                        self._start_ugc_thread(entropy_client, down_data))
+            finally:
+                pipeline.download_completed(exit_st)
+
+        download_thread = ParallelTask(_download)
+        download_thread.daemon = True
+        download_thread.name = "DownloadThread"
+
+        pipeline.start()
+        download_thread.start()
+        try:
+            return self._install_packages(
+                entropy_client, run_queue, packages, onlydeps,
+                config_files, pipeline=pipeline, actions=actions)
+        finally:
+            # no thread must be using the actions when they are finalized
+            pipeline.stop()
+            download_thread.join()
+            for ugc_thread in ugc_threads:
+                ugc_thread.join()
+            # release the resources of the packages left behind,
+            # finalize() does nothing on the already finalized ones
+            for _pkg_match, pkg in actions:
+                pkg.finalize()
 
 
 SoloCommandDescriptor.register(
@@ -11,7 +11,6 @@
 """
 import os
 import sys
-import re
 import argparse
 
 from entropy.const import etpConst, const_convert_to_unicode, \
@@ -20,6 +19,9 @@ from entropy.i18n import _, ngettext
 from entropy.output import darkgreen, darkred, blue, teal, purple, brown, \
     bold
 
+from entropy.client.orphans import FileOwnershipIndex, \
+    OrphanedFilesScanner
+
 import entropy.tools
 
 from solo.commands.descriptor import SoloCommandDescriptor
@@ -1059,84 +1061,6 @@ Repository query tools.
             entropy_client.output(
                 darkgreen(_("Orphans Search")),
                 header=darkred(" @@ "))
-
-        reverse_symlink_map = settings['system_rev_symlinks']
-        system_dirs_mask = [x for x in settings['system_dirs_mask'] \
-            if entropy.tools.is_valid_path(x)]
-        # make sure we're all rawstring.
-        system_dirs_mask = [const_convert_to_rawstring(x) for x in \
-                system_dirs_mask]
-
-        system_dirs_mask_regexp = []
-        for mask in settings['system_dirs_mask']:
-            reg_mask = re.compile(mask)
-            system_dirs_mask_regexp.append(reg_mask)
-
-        file_data = set()
-        dirs = settings['system_dirs']
-        count = 0
-        for xdir in dirs:
-            # make sure it's bytes (raw encoding
-            # as per EntropyRepository.retrieveContent())
-            xdir = const_convert_to_rawstring(
-                    xdir,
-                    from_enctype=etpConst['conf_raw_encoding'])
-            try:
-                wd = os.walk(xdir)
-            except RuntimeError: # maximum recursion?
-                continue
-
-            for currentdir, subdirs, files in wd:
-                found_files = set()
-
-                for filename in files:
-                    filename = os.path.join(currentdir, filename)
-
-                    # filter symlinks, broken ones will be reported
-                    if os.path.islink(filename) and \
-                            os.path.lexists(filename):
-                        continue
-
-                    do_cont = False
-                    for mask in system_dirs_mask:
-                        if filename.startswith(mask):
-                            do_cont = True
-                            break
-                    if do_cont:
-                        continue
-
-                    for mask in system_dirs_mask_regexp:
-                        if mask.match(filename):
-                            do_cont = True
-                            break
-
-                    if do_cont:
-                        continue
-
-                    count += 1
-                    filename_utf = const_convert_to_unicode(filename)
-                    if not quiet and ((count == 0) or (count % 500 == 0)):
-                        count = 0
-                        if len(filename_utf) > 50:
-                            fname = filename_utf[:40] + \
-                                const_convert_to_unicode("...") + \
-                                filename_utf[-10:]
-                        else:
-                            fname = filename_utf
-                        entropy_client.output(
-                            "%s: %s" % (
-                                blue(_("Analyzing")),
-                                fname),
-                            header=darkred(" @@ "),
-                            back=True)
-                    found_files.add(filename_utf)
-
-                if found_files:
-                    file_data |= found_files
-
-        totalfiles = len(file_data)
-
-        if not quiet:
             entropy_client.output(
                 "%s: %s" % (
                     blue(_("Analyzed directories")),
@@ -1148,55 +1072,68 @@ Repository query tools.
                     " ".join(settings['system_dirs_mask']),),
                 header=darkred(" @@ "))
             entropy_client.output(
-                "%s: %s" % (
-                    blue(_("Number of files collected on the filesystem")),
-                    bold(const_convert_to_unicode(totalfiles)),),
-                header=darkred(" @@ "))
-            entropy_client.output(
-                "%s: %s" % (
-                    blue(_("Now searching among installed packages")),
-                    bold(const_convert_to_unicode(totalfiles)),),
-                header=darkred(" @@ "))
+                blue(_("Updating the installed files index")),
+                header=darkred(" @@ "),
+                back=True)
 
+        ownership_index = FileOwnershipIndex(
+            inst_repo, settings['system_rev_symlinks'])
+        try:
+            ownership_index.update()
+            return self._orphans_scan(
+                entropy_client, ownership_index, settings, quiet)
+        finally:
+            ownership_index.close()
+
+    def _orphans_scan(self, entropy_client, ownership_index,
+                      settings, quiet):
+        """
+        Scan the filesystem for orphaned files, writing them to disk
+        as soon as they are found.
+        """
+        scanner = OrphanedFilesScanner(
+            ownership_index, settings['system_dirs'],
+            settings['system_dirs_mask'])
 
-        pkg_ids = inst_repo.listAllPackageIds()
-        length = str(len(pkg_ids))
-        count = 0
+        orphanedfiles = 0
+        sizecount = 0
+        fname = "/tmp/entropy-orphans.txt"
 
-        def gen_cont(pkg_id):
-            for path, ftype in inst_repo.retrieveContentIter(
-                pkg_id):
-                # reverse sym
-                for sym_dir in reverse_symlink_map:
-                    if path.startswith(sym_dir):
-                        for sym_child in reverse_symlink_map[sym_dir]:
-                            yield sym_child+path[len(sym_dir):]
-                # real path also
-                dirname_real = os.path.realpath(os.path.dirname(path))
-                yield os.path.join(dirname_real, os.path.basename(path))
-                yield path
+        with open(fname, "wb") as f_out:
 
-        for pkg_id in pkg_ids:
+            for filename_utf in scanner.scan():
+                orphanedfiles += 1
 
-            if not quiet:
-                count += 1
-                atom = inst_repo.retrieveAtom(pkg_id)
-                if atom is None:
+                myfile = const_convert_to_rawstring(filename_utf)
+                mysize = 0
+                try:
+                    mysize += os.stat(myfile).st_size
+                except OSError:
+                    mysize = 0
+                sizecount += mysize
+
+                f_out.write(myfile + const_convert_to_rawstring("\n"))
+                if quiet:
+                    entropy_client.output(myfile, level="generic")
                     continue
+
+                if len(filename_utf) > 50:
+                    fname_txt = filename_utf[:40] + \
+                        const_convert_to_unicode("...") + \
+                        filename_utf[-10:]
+                else:
+                    fname_txt = filename_utf
                 entropy_client.output(
                     "%s: %s" % (
-                        blue(_("Checking")),
-                        bold(atom),),
+                        blue(_("Analyzing")),
+                        fname_txt),
                     header=darkred(" @@ "),
-                    count=(count, length),
                     back=True)
 
-            # remove from file_data
-            file_data -= set(gen_cont(pkg_id))
-
-        orphanedfiles = len(file_data)
-        fname = "/tmp/entropy-orphans.txt"
+            f_out.flush()
 
+        totalfiles = scanner.count()
+        humansize = entropy.tools.bytes_into_human(sizecount)
         if not quiet:
             entropy_client.output(
                 "%s: %s" % (
@@ -1223,30 +1160,6 @@ Repository query tools.
                     bold(const_convert_to_unicode(fname))
                     ),
                 header=darkred(" @@ "))
-
-        sizecount = 0
-        file_data = list(file_data)
-        file_data.sort(reverse = True)
-
-        with open(fname, "wb") as f_out:
-
-            for myfile in file_data:
-                myfile = const_convert_to_rawstring(myfile)
-                mysize = 0
-                try:
-                    mysize += os.stat(myfile).st_size
-                except OSError:
-                    mysize = 0
-                sizecount += mysize
-
-                f_out.write(myfile + const_convert_to_rawstring("\n"))
-                if quiet:
-                    entropy_client.output(myfile, level="generic")
-
-            f_out.flush()
-
-        humansize = entropy.tools.bytes_into_human(sizecount)
-        if not quiet:
             entropy_client.output(
                 "%s: %s" % (
                     blue(_("Total space wasted")),
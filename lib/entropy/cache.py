@@ -46,6 +46,16 @@ class EntropyCacher(Singleton):
     # yet able to write data to disk.
     STASHING_CACHE = True
 
+    # On-disk storage backend. "file" writes one pickle file per
+    # cache key (entropy.dump.dumpobj), "sqlite" keeps all the keys of
+    # a cache directory into a single indexed file
+    # (entropy.dump.SqliteDumpStore).
+    STORE_BACKEND = os.getenv("ETP_CACHE_STORE", "file")
+
+    # Maximum size in bytes of each "sqlite" store, the least recently
+    # used objects are evicted when it grows bigger.
+    STORE_MAX_SIZE = entropy.dump.SqliteDumpStore.DEFAULT_MAX_SIZE
+
     """
     Entropy asynchronous and synchronous cache writer
     and reader. This class is a Singleton and contains
@@ -124,6 +134,17 @@ class EntropyCacher(Singleton):
         self.__inside_with_stmt -= 1
         self.__enter_context_lock.release()
 
+    @classmethod
+    def _store(cls, cache_dir):
+        """
+        Return the SqliteDumpStore for the given cache directory, or None
+        if the "file" backend is in use.
+        """
+        if cls.STORE_BACKEND != "sqlite":
+            return None
+        return entropy.dump.SqliteDumpStore.get(
+            cache_dir, max_size = cls.STORE_MAX_SIZE)
+
     def __copy_obj(self, obj):
         """
         Return a copy of an object done by the standard
@@ -171,11 +192,23 @@ class EntropyCacher(Singleton):
                 pass
 
         def _commit_data(_massive_data):
+            store_data = {}
             for (key, cache_dir), data in _massive_data:
+                store = EntropyCacher._store(cache_dir)
+                if store is not None:
+                    store_data.setdefault(store, []).append((key, data))
+                    continue
                 d_o = entropy.dump.dumpobj
                 if d_o is not None:
                     d_o(key, data, dump_dir = cache_dir)
 
+            # one atomic batch per store
+            for store, objects in store_data.items():
+                try:
+                    store.dump_many(objects)
+                except (EOFError, IOError):
+                    pass
+
         while self.__alive or run_until_empty:
 
             if const_debug_enabled():
@@ -321,10 +354,14 @@ class EntropyCacher(Singleton):
         """
         if cache_dir is None:
             cache_dir = self.current_directory()
+        store = self._store(cache_dir)
         try:
             with self.__dump_data_lock:
-                entropy.dump.dumpobj(key, data, dump_dir = cache_dir,
-                    ignore_exceptions = False)
+                if store is not None:
+                    store.dump(key, data)
+                else:
+                    entropy.dump.dumpobj(key, data, dump_dir = cache_dir,
+                        ignore_exceptions = False)
         except (EOFError, IOError, OSError) as err:
             raise IOError("cannot store %s to %s. err: %s" % (
                 key, cache_dir, repr(err)))
@@ -372,8 +409,15 @@ class EntropyCacher(Singleton):
             #    const_debug_write(__name__,
             #        "EntropyCacher.push, sync push %s, into %s" % (
             #            key, cache_dir,))
+            store = self._store(cache_dir)
             with self.__dump_data_lock:
-                entropy.dump.dumpobj(key, data, dump_dir = cache_dir)
+                if store is not None:
+                    try:
+                        store.dump(key, data)
+                    except (EOFError, IOError):
+                        pass
+                else:
+                    entropy.dump.dumpobj(key, data, dump_dir = cache_dir)
 
     def pop(self, key, cache_dir = None, aging_days = None):
         """
@@ -385,6 +429,9 @@ class EntropyCacher(Singleton):
         @type key: string
         @keyword cache_dir: alternative cache directory
         @type cache_dir: string
+        @keyword aging_days: if int, consider the cached object invalid
+            if older than aging_days.
+        @type aging_days: int
         @rtype: Python object
         @return: object stored into the stack or None (if stack is empty)
         """
@@ -397,11 +444,49 @@ class EntropyCacher(Singleton):
             if ram_obj is not None:
                 return ram_obj
 
+        store = self._store(cache_dir)
+        if store is not None:
+            return store.load(key, aging_days = aging_days)
+
         l_o = entropy.dump.loadobj
         if not l_o:
             return
         return l_o(key, dump_dir = cache_dir, aging_days = aging_days)
 
+    @classmethod
+    def clear_cache_prefix(cls, prefix, cache_dir = None):
+        """
+        Clear all the Entropy Cache items whose identifier starts with
+        prefix from on-disk cache.
+
+        @param prefix: Entropy Cache item identifier prefix
+        @type prefix: string
+        @keyword cache_dir: alternative cache directory
+        @type cache_dir: string
+        """
+        if cache_dir is None:
+            cache_dir = cls.current_directory()
+
+        store = cls._store(cache_dir)
+        if store is not None:
+            store.remove_prefix(prefix)
+            return
+
+        prefix_dir = os.path.dirname(prefix)
+        prefix_name = os.path.basename(prefix)
+        dump_dir = os.path.join(cache_dir, prefix_dir)
+        try:
+            items = os.listdir(dump_dir)
+        except (OSError, IOError,):
+            return
+        for item in items:
+            if item.startswith(prefix_name) and \
+                    item.endswith(entropy.dump.D_EXT):
+                try:
+                    os.remove(os.path.join(dump_dir, item))
+                except (OSError, IOError,):
+                    pass
+
     @classmethod
     def clear_cache_item(cls, cache_item, cache_dir = None):
         """
@@ -416,6 +501,14 @@ class EntropyCacher(Singleton):
             cache_dir = cls.current_directory()
         dump_path = os.path.join(cache_dir, cache_item)
 
+        store = cls._store(cache_dir)
+        if store is not None:
+            prefix = os.path.dirname(cache_item)
+            if prefix:
+                store.remove_prefix(prefix + os.path.sep)
+            else:
+                store.clear()
+
         dump_dir = os.path.dirname(dump_path)
         for currentdir, subdirs, files in os.walk(dump_dir):
             path = os.path.join(dump_dir, currentdir)
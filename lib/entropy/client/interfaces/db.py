@@ -126,6 +126,10 @@ class InstalledPackagesRepository(CachedRepository):
         # force our own name, always.
         kwargs = kwargs.copy()
         kwargs['name'] = self.NAME
+        # must be known before the schema updates run, in the parent
+        # constructor.
+        self._CONTENT_DIRS = self._misc_setting("compact_content")
+        self._SEARCH_INDEX = self._misc_setting("search_index")
         super(InstalledPackagesRepository, self).__init__(
             *args, **kwargs)
 
@@ -134,6 +138,19 @@ class InstalledPackagesRepository(CachedRepository):
             const_setup_file(self._db, etpConst['entropygid'], 0o644,
                 uid = etpConst['uid'])
 
+    @staticmethod
+    def _misc_setting(name):
+        """
+        Return the value of the given boolean client.conf setting, like
+        "compact_content" or "search_index", False if the Entropy Client
+        settings are not available.
+        """
+        plugin_id = etpConst['system_settings_plugins_ids']['client_plugin']
+        try:
+            return SystemSettings()[plugin_id]['misc'][name]
+        except KeyError:
+            return False
+
     def handlePackage(self, pkg_data, revision = None,
                       formattedContent = False):
         """
@@ -156,6 +173,9 @@ class AvailablePackagesRepositoryUpdater(object):
     The required logic for updating a repository is stored here.
     """
     WEBSERV_CACHE_ID = 'webserv_repo/segment_'
+    # maximum amount of packages to fetch during a differential sync,
+    # above this a full repository download is cheaper
+    WEBSERV_SYNC_THRESHOLD = 2500
 
     FETCH_ERRORS = (
         UrlFetcher.GENERIC_FETCH_WARN,
@@ -277,10 +297,12 @@ class AvailablePackagesRepositoryUpdater(object):
                 "__get_webserv_database_differences: error: %s" % (err,))
             return None, None
 
-        added = [x for x in remote_package_ids if x not in package_ids]
-        removed = [x for x in package_ids if x not in remote_package_ids]
-        # sort, to increase determinism
-        added.sort()
+        # package identifiers are never reused for different packages,
+        # so comparing the keys is enough.
+        added, removed, _changed = \
+            EntropyRepositoryBase._sortedDifferences(
+                ((x, None) for x in package_ids),
+                ((x, None) for x in sorted(remote_package_ids)))
         return added, removed
 
     def __eapi1_eapi2_databases_alignment(self, dbfile, dbfile_old):
@@ -881,6 +903,27 @@ class AvailablePackagesRepositoryUpdater(object):
                     pass
         const_set_nice_level(old_prio)
 
+    def __dependency_graph_compile(self):
+
+        # renice a bit, to avoid eating resources
+        old_prio = const_set_nice_level(15)
+        mytxt = red("%s ...") % (_("Compiling dependency graph"),)
+        self._entropy.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = "\t"
+        )
+        dbconn = self._entropy.open_repository(self._repository_id)
+        try:
+            dbconn.compileDependencyGraph()
+        except (OSError, IOError, DatabaseError, OperationalError) as err:
+            # not critical, dependencies are matched through SQL
+            const_debug_write(
+                __name__,
+                "__dependency_graph_compile: %s" % (repr(err),))
+        const_set_nice_level(old_prio)
+
     def _construct_paths(self, uri, item, cmethod, get_signature = False):
         """
         Build a remote URL and a local path for a supported resource item.
@@ -1631,7 +1674,8 @@ class AvailablePackagesRepositoryUpdater(object):
             return False
 
         try:
-            mypackage_ids = mydbconn.listAllPackageIds()
+            mypackage_ids = mydbconn.listAllPackageIds(
+                order_by = "package_id")
         except (DatabaseError, IntegrityError, OperationalError,):
             return False
 
@@ -1642,7 +1686,7 @@ class AvailablePackagesRepositoryUpdater(object):
             # nothing to sync, it seems, if force is True, fallback to EAPI2
             return False
 
-        threshold = 100
+        threshold = self.WEBSERV_SYNC_THRESHOLD
         # is it worth it?
         if len(added_ids) > threshold:
             mytxt = "%s: %s (%s: %s/%s)" % (
@@ -2237,6 +2281,7 @@ class AvailablePackagesRepositoryUpdater(object):
         self.__update_repository_revision(revision)
         if self._entropy._indexing:
             self.__database_indexing()
+        self.__dependency_graph_compile()
 
         try:
             spm_class = self._entropy.Spm_class()
@@ -2273,6 +2318,12 @@ class MaskableRepository(EntropyRepositoryBase):
     _real_client_settings = None
     _real_client_settings_lock = threading.Lock()
 
+    # maskFilter() on-disk cache, (cache key, dict), see
+    # _mask_filter_disk_cache()
+    _mask_filter_cache = None
+    _mask_filter_cache_dirty = False
+    _mask_filter_cache_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         super(MaskableRepository, self).__init__(*args, **kwargs)
 
@@ -2298,25 +2349,64 @@ class MaskableRepository(EntropyRepositoryBase):
         from entropy.client.interfaces import Client
         return Client()._settings_client_plugin
 
-    def _mask_filter_fetch_cache(self, package_id):
-        if self._caching:
-            return loadobj(
-                "MaskableRepositoryFilter/%s_%s/%s" % (
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    package_id,
-                    )
-                )
+    def _mask_filter_disk_cache(self):
+        """
+        Return the on-disk cache used by maskFilter() and maskFilterBatch(),
+        a dict mapping package identifiers to maskFilter() results, or None
+        if caching is disabled. The dict is loaded once per cache key and
+        written back by _mask_filter_flush_cache().
+        Must be called with _mask_filter_cache_lock held.
+        """
+        if not self._caching:
+            return None
+
+        cache_key = "MaskableRepositoryFilter/%s_%s/batch" % (
+            self.name, self.atomMatchCacheKey())
+        cache = self._mask_filter_cache
+        if cache is not None and cache[0] == cache_key:
+            return cache[1]
+
+        # settings changed, store what we have before switching
+        self._mask_filter_flush_cache_unlocked()
+        cached = loadobj(cache_key)
+        if not isinstance(cached, dict):
+            cached = {}
+        self._mask_filter_cache = (cache_key, cached)
+        return cached
 
     def _mask_filter_store_cache(self, package_id, value):
+        with self._mask_filter_cache_lock:
+            disk_cache = self._mask_filter_disk_cache()
+            if disk_cache is not None:
+                disk_cache[package_id] = value
+                self._mask_filter_cache_dirty = True
+
+    def _mask_filter_flush_cache(self):
+        """
+        Write the maskFilter() on-disk cache, if it changed.
+        """
+        with self._mask_filter_cache_lock:
+            self._mask_filter_flush_cache_unlocked()
+
+    def _mask_filter_flush_cache_unlocked(self):
+        """
+        Unlocked version of _mask_filter_flush_cache().
+        """
+        cache = self._mask_filter_cache
+        if cache is None or not self._mask_filter_cache_dirty:
+            return
+        self._mask_filter_cache_dirty = False
         if self._caching:
-            dumpobj(
-                "MaskableRepositoryFilter/%s_%s/%s" % (
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    package_id,
-                    ),
-                value)
+            cache_key, value = cache
+            dumpobj(cache_key, value)
+
+    def close(self, safe = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        The maskFilter() on-disk cache is written here.
+        """
+        self._mask_filter_flush_cache()
+        super(MaskableRepository, self).close(safe = safe)
 
     def _maskFilter_live(self, package_id):
 
@@ -2455,13 +2545,15 @@ class MaskableRepository(EntropyRepositoryBase):
 
                 return -1, myr
 
-    def _maskFilter_package_license_mask(self, package_id, live):
+    def _maskFilter_package_license_mask(self, package_id, live,
+                                         licenses = None):
 
         if not self._settings['license_mask']:
             return
 
-        mylicenses = self.retrieveLicense(package_id)
-        mylicenses = mylicenses.strip().split()
+        if licenses is None:
+            licenses = self.retrieveLicense(package_id)
+        mylicenses = licenses.strip().split()
         lic_mask = self._settings['license_mask']
         for mylicense in mylicenses:
 
@@ -2479,12 +2571,14 @@ class MaskableRepository(EntropyRepositoryBase):
 
             return -1, myr
 
-    def _maskFilter_keyword_mask(self, package_id, live):
+    def _maskFilter_keyword_mask(self, package_id, live, keywords = None):
 
         # WORKAROUND for buggy entries
         # ** is fine then
         # TODO: remove this before 31-12-2011
-        mykeywords = self.retrieveKeywords(package_id)
+        mykeywords = keywords
+        if mykeywords is None:
+            mykeywords = self.retrieveKeywords(package_id)
         if mykeywords == set([""]):
             mykeywords = set(['**'])
 
@@ -2680,15 +2774,81 @@ class MaskableRepository(EntropyRepositoryBase):
         if cached is not None:
             return cached
 
+        # avoid memleaks
+        if len(validator_cache) > 100000:
+            validator_cache.clear()
+
         # use on-disk cache?
-        cached = self._mask_filter_fetch_cache(package_id)
+        with self._mask_filter_cache_lock:
+            disk_cache = self._mask_filter_disk_cache()
+            if disk_cache is not None:
+                cached = disk_cache.get(package_id)
         if cached is not None:
+            validator_cache[(package_id, self.name, live)] = cached
             return cached
 
+        return self._maskFilter(package_id, live, validator_cache)
+
+    def maskFilterBatch(self, package_ids, live = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Licenses and keywords of the packages that are not cached yet are
+        fetched in bulk before running the masking logic.
+        """
+        validator_cache = self._client_settings.get(
+            'masking_validation', {}).get('cache', {})
+
+        results = {}
+        pending = []
+        for package_id in package_ids:
+            cached = validator_cache.get((package_id, self.name, live))
+            if cached is None:
+                pending.append(package_id)
+            else:
+                results[package_id] = cached
+
+        if not pending:
+            return results
+
         # avoid memleaks
-        if len(validator_cache) > 100000:
+        if len(validator_cache) + len(pending) > 100000:
             validator_cache.clear()
 
+        # use on-disk cache?
+        with self._mask_filter_cache_lock:
+            disk_cache = self._mask_filter_disk_cache()
+            if disk_cache:
+                missing = []
+                for package_id in pending:
+                    cached = disk_cache.get(package_id)
+                    if cached is None:
+                        missing.append(package_id)
+                    else:
+                        validator_cache[(package_id, self.name, live)] = \
+                            cached
+                        results[package_id] = cached
+                pending = missing
+
+        if not pending:
+            return results
+
+        licenses = {}
+        if self._settings['license_mask']:
+            licenses = self.retrieveLicenseBatch(pending)
+        keywords = self.retrieveKeywordsBatch(pending)
+
+        for package_id in pending:
+            results[package_id] = self._maskFilter(
+                package_id, live, validator_cache,
+                licenses = licenses.get(package_id),
+                keywords = keywords.get(package_id))
+        return results
+
+    def _maskFilter(self, package_id, live, validator_cache,
+                    licenses = None, keywords = None):
+        """
+        Run the masking logic for a package that is not cached.
+        """
         if live:
             data = self._maskFilter_live(package_id)
             if data:
@@ -2709,21 +2869,24 @@ class MaskableRepository(EntropyRepositoryBase):
             self._mask_filter_store_cache(package_id, data)
             return data
 
-        data = self._maskFilter_package_license_mask(package_id, live)
+        data = self._maskFilter_package_license_mask(package_id, live,
+            licenses = licenses)
         if data:
             self._mask_filter_store_cache(package_id, data)
             return data
 
-        data = self._maskFilter_keyword_mask(package_id, live)
+        data = self._maskFilter_keyword_mask(package_id, live,
+            keywords = keywords)
         if data:
             self._mask_filter_store_cache(package_id, data)
             return data
 
         # holy crap, can't validate
         myr = self._settings['pkg_masking_reference']['completely_masked']
-        validator_cache[(package_id, self.name, live)] = -1, myr
+        data = -1, myr
+        validator_cache[(package_id, self.name, live)] = data
         self._mask_filter_store_cache(package_id, data)
-        return -1, myr
+        return data
 
     def atomMatchCacheKey(self):
         """
@@ -2741,6 +2904,10 @@ class AvailablePackagesRepository(CachedRepository, MaskableRepository):
     subclass of EntropyRepository. It implements the update() method in order
     to make possible to update the repository.
     """
+
+    # match dependencies through the compiled dependency graph
+    _DEPENDENCY_GRAPH = True
+
     def __init__(self, *args, **kwargs):
         super(AvailablePackagesRepository, self).__init__(*args, **kwargs)
 
@@ -2870,3 +3037,14 @@ class GenericRepository(CachedRepository, MaskableRepository):
         if not enabled:
             return package_id, 0
         return MaskableRepository.maskFilter(self, package_id, live = live)
+
+    def maskFilterBatch(self, package_ids, live = True):
+        """
+        Reimplemented from EntropyRepository.
+        See maskFilter().
+        """
+        enabled = getattr(self, 'enable_mask_filter', False)
+        if not enabled:
+            return dict((x, (x, 0)) for x in package_ids)
+        return MaskableRepository.maskFilterBatch(self, package_ids,
+                                                  live = live)
@@ -14,7 +14,7 @@ import collections
 import hashlib
 
 from entropy.const import etpConst, const_debug_write, \
-    const_isnumber, const_convert_to_rawstring, const_convert_to_unicode, \
+    const_convert_to_rawstring, const_convert_to_unicode, \
     const_debug_enabled, const_file_readable
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     DependenciesNotFound, DependenciesNotRemovable, DependenciesCollision
@@ -168,6 +168,54 @@ class CalculatorsMixin:
             if reponame in conflictingRevisions:
                 return (results[reponame], reponame)
 
+    def __atom_match_batch(self, matches, match_repos, mask_filter = True):
+        """
+        Batched, extended results only, version of atom_match() working on
+        (package key, slot, tag) tuples (see
+        EntropyRepositoryBase.atomMatchBatch()).
+        Return a dict composed by (package key, slot, tag) tuples as keys
+        and ((package_id, version, tag, revision), repository) as values.
+        Packages not found are returned as ((-1, None, None, None), 1).
+        """
+        matches = list(matches)
+        repo_results = {}
+        for repo in match_repos:
+            try:
+                dbconn = self.open_repository(repo)
+            except (RepositoryError, SystemDatabaseError):
+                # ouch, repository not available or corrupted !
+                continue
+            try:
+                repo_results[repo] = dbconn.atomMatchBatch(
+                    matches, maskFilter = mask_filter)
+            except (OperationalError, DatabaseError):
+                # OperationalError => error in data format
+                # DatabaseError => database disk image is malformed
+                # repository fooked, skip!
+                continue
+
+        valid_repos = list(match_repos)
+        results = {}
+        for match in matches:
+            match_results = {}
+            for repo, repo_data in repo_results.items():
+                pkg_data = repo_data[match]
+                if pkg_data[1] == 0:
+                    match_results[repo] = (pkg_data[0],) + pkg_data[2:]
+
+            dbpkginfo = ((-1, None, None, None), 1)
+            if len(match_results) == 1:
+                repo = list(match_results.keys())[0]
+                dbpkginfo = (match_results[repo], repo)
+            elif len(match_results) > 1:
+                mypkginfo = self.__handle_multi_repo_matches(
+                    match_results, True, valid_repos)
+                if mypkginfo is not None:
+                    dbpkginfo = mypkginfo
+            results[match] = dbpkginfo
+
+        return results
+
     def atom_match(self, atom, match_slot = None, mask_filter = True,
             multi_match = False, multi_repo = False, match_repo = None,
             extended_results = False, use_cache = True):
@@ -671,7 +719,7 @@ class CalculatorsMixin:
                 deep_deps, dependencies,))
 
         etp_cmp = entropy.dep.entropy_compare_versions
-        etp_get_rev = entropy.dep.dep_get_entropy_revision
+        parse_atom = entropy.dep.parse_atom
 
         if depcache is None:
             depcache = {}
@@ -746,7 +794,7 @@ class CalculatorsMixin:
                 # check if dependency can be matched in available repos and
                 # if it is a tagged package, in this case, we need to rewrite
                 # the dependency string to restrict its scope
-                dependency_tag = entropy.dep.dep_gettag(dependency)
+                dependency_tag = parse_atom(dependency).tag
                 if not dependency_tag:
                     # also filter out empty tags (pkgs without tags)
                     av_tags = [x for x in \
@@ -785,7 +833,7 @@ class CalculatorsMixin:
             # -1 revision means, always pull the latest
             do_rev_deep = False
             if not deep_deps:
-                string_rev = etp_get_rev(dependency)
+                string_rev = parse_atom(dependency).revision
                 if string_rev == -1:
                     do_rev_deep = True
 
@@ -935,7 +983,7 @@ class CalculatorsMixin:
             # restrict dependency matching scope inside mutually available
             # package tags. Equals to tags available in both installed and
             # available repositories.
-            dependency_tag = entropy.dep.dep_gettag(dependency)
+            dependency_tag = parse_atom(dependency).tag
             installed_tags = [x[1] for x in client_data if x[1]]
             if installed_tags and not dependency_tag:
 
@@ -2913,12 +2961,11 @@ class CalculatorsMixin:
             except OperationalError:
                 continue
 
-            def fm(pkg_id):
-                pkg_id_filtered, reason_id = repo.maskFilter(pkg_id)
+            filtered = repo.maskFilterBatch(package_ids)
+            for pkg_id in package_ids:
+                pkg_id_filtered, reason_id = filtered[pkg_id]
                 if pkg_id_filtered == -1:
-                    return ((pkg_id, repository_id,), reason_id)
-                return None
-            masked += [x for x in map(fm, package_ids) if x is not None]
+                    masked.append(((pkg_id, repository_id,), reason_id))
 
         # add live unmasked elements too
         unmasks = self._settings['live_packagemasking']['unmask_matches']
@@ -2966,8 +3013,10 @@ class CalculatorsMixin:
             repo = self.open_repository(repository_id)
             try:
                 # db may be corrupted, we cannot deal with it here
-                package_ids = [x for x in repo.listAllPackageIds(
-                    order_by = 'atom') if repo.maskFilter(x)[0] != -1]
+                package_ids = repo.listAllPackageIds(order_by = 'atom')
+                filtered = repo.maskFilterBatch(package_ids)
+                package_ids = [x for x in package_ids if \
+                                   filtered[x][0] != -1]
             except OperationalError:
                 continue
             myavailable = []
@@ -3192,10 +3241,27 @@ class CalculatorsMixin:
             # client db is broken!
             raise SystemDatabaseError("installed packages repository is broken")
 
+        strict_data = {}
+        matches = set()
+        for package_id in package_ids:
+            data = inst_repo.getStrictData(package_id)
+            if data is None:
+                # check against broken entries, or removed during iteration
+                continue
+            strict_data[package_id] = data
+            cl_pkgkey, cl_slot, cl_tag = data[0], data[1], data[3]
+            matches.add((cl_pkgkey, cl_slot, None))
+            if cl_tag:
+                matches.add((cl_pkgkey, cl_slot, cl_tag))
+
+        # resolve all the installed packages at once, for every repository
+        matched = self.__atom_match_batch(matches, match_repos)
+
         count = 0
         total = len(package_ids)
         last_count = 0
         remove = collections.deque()
+        unmatched = collections.deque()
         fine = collections.deque()
         spm_fine = collections.deque()
         update = set()
@@ -3230,69 +3296,20 @@ class CalculatorsMixin:
             try:
                 cl_pkgkey, cl_slot, cl_version, \
                     cl_tag, cl_revision, \
-                    cl_atom = self.installed_repository().getStrictData(
-                        package_id)
-            except TypeError:
-                # check against broken entries, or removed during iteration
+                    cl_atom = strict_data[package_id]
+            except KeyError:
                 continue
-            use_match_cache = True
-            do_continue = False
 
             # try to search inside package tag, if it's available,
             # otherwise, do the usual duties.
-            cl_pkgkey_tag = None
+            match = None
             if cl_tag:
-                cl_pkgkey_tag = "%s%s%s" % (
-                    cl_pkgkey,
-                    etpConst['entropytagprefix'],
-                    cl_tag)
-
-            while True:
-                try:
+                match = matched[(cl_pkgkey, cl_slot, cl_tag)]
+                if match[1] == 1:
                     match = None
-                    if cl_pkgkey_tag is not None:
-                        # search with tag first, if nothing
-                        # pops up, fallback
-                        # to usual search?
-                        match = self.atom_match(
-                            cl_pkgkey_tag,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
-                        try:
-                            if const_isnumber(match[1]):
-                                match = None
-                        except TypeError:
-                            if not use_match_cache:
-                                raise
-                            use_match_cache = False
-                            continue
-
-                    if match is None:
-                        match = self.atom_match(
-                            cl_pkgkey,
-                            match_slot = cl_slot,
-                            extended_results = True,
-                            use_cache = use_match_cache,
-                            match_repo = match_repos
-                        )
-                except OperationalError:
-                    # ouch, but don't crash here
-                    do_continue = True
-                    break
-                try:
-                    m_package_id = match[0][0]
-                except TypeError:
-                    if not use_match_cache:
-                        raise
-                    use_match_cache = False
-                    continue
-                break
-
-            if do_continue:
-                continue
+            if match is None:
+                match = matched[(cl_pkgkey, cl_slot, None)]
+            m_package_id = match[0][0]
 
             # now compare
             # version: cl_version
@@ -3332,8 +3349,7 @@ class CalculatorsMixin:
                     # first check branch
                     if package_id is not None:
 
-                        c_digest = self.installed_repository().retrieveDigest(
-                            package_id)
+                        c_digest = inst_repo.retrieveDigest(package_id)
                         # If the repo has been manually (user-side)
                         # regenerated, digest == "0". In this case
                         # skip the check.
@@ -3351,12 +3367,16 @@ class CalculatorsMixin:
                     fine.append(cl_atom)
                     continue
 
-            # don't take action if it's just masked
-            maskedresults = self.atom_match(
-                cl_pkgkey, match_slot = cl_slot,
-                mask_filter = False, match_repo = match_repos)
-            if maskedresults[0] == -1:
-                remove.append(package_id)
+            unmatched.append((package_id, (cl_pkgkey, cl_slot, None)))
+
+        # don't take action if it's just masked
+        if unmatched:
+            masked_matched = self.__atom_match_batch(
+                set(x for _pkg_id, x in unmatched), match_repos,
+                mask_filter = False)
+            for package_id, match in unmatched:
+                if masked_matched[match][0][0] == -1:
+                    remove.append(package_id)
 
         # validate remove, do not return installed packages that are
         # still referenced by others as "removable"
@@ -23,6 +23,7 @@ import types
 import subprocess
 import threading
 import codecs
+import collections
 import copy
 from datetime import datetime
 
@@ -37,11 +38,11 @@ from entropy.exceptions import RepositoryError, SystemDatabaseError, \
 from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.exceptions import Error as EntropyRepositoryError
 from entropy.cache import EntropyCacher
-from entropy.misc import FlockFile
+from entropy.misc import FlockFile, ParallelTask
 from entropy.fetchers import UrlFetcher
 from entropy.client.interfaces.db import ClientEntropyRepositoryPlugin, \
     InstalledPackagesRepository, AvailablePackagesRepository, GenericRepository
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorStatistics
 from entropy.client.misc import sharedinstlock
 from entropy.output import purple, bold, red, blue, darkgreen, darkred, brown, \
     teal
@@ -1862,80 +1863,105 @@ class MiscMixin:
         """
         Execute a throughput-oriented benchmark against the
         list of given Entropy Packages mirrors. Return a new sorted list.
+        Mirrors are tested concurrently, by a bounded pool of threads, and
+        the results are fed to the mirror statistics (see
+        entropy.client.mirrors.MirrorStatistics).
         """
         # we believe that if a mirror does not respond in 6
         # seconds, then we should give up.
         reasonable_timeout = 6
-        mirror_stats = {}
-        mirror_cache = set()
-        retries = 1
+        # maximum number of mirrors tested at the same time
+        max_workers = 4
         mirror_test_file = "MIRROR_TEST"
+        fetch_errors = (
+            UrlFetcher.TIMEOUT_FETCH_ERROR,
+            UrlFetcher.GENERIC_FETCH_ERROR)
 
+        mirror_cache = set()
+        queue = collections.deque()
         for mirror in mirrors:
+            url_data = entropy.tools.spliturl(mirror)
+            hostname = url_data.hostname
+            if hostname is None:
+                # mirror string is fucked up
+                continue
+            if hostname in mirror_cache:
+                continue
+            mirror_cache.add(hostname)
+            queue.append((mirror, hostname))
 
-            tmp_fd, tmp_path = const_mkstemp(
-                prefix="entropy.client.methods.reorder_mirrors")
-            try:
+        mirror_stats = {}
+        statistics = MirrorStatistics()
+        output_lock = threading.Lock()
 
-                url_data = entropy.tools.spliturl(mirror)
-                hostname = url_data.hostname
-                if hostname is None:
-                    # mirror string is fucked up
-                    continue
-                if hostname in mirror_cache:
-                    continue
-                mirror_cache.add(hostname)
-                mirror_url = mirror + "/" + mirror_test_file
+        def _benchmark():
+            while True:
+                try:
+                    mirror, hostname = queue.popleft()
+                except IndexError:
+                    break
 
                 mytxt = "%s: %s" % (
                     blue(_("Checking speed of")),
                     purple(hostname),
                 )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = purple(" @@ "),
-                    back = True
-                )
+                with output_lock:
+                    self.output(
+                        mytxt,
+                        importance = 1,
+                        level = "info",
+                        header = purple(" @@ "),
+                        back = True
+                    )
 
-                download_speeds = []
-                fetch_errors = (
-                    UrlFetcher.TIMEOUT_FETCH_ERROR,
-                    UrlFetcher.GENERIC_FETCH_ERROR)
-                for idx in range(retries):
-                    fetcher = self._url_fetcher(mirror_url, tmp_path,
+                result_speed = 0.0
+                tmp_fd, tmp_path = const_mkstemp(
+                    prefix="entropy.client.methods.reorder_mirrors")
+                try:
+                    fetcher = self._url_fetcher(
+                        mirror + "/" + mirror_test_file, tmp_path,
                         resume = False, show_speed = False,
                         timeout = reasonable_timeout)
                     rc = fetcher.download()
                     if rc not in fetch_errors:
-                        download_speeds.append(fetcher.get_transfer_rate())
+                        result_speed = fetcher.get_transfer_rate()
+                finally:
+                    os.close(tmp_fd)
+                    os.remove(tmp_path)
 
-                result_speed = 0.0
-                if download_speeds:
-                    download_speeds.sort(reverse=True)
-                    # take the best
-                    result_speed = download_speeds[0]
                 mirror_stats[mirror] = result_speed
+                if result_speed > 0:
+                    statistics.record_transfer(mirror, result_speed)
+                else:
+                    statistics.record_failure(mirror)
 
                 mytxt = "%s: %s, %s/sec" % (
                     blue(_("Mirror speed")),
                     purple(hostname),
                     teal(str(entropy.tools.bytes_into_human(result_speed))),
                 )
-                self.output(
-                    mytxt,
-                    importance = 1,
-                    level = "info",
-                    header = brown(" @@ ")
-                )
-            finally:
-                os.close(tmp_fd)
-                os.remove(tmp_path)
+                with output_lock:
+                    self.output(
+                        mytxt,
+                        importance = 1,
+                        level = "info",
+                        header = brown(" @@ ")
+                    )
 
-        # calculate new order
-        new_mirrors = sorted(mirror_stats.keys(),
-            key = lambda x: mirror_stats[x])
+        workers = []
+        for _idx in range(min(max_workers, len(queue))):
+            th = ParallelTask(_benchmark)
+            th.name = "BenchmarkMirrors{%d}" % (_idx,)
+            th.daemon = True
+            workers.append(th)
+            th.start()
+        for th in workers:
+            th.join()
+        statistics.save()
+
+        # calculate new order, mirrors are used in reverse order
+        new_mirrors = [x for x in mirrors if x in mirror_stats]
+        new_mirrors.sort(key = lambda x: mirror_stats[x])
         return new_mirrors
 
     def reorder_mirrors(self, repository_id, dry_run = False):
@@ -2207,7 +2233,11 @@ class MiscMixin:
         if os.path.isfile(pkg_path):
             os.remove(pkg_path)
 
-        tar = tarfile.open(pkg_path, "w:"+compression)
+        if compression:
+            tar = entropy.tools.open_compressed_tarfile(pkg_path,
+                compressor = compression)
+        else:
+            tar = tarfile.open(pkg_path, "w:")
 
         if not fake:
 
@@ -19,6 +19,8 @@ from entropy.output import red, purple, teal, brown, darkred, blue, darkgreen
 
 import entropy.tools
 
+from entropy.client.misc import ConfigProtectTrie
+
 from .. import _content as Content
 
 from .action import PackageAction
@@ -270,17 +272,24 @@ class _PackageInstallRemoveAction(PackageAction):
         }
         return metadata
 
-    def _handle_config_protect(self, protect, mask, protectskip,
-                               fromfile, tofile,
+    def _get_config_protect_trie(self, protect, mask):
+        """
+        Return a ConfigProtectTrie object built from the given
+        configuration protection and mask paths and from the
+        configuration protection skip list.
+        """
+        return ConfigProtectTrie(
+            protect, mask, self._get_config_protect_skip())
+
+    def _handle_config_protect(self, config_protect, fromfile, tofile,
                                do_allocation_check = True,
                                do_quiet = False):
         """
         Handle configuration file protection. This method contains the logic
         for determining if a file should be protected from overwrite.
+        config_protect is a ConfigProtectTrie object.
         """
-        protected = False
         do_continue = False
-        in_mask = False
 
         tofile_os = tofile
         fromfile_os = fromfile
@@ -288,45 +297,8 @@ class _PackageInstallRemoveAction(PackageAction):
             tofile_os = const_convert_to_rawstring(tofile)
             fromfile_os = const_convert_to_rawstring(fromfile)
 
-        if tofile in protect:
-            protected = True
-            in_mask = True
-
-        elif os.path.dirname(tofile) in protect:
-            protected = True
-            in_mask = True
-
-        else:
-            tofile_testdir = os.path.dirname(tofile)
-            old_tofile_testdir = None
-            while tofile_testdir != old_tofile_testdir:
-                if tofile_testdir in protect:
-                    protected = True
-                    in_mask = True
-                    break
-                old_tofile_testdir = tofile_testdir
-                tofile_testdir = os.path.dirname(tofile_testdir)
-
-        if protected: # check if perhaps, file is masked, so unprotected
-
-            if tofile in mask:
-                protected = False
-                in_mask = False
-
-            elif os.path.dirname(tofile) in mask:
-                protected = False
-                in_mask = False
-
-            else:
-                tofile_testdir = os.path.dirname(tofile)
-                old_tofile_testdir = None
-                while tofile_testdir != old_tofile_testdir:
-                    if tofile_testdir in mask:
-                        protected = False
-                        in_mask = False
-                        break
-                    old_tofile_testdir = tofile_testdir
-                    tofile_testdir = os.path.dirname(tofile_testdir)
+        protected = bool(config_protect.protected(tofile))
+        in_mask = protected
 
         if not os.path.lexists(tofile_os):
             protected = False # file doesn't exist
@@ -374,7 +346,7 @@ class _PackageInstallRemoveAction(PackageAction):
         ##__________________##
 
         # check if protection is disabled for this element
-        if tofile in protectskip:
+        if config_protect.skipped(tofile):
             self._entropy.logger.log(
                 "[Package]",
                 etpConst['logging']['normal_loglevel_id'],
@@ -446,8 +418,7 @@ class _PackageInstallRemoveAction(PackageAction):
                                          not_removed_due_to_collisions,
                                          colliding_path_messages,
                                          automerge_metadata, col_protect,
-                                         protect, mask, protectskip,
-                                         sys_root):
+                                         config_protect, sys_root):
         """
         Body of the _remove_content_from_system() method.
         """
@@ -498,7 +469,7 @@ class _PackageInstallRemoveAction(PackageAction):
                 protected_item_test = sys_root_item
                 (in_mask, protected, _x,
                  do_continue) = self._handle_config_protect(
-                     protect, mask, protectskip, None, protected_item_test,
+                     config_protect, None, protected_item_test,
                      do_allocation_check = False, do_quiet = True
                  )
 
@@ -666,7 +637,7 @@ class _PackageInstallRemoveAction(PackageAction):
             protect, mask = protect_mask
         else:
             protect, mask = set(), set()
-        protectskip = self._get_config_protect_skip()
+        config_protect = self._get_config_protect_trie(protect, mask)
 
         remove_content = None
         try:
@@ -684,8 +655,7 @@ class _PackageInstallRemoveAction(PackageAction):
                 directories, directories_cache,
                 preserved_mgr,
                 not_removed_due_to_collisions, colliding_path_messages,
-                automerge_metadata, col_protect, protect, mask, protectskip,
-                sys_root)
+                automerge_metadata, col_protect, config_protect, sys_root)
 
         finally:
             if hasattr(remove_content, "close"):
@@ -17,7 +17,7 @@ import stat
 
 from entropy.const import etpConst, const_debug_write, const_debug_enabled, \
     const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorStatistics
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
@@ -169,6 +169,7 @@ class _PackageFetchAction(PackageAction):
         """
         avail_data = self._settings['repositories']['available']
         product = self._settings['repositories']['product']
+        rank = MirrorStatistics().rank
         uris = []
 
         plain_packages = avail_data[repository_id]['plain_packages']
@@ -177,8 +178,8 @@ class _PackageFetchAction(PackageAction):
                 uri, product, original_repo)
             uris.append(expanded_uri)
 
-        uris.reverse()
-        uris.extend(avail_data[repository_id]['packages'][::-1])
+        uris = rank(uris[::-1])
+        uris.extend(rank(avail_data[repository_id]['packages'][::-1]))
 
         return uris
 
@@ -644,6 +645,8 @@ class _PackageFetchAction(PackageAction):
         # this is done in order to support "equo repo merge" feature
         # allowing client-side repository package metadata moves.
         original_repo = repo.getInstalledPackageRepository(package_id)
+        mirror_stats = MirrorStatistics()
+        rank = mirror_stats.rank
 
         if (original_repo != repository_id) and (
                 original_repo not in avail_data) and (
@@ -656,15 +659,15 @@ class _PackageFetchAction(PackageAction):
             uris = self._build_uris_list(original_repo, repository_id)
         else:
             if original_repo in avail_data:
-                uris = avail_data[original_repo]['packages'][::-1]
+                uris = rank(avail_data[original_repo]['packages'][::-1])
                 if repository_id in avail_data:
-                    uris += avail_data[repository_id]['packages'][::-1]
+                    uris += rank(avail_data[repository_id]['packages'][::-1])
             elif original_repo in excluded_data:
-                uris = excluded_data[original_repo]['packages'][::-1]
+                uris = rank(excluded_data[original_repo]['packages'][::-1])
                 if repository_id in avail_data:
-                    uris += avail_data[repository_id]['packages'][::-1]
+                    uris += rank(avail_data[repository_id]['packages'][::-1])
             else:
-                uris = avail_data[repository_id]['packages'][::-1]
+                uris = rank(avail_data[repository_id]['packages'][::-1])
 
         remaining = set(uris)
         mirror_status = StatusInterface()
@@ -682,11 +685,8 @@ class _PackageFetchAction(PackageAction):
             mirror_count_txt = "( mirror #%s ) " % (mirrorcount,)
             url = uri + "/" + download
 
-            # check if uri is sane
-            if mirror_status.get_failing_mirror_status(uri) >= 30:
-                # ohohoh!
-                # set to 30 for convenience
-                mirror_status.set_failing_mirror_status(uri, 30)
+            # check if uri is sane, failure scores decay over time
+            if mirror_status.is_failing_mirror(uri):
                 mytxt = mirror_count_txt
                 mytxt += blue(" %s: ") % (_("Mirror"),)
                 mytxt += red(self._get_url_name(uri))
@@ -698,18 +698,6 @@ class _PackageFetchAction(PackageAction):
                     header = red("   ## ")
                 )
 
-                if mirror_status.get_failing_mirror_status(uri) == 30:
-                    # put to 75 then decrement by 4 so we
-                    # won't reach 30 anytime soon ahahaha
-                    mirror_status.add_failing_mirror(uri, 45)
-                elif mirror_status.get_failing_mirror_status(uri) > 31:
-                    # now decrement each time this point is reached,
-                    # if will be back < 30, then equo will try to use it again
-                    mirror_status.add_failing_mirror(uri, -4)
-                else:
-                    # put to 0 - reenable mirror, welcome back uri!
-                    mirror_status.set_failing_mirror_status(uri, 0)
-
                 remaining.discard(uri)
                 continue
 
@@ -743,6 +731,9 @@ class _PackageFetchAction(PackageAction):
                     )
 
                 if exit_st == 0:
+                    mirror_stats.record_transfer(uri, data_transfer)
+                    mirror_stats.save()
+
                     txt = mirror_count_txt
                     txt += "%s: " % (
                         blue(_("Successfully downloaded from")),
@@ -828,6 +819,7 @@ class _PackageFetchAction(PackageAction):
                 # make sure we don't have nasty issues
                 if not remaining:
                     mirror_status.set_working_mirror(None)
+                    mirror_stats.save()
                     return 3
 
                 break
@@ -1045,10 +1037,22 @@ class _PackageFetchAction(PackageAction):
                 )
             return False
 
+        # package file digests, computed reading the file only once
+        digests = {}
+
+        def do_compare_digest(hash_type):
+            def _compare(pkg_path, hash_val):
+                digest = digests.get(hash_type)
+                if digest is None:
+                    digest = entropy.tools.multi_digest(
+                        pkg_path, (hash_type,))[hash_type]
+                return str(hash_val) == str(digest)
+            return _compare
+
         signature_vry_map = {
-            'sha1': entropy.tools.compare_sha1,
-            'sha256': entropy.tools.compare_sha256,
-            'sha512': entropy.tools.compare_sha512,
+            'sha1': do_compare_digest('sha1'),
+            'sha256': do_compare_digest('sha256'),
+            'sha512': do_compare_digest('sha512'),
             'gpg': do_compare_gpg,
         }
 
@@ -1131,10 +1135,20 @@ class _PackageFetchAction(PackageAction):
             header = red("   ## ")
         )
 
+        # check if package has been already checked
+        mtime_validated = do_mtime_validation() == 0
+        algorithms = ["md5"]
+        if not mtime_validated and isinstance(signatures, dict):
+            algorithms.extend(
+                x for x in ("sha1", "sha256", "sha512") \
+                    if signatures.get(x) and x in enabled_hashes)
+
         download_name = os.path.basename(download_path)
         valid_checksum = False
         try:
-            valid_checksum = entropy.tools.compare_md5(download_path, checksum)
+            digests.update(entropy.tools.multi_digest(
+                    download_path, algorithms, parallel = True))
+            valid_checksum = str(checksum) == str(digests['md5'])
         except (OSError, IOError) as err:
             valid_checksum = False
             const_debug_write(
@@ -1168,9 +1182,8 @@ class _PackageFetchAction(PackageAction):
             )
             return 1
 
-        # check if package has been already checked
         validated = True
-        if do_mtime_validation() != 0:
+        if not mtime_validated:
             validated = do_signatures_validation(signatures) == 0
 
         if not validated:
@@ -60,6 +60,10 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         if self._meta is not None:
             meta = self._meta
             self._meta = None
+            if meta.get('prepared'):
+                # the image may have been unpacked without being merged
+                shutil.rmtree(
+                    const_convert_to_rawstring(meta['unpackdir']), True)
             meta.clear()
 
     def _get_remove_package_id_unlocked(self, inst_repo):
@@ -250,9 +254,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         """
         self.setup()
 
-        spm_class = self._entropy.Spm_class()
-        exit_st = spm_class.entropy_install_setup_hook(
-            self._entropy, self._meta)
+        exit_st = self._spm_setup_hook()
         if exit_st != 0:
             return exit_st
 
@@ -262,6 +264,65 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 break
         return exit_st
 
+    def prepare(self):
+        """
+        Unpack the package into its private image directory ahead of
+        time, without touching the live filesystem. If this succeeds,
+        start() skips the unpack phase. This method can be called from
+        a thread other than the one calling start(), as long as the two
+        calls do not overlap.
+        Errors are not reported here: the partially unpacked image is
+        removed and start() reports the error without unpacking again.
+        Exceptions are raised as usual.
+
+        @return: exit status
+        @rtype: int
+        """
+        self.setup()
+        if self._unpack_phase not in self._meta['phases']:
+            # merge_from or already prepared
+            return 0
+
+        exit_st = self._spm_setup_hook()
+        if exit_st != 0:
+            return exit_st
+
+        self._meta['prepared'] = True
+        try:
+            exit_st = self._unpack_phase(report = False)
+        except:
+            self._remove_prepared_image()
+            raise
+
+        if exit_st == 0:
+            self._meta['phases'].remove(self._unpack_phase)
+        else:
+            self._remove_prepared_image()
+            self._meta['prepare_error'] = exit_st
+        return exit_st
+
+    def _remove_prepared_image(self):
+        """
+        Remove the image unpacked by a failed prepare().
+        """
+        self._meta['prepared'] = False
+        shutil.rmtree(
+            const_convert_to_rawstring(self._meta['unpackdir']), True)
+
+    def _spm_setup_hook(self):
+        """
+        Call the Spm install setup hook, once.
+        """
+        if self._meta.get('spm_setup_done'):
+            return 0
+
+        spm_class = self._entropy.Spm_class()
+        exit_st = spm_class.entropy_install_setup_hook(
+            self._entropy, self._meta)
+        if exit_st == 0:
+            self._meta['spm_setup_done'] = True
+        return exit_st
+
     def _escape_path(self, path):
         """
         Some applications (like ld) don't like ":" in path, others just don't
@@ -561,9 +622,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         return spm_class.entropy_install_unpack_hook(self._entropy,
             self._meta)
 
-    def _unpack_phase(self):
+    def _unpack_phase(self, report = True):
         """
         Execute the unpack phase.
+
+        @keyword report: if False, errors are not printed, see prepare()
+        @type report: bool
         """
         xterm_title = "%s %s: %s" % (
             self._xterm_header,
@@ -573,6 +637,8 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         self._entropy.set_title(xterm_title)
 
         def _unpack_error(exit_st):
+            if not report:
+                return
             msg = _("An error occurred while trying to unpack the package")
             errormsg = "%s. %s. %s: %s" % (
                 red(msg),
@@ -587,6 +653,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 header = red("   ## ")
             )
 
+        prepare_error = self._meta.get('prepare_error')
+        if prepare_error is not None:
+            # prepare() failed, do not unpack again
+            _unpack_error(prepare_error)
+            return prepare_error
+
         locks = []
         try:
             download_path = self._meta['pkgpath']
@@ -1432,19 +1504,35 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
 
         return 0
 
-    def _handle_install_collision_protect_unlocked(self, inst_repo,
-                                                   remove_package_id,
+    def _get_install_collisions_unlocked(self, inst_repo, remove_package_id,
+                                         image_dir):
+        """
+        Return the set of package image files (relative to image_dir, as
+        unicode strings) that are owned by installed packages other than
+        the one being replaced. Package ownership is resolved for all
+        the image files at once.
+        """
+        paths = set()
+        for currentdir, subdirs, files in os.walk(image_dir):
+            for item in files:
+                fromfile = os.path.join(currentdir, item)
+                paths.add(const_convert_to_unicode(
+                        fromfile[len(image_dir):]))
+
+        collisions = set()
+        owners = inst_repo.isFileAvailableBatch(paths)
+        for path, package_ids in owners.items():
+            if remove_package_id not in package_ids:
+                collisions.add(path)
+        return collisions
+
+    def _handle_install_collision_protect_unlocked(self, collisions,
                                                    tofile,
                                                    todbfile):
         """
         Handle files collition protection for the install phase.
         """
-
-        avail = inst_repo.isFileAvailable(
-            const_convert_to_unicode(todbfile),
-            get_id = True)
-
-        if (remove_package_id not in avail) and avail:
+        if const_convert_to_unicode(todbfile) in collisions:
             mytxt = darkred(_("Collision found during install for"))
             mytxt += "%s %s - %s" % (
                 blue(_("QA:")),
@@ -1478,7 +1566,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         protect = self._get_config_protect(repo, self._package_id)
         mask = self._get_config_protect(repo, self._package_id,
                                         mask = True)
-        protectskip = self._get_config_protect_skip()
+        config_protect = self._get_config_protect_trie(protect, mask)
 
         # support for unit testing settings
         sys_root = self._get_system_root(metadata)
@@ -1497,6 +1585,11 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 from_enctype = etpConst['conf_encoding'])
         movefile = entropy.tools.movefile
 
+        collisions = None
+        if col_protect > 1:
+            collisions = self._get_install_collisions_unlocked(
+                inst_repo, remove_package_id, image_dir)
+
         def workout_subdir(currentdir, subdir):
 
             imagepath_dir = os.path.join(currentdir, subdir)
@@ -1734,10 +1827,10 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                         items_not_installed.add(unicode_tofile)
                         return 0
 
-            if col_protect > 1:
+            if collisions:
                 todbfile = fromfile[len(image_dir):]
                 myrc = self._handle_install_collision_protect_unlocked(
-                    inst_repo, remove_package_id, tofile, todbfile)
+                    collisions, tofile, todbfile)
                 if not myrc:
                     return 0
 
@@ -1752,7 +1845,7 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             pre_tofile = tofile[:]
             (in_mask, protected,
              tofile, do_return) = self._handle_config_protect(
-                 protect, mask, protectskip, fromfile, tofile)
+                 config_protect, fromfile, tofile)
 
             # collect new config automerge data
             if in_mask and os.path.exists(fromfile):
@@ -15,7 +15,7 @@ import os
 import threading
 
 from entropy.const import etpConst, const_setup_perms, const_mkstemp
-from entropy.client.mirrors import StatusInterface
+from entropy.client.mirrors import StatusInterface, MirrorStatistics
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.output import blue, darkblue, bold, red, darkred, brown, darkgreen
@@ -524,6 +524,15 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 exit_st = -100
                 break
 
+        # feed the mirror statistics with the real throughput
+        mirror_stats = MirrorStatistics()
+        transfer_rates = fetch_intf.get_transfer_rates()
+        for download_id, (url, _path) in enumerate(url_path_list, 1):
+            if url not in failed_map:
+                mirror_stats.record_transfer(
+                    url, transfer_rates.get(download_id, 0))
+        mirror_stats.save()
+
         return exit_st, failed_map, fetch_intf.get_transfer_rate()
 
     def _download_packages(self, download_list):
@@ -533,6 +542,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
         avail_data = self._settings['repositories']['available']
         excluded_data = self._settings['repositories']['excluded']
 
+        rank = MirrorStatistics().rank
+
         repo_uris = {}
         for pkg_id, repository_id, fname, cksum, _signatures in download_list:
             repo = self._entropy.open_repository(repository_id)
@@ -554,13 +565,13 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
             else:
                 if original_repo in avail_data:
-                    uris = avail_data[original_repo]['packages'][::-1]
-                    uris += avail_data[repository_id]['packages'][::-1]
+                    uris = rank(avail_data[original_repo]['packages'][::-1])
+                    uris += rank(avail_data[repository_id]['packages'][::-1])
                 elif original_repo in excluded_data:
-                    uris = excluded_data[original_repo]['packages'][::-1]
-                    uris += avail_data[repository_id]['packages'][::-1]
+                    uris = rank(excluded_data[original_repo]['packages'][::-1])
+                    uris += rank(avail_data[repository_id]['packages'][::-1])
                 else:
-                    uris = avail_data[repository_id]['packages'][::-1]
+                    uris = rank(avail_data[repository_id]['packages'][::-1])
 
             obj = repo_uris.setdefault(repository_id, [])
             # append at the beginning
@@ -591,13 +602,10 @@ class _PackageMultiFetchAction(_PackageFetchAction):
 
         # return True: for failing, return False: for fine
         def mirror_fail_check(repository_id, best_mirror):
-            # check if uri is sane
-            if not mirror_status.get_failing_mirror_status(best_mirror) >= 30:
+            # check if uri is sane, failure scores decay over time
+            if not mirror_status.is_failing_mirror(best_mirror):
                 return False
 
-            # set to 30 for convenience
-            mirror_status.set_failing_mirror_status(best_mirror, 30)
-
             mirrorcount = repo_uris[repository_id].index(best_mirror) + 1
             txt = "( mirror #%s ) %s %s - %s" % (
                 mirrorcount,
@@ -612,13 +620,6 @@ class _PackageMultiFetchAction(_PackageFetchAction):
                 header = red("   ## ")
             )
 
-            if mirror_status.get_failing_mirror_status(best_mirror) == 30:
-                mirror_status.add_failing_mirror(best_mirror, 45)
-            elif mirror_status.get_failing_mirror_status(best_mirror) > 31:
-                mirror_status.add_failing_mirror(best_mirror, -4)
-            else:
-                mirror_status.set_failing_mirror_status(best_mirror, 0)
-
             try:
                 remaining[repository_id].remove(best_mirror)
             except ValueError:
@@ -386,12 +386,15 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'splitdebug': etpConst['splitdebug'],
             'splitdebug_dirs': etpConst['splitdebug_dirs'],
             'multifetch': 1,
+            'unpack_workers': 2,
             'collisionprotect': etpConst['collisionprotect'],
             'configprotect': set(),
             'configprotectmask': set(),
             'configprotectskip': set(),
             'autoprune_days': None, # disabled by default
             'edelta_support': False, # disabled by default
+            'compact_content': False, # disabled by default
+            'search_index': False, # disabled by default
         }
 
         cli_conf = ClientSystemSettingsPlugin.client_conf_path()
@@ -439,6 +442,11 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
                 if bool_setting:
                     data['multifetch'] = 3
 
+        def _unpack_workers(setting):
+            int_setting = entropy.tools.setting_to_int(setting, 0, 8)
+            if int_setting is not None:
+                data['unpack_workers'] = int_setting
+
         def _gpg(setting):
             bool_setting = entropy.tools.setting_to_bool(setting)
             if bool_setting is not None:
@@ -459,6 +467,16 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             if int_setting is not None:
                 data['collisionprotect'] = int_setting
 
+        def _compact_content(setting):
+            bool_setting = entropy.tools.setting_to_bool(setting)
+            if bool_setting is not None:
+                data['compact_content'] = bool_setting
+
+        def _search_index(setting):
+            bool_setting = entropy.tools.setting_to_bool(setting)
+            if bool_setting is not None:
+                data['search_index'] = bool_setting
+
         def _configprotect(setting):
             for opt in setting.split():
                 data['configprotect'].add(const_convert_to_unicode(opt))
@@ -485,9 +503,12 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'packagehashes': _packagehashes,
             'package-hashes': _packagehashes,
             'multifetch': _multifetch,
+            'unpack-workers': _unpack_workers,
             'gpg': _gpg,
             'ignore-spm-downgrades': _spm_downgrades,
             'splitdebug': _splitdebug,
+            'compact-content': _compact_content,
+            'search-index': _search_index,
             # backward compatibility
             'collisionprotect': _collisionprotect,
             'collision-protect': _collisionprotect,
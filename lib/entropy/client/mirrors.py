@@ -9,25 +9,72 @@
     B{Entropy Package Manager Client Download Mirrors Interface}.
 
 """
+import threading
+import time
+
+from entropy.const import const_debug_write
 from entropy.core import Singleton
 
+import entropy.dump
+import entropy.tools
+
+
 class StatusInterface(Singleton, dict):
 
+    """
+    Keep track of failing download mirrors. Failure scores are not simple
+    counters: they decay over time, halving every FAILURE_HALF_LIFE seconds,
+    so that a mirror reaching FAILURE_THRESHOLD is skipped for a while and
+    then gets back in.
+    """
+
+    # mirrors with a failure score above this value are skipped
+    FAILURE_THRESHOLD = 30
+
+    # seconds after which a failure score is halved
+    FAILURE_HALF_LIFE = 300.0
+
     def init_singleton(self):
         self.__last_mirrorname = None
         dict.__init__(self)
 
+    def _decayed(self, mirrorname, cur_t):
+        score, mtime = self.get(mirrorname, (0, cur_t))
+        # whole seconds, failures in a row must add up exactly
+        elapsed = max(0, int(cur_t - mtime))
+        return score * 0.5 ** (elapsed / self.FAILURE_HALF_LIFE)
+
     def add_failing_mirror(self, mirrorname, increment = 1):
-        if mirrorname not in self:
-            self[mirrorname] = 0
-        self[mirrorname] += increment
-        return self[mirrorname]
+        cur_t = time.time()
+        old_score = self._decayed(mirrorname, cur_t)
+        score = old_score + increment
+        if old_score < self.FAILURE_THRESHOLD <= score:
+            # just crossed the threshold, double the score so that the
+            # mirror is kept out for (at least) a whole half life.
+            score *= 2
+        self[mirrorname] = (score, cur_t)
+        if increment > 0:
+            MirrorStatistics().record_failure(mirrorname)
+        return score
 
     def get_failing_mirror_status(self, mirrorname):
-        return self.get(mirrorname, 0)
+        return self._decayed(mirrorname, time.time())
 
     def set_failing_mirror_status(self, mirrorname, value):
-        self[mirrorname] = value
+        self[mirrorname] = (value, time.time())
+
+    def is_failing_mirror(self, mirrorname):
+        """
+        Return whether the given mirror reached the failure threshold and
+        must not be used.
+
+        @param mirrorname: mirror URI
+        @type mirrorname: string
+        @return: True, if the mirror must be skipped
+        @rtype: bool
+        """
+        return self.get_failing_mirror_status(
+            mirrorname) >= self.FAILURE_THRESHOLD
 
     def set_working_mirror(self, mirrorname):
         self.__last_mirrorname = mirrorname
@@ -38,4 +85,170 @@ class StatusInterface(Singleton, dict):
 
     def clear(self):
         self.__last_mirrorname = None
-        return dict.clear(self)
\ No newline at end of file
+        return dict.clear(self)
+
+
+class MirrorStatistics(Singleton):
+
+    """
+    Persistent download mirror statistics, kept per mirror host.
+
+    Every completed download updates an exponentially weighted moving
+    average (EWMA) of the throughput of the mirror host, while failures
+    count as zero throughput samples. Statistics age: the older the last
+    sample, the closer the mirror score gets to the one of an unknown
+    mirror (the median of the known ones), so that badly ranked mirrors
+    are eventually tried again.
+
+    Statistics are stored through entropy.dump by save().
+    """
+
+    # entropy.dump object name
+    DUMP_NAME = "mirror_statistics"
+
+    # weight of a new throughput sample
+    EWMA_ALPHA = 0.3
+
+    # seconds after which a sample only counts half
+    AGING_HALF_LIFE = 86400.0
+
+    def init_singleton(self):
+        self._lock = threading.RLock()
+        self._stats = None
+        self._dirty = False
+
+    def _key(self, mirror):
+        """
+        Return the statistics key of the given mirror URI (its host name).
+        """
+        try:
+            hostname = entropy.tools.spliturl(mirror).hostname
+        except (AttributeError, ValueError):
+            hostname = None
+        if hostname is None:
+            return mirror
+        return hostname
+
+    def _data(self):
+        """
+        Return the statistics dict, loading it if needed. Must be called
+        with the instance lock held.
+        """
+        if self._stats is None:
+            stats = entropy.dump.loadobj(self.DUMP_NAME)
+            if not isinstance(stats, dict):
+                stats = {}
+            self._stats = stats
+        return self._stats
+
+    def _record(self, mirror, rate):
+        key = self._key(mirror)
+        with self._lock:
+            stats = self._data()
+            cur_t = time.time()
+            entry = stats.get(key)
+            if entry is not None:
+                old_rate, _mtime = entry
+                rate = self.EWMA_ALPHA * rate + \
+                    (1.0 - self.EWMA_ALPHA) * old_rate
+            stats[key] = (rate, cur_t)
+            self._dirty = True
+
+    def record_transfer(self, mirror, rate):
+        """
+        Record the throughput of a completed download.
+
+        @param mirror: mirror (or download) URI
+        @type mirror: string
+        @param rate: transfer rate in bytes/sec, as returned by
+            UrlFetcher.get_transfer_rate()
+        @type rate: float
+        """
+        if rate > 0:
+            self._record(mirror, float(rate))
+
+    def record_failure(self, mirror):
+        """
+        Record a download failure, which is accounted as a zero
+        throughput sample.
+
+        @param mirror: mirror (or download) URI
+        @type mirror: string
+        """
+        self._record(mirror, 0.0)
+
+    def _prior(self, stats):
+        """
+        Return the score of mirrors without statistics.
+        """
+        rates = sorted(x for x, _mtime in stats.values() if x > 0)
+        if not rates:
+            # just above a failing mirror
+            return 1.0
+        return rates[len(rates) // 2]
+
+    def _score(self, entry, prior, cur_t):
+        if entry is None:
+            return prior
+        rate, mtime = entry
+        weight = 0.5 ** (max(0.0, cur_t - mtime) / self.AGING_HALF_LIFE)
+        return weight * rate + (1.0 - weight) * prior
+
+    def get_throughput(self, mirror):
+        """
+        Return the (aged) throughput estimate of the given mirror.
+
+        @param mirror: mirror (or download) URI
+        @type mirror: string
+        @return: transfer rate in bytes/sec or None, if the mirror
+            has no statistics
+        @rtype: float or None
+        """
+        with self._lock:
+            stats = self._data()
+            entry = stats.get(self._key(mirror))
+            if entry is None:
+                return None
+            return self._score(entry, self._prior(stats), time.time())
+
+    def rank(self, mirrors):
+        """
+        Return a new list of mirrors sorted by throughput, fastest first.
+        Mirrors with equal scores (like the ones without statistics) keep
+        their relative order.
+
+        @param mirrors: list of mirror URIs
+        @type mirrors: list
+        @return: sorted list of mirror URIs
+        @rtype: list
+        """
+        with self._lock:
+            stats = self._data()
+            if not stats:
+                return list(mirrors)
+            prior = self._prior(stats)
+            cur_t = time.time()
+            scores = dict((x, self._score(
+                stats.get(self._key(x)), prior, cur_t)) for x in mirrors)
+        return sorted(mirrors, key = lambda x: scores[x], reverse = True)
+
+    def save(self):
+        """
+        Store the statistics to disk, if changed.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            const_debug_write(__name__,
+                "MirrorStatistics.save: %d mirrors" % (len(self._stats),))
+            entropy.dump.dumpobj(self.DUMP_NAME, self._stats.copy())
+            self._dirty = False
+
+    def clear(self):
+        """
+        Drop all the statistics, on disk too.
+        """
+        with self._lock:
+            self._stats = {}
+            self._dirty = False
+            entropy.dump.removeobj(self.DUMP_NAME)
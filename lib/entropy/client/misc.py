@@ -57,6 +57,126 @@ def exclusiveinstlock(method):
     return wrapped
 
 
+class ConfigProtectTrie(object):
+
+    """
+    Compiled CONFIG_PROTECT, CONFIG_PROTECT_MASK and configuration
+    protection skip list lookup object.
+    Paths are stored into a prefix tree keyed by path component, so that
+    determining whether a path is protected only requires a single walk
+    down its components.
+    """
+
+    _PROTECT = 1
+    _MASK = 2
+    _FLAGS = None
+
+    def __init__(self, protect, mask, protectskip = None):
+        """
+        ConfigProtectTrie constructor.
+
+        @param protect: CONFIG_PROTECT paths
+        @type protect: iterable
+        @param mask: CONFIG_PROTECT_MASK paths
+        @type mask: iterable
+        @keyword protectskip: paths whose protection should be skipped
+        @type protectskip: iterable
+        """
+        self._root = {}
+        self._protect = frozenset(protect)
+        for path in self._protect:
+            self._add(path, self._PROTECT)
+        for path in mask:
+            self._add(path, self._MASK)
+        if protectskip is None:
+            protectskip = []
+        self._protectskip = frozenset(protectskip)
+
+    @staticmethod
+    def _split(path):
+        """
+        Split the given path into its components. The root directory is
+        represented by an empty component.
+        """
+        if not path:
+            return []
+        stripped = path.rstrip(path[0:0] + "/")
+        if not stripped:
+            # root directory
+            return [stripped]
+        return stripped.split(path[0:0] + "/")
+
+    def _add(self, path, flag):
+        """
+        Add a path to the prefix tree, marking it with the given flag.
+        """
+        node = self._root
+        for component in self._split(path):
+            node = node.setdefault(component, {})
+        node[self._FLAGS] = node.get(self._FLAGS, 0) | flag
+
+    def _lookup(self, path):
+        """
+        Return the flags of the given path and of all its parent
+        directories.
+        """
+        flags = 0
+        node = self._root
+        for component in self._split(path):
+            node = node.get(component)
+            if node is None:
+                break
+            flags |= node.get(self._FLAGS, 0)
+        return flags
+
+    def protected(self, path):
+        """
+        Return whether the given path is protected, which means that the
+        path or one of its parent directories is listed in CONFIG_PROTECT
+        and neither the path nor one of its parent directories is listed
+        in CONFIG_PROTECT_MASK.
+
+        @param path: path to test
+        @type path: string
+        @return: True, if path is protected
+        @rtype: bool
+        """
+        flags = self._lookup(path)
+        return (flags & self._PROTECT) and not (flags & self._MASK)
+
+    def skipped(self, path):
+        """
+        Return whether the protection of the given path should be skipped.
+
+        @param path: path to test
+        @type path: string
+        @return: True, if path protection should be skipped
+        @rtype: bool
+        """
+        return path in self._protectskip
+
+    def roots(self):
+        """
+        Return the sorted list of CONFIG_PROTECT paths that are not
+        contained into other CONFIG_PROTECT paths.
+
+        @return: list of paths
+        @rtype: list
+        """
+        paths = []
+        for path in sorted(self._protect):
+            flags = 0
+            node = self._root
+            for component in self._split(path)[:-1]:
+                node = node.get(component)
+                if node is None:
+                    break
+                flags |= node.get(self._FLAGS, 0)
+            if not (flags & self._PROTECT):
+                paths.append(path)
+        return paths
+
+
 class ConfigurationFiles(dict):
 
     """
@@ -293,7 +413,10 @@ class ConfigurationFiles(dict):
         Load configuration file updates reading from disk.
         """
         name_cache = set()
-        client_conf_protect = self._get_config_protect()
+        # paths contained into other protected directories are walked
+        # as part of them already.
+        client_conf_protect = ConfigProtectTrie(
+            self._get_config_protect(), []).roots()
         # NOTE: with Python 3.x we can remove const_convert...
         # and avoid using _encode_path.
         cfg_pfx = const_convert_to_rawstring("._cfg")
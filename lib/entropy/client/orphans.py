@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Package Manager Client Orphaned Files Interface}.
+
+"""
+import errno
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import stat
+
+from entropy.const import etpConst, const_convert_to_unicode, \
+    const_convert_to_rawstring, const_is_python3, const_mkdtemp, \
+    const_debug_write
+from entropy.misc import ParallelTask
+
+import entropy.tools
+
+if const_is_python3():
+    import queue as Queue
+else:
+    import Queue
+
+
+class FileOwnershipIndex(object):
+
+    """
+    Persistent, sorted index of the paths owned by the packages in the
+    Installed Packages Repository. Besides the paths recorded in the
+    repository, the index contains their variants reachable through the
+    system symlinks (see SystemSettings "system_rev_symlinks") and
+    through the symlinks of their parent directories.
+    The index is stored into a SQLite database and rebuilt only when the
+    Installed Packages Repository changes.
+    """
+
+    INDEX_FILE = "file_ownership_index.db"
+
+    def __init__(self, installed_repository, reverse_symlink_map,
+                 index_dir = None):
+        """
+        FileOwnershipIndex constructor.
+
+        @param installed_repository: the Installed Packages Repository
+        @type installed_repository: EntropyRepositoryBase
+        @param reverse_symlink_map: SystemSettings "system_rev_symlinks"
+        @type reverse_symlink_map: dict
+        @keyword index_dir: directory where the index is stored, if None,
+            etpConst['dumpstoragedir'] is used
+        @type index_dir: string
+        """
+        self._repo = installed_repository
+        self._reverse_symlink_map = reverse_symlink_map
+        if index_dir is None:
+            index_dir = etpConst['dumpstoragedir']
+        self._index_path = os.path.join(index_dir, self.INDEX_FILE)
+        self._tmp_dir = None
+
+    def _signature(self):
+        """
+        Return the signature of the data the index is built from.
+        """
+        sha = hashlib.sha1()
+        data = "%s|%s|%s" % (
+            self._repo.checksum(),
+            etpConst['systemroot'],
+            sorted((x, sorted(y)) for x, y in
+                   self._reverse_symlink_map.items()),)
+        sha.update(const_convert_to_rawstring(data))
+        return sha.hexdigest()
+
+    def _stored_signature(self):
+        """
+        Return the signature of the stored index, or None.
+        """
+        if not os.path.isfile(self._index_path):
+            return None
+        conn = None
+        try:
+            conn = sqlite3.connect(self._index_path)
+            cur = conn.execute("""
+            SELECT value FROM metadata WHERE name = 'signature'
+            """)
+            row = cur.fetchone()
+        except sqlite3.Error:
+            return None
+        finally:
+            if conn is not None:
+                conn.close()
+        if row is None:
+            return None
+        return row[0]
+
+    def _owned_paths(self):
+        """
+        Generate all the paths owned by the installed packages, including
+        the symlink variants. Duplicates may be generated.
+        """
+        realpath_cache = {}
+        reverse_symlink_map = self._reverse_symlink_map
+
+        for package_id in self._repo.listAllPackageIds():
+            for path, _ftype in self._repo.retrieveContentIter(package_id):
+                # reverse sym
+                for sym_dir in reverse_symlink_map:
+                    if path.startswith(sym_dir):
+                        for sym_child in reverse_symlink_map[sym_dir]:
+                            yield sym_child + path[len(sym_dir):]
+                # real path also
+                dirname, basename = os.path.split(path)
+                dirname_real = realpath_cache.get(dirname)
+                if dirname_real is None:
+                    dirname_real = os.path.realpath(dirname)
+                    realpath_cache[dirname] = dirname_real
+                yield os.path.join(dirname_real, basename)
+                yield path
+
+    def _build(self, index_path, signature):
+        """
+        Build the index into index_path.
+        """
+        tmp_path = index_path + ".%s.tmp" % (os.getpid(),)
+        try:
+            os.remove(tmp_path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript("""
+                PRAGMA synchronous = OFF;
+                PRAGMA journal_mode = OFF;
+                CREATE TABLE metadata (
+                    name VARCHAR PRIMARY KEY,
+                    value VARCHAR
+                );
+                CREATE TABLE paths (
+                    path VARCHAR PRIMARY KEY
+                );
+            """)
+            conn.executemany("""
+            INSERT OR IGNORE INTO paths VALUES (?)
+            """, ((const_convert_to_unicode(x),) for x in
+                  self._owned_paths()))
+            conn.execute("""
+            INSERT INTO metadata VALUES ('signature', ?)
+            """, (signature,))
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.rename(tmp_path, index_path)
+
+    def update(self):
+        """
+        Make sure that the index is in sync with the Installed Packages
+        Repository, rebuilding it if needed. If the index directory is
+        not writable, the index is built into a temporary directory that
+        is removed by close().
+
+        @return: True, if the index has been rebuilt
+        @rtype: bool
+        """
+        signature = self._signature()
+        if self._stored_signature() == signature:
+            return False
+
+        try:
+            self._build(self._index_path, signature)
+        except (OSError, IOError, sqlite3.Error) as err:
+            const_debug_write(
+                __name__,
+                "FileOwnershipIndex.update: cannot write %s: %s" % (
+                    self._index_path, repr(err),))
+            self.close()
+            self._tmp_dir = const_mkdtemp(prefix = "entropy.orphans")
+            self._index_path = os.path.join(self._tmp_dir, self.INDEX_FILE)
+            self._build(self._index_path, signature)
+        return True
+
+    def close(self):
+        """
+        Remove the temporary index, if any.
+        """
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, True)
+            self._tmp_dir = None
+
+    def iter_prefix(self, prefix):
+        """
+        Iterate, in sorted order, over the indexed paths starting with
+        the given directory prefix.
+        This method opens its own database connection, so it is safe to
+        call it from any thread.
+
+        @param prefix: directory prefix, must end with os.path.sep
+        @type prefix: string
+        @return: iterator of paths
+        @rtype: iterator
+        """
+        prefix = const_convert_to_unicode(prefix)
+        # first string sorting after every string starting with prefix
+        upper = prefix[:-1] + const_convert_to_unicode(
+            chr(ord(os.path.sep) + 1))
+
+        conn = sqlite3.connect(self._index_path, check_same_thread = False)
+        try:
+            cur = conn.execute("""
+            SELECT path FROM paths WHERE path >= ? AND path < ?
+            ORDER BY path
+            """, (prefix, upper))
+            for path, in cur:
+                yield path
+        finally:
+            conn.close()
+
+
+class OrphanedFilesScanner(object):
+
+    """
+    Find the files on the live filesystem that are not owned by any
+    installed package.
+    Every system directory is walked by its own thread, in sorted order,
+    and merged against a FileOwnershipIndex. Orphaned files are returned
+    as soon as they are found, neither the filesystem listing nor the
+    index are ever loaded into memory.
+    """
+
+    _QUEUE_SIZE = 1024
+
+    def __init__(self, ownership_index, system_dirs, system_dirs_mask):
+        """
+        OrphanedFilesScanner constructor.
+
+        @param ownership_index: an updated FileOwnershipIndex object
+        @type ownership_index: FileOwnershipIndex
+        @param system_dirs: SystemSettings "system_dirs"
+        @type system_dirs: list
+        @param system_dirs_mask: SystemSettings "system_dirs_mask"
+        @type system_dirs_mask: list
+        """
+        self._index = ownership_index
+        self._mask_regexps = [re.compile(x) for x in system_dirs_mask]
+        # make sure we're all rawstring.
+        self._mask_paths = [const_convert_to_rawstring(x) for x in \
+            system_dirs_mask if entropy.tools.is_valid_path(x)]
+        self._dirs = self._top_dirs(system_dirs)
+        self._counters = dict((x, 0) for x in self._dirs)
+
+    @staticmethod
+    def _top_dirs(system_dirs):
+        """
+        Return the system directories that are not contained into other
+        system directories, as raw strings.
+        """
+        sep = const_convert_to_rawstring(os.path.sep)
+        dirs = set()
+        for xdir in system_dirs:
+            # make sure it's bytes (raw encoding
+            # as per EntropyRepository.retrieveContent())
+            xdir = const_convert_to_rawstring(
+                xdir, from_enctype = etpConst['conf_raw_encoding'])
+            dirs.add(xdir.rstrip(sep) + sep)
+
+        top_dirs = []
+        for xdir in sorted(dirs):
+            if top_dirs and xdir.startswith(top_dirs[-1]):
+                continue
+            top_dirs.append(xdir)
+        return top_dirs
+
+    def count(self):
+        """
+        Return the number of files analyzed so far.
+
+        @return: number of analyzed files
+        @rtype: int
+        """
+        return sum(self._counters.values())
+
+    def _masked(self, path):
+        """
+        Return whether the given path is masked.
+        """
+        for mask in self._mask_paths:
+            if path.startswith(mask):
+                return True
+        for mask in self._mask_regexps:
+            if mask.match(path):
+                return True
+        return False
+
+    def _dir_masked(self, path):
+        """
+        Return whether all the files in the given directory (ending with
+        os.path.sep) are masked by a path prefix.
+        """
+        for mask in self._mask_paths:
+            if path.startswith(mask):
+                return True
+        return False
+
+    @staticmethod
+    def _list_dir(path):
+        """
+        Return the list of (name, is_dir) tuples of the given directory,
+        skipping symlinks. Directory names end with os.path.sep, so that
+        sorting the list gives the same order of sorting full paths.
+        """
+        sep = path[-1:]
+        entries = []
+        scandir = getattr(os, "scandir", None)
+
+        if scandir is not None:
+            for entry in scandir(path):
+                try:
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir(follow_symlinks = False):
+                        entries.append((entry.name + sep, True))
+                    else:
+                        entries.append((entry.name, False))
+                except OSError:
+                    continue
+            return entries
+
+        for name in os.listdir(path):
+            try:
+                mode = os.lstat(path + name).st_mode
+            except OSError:
+                continue
+            if stat.S_ISLNK(mode):
+                continue
+            if stat.S_ISDIR(mode):
+                entries.append((name + sep, True))
+            else:
+                entries.append((name, False))
+        return entries
+
+    def _walk(self, top_dir):
+        """
+        Walk the given directory (ending with os.path.sep) generating its
+        files, in sorted order, as unicode strings.
+        """
+        stack = [(top_dir, None)]
+        counters = self._counters
+
+        while stack:
+            path, entries = stack.pop()
+            if entries is None:
+                try:
+                    entries = self._list_dir(path)
+                except (OSError, IOError, RuntimeError):
+                    continue
+                entries.sort(reverse = True)
+
+            while entries:
+                name, is_dir = entries.pop()
+                item = path + name
+                if is_dir:
+                    if self._dir_masked(item):
+                        continue
+                    stack.append((path, entries))
+                    stack.append((item, None))
+                    break
+
+                if self._masked(item):
+                    continue
+                counters[top_dir] += 1
+                yield const_convert_to_unicode(item)
+
+    def _scan(self, top_dir, results):
+        """
+        Merge the sorted listing of the given directory against the
+        ownership index, pushing the orphaned files to results.
+        """
+        try:
+            indexed = self._index.iter_prefix(top_dir)
+            indexed_path = next(indexed, None)
+
+            for path in self._walk(top_dir):
+                while indexed_path is not None and indexed_path < path:
+                    indexed_path = next(indexed, None)
+                if indexed_path != path:
+                    results.put(path)
+
+        except Exception as err:
+            results.put(err)
+        finally:
+            results.put(None)
+
+    def scan(self):
+        """
+        Scan the system directories, generating the orphaned files as
+        soon as they are found. The order of the generated files is
+        undefined.
+
+        @return: iterator of orphaned files (unicode strings)
+        @rtype: iterator
+        """
+        results = Queue.Queue(self._QUEUE_SIZE)
+        threads = []
+        for top_dir in self._dirs:
+            th = ParallelTask(self._scan, top_dir, results)
+            th.daemon = True
+            th.start()
+            threads.append(th)
+
+        running = len(threads)
+        while running:
+            item = results.get()
+            if item is None:
+                running -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+        for th in threads:
+            th.join()
@@ -596,6 +596,8 @@ def const_default_settings(rootdir):
         'default_nice': 0,
         # Default download socket timeout for Entropy Client transceivers
         'default_download_timeout': 30,
+        # Default number of concurrent downloads for Entropy Client
+        'default_download_workers': 4,
         # Entropy package dependencies type identifiers
         'dependency_type_ids': {
             'rdepend_id': 0, # runtime dependencies
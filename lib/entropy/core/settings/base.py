@@ -1890,6 +1890,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             'default_repository': etpConst['officialrepositoryid'],
             'transfer_limit': etpConst['downloadspeedlimit'],
             'timeout': etpConst['default_download_timeout'],
+            'download_workers': etpConst['default_download_workers'],
             'security_advisories_url': etpConst['securityurl'],
             'developer_repo': False,
             'differential_update': True,
@@ -1994,6 +1995,14 @@ class SystemSettings(Singleton, EntropyPluginStore):
             except ValueError:
                 return
 
+        def _down_workers(line, setting):
+            try:
+                myval = int(setting)
+            except ValueError:
+                return
+            if myval > 0:
+                data['download_workers'] = myval
+
         def _security_url(setting):
             data['security_advisories_url'] = setting
 
@@ -2013,6 +2022,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             # backward compatibility
             'downloadtimeout': _down_timeout,
             'download-timeout': _down_timeout,
+            'download-workers': _down_workers,
             # backward compatibility
             'securityurl': _security_url,
             'security-url': _security_url,
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    I{EntropyRepository} compiled dependency graph.
+
+"""
+import bisect
+import errno
+import mmap
+import os
+import struct
+import zlib
+
+from entropy.const import const_isunicode, const_convert_to_unicode
+from entropy.exceptions import EntropyException
+
+
+class _RecordColumn(object):
+    """
+    Read-only sequence view of a field of fixed size records stored into
+    a buffer. Used to run bisect on memory-mapped data.
+    """
+
+    def __init__(self, buf, offset, record, count, field):
+        self._buf = buf
+        self._offset = offset
+        self._record = record
+        self._count = count
+        self._field = field
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if idx < 0 or idx >= self._count:
+            raise IndexError(idx)
+        return self._record.unpack_from(
+            self._buf, self._offset + idx * self._record.size)[self._field]
+
+
+class CompiledDependencyGraph(object):
+
+    """
+    Read-only, memory-mapped, dependency graph of a repository.
+    It stores the dependency strings (conflicts included) of every
+    package and, for every dependency string, the package identifier
+    that atomMatch() returns when package masking is disabled.
+    The file is bound to a repository checksum, see checksum().
+
+    File layout (little endian):
+        - header: magic, format version, checksum length, number of
+          dependencies, number of packages, number of edges,
+          string pool size
+        - checksum
+        - dependencies: (crc32, package_id, pool offset, length),
+          sorted by crc32
+        - packages: (package_id, first edge, number of edges),
+          sorted by package_id
+        - edges: (dependency index, dependency type)
+        - string pool (utf-8)
+    """
+
+    MAGIC = b"ETPDEPGR"
+    VERSION = 1
+
+    # package identifier of dependencies that must be matched at runtime
+    UNRESOLVED = -2
+    # dependency type of conflicts
+    CONFLICT = -1
+
+    _HEADER = struct.Struct("<8sIIIIII")
+    _DEPENDENCY = struct.Struct("<IiII")
+    _PACKAGE = struct.Struct("<iII")
+    _EDGE = struct.Struct("<Ii")
+
+    class InvalidGraph(EntropyException):
+        """
+        Raised when the dependency graph file is corrupted or has an
+        unsupported format.
+        """
+
+    def __init__(self, path):
+        """
+        CompiledDependencyGraph constructor.
+
+        @param path: path to the dependency graph file
+        @type path: string
+        @raise IOError: if the file cannot be read
+        @raise CompiledDependencyGraph.InvalidGraph: if the file is invalid
+        """
+        self._path = path
+        self._mmap = None
+        with open(path, "rb") as graph_f:
+            size = os.fstat(graph_f.fileno()).st_size
+            if size < self._HEADER.size:
+                raise CompiledDependencyGraph.InvalidGraph(
+                    "truncated header")
+            self._mmap = mmap.mmap(graph_f.fileno(), 0,
+                                   access = mmap.ACCESS_READ)
+
+        try:
+            self._setup(size)
+        except (struct.error, UnicodeDecodeError) as err:
+            self.close()
+            raise CompiledDependencyGraph.InvalidGraph(repr(err))
+        except CompiledDependencyGraph.InvalidGraph:
+            self.close()
+            raise
+
+    def _setup(self, size):
+        """
+        Parse the header and compute the offset of every section.
+        """
+        magic, version, checksum_len, deps_count, pkgs_count, \
+            edges_count, pool_size = self._HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            raise CompiledDependencyGraph.InvalidGraph("invalid magic")
+        if version != self.VERSION:
+            raise CompiledDependencyGraph.InvalidGraph(
+                "unsupported version: %s" % (version,))
+
+        offset = self._HEADER.size
+        self._checksum = const_convert_to_unicode(
+            self._mmap[offset:offset + checksum_len], enctype = "utf-8")
+        offset += checksum_len
+        self._deps_offset = offset
+        self._deps_count = deps_count
+        offset += deps_count * self._DEPENDENCY.size
+        self._pkgs_offset = offset
+        self._pkgs_count = pkgs_count
+        offset += pkgs_count * self._PACKAGE.size
+        self._edges_offset = offset
+        offset += edges_count * self._EDGE.size
+        self._pool_offset = offset
+        offset += pool_size
+        if offset != size:
+            raise CompiledDependencyGraph.InvalidGraph("size mismatch")
+
+        self._deps_hashes = _RecordColumn(
+            self._mmap, self._deps_offset, self._DEPENDENCY,
+            deps_count, 0)
+        self._pkgs_ids = _RecordColumn(
+            self._mmap, self._pkgs_offset, self._PACKAGE,
+            pkgs_count, 0)
+
+    @staticmethod
+    def _encode(dependency):
+        """
+        Return the raw (utf-8) representation of a dependency string.
+        """
+        if const_isunicode(dependency):
+            return dependency.encode("utf-8")
+        return dependency
+
+    def close(self):
+        """
+        Release the memory-mapped file.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def checksum(self):
+        """
+        Return the checksum of the repository the graph has been
+        compiled from.
+
+        @return: the repository checksum
+        @rtype: string
+        """
+        return self._checksum
+
+    def _dependency(self, idx):
+        """
+        Return the dependency string stored at the given index.
+        """
+        _crc, _package_id, pool_offset, length = \
+            self._DEPENDENCY.unpack_from(
+                self._mmap, self._deps_offset + idx * self._DEPENDENCY.size)
+        start = self._pool_offset + pool_offset
+        return const_convert_to_unicode(
+            self._mmap[start:start + length], enctype = "utf-8")
+
+    def match(self, dependency):
+        """
+        Return the package identifier matched by the given dependency
+        string when package masking is disabled.
+
+        @param dependency: dependency string
+        @type dependency: string
+        @return: the package identifier, -1 if the dependency doesn't match
+            any package, or None if the dependency is not in the graph or it
+            cannot be matched without querying the repository
+        @rtype: int
+        """
+        raw = self._encode(dependency)
+        crc = zlib.crc32(raw) & 0xffffffff
+        idx = bisect.bisect_left(self._deps_hashes, crc)
+
+        record = self._DEPENDENCY
+        while idx < self._deps_count:
+            dep_crc, package_id, pool_offset, length = record.unpack_from(
+                self._mmap, self._deps_offset + idx * record.size)
+            if dep_crc != crc:
+                break
+            start = self._pool_offset + pool_offset
+            if self._mmap[start:start + length] == raw:
+                if package_id == self.UNRESOLVED:
+                    return None
+                return package_id
+            idx += 1
+        return None
+
+    def dependencies(self, package_id):
+        """
+        Return the dependencies of the given package.
+
+        @param package_id: package identifier
+        @type package_id: int
+        @return: tuple of (dependency string, dependency type), conflicts
+            are returned with the "!" prefix and CONFLICT type, or None if
+            the package is not in the graph
+        @rtype: tuple
+        """
+        idx = bisect.bisect_left(self._pkgs_ids, package_id)
+        if idx >= self._pkgs_count:
+            return None
+        pkg_id, first_edge, edges_count = self._PACKAGE.unpack_from(
+            self._mmap, self._pkgs_offset + idx * self._PACKAGE.size)
+        if pkg_id != package_id:
+            return None
+
+        edge = self._EDGE
+        deps = []
+        offset = self._edges_offset + first_edge * edge.size
+        for _idx in range(edges_count):
+            dep_idx, dep_type = edge.unpack_from(self._mmap, offset)
+            deps.append((self._dependency(dep_idx), dep_type))
+            offset += edge.size
+        return tuple(deps)
+
+    @classmethod
+    def build(cls, path, checksum, dependencies, matcher):
+        """
+        Compile a dependency graph and atomically write it to path.
+
+        @param path: path to the dependency graph file
+        @type path: string
+        @param checksum: checksum of the repository
+        @type checksum: string
+        @param dependencies: dict composed by package identifier as key and
+            iterable of (dependency string, dependency type) as value
+        @type dependencies: dict
+        @param matcher: callable returning the package identifier matched
+            by a dependency string, -1 if nothing matches, or None if the
+            dependency must be matched at runtime
+        @type matcher: callable
+        @raise IOError: if the file cannot be written
+        @raise OSError: if the file cannot be written
+        """
+        deps = []
+        deps_index = {}
+        packages = []
+        edges = []
+        for package_id in sorted(dependencies):
+            first_edge = len(edges)
+            for dependency, dep_type in dependencies[package_id]:
+                idx = deps_index.get(dependency)
+                if idx is None:
+                    idx = len(deps)
+                    deps_index[dependency] = idx
+                    deps.append(dependency)
+                edges.append((idx, dep_type))
+            packages.append(
+                (package_id, first_edge, len(edges) - first_edge))
+
+        records = []
+        for idx, dependency in enumerate(deps):
+            raw = cls._encode(dependency)
+            package_id = matcher(dependency)
+            if package_id is None:
+                package_id = cls.UNRESOLVED
+            records.append(
+                (zlib.crc32(raw) & 0xffffffff, idx, package_id, raw))
+        records.sort()
+
+        remap = [0] * len(records)
+        for new_idx, record in enumerate(records):
+            remap[record[1]] = new_idx
+
+        raw_checksum = cls._encode(checksum)
+        pool_size = sum(len(x[3]) for x in records)
+
+        tmp_path = path + ".%s.tmp" % (os.getpid(),)
+        try:
+            with open(tmp_path, "wb") as graph_f:
+                graph_f.write(cls._HEADER.pack(
+                    cls.MAGIC, cls.VERSION, len(raw_checksum),
+                    len(records), len(packages), len(edges), pool_size))
+                graph_f.write(raw_checksum)
+
+                pool_offset = 0
+                for crc, _idx, package_id, raw in records:
+                    graph_f.write(cls._DEPENDENCY.pack(
+                        crc, package_id, pool_offset, len(raw)))
+                    pool_offset += len(raw)
+                for package in packages:
+                    graph_f.write(cls._PACKAGE.pack(*package))
+                for idx, dep_type in edges:
+                    graph_f.write(cls._EDGE.pack(remap[idx], dep_type))
+                for record in records:
+                    graph_f.write(record[3])
+
+            os.rename(tmp_path, path)
+        except (OSError, IOError):
+            try:
+                os.remove(tmp_path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+            raise
@@ -19,7 +19,6 @@ import contextlib
 import threading
 
 from entropy.i18n import _
-from entropy.exceptions import InvalidAtom
 from entropy.const import etpConst, const_cmp, const_debug_write, \
     const_convert_to_rawstring, const_mkstemp, const_is_python3
 from entropy.output import TextInterface, brown, bold, red, blue, purple, \
@@ -369,6 +368,9 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     VIRTUAL_META_PACKAGE_CATEGORY = "virtual"
     # You can extend this with custom settings for your Repository
     SETTING_KEYS = ("arch", "schema_revision")
+    # number of packages whose metadata is kept in memory at the same
+    # time by _iterPackageDataBatch()
+    _PACKAGE_DATA_CHUNK_SIZE = 64
 
     class ModuleProxy(object):
 
@@ -1980,6 +1982,52 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         return data
 
+    def getPackageDataBatch(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reconstruct all the package metadata belonging to the provided
+        package identifiers, see getPackageData().
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        getPackageData() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword get_content:
+        @type get_content: bool
+        @keyword content_insert_formatted:
+        @type content_insert_formatted: bool
+        @keyword get_changelog:  return ChangeLog text metadatum or None
+        @type get_changelog: bool
+        @keyword get_content_safety: return content_safety metadata or {}
+        @type get_content_safety: bool
+        @return: dict composed by package identifier as key and package
+            metadata (or None, if not available) as value
+        @rtype: dict
+        """
+        return dict((x, self.getPackageData(
+                    x, get_content = get_content,
+                    content_insert_formatted = content_insert_formatted,
+                    get_changelog = get_changelog,
+                    get_content_safety = get_content_safety))
+                    for x in package_ids)
+
+    def _iterPackageDataBatch(self, package_ids, **kwargs):
+        """
+        Generate (package_id, metadata) tuples for the given package
+        identifiers, in order, calling getPackageDataBatch() on chunks of
+        them in order to keep memory usage bounded. Keyword arguments are
+        passed to getPackageDataBatch().
+        """
+        package_ids = list(package_ids)
+        chunk_size = self._PACKAGE_DATA_CHUNK_SIZE
+        for idx in range(0, len(package_ids), chunk_size):
+            chunk = package_ids[idx:idx + chunk_size]
+            data = self.getPackageDataBatch(chunk, **kwargs)
+            for package_id in chunk:
+                yield package_id, data[package_id]
+
     def getPackageXmlData(self, package_ids, get_content=True,
                           get_changelog=True, get_content_safety=True):
         """
@@ -2010,11 +2058,10 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         package_changelogs_id = 1
         package_changelogs = {}
 
-        for package_id in package_ids:
-            data = self.getPackageData(
-                package_id, get_content = get_content,
+        for package_id, data in self._iterPackageDataBatch(
+                package_ids, get_content = get_content,
                 get_changelog = get_changelog,
-                get_content_safety = get_content_safety)
+                get_content_safety = get_content_safety):
 
             package = doc.createElement("package")
             package.setAttribute("id", "id-%d" % (package_id,))
@@ -2160,7 +2207,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 for dep, dep_type in sorted(data['pkg_dependencies']):
                     dependency = doc.createElement("dependency")
                     dependency.appendChild(doc.createTextNode(dep))
-                    dependency.setAttribute("type", dep_type)
+                    dependency.setAttribute("type", dep_type_map[dep_type])
                     dependency.setAttribute("conflict", "false")
                     dependencies.appendChild(dependency)
 
@@ -3475,6 +3522,44 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveDependenciesBatch(self, package_ids, extended = False,
+        deptype = None, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Return dependencies for the given package identifiers, see
+        retrieveDependencies().
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        retrieveDependencies() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword extended: return in extended format (list of tuples of length 2
+            composed by dependency name and dependency type)
+        @type extended: bool
+        @keyword deptype: return only given type of dependencies
+            see etpConst['dependency_type_ids']['*depend_id'] for dependency type
+            identifiers
+        @type deptype: bool
+        @keyword exclude_deptypes: exclude given dependency types from returned
+            data. Please see etpConst['dependency_type_ids'] for valid values.
+            Anything != int will raise AttributeError
+        @type exclude_deptypes: list
+        @keyword resolve_conditional_deps: resolve conditional dependencies
+            automatically by default, stuff like
+            ( app-foo/foo | app-foo/bar ) & bar-baz/foo
+        @type resolve_conditional_deps: bool
+        @return: dict composed by package identifier as key and
+            dependencies (tuple or frozenset) as value
+        @rtype: dict
+        @raise AttributeError: if exclude_deptypes contains illegal values
+        """
+        return dict((x, self.retrieveDependencies(
+                    x, extended = extended, deptype = deptype,
+                    exclude_deptypes = exclude_deptypes,
+                    resolve_conditional_deps = resolve_conditional_deps))
+                    for x in package_ids)
+
     def retrieveKeywords(self, package_id):
         """
         Return package SPM keyword list for given package identifier.
@@ -3486,6 +3571,21 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveKeywordsBatch(self, package_ids):
+        """
+        Return package SPM keyword lists for the given package identifiers.
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        retrieveKeywords() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and list
+            (frozenset) of keywords as value
+        @rtype: dict
+        """
+        return dict((x, self.retrieveKeywords(x)) for x in package_ids)
+
     def retrieveProtect(self, package_id):
         """
         Return CONFIG_PROTECT (configuration file protection) string
@@ -3568,6 +3668,32 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveContentBatch(self, package_ids, extended = False,
+        formatted = False, insert_formatted = False):
+        """
+        Return files contained in the given packages, see
+        retrieveContent().
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        retrieveContent() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword extended: return in extended format
+        @type extended: bool
+        @keyword formatted: return in dict() form
+        @type formatted: bool
+        @keyword insert_formatted: return in list of tuples form, ready to
+            be added with insertContent()
+        @return: dict composed by package identifier as key and content
+            metadata as value
+        @rtype: dict
+        """
+        return dict((x, self.retrieveContent(
+                    x, extended = extended, formatted = formatted,
+                    insert_formatted = insert_formatted))
+                    for x in package_ids)
+
     def retrieveContentIter(self, package_id, order_by = None,
                             reverse = False):
         """
@@ -3758,6 +3884,21 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def retrieveLicenseBatch(self, package_ids):
+        """
+        Return "license" metadata for the given package identifiers.
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        retrieveLicense() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @return: dict composed by package identifier as key and license
+            string (or None) as value
+        @rtype: dict
+        """
+        return dict((x, self.retrieveLicense(x)) for x in package_ids)
+
     def retrieveCompileFlags(self, package_id):
         """
         Return Compiler flags during building of package.
@@ -3848,6 +3989,27 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def isFileAvailableBatch(self, paths):
+        """
+        Return the package identifiers owning the given file paths.
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        isFileAvailable() for each path.
+
+        @param paths: list of paths to files or directories
+        @type paths: iterable
+        @return: dict composed by path as key and list (frozenset) of
+            package identifiers as value. Paths not owned by any package
+            are not part of the returned dict.
+        @rtype: dict
+        """
+        owners = {}
+        for path in paths:
+            package_ids = self.isFileAvailable(path, get_id = True)
+            if package_ids:
+                owners[path] = package_ids
+        return owners
+
     def resolveNeeded(self, needed, elfclass = -1, extended = False):
         """
         Resolve NEEDED ELF entry (a library name) to package_ids owning given
@@ -4390,6 +4552,16 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def listAllPackageDigests(self):
+        """
+        List all the (package identifier, digest) pairs available in
+        repository, ordered by package identifier.
+
+        @return: tuple of (package_id, digest) tuples
+        @rtype: tuple
+        """
+        raise NotImplementedError()
+
     def listAllInjectedPackageIds(self):
         """
         List all injected package identifiers available in repository.
@@ -4548,25 +4720,49 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
-    def _getIdpackagesDifferences(self, foreign_package_ids):
-        """
-        Return differences between in-repository package identifiers and
-        list provided.
-
-        @param foreign_package_ids: list of foreign package_ids
-        @type foreign_package_ids: iterable
-        @return: tuple composed by package_ids that would be added
-            and package_ids that would be removed
+    @staticmethod
+    def _sortedDifferences(local_items, foreign_items):
+        """
+        Compare two iterables of (key, value) tuples, both sorted by key,
+        walking them once in lockstep. Keys must be unique.
+
+        @param local_items: sorted iterable of (key, value) tuples
+        @type local_items: iterable
+        @param foreign_items: sorted iterable of (key, value) tuples
+        @type foreign_items: iterable
+        @return: tuple composed by the list of keys only available in
+            foreign_items (added), the list of keys only available in
+            local_items (removed) and the list of keys whose value
+            differs (changed), all sorted
         @rtype: tuple
         """
-        myids = self.listAllPackageIds()
-        if isinstance(foreign_package_ids, (list, tuple)):
-            outids = set(foreign_package_ids)
-        else:
-            outids = foreign_package_ids
-        added_ids = outids - myids
-        removed_ids = myids - outids
-        return added_ids, removed_ids
+        added, removed, changed = [], [], []
+        local_iter, foreign_iter = iter(local_items), iter(foreign_items)
+        end = object()
+
+        local = next(local_iter, end)
+        foreign = next(foreign_iter, end)
+        while local is not end and foreign is not end:
+            if local[0] == foreign[0]:
+                if local[1] != foreign[1]:
+                    changed.append(local[0])
+                local = next(local_iter, end)
+                foreign = next(foreign_iter, end)
+            elif local[0] < foreign[0]:
+                removed.append(local[0])
+                local = next(local_iter, end)
+            else:
+                added.append(foreign[0])
+                foreign = next(foreign_iter, end)
+
+        while local is not end:
+            removed.append(local[0])
+            local = next(local_iter, end)
+        while foreign is not end:
+            added.append(foreign[0])
+            foreign = next(foreign_iter, end)
+
+        return added, removed, changed
 
     def alignDatabases(self, dbconn, force = False, output_header = "  ",
         align_limit = 300):
@@ -4588,8 +4784,11 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             -1 = nothing to do)
         @rtype: int
         """
-        added_ids, removed_ids = self._getIdpackagesDifferences(
-            dbconn.listAllPackageIds())
+        # packages whose digest changed are replaced
+        added_ids, removed_ids, changed_ids = self._sortedDifferences(
+            self.listAllPackageDigests(), dbconn.listAllPackageDigests())
+        added_ids += changed_ids
+        removed_ids += changed_ids
 
         if not force:
             if len(added_ids) > align_limit: # too much hassle
@@ -4633,7 +4832,9 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         maxcount = len(added_ids)
         mycount = 0
-        for package_id in added_ids:
+        added_data = dbconn._iterPackageDataBatch(
+            added_ids, get_content = True, content_insert_formatted = True)
+        for package_id, mydata in added_data:
             mycount += 1
             mytxt = "%s: %s" % (
                 red(_("Adding entry")),
@@ -4647,8 +4848,6 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 back = True,
                 count = (mycount, maxcount)
             )
-            mydata = dbconn.getPackageData(package_id, get_content = True,
-                content_insert_formatted = True)
             self.addPackage(
                 mydata,
                 revision = mydata['revision'],
@@ -4701,6 +4900,9 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         Get Repository metadata checksum, useful for integrity verification.
         Note: result is cached in EntropyRepository.live_cache (dict).
+        Only the checksums computed with do_order=True can be compared
+        against other repositories, the others may just change whenever
+        this repository changes.
 
         @keyword do_order: order metadata collection alphabetically
         @type do_order: bool
@@ -4989,6 +5191,23 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         return package_id, 0
 
+    def maskFilterBatch(self, package_ids, live = True):
+        """
+        Evaluate maskFilter() for many package identifiers at once.
+        Subclasses supporting package masking are encouraged to reimplement
+        this method fetching the required metadata in bulk, the base
+        implementation just calls maskFilter() for each package identifier.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: iterable
+        @keyword live: use live masking feature
+        @type live: bool
+        @return: dict composed by package identifier as key and maskFilter()
+            result tuple as value
+        @rtype: dict
+        """
+        return dict((x, self.maskFilter(x, live = live)) for x in package_ids)
+
     def atomMatchCacheKey(self):
         """
         Return a string that shall be used as part of the atomMatch cache key
@@ -5046,71 +5265,28 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 if rc == 0:
                     return data, rc
 
-        matchTag = entropy.dep.dep_gettag(atom)
-        try:
-            matchUse = entropy.dep.dep_getusedeps(atom)
-        except InvalidAtom:
-            matchUse = ()
-        atomSlot = entropy.dep.dep_getslot(atom)
-        matchRevision = entropy.dep.dep_get_entropy_revision(atom)
+        parsed_atom = entropy.dep.parse_atom(atom)
+        matchTag = parsed_atom.tag
+        matchUse = parsed_atom.usedeps
+        matchRevision = parsed_atom.revision
         if isinstance(matchRevision, int):
             if matchRevision < 0:
                 matchRevision = None
 
-        # use match
-        scan_atom = entropy.dep.remove_usedeps(atom)
-        # tag match
-        scan_atom = entropy.dep.remove_tag(scan_atom)
-
-        # slot match
-        scan_atom = entropy.dep.remove_slot(scan_atom)
-        if (matchSlot is None) and (atomSlot is not None):
-            matchSlot = atomSlot
-
-        # revision match
-        scan_atom = entropy.dep.remove_entropy_revision(scan_atom)
-
-        direction = ''
-        justname = True
-        pkgkey = ''
-        pkgname = ''
-        pkgcat = ''
-        pkgversion = ''
-        stripped_atom = ''
+        if (matchSlot is None) and (parsed_atom.slot is not None):
+            matchSlot = parsed_atom.slot
+
+        direction = parsed_atom.direction
+        justname = parsed_atom.justname
+        pkgkey = parsed_atom.key
+        pkgname = parsed_atom.name
+        pkgcat = parsed_atom.category
+        pkgversion = parsed_atom.version
+        stripped_atom = parsed_atom.stripped_atom
         found_ids = []
         default_package_ids = None
 
-        if scan_atom:
-
-            while True:
-                # check for direction
-                scan_cpv = entropy.dep.dep_getcpv(scan_atom)
-                stripped_atom = scan_cpv
-                if scan_atom.endswith("*"):
-                    stripped_atom += "*"
-                direction = scan_atom[0:-len(stripped_atom)]
-
-                justname = entropy.dep.isjustname(scan_cpv)
-                pkgkey = stripped_atom
-                if justname == 0:
-                    # get version
-                    data = entropy.dep.catpkgsplit(scan_cpv)
-                    if data is None:
-                        break # badly formatted
-                    wildcard = ""
-                    if scan_atom.endswith("*"):
-                        wildcard = "*"
-                    pkgversion = data[2]+wildcard+"-"+data[3]
-                    pkgkey = entropy.dep.dep_getkey(stripped_atom)
-
-                splitkey = pkgkey.split("/")
-                if (len(splitkey) == 2):
-                    pkgcat, pkgname = splitkey
-                else:
-                    pkgcat, pkgname = "null", splitkey[0]
-
-                break
-
+        if parsed_atom.scan_atom:
 
             # IDs found in the database that match our search
             try:
@@ -5130,10 +5306,10 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             found_ids = self.__filterSlotTagUse(found_ids, matchSlot,
                 matchTag, matchUse, direction)
             if maskFilter:
-                def _filter(pkg_id):
-                    pkg_id, pkg_reason = self.maskFilter(pkg_id)
-                    return pkg_id != -1
-                found_ids = set(filter(_filter, found_ids))
+                found_ids = set(
+                    x for x, (pkg_id, _pkg_reason) in \
+                        self.maskFilterBatch(found_ids).items() \
+                        if pkg_id != -1)
 
         ### END FILTERING
 
@@ -5276,6 +5452,39 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             )
             return x, rc
 
+    def atomMatchBatch(self, matches, maskFilter = True):
+        """
+        Match a list of (package key, slot, tag) tuples at once. Every tuple
+        is matched like atomMatch() would do with extendedResults = True,
+        using the package key (with the tag appended, if any) as atom and
+        slot as matchSlot. A None slot or tag means "any".
+        This is the building block of whole-system update calculations.
+        Subclasses are encouraged to reimplement this method using
+        set-oriented queries, the base implementation just calls
+        atomMatch() for each tuple.
+
+        @param matches: list of (package key, slot, tag) tuples
+        @type matches: list
+        @keyword maskFilter: enable package masking filter
+        @type maskFilter: bool
+        @return: dict composed by (package key, slot, tag) tuple as key and
+            atomMatch() extended result tuple (package_id or -1, command
+            status, version, tag, revision) as value
+        @rtype: dict
+        """
+        results = {}
+        for match in matches:
+            if match in results:
+                continue
+            key, slot, tag = match
+            atom = key
+            if tag:
+                atom = "%s%s%s" % (key, etpConst['entropytagprefix'], tag)
+            data, rc = self.atomMatch(atom, matchSlot = slot,
+                maskFilter = maskFilter, extendedResults = True)
+            results[match] = data
+        return results
+
     def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch):
 
         if pkgcat == "null":
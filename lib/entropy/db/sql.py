@@ -608,6 +608,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
     _MAIN_THREAD = threading.current_thread()
 
+    # Maximum amount of bind parameters used by a single IN clause
+    # (SQLite defaults to 999 bind parameters per statement).
+    _BATCH_CHUNK_SIZE = 500
+
     @classmethod
     def isMainThread(cls, thread_obj):
         return thread_obj is cls._MAIN_THREAD
@@ -900,6 +904,23 @@ class EntropySQLRepository(EntropyRepositoryBase):
             content |= set(x)
         return frozenset(content)
 
+    def _executeBatch(self, query, package_ids):
+        """
+        Execute the given query once per chunk of package identifiers and
+        return all the resulting rows. The query must contain a "%s"
+        placeholder that is replaced with the bind parameters list of an
+        IN clause.
+        """
+        package_ids = list(package_ids)
+        rows = []
+        chunk_size = self._BATCH_CHUNK_SIZE
+        for idx in range(0, len(package_ids), chunk_size):
+            chunk = package_ids[idx:idx + chunk_size]
+            cur = self._cursor().execute(
+                query % (",".join(["?"] * len(chunk)),), chunk)
+            rows.extend(cur.fetchall())
+        return rows
+
     def _cur2tuple(self, cur):
         """
         Flatten out a cursor content (usually some kind of list of lists)
@@ -1383,6 +1404,11 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if original_repository is not None:
             self.storeInstalledPackage(package_id, original_repository)
 
+        # dependencies and conflicts are handled by insertDependencies()
+        # and insertConflicts()
+        self._bumpChecksumGenerations(
+            ("baseinfo", "extrainfo", "packagesignatures"))
+
         # baseinfo and extrainfo are tainted
         # ensure that cache is clear even here
         self.clearCache()
@@ -1396,6 +1422,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Needs to call superclass method.
         """
         try:
+            rev_deps = self._getReverseDependenciesMetadata()
             package_id = self._addPackage(pkg_data, revision = revision,
                 package_id = package_id,
                 formatted_content = formatted_content)
@@ -1403,6 +1430,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 pkg_data, revision = revision,
                 package_id = package_id,
                 formatted_content = formatted_content)
+            if rev_deps is not None:
+                self._addReverseDependenciesMetadata(package_id, *rev_deps)
             return package_id
         except:
             self._connection().rollback()
@@ -1414,13 +1443,17 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Needs to call superclass method.
         """
         try:
+            rev_deps = self._getReverseDependenciesMetadata()
             self.clearCache()
             super(EntropySQLRepository, self).removePackage(
                 package_id, from_add_package = from_add_package)
             self.clearCache()
 
-            return self._removePackage(package_id,
+            outcome = self._removePackage(package_id,
                 from_add_package = from_add_package)
+            if rev_deps is not None:
+                self._removeReverseDependenciesMetadata(package_id, *rev_deps)
+            return outcome
         except:
             self._connection().rollback()
             raise
@@ -1433,6 +1466,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         self._cursor().execute(
             "DELETE FROM baseinfo WHERE idpackage = ?", (package_id,))
+        self._bumpChecksumGenerations(
+            ("baseinfo", "extrainfo", "packagesignatures",
+             "dependenciesreference", "dependencies", "conflicts"))
 
     def _removeMirrorEntries(self, mirrorname):
         """
@@ -1563,6 +1599,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET datecreation = ? WHERE idpackage = ?
         """, (str(date), package_id,))
+        self._bumpChecksumGenerations(("extrainfo",))
 
     def setDigest(self, package_id, digest):
         """
@@ -1571,6 +1608,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET digest = ? WHERE idpackage = ?
         """, (digest, package_id,))
+        self._bumpChecksumGenerations(("extrainfo",))
 
     def setSignatures(self, package_id, sha1, sha256, sha512, gpg = None):
         """
@@ -1580,6 +1618,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         UPDATE packagesignatures SET sha1 = ?, sha256 = ?, sha512 = ?,
         gpg = ? WHERE idpackage = ?
         """, (sha1, sha256, sha512, gpg, package_id))
+        self._bumpChecksumGenerations(("packagesignatures",))
 
     def setDownloadURL(self, package_id, url):
         """
@@ -1593,6 +1632,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE extrainfo SET download = ? WHERE idpackage = ?
         """, (url, package_id,))
+        self._bumpChecksumGenerations(("extrainfo",))
 
     def setCategory(self, package_id, category):
         """
@@ -1601,6 +1641,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET category = ? WHERE idpackage = ?
         """, (category, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
     def setCategoryDescription(self, category, description_data):
         """
@@ -1622,6 +1663,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET name = ? WHERE idpackage = ?
         """, (name, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
     def setDependency(self, iddependency, dependency):
         """
@@ -1631,6 +1673,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         UPDATE dependenciesreference SET dependency = ?
         WHERE iddependency = ?
         """, (dependency, iddependency,))
+        self._bumpChecksumGenerations(("dependenciesreference",))
 
     def setAtom(self, package_id, atom):
         """
@@ -1639,6 +1682,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET atom = ? WHERE idpackage = ?
         """, (atom, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
     def setSlot(self, package_id, slot):
         """
@@ -1647,6 +1691,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET slot = ? WHERE idpackage = ?
         """, (slot, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
     def setRevision(self, package_id, revision):
         """
@@ -1655,6 +1700,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET revision = ? WHERE idpackage = ?
         """, (revision, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
     def removeDependencies(self, package_id):
         """
@@ -1663,6 +1709,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         DELETE FROM dependencies WHERE idpackage = ?
         """, (package_id,))
+        self._bumpChecksumGenerations(("dependencies",))
 
     def insertDependencies(self, package_id, depdata):
         """
@@ -1691,6 +1738,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().executemany("""
         INSERT INTO dependencies VALUES (?, ?, ?)
         """, insert_list())
+        self._bumpChecksumGenerations(
+            ("dependenciesreference", "dependencies"))
 
     def removeConflicts(self, package_id):
         """
@@ -1702,6 +1751,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         DELETE FROM conflicts WHERE idpackage = ?
         """, (package_id,))
+        self._bumpChecksumGenerations(("conflicts",))
 
     def insertConflicts(self, package_id, conflicts):
         """
@@ -1715,6 +1765,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().executemany("""
         INSERT INTO conflicts VALUES (?, ?)
         """, [(package_id, x,) for x in conflicts])
+        self._bumpChecksumGenerations(("conflicts",))
 
     def insertContent(self, package_id, content, already_formatted = False):
         """
@@ -2420,6 +2471,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         DELETE FROM dependenciesreference
         WHERE iddependency NOT IN (SELECT iddependency FROM dependencies)
         """)
+        self._bumpChecksumGenerations(("dependenciesreference",))
 
     def getFakeSpmUid(self):
         """
@@ -2582,6 +2634,335 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def _executeBatchGroups(self, query, package_ids):
+        """
+        Execute the given query through _executeBatch() and group the
+        resulting rows by package identifier, which must be the first
+        selected column. Rows are returned without it, in query order.
+        """
+        groups = dict((x, []) for x in package_ids)
+        for row in self._executeBatch(query, groups):
+            groups[row[0]].append(row[1:])
+        return groups
+
+    def _executeBatchFirst(self, query, package_ids, default = None):
+        """
+        Execute the given query through _executeBatch() and return the
+        first value (or the first row, if more than one column is
+        selected) found for each package identifier, as done by the
+        "LIMIT 1" queries of the single package methods.
+        """
+        values = {}
+        for row in self._executeBatch(query, package_ids):
+            if row[0] not in values:
+                if len(row) == 2:
+                    values[row[0]] = row[1]
+                else:
+                    values[row[0]] = row[1:]
+        return dict((x, values.get(x, default)) for x in package_ids)
+
+    def getPackageDataBatch(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Every metadatum is retrieved with a single query per table, see
+        getPackageData() for the meaning of the returned values.
+        """
+        package_ids = list(package_ids)
+        base_data = dict((x[0], x[1:]) for x in self._executeBatch("""
+        SELECT
+            baseinfo.idpackage,
+            baseinfo.atom,
+            baseinfo.name,
+            baseinfo.version,
+            baseinfo.versiontag,
+            extrainfo.description,
+            baseinfo.category,
+            extrainfo.chost,
+            extrainfo.cflags,
+            extrainfo.cxxflags,
+            extrainfo.homepage,
+            baseinfo.license,
+            baseinfo.branch,
+            extrainfo.download,
+            extrainfo.digest,
+            baseinfo.slot,
+            baseinfo.etpapi,
+            extrainfo.datecreation,
+            extrainfo.size,
+            baseinfo.revision
+        FROM
+            baseinfo,
+            extrainfo
+        WHERE
+            baseinfo.idpackage IN (%s)
+            AND baseinfo.idpackage = extrainfo.idpackage
+        """, package_ids))
+        found_ids = [x for x in base_data]
+        groups = self._executeBatchGroups
+        first = self._executeBatchFirst
+
+        contents = {}
+        if get_content:
+            contents = self.retrieveContentBatch(
+                found_ids, extended = True, formatted = True,
+                insert_formatted = content_insert_formatted)
+
+        sources = groups("""
+        SELECT sources.idpackage, sourcesreference.source
+        FROM sources, sourcesreference
+        WHERE sources.idpackage IN (%s) AND
+        sources.idsource = sourcesreference.idsource
+        """, found_ids)
+        mirror_names = {}
+        for package_id, rows in sources.items():
+            sources[package_id] = frozenset(x for x, in rows)
+            mirror_names[package_id] = set()
+            for x in sources[package_id]:
+                if x.startswith("mirror://"):
+                    mirror_names[package_id].add(x.split("/")[2])
+        mirror_data = dict((x, set()) for x in set(
+                itertools.chain.from_iterable(mirror_names.values())))
+        for mirror_name, mirror_link in self._executeBatch("""
+        SELECT mirrorname, mirrorlink FROM mirrorlinks
+        WHERE mirrorname IN (%s)
+        """, mirror_data):
+            mirror_data[mirror_name].add(mirror_link)
+
+        signatures = first("""
+        SELECT idpackage, sha1, sha256, sha512, gpg FROM packagesignatures
+        WHERE idpackage IN (%s)
+        """, found_ids, default = (None, None, None, None))
+
+        changelogs = {}
+        if get_changelog:
+            changelogs = first("""
+            SELECT baseinfo.idpackage, packagechangelogs.changelog
+            FROM packagechangelogs, baseinfo
+            WHERE baseinfo.idpackage IN (%s) AND
+            packagechangelogs.category = baseinfo.category AND
+            packagechangelogs.name = baseinfo.name
+            """, found_ids)
+            for package_id, changelog in changelogs.items():
+                if changelog is None:
+                    continue
+                try:
+                    changelogs[package_id] = const_convert_to_unicode(
+                        changelog)
+                except UnicodeDecodeError:
+                    changelogs[package_id] = const_convert_to_unicode(
+                        changelog, enctype = 'utf-8')
+
+        contents_safety = {}
+        if get_content_safety:
+            contents_safety = groups("""
+            SELECT idpackage, file, sha256, mtime FROM contentsafety
+            WHERE idpackage IN (%s)
+            """, found_ids)
+            for package_id, rows in contents_safety.items():
+                contents_safety[package_id] = dict(
+                    (path, {'sha256': sha256, 'mtime': mtime}) for
+                    path, sha256, mtime in rows)
+
+        deps = self.retrieveDependenciesBatch(
+            found_ids, extended = True,
+            resolve_conditional_deps = False)
+
+        needed_libs = groups("""
+        SELECT idpackage, lib_user_path, lib_user_soname, soname, elfclass,
+            rpath
+        FROM needed_libs WHERE idpackage IN (%s)
+        """, found_ids)
+
+        spm_uids = first("""
+        SELECT counters.idpackage, counters.counter FROM counters, baseinfo
+        WHERE counters.idpackage IN (%s) AND
+        baseinfo.idpackage = counters.idpackage AND
+        baseinfo.branch = counters.branch
+        """, found_ids, default = -1)
+        triggers = first("""
+        SELECT idpackage, data FROM triggers WHERE idpackage IN (%s)
+        """, found_ids, default = '')
+        disk_sizes = first("""
+        SELECT idpackage, size FROM sizes WHERE idpackage IN (%s)
+        """, found_ids, default = 0)
+        injected = frozenset(self._cur2tuple(self._executeBatch("""
+        SELECT idpackage FROM injected WHERE idpackage IN (%s)
+        """, found_ids)))
+        system_packages = frozenset(self._cur2tuple(self._executeBatch("""
+        SELECT idpackage FROM systempackages WHERE idpackage IN (%s)
+        """, found_ids)))
+        protect = first("""
+        SELECT configprotect.idpackage, protect
+        FROM configprotect, configprotectreference
+        WHERE configprotect.idpackage IN (%s) AND
+        configprotect.idprotect = configprotectreference.idprotect
+        """, found_ids, default = '')
+        protect_mask = first("""
+        SELECT configprotectmask.idpackage, protect
+        FROM configprotectmask, configprotectreference
+        WHERE configprotectmask.idpackage IN (%s) AND
+        configprotectmask.idprotect = configprotectreference.idprotect
+        """, found_ids, default = '')
+        useflags = groups("""
+        SELECT useflags.idpackage, useflagsreference.flagname
+        FROM useflags, useflagsreference
+        WHERE useflags.idpackage IN (%s)
+        AND useflags.idflag = useflagsreference.idflag
+        """, found_ids)
+        keywords = self.retrieveKeywordsBatch(found_ids)
+        provided_libs = groups("""
+        SELECT idpackage, library, path, elfclass FROM provided_libs
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        provides = groups("""
+        SELECT idpackage, atom, is_default FROM provide
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        conflicts = groups("""
+        SELECT idpackage, conflict FROM conflicts WHERE idpackage IN (%s)
+        """, found_ids)
+
+        license_names = {}
+        for package_id in found_ids:
+            licenses = base_data[package_id][10]
+            names = set()
+            if licenses is not None:
+                for licname in licenses.split():
+                    if not licname.strip():
+                        continue
+                    if not entropy.tools.is_valid_string(licname):
+                        continue
+                    names.add(licname)
+            license_names[package_id] = names
+        license_texts = {}
+        for licname, lictext in self._executeBatch("""
+        SELECT licensename, text FROM licensedata WHERE licensename IN (%s)
+        """, set(itertools.chain.from_iterable(license_names.values()))):
+            if licname in license_texts:
+                continue
+            try:
+                license_texts[licname] = const_convert_to_unicode(lictext)
+            except UnicodeDecodeError:
+                license_texts[licname] = const_convert_to_unicode(
+                    lictext, enctype = 'utf-8')
+
+        spm_phases = first("""
+        SELECT idpackage, phases FROM packagespmphases
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        spm_repositories = first("""
+        SELECT idpackage, repository FROM packagespmrepository
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        desktop_mimes = groups("""
+        SELECT idpackage, name, mimetype, executable, icon
+        FROM packagedesktopmime WHERE idpackage IN (%s)
+        """, found_ids)
+        provided_mimes = groups("""
+        SELECT idpackage, mimetype FROM provided_mime
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        repositories = first("""
+        SELECT idpackage, repositoryname FROM installedtable
+        WHERE idpackage IN (%s)
+        """, found_ids)
+        extra_downloads = groups("""
+        SELECT idpackage, download, type, size, disksize, md5, sha1,
+            sha256, sha512, gpg
+        FROM packagedownloads WHERE idpackage IN (%s)
+        """, found_ids)
+
+        result = dict((x, None) for x in package_ids)
+        for package_id in found_ids:
+            atom, name, version, versiontag, \
+            description, category, chost, \
+            cflags, cxxflags, homepage, \
+            mylicense, branch, download, \
+            digest, slot, etpapi, \
+            datecreation, size, revision = base_data[package_id]
+
+            sha1, sha256, sha512, gpg = signatures[package_id]
+            pkg_needed_libs = frozenset(needed_libs[package_id])
+
+            result[package_id] = {
+                'atom': atom,
+                'name': name,
+                'version': version,
+                'versiontag': versiontag,
+                'description': description,
+                'category': category,
+                'chost': chost,
+                'cflags': cflags,
+                'cxxflags': cxxflags,
+                'homepage': homepage,
+                'license': mylicense,
+                'branch': branch,
+                'download': download,
+                'digest': digest,
+                'slot': slot,
+                'etpapi': etpapi,
+                'datecreation': datecreation,
+                'size': size,
+                'revision': revision,
+                'counter': spm_uids[package_id],
+                'trigger': const_convert_to_rawstring(
+                    triggers[package_id]),
+                'disksize': disk_sizes[package_id],
+                'changelog': changelogs.get(package_id),
+                'injected': package_id in injected,
+                'systempackage': package_id in system_packages,
+                'config_protect': protect[package_id],
+                'config_protect_mask': protect_mask[package_id],
+                'useflags': frozenset(x for x, in useflags[package_id]),
+                'keywords': keywords[package_id],
+                'sources': sources[package_id],
+                'needed': tuple(
+                    sorted((soname, elfclass) for _x, _x, soname, elfclass,
+                           _x in pkg_needed_libs)),
+                'needed_libs': pkg_needed_libs,
+                'provided_libs': frozenset(provided_libs[package_id]),
+                'provide_extended': frozenset(provides[package_id]),
+                'conflicts': frozenset(x for x, in conflicts[package_id]),
+                'licensedata': dict(
+                    (x, license_texts[x]) for x in license_names[package_id]
+                    if x in license_texts),
+                'content': contents.get(package_id, {}),
+                'content_safety': contents_safety.get(package_id, {}),
+                'pkg_dependencies': deps[package_id],
+                'mirrorlinks': [[x, frozenset(mirror_data[x])] for x in
+                                mirror_names[package_id]],
+                'signatures': {
+                    'sha1': sha1,
+                    'sha256': sha256,
+                    'sha512': sha512,
+                    'gpg': gpg,
+                },
+                'spm_phases': spm_phases[package_id],
+                'spm_repository': spm_repositories[package_id],
+                'desktop_mime': [
+                    {'name': x, 'mimetype': y, 'executable': z, 'icon': w}
+                    for x, y, z, w in desktop_mimes[package_id]],
+                'provided_mime': frozenset(
+                    x for x, in provided_mimes[package_id]),
+                'original_repository': repositories[package_id],
+                'extra_download': tuple({
+                    "download": download,
+                    "type": d_type,
+                    "size": d_size,
+                    "disksize": d_disksize,
+                    "md5": md5,
+                    "sha1": d_sha1,
+                    "sha256": d_sha256,
+                    "sha512": d_sha512,
+                    "gpg": d_gpg,
+                } for download, d_type, d_size, d_disksize, md5, d_sha1,
+                    d_sha256, d_sha512, d_gpg in extra_downloads[package_id]),
+            }
+
+        return result
+
     def retrieveRepositoryUpdatesDigest(self, repository):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3280,6 +3661,44 @@ class EntropySQLRepository(EntropyRepositoryBase):
                     cur, [self]))
         return iter_obj(cur)
 
+    def retrieveDependenciesBatch(self, package_ids, extended = False,
+        deptype = None, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        depstring = ''
+        if deptype is not None:
+            depstring = ' AND dependencies.type = %d' % (deptype,)
+
+        excluded_deptypes_query = ""
+        if exclude_deptypes is not None:
+            for dep_type in exclude_deptypes:
+                excluded_deptypes_query += " AND dependencies.type != %d" % (
+                    dep_type,)
+
+        dependencies = self._executeBatchGroups("""
+        SELECT dependencies.idpackage, dependenciesreference.dependency,
+            dependencies.type
+        FROM dependencies, dependenciesreference
+        WHERE dependencies.idpackage IN (%%s) AND
+        dependencies.iddependency =
+        dependenciesreference.iddependency %s %s""" % (
+                depstring, excluded_deptypes_query,), package_ids)
+
+        iter_obj = tuple
+        if not extended:
+            iter_obj = frozenset
+
+        result = {}
+        for package_id, data in dependencies.items():
+            if not extended:
+                data = [x for x, _x in data]
+            if resolve_conditional_deps:
+                data = entropy.dep.expand_dependencies(data, [self])
+            result[package_id] = iter_obj(data)
+        return result
+
     def retrieveKeywords(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3290,6 +3709,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
         keywords.idkeyword = keywordsreference.idkeyword""", (package_id,))
         return self._cur2frozenset(cur)
 
+    def retrieveKeywordsBatch(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        keywords = dict((x, set()) for x in package_ids)
+        for package_id, keyword in self._executeBatch("""
+        SELECT keywords.idpackage, keywordname FROM keywords,keywordsreference
+        WHERE keywords.idpackage IN (%s) AND
+        keywords.idkeyword = keywordsreference.idkeyword""", keywords):
+            keywords[package_id].add(keyword)
+        return dict((x, frozenset(y)) for x, y in keywords.items())
+
     def retrieveProtect(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3417,6 +3848,32 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
         return fl
 
+    def retrieveContentBatch(self, package_ids, extended = False,
+        formatted = False, insert_formatted = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        extstring = ''
+        if extended:
+            extstring = ",type"
+
+        content = self._executeBatchGroups("""
+        SELECT idpackage, file%s FROM content WHERE idpackage IN (%%s)""" % (
+                extstring,), package_ids)
+
+        result = {}
+        for package_id, rows in content.items():
+            if extended and insert_formatted:
+                fl = tuple((package_id,) + x for x in rows)
+            elif extended and formatted:
+                fl = dict(rows)
+            elif extended:
+                fl = tuple(rows)
+            else:
+                fl = frozenset(x for x, in rows)
+            result[package_id] = fl
+        return result
+
     def retrieveContentIter(self, package_id, order_by = None,
                             reverse = False):
         """
@@ -3686,6 +4143,16 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if licname:
             return licname[0]
 
+    def retrieveLicenseBatch(self, package_ids):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        licenses = dict((x, None) for x in package_ids)
+        licenses.update(self._executeBatch("""
+        SELECT idpackage, license FROM baseinfo
+        WHERE idpackage IN (%s)""", licenses))
+        return licenses
+
     def retrieveCompileFlags(self, package_id):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -3703,14 +4170,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        index = self._getLiveCache("reverseDependenciesIndex")
+        if index is None:
+            _dep_data, index = self._generateReverseDependenciesMetadata()
 
-        dep_ids = set((k for k, v in cached.items() if package_id in v))
+        dep_ids = frozenset(index.get(package_id, ()))
+        # avoid python3.x memleak
+        del index
         if not dep_ids:
-            # avoid python3.x memleak
-            del cached
             if key_slot:
                 return tuple()
             return frozenset()
@@ -3818,24 +4285,20 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 WHERE dependencies.iddependency IN ( %s )""" % (dep_ids_str,))
                 result = self._cur2frozenset(cur)
 
-        # avoid python3.x memleak
-        del cached
         return result
 
     def retrieveUnusedPackageIds(self):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        index = self._getLiveCache("reverseDependenciesIndex")
+        if index is None:
+            _dep_data, index = self._generateReverseDependenciesMetadata()
 
-        pkg_ids = set()
-        for v in cached.values():
-            pkg_ids |= v
+        pkg_ids = list(index.keys())
+        # avoid python3.x memleak
+        del index
         if not pkg_ids:
-            # avoid python3.x memleak
-            del cached
             return tuple()
         pkg_ids_str = ', '.join((str(x) for x in pkg_ids))
 
@@ -3844,8 +4307,6 @@ class EntropySQLRepository(EntropyRepositoryBase):
         WHERE idpackage NOT IN ( %s )
         ORDER BY atom
         """ % (pkg_ids_str,))
-        # avoid python3.x memleak
-        del cached
         return self._cur2tuple(cur)
 
     def arePackageIdsAvailable(self, package_ids):
@@ -3907,6 +4368,43 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return True
         return False
 
+    def isFileAvailableBatch(self, paths):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        # setup random table name
+        random_str = "%s_%s" % (id(paths), time.time())
+        if const_is_python3():
+            random_str = const_convert_to_rawstring(random_str)
+        randomtable = "fowners%s" % (hashlib.md5(random_str).hexdigest(),)
+
+        self._cursor().executescript("""
+            DROP TABLE IF EXISTS `%s`;
+            CREATE TEMPORARY TABLE `%s` ( file VARCHAR(75) PRIMARY KEY );
+            """ % (randomtable, randomtable,)
+        )
+
+        try:
+            self._cursor().executemany("""
+            %s INTO `%s` VALUES (?)""" % (
+                    self._INSERT_OR_REPLACE, randomtable,),
+                ((x,) for x in paths))
+
+            cur = self._cursor().execute("""
+            SELECT content.file, content.idpackage FROM content, `%s`
+            WHERE content.file = `%s`.file""" % (
+                    randomtable, randomtable,))
+
+            owners = {}
+            for path, package_id in cur:
+                obj = owners.setdefault(path, set())
+                obj.add(package_id)
+            return dict((x, frozenset(y)) for x, y in owners.items())
+
+        finally:
+            self._cursor().execute('DROP TABLE IF EXISTS `%s`' % (
+                    randomtable,))
+
     def resolveNeeded(self, needed, elfclass = -1, extended = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4079,10 +4577,18 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         if like:
+            index_string = ''
+            index_args = ()
+            index_query = self._searchIndexQuery("content", [bfile])
+            if index_query is not None:
+                index_string, index_args = index_query
+                index_string = "content.idpackage IN (%s) AND" % (
+                    index_string,)
             cur = self._cursor().execute("""
             SELECT content.idpackage FROM content,baseinfo
-            WHERE file LIKE ? AND
-            content.idpackage = baseinfo.idpackage""", (bfile,))
+            WHERE %s file LIKE ? AND
+            content.idpackage = baseinfo.idpackage""" % (index_string,),
+                index_args + (bfile,))
         else:
             cur = self._cursor().execute("""
             SELECT content.idpackage
@@ -4351,7 +4857,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
         like_keyword = "%"+keyword+"%"
         if not sensitive:
             like_keyword = like_keyword.lower()
-        searchkeywords = (like_keyword, like_keyword)
+
+        index_string = ''
+        index_args = ()
+        index_query = self._searchIndexQuery("atom", [like_keyword])
+        if index_query is not None:
+            index_string, index_args = index_query
+            index_string = "t.idpackage IN (%s) AND" % (index_string,)
+        searchkeywords = index_args + (like_keyword, like_keyword)
 
         slotstring = ''
         if slot:
@@ -4392,26 +4905,26 @@ class EntropySQLRepository(EntropyRepositoryBase):
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
                 SELECT %s FROM baseinfo t
-                    WHERE t.atom LIKE ?
+                    WHERE %s t.atom LIKE ?
                 UNION ALL
                 SELECT %s FROM baseinfo d, provide as p
                     WHERE d.idpackage = p.idpackage
                     AND p.atom LIKE ?
             ) WHERE 1=1 %s %s %s
-            """ % (search_elements, search_elements_all,
+            """ % (search_elements, search_elements_all, index_string,
                 search_elements_provide_all, slotstring, tagstring,
                 order_by_string), searchkeywords)
         else:
             cur = self._cursor().execute("""
             SELECT DISTINCT %s FROM (
                 SELECT %s FROM baseinfo t
-                    WHERE LOWER(t.atom) LIKE ?
+                    WHERE %s LOWER(t.atom) LIKE ?
                 UNION ALL
                 SELECT %s FROM baseinfo d, provide as p
                     WHERE d.idpackage = p.idpackage
                     AND LOWER(p.atom) LIKE ?
             ) WHERE 1=1 %s %s %s
-            """ % (search_elements, search_elements_all,
+            """ % (search_elements, search_elements_all, index_string,
                 search_elements_provide_all, slotstring, tagstring,
                 order_by_string), searchkeywords)
 
@@ -4419,6 +4932,26 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return self._cur2tuple(cur)
         return tuple(cur)
 
+    def _searchIndexQuery(self, index, like_keywords):
+        """
+        Return an SQL subquery, and its arguments, selecting the
+        identifiers of the packages whose metadata may match all the
+        given LIKE patterns, using a full-text index. The subquery may
+        select packages that do not match, callers must still apply the
+        LIKE patterns to the metadata.
+        This implementation does not provide any full-text index.
+
+        @param index: the indexed metadata, either "atom", "description"
+            or "content"
+        @type index: string
+        @param like_keywords: the LIKE patterns applied to the metadata
+        @type like_keywords: list
+        @return: a (subquery, arguments) tuple or None, if no index can be
+            used for the given pattern
+        @rtype: tuple or None
+        """
+        return None
+
     def searchProvidedVirtualPackage(self, keyword):
         """
         Search in old-style Portage PROVIDE metadata.
@@ -4447,6 +4980,13 @@ class EntropySQLRepository(EntropyRepositoryBase):
         for sub_keyword in keyword_split:
             query_str_list.append("LOWER(extrainfo.description) LIKE ?")
             query_args.append("%" + sub_keyword + "%")
+
+        index_query = self._searchIndexQuery("description", query_args)
+        if index_query is not None:
+            index_string, index_args = index_query
+            query_str_list.insert(
+                0, "extrainfo.idpackage IN (%s)" % (index_string,))
+            query_args = list(index_args) + query_args
         query_str = " AND ".join(query_str_list)
         if just_id:
             cur = self._cursor().execute("""
@@ -4517,10 +5057,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
             WHERE name = ?
             """ % (atomstring,), (keyword,))
         else:
+            # the package name is part of the atom
+            index_string = ''
+            index_args = ()
+            index_query = self._searchIndexQuery(
+                "atom", ["%" + keyword.lower() + "%"])
+            if index_query is not None:
+                index_string, index_args = index_query
+                index_string = "idpackage IN (%s) AND" % (index_string,)
             cur = self._cursor().execute("""
             SELECT %s idpackage FROM baseinfo
-            WHERE LOWER(name) = ?
-            """ % (atomstring,), (keyword.lower(),))
+            WHERE %s LOWER(name) = ?
+            """ % (atomstring, index_string,),
+                index_args + (keyword.lower(),))
 
         if just_id:
             return self._cur2tuple(cur)
@@ -4567,6 +5116,118 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (name, category))
         return tuple(cur)
 
+    def atomMatchBatch(self, matches, maskFilter = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        All the candidates are pulled with a single join between baseinfo
+        and a temporary table holding the requested tuples, then masking
+        is evaluated once per candidate package identifier.
+        """
+        if not self._isBaseinfoExtrainfo2010():
+            return super(EntropySQLRepository, self).atomMatchBatch(
+                matches, maskFilter = maskFilter)
+
+        requests = []
+        fallback = []
+        # "" and None tags mean the same thing
+        for match in set((x, y, z or None) for x, y, z in matches):
+            key, slot, tag = match
+            split_key = key.split("/")
+            if len(split_key) != 2:
+                fallback.append(match)
+                continue
+            category, name = split_key
+            requests.append((len(requests), category, name, slot, tag))
+
+        candidates = {}
+        if requests:
+            self._cursor().executescript("""
+            DROP TABLE IF EXISTS atommatchbatch;
+            CREATE TEMPORARY TABLE atommatchbatch (
+                idmatch INTEGER PRIMARY KEY,
+                category VARCHAR,
+                name VARCHAR,
+                slot VARCHAR,
+                versiontag VARCHAR
+            );
+            """)
+            try:
+                self._cursor().executemany("""
+                INSERT INTO atommatchbatch VALUES (?, ?, ?, ?, ?)
+                """, requests)
+                cur = self._cursor().execute("""
+                SELECT atommatchbatch.idmatch, baseinfo.idpackage,
+                    baseinfo.version, baseinfo.versiontag, baseinfo.revision
+                FROM atommatchbatch, baseinfo
+                WHERE baseinfo.category = atommatchbatch.category
+                AND baseinfo.name = atommatchbatch.name
+                AND (atommatchbatch.slot IS NULL
+                    OR baseinfo.slot = atommatchbatch.slot)
+                AND (atommatchbatch.versiontag IS NULL
+                    OR baseinfo.versiontag = atommatchbatch.versiontag)
+                """)
+                for idmatch, package_id, version, tag, revision in cur:
+                    obj = candidates.setdefault(idmatch, [])
+                    obj.append((package_id, version, tag, revision))
+            finally:
+                self._cursor().execute(
+                    "DROP TABLE IF EXISTS atommatchbatch")
+
+        allowed = None
+        if maskFilter:
+            package_ids = set()
+            for pkg_data in candidates.values():
+                package_ids.update(x[0] for x in pkg_data)
+            allowed = set(x for x, (pkg_id, _reason) in \
+                              self.maskFilterBatch(package_ids).items() \
+                              if pkg_id != -1)
+
+        results = {}
+        not_found = (-1, 1, None, None, None)
+        for idmatch, category, name, slot, tag in requests:
+            match = ("%s/%s" % (category, name), slot, tag)
+            pkg_data = candidates.get(idmatch)
+
+            if pkg_data is None:
+                if category == self.VIRTUAL_META_PACKAGE_CATEGORY:
+                    # old-style virtuals are only resolved by atomMatch()
+                    fallback.append(match)
+                else:
+                    results[match] = not_found
+                continue
+
+            if allowed is not None:
+                pkg_data = [x for x in pkg_data if x[0] in allowed]
+
+            pkgdata = {}
+            for package_id, version, pkg_tag, revision in pkg_data:
+                pkgdata[(version, pkg_tag, revision)] = package_id
+            versions = list(pkgdata.keys())
+
+            # if tag is not specified, and tagged and non-tagged packages
+            # are available, prefer non-tagged ones, like atomMatch() does.
+            if not tag:
+                non_tagged = [x for x in versions if not x[1]]
+                if non_tagged:
+                    versions = non_tagged
+
+            if not versions:
+                results[match] = not_found
+                continue
+
+            if len(versions) == 1:
+                newer = versions[0]
+            else:
+                newer = entropy.dep.get_entropy_newer_version(versions)[0]
+            results[match] = (pkgdata[newer], 0) + newer
+
+        if fallback:
+            results.update(
+                super(EntropySQLRepository, self).atomMatchBatch(
+                    fallback, maskFilter = maskFilter))
+
+        return dict((x, results[(x[0], x[1], x[2] or None)]) for x in matches)
+
     def isPackageScopeAvailable(self, atom, slot, revision):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4687,6 +5348,15 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 return tuple()
             return frozenset()
 
+    def listAllPackageDigests(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        cur = self._cursor().execute("""
+        SELECT idpackage, digest FROM extrainfo ORDER BY idpackage
+        """)
+        return tuple(cur)
+
     def listAllInjectedPackageIds(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4813,6 +5483,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         self._cursor().execute("""
         UPDATE baseinfo SET branch = ?
         WHERE idpackage = ?""", (tobranch, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
         self.clearCache()
 
     def getSetting(self, setting_name):
@@ -4860,6 +5531,16 @@ class EntropySQLRepository(EntropyRepositoryBase):
             const_convert_to_unicode(setting_value),))
         self._settings_cache.clear()
 
+    def _bumpChecksumGenerations(self, tables):
+        """
+        Called by the methods writing to the tables tracked by checksum(),
+        once per call and within the same transaction. Subclasses keeping
+        per table generations reimplement this.
+
+        @param tables: names of the modified tables
+        @type tables: tuple
+        """
+
     def _setupInitialSettings(self):
         """
         Not implemented, subclasses must implement this.
@@ -4943,8 +5624,19 @@ class EntropySQLRepository(EntropyRepositoryBase):
         # avoid memleak with python3.x
         del cached
 
+        result = self._checksum(do_order, strict, include_signatures,
+                                include_dependencies)
+        self._setLiveCache(cache_key, result)
+        return result
+
+    def _checksum(self, do_order, strict, include_signatures,
+                  include_dependencies):
+        """
+        Compute the repository checksum by hashing the metadata tables,
+        see checksum().
+        """
         package_id_order = ""
-        depenenciesref_order = ""
+        dependenciesref_order = ""
         dependencies_order = ""
         if do_order:
             package_id_order = "order by idpackage"
@@ -5014,10 +5706,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
             """ % (dependencies_order,))
             do_update_hash(m, cur)
 
-        result = m.hexdigest()
-        self._setLiveCache(cache_key, result)
-
-        return result
+        return m.hexdigest()
 
     def storeInstalledPackage(self, package_id, repoid, source = 0):
         """
@@ -5125,6 +5814,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         self._cursor().execute('UPDATE packagesignatures set gpg = NULL')
+        self._bumpChecksumGenerations(("packagesignatures",))
 
     def dropAllIndexes(self):
         """
@@ -5536,6 +6226,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
     def _generateReverseDependenciesMetadata(self):
         """
         Reverse dependencies dynamic metadata generation.
+        Return a tuple composed by a dict mapping dependency identifiers
+        to the set of package identifiers satisfying them and its inverted
+        index, mapping package identifiers to the set of dependency
+        identifiers they satisfy.
         """
         checksum = self.checksum()
         try:
@@ -5553,44 +6247,128 @@ class EntropySQLRepository(EntropyRepositoryBase):
             hash_str = hash_str.encode("utf-8")
         sha = hashlib.sha1()
         sha.update(hash_str)
-        cache_key = "__generateReverseDependenciesMetadata2_" + \
+        cache_key = "__generateReverseDependenciesMetadata3_" + \
             sha.hexdigest()
         rev_deps_data = self._cacher.pop(cache_key)
         if rev_deps_data is not None:
-            self._setLiveCache("reverseDependenciesMetadata",
-                rev_deps_data)
-            return rev_deps_data
+            dep_data, index = rev_deps_data
+            self._setLiveCache("reverseDependenciesMetadata", dep_data)
+            self._setLiveCache("reverseDependenciesIndex", index)
+            return dep_data, index
 
         dep_data = {}
-        for iddep, atom in self.listAllDependencies():
+        index = {}
+        self._updateReverseDependenciesMetadata(
+            dep_data, index, self.listAllDependencies())
+
+        self._setLiveCache("reverseDependenciesMetadata", dep_data)
+        self._setLiveCache("reverseDependenciesIndex", index)
+        try:
+            self._cacher.save(cache_key, (dep_data, index))
+        except IOError:
+            # race condition, ignore
+            pass
+        return dep_data, index
+
+    def _getReverseDependenciesMetadata(self):
+        """
+        Return the reverse dependencies metadata and its inverted index
+        (see _generateReverseDependenciesMetadata()) if they are available
+        in the in-memory cache, None otherwise. Metadata is never generated
+        here.
+        """
+        dep_data = self._getLiveCache("reverseDependenciesMetadata")
+        index = self._getLiveCache("reverseDependenciesIndex")
+        if dep_data is None or index is None:
+            return None
+        return dep_data, index
+
+    def _updateReverseDependenciesMetadata(self, dep_data, index,
+                                           dependencies):
+        """
+        Match the given (dependency identifier, dependency) pairs again and
+        update the reverse dependencies metadata and its inverted index
+        in place.
+        """
+        for iddep, atom in dependencies:
 
             if iddep == -1:
                 continue
 
+            for package_id in dep_data.pop(iddep, ()):
+                dep_ids = index.get(package_id)
+                if dep_ids is not None:
+                    dep_ids.discard(iddep)
+                    if not dep_ids:
+                        del index[package_id]
+
             if atom.endswith(etpConst['entropyordepquestion']):
                 or_atoms = atom[:-1].split(etpConst['entropyordepsep'])
-                for or_atom in or_atoms:
-                    # not safe to use cache here, people messing with multiple
-                    # instances can make this crash
-                    package_id, rc = self.atomMatch(or_atom, useCache = False)
-                    if package_id != -1:
-                        obj = dep_data.setdefault(iddep, set())
-                        obj.add(package_id)
             else:
+                or_atoms = (atom,)
+
+            for or_atom in or_atoms:
                 # not safe to use cache here, people messing with multiple
                 # instances can make this crash
-                package_id, rc = self.atomMatch(atom, useCache = False)
+                package_id, rc = self.atomMatch(or_atom, useCache = False)
                 if package_id != -1:
                     obj = dep_data.setdefault(iddep, set())
                     obj.add(package_id)
+                    obj = index.setdefault(package_id, set())
+                    obj.add(iddep)
 
+    def _addReverseDependenciesMetadata(self, package_id, dep_data, index):
+        """
+        Update the reverse dependencies metadata after package_id has been
+        added and store it back into the in-memory cache.
+        Both the dependencies of package_id and the dependencies that may
+        now be satisfied by it are matched again.
+        """
+        keys = set(["%s/%s" % self.retrieveKeySplit(package_id)])
+        for provide, _is_default in self.retrieveProvide(package_id):
+            keys.add(entropy.dep.dep_getkey(provide))
+
+        dependencies = {}
+        for key in keys:
+            cur = self._cursor().execute("""
+            SELECT iddependency, dependency FROM dependenciesreference
+            WHERE dependency LIKE ?
+            """, ("%" + key + "%",))
+            dependencies.update(cur)
+
+        cur = self._cursor().execute("""
+        SELECT dependenciesreference.iddependency,
+            dependenciesreference.dependency
+        FROM dependencies, dependenciesreference
+        WHERE dependencies.idpackage = ? AND
+        dependencies.iddependency = dependenciesreference.iddependency
+        """, (package_id,))
+        dependencies.update(cur)
+
+        self._updateReverseDependenciesMetadata(
+            dep_data, index, dependencies.items())
         self._setLiveCache("reverseDependenciesMetadata", dep_data)
-        try:
-            self._cacher.save(cache_key, dep_data)
-        except IOError:
-            # race condition, ignore
-            pass
-        return dep_data
+        self._setLiveCache("reverseDependenciesIndex", index)
+
+    def _removeReverseDependenciesMetadata(self, package_id, dep_data,
+                                           index):
+        """
+        Update the reverse dependencies metadata after package_id has been
+        removed and store it back into the in-memory cache.
+        The dependencies that were satisfied by package_id are matched again.
+        """
+        dep_ids = index.get(package_id)
+        if dep_ids:
+            cur = self._cursor().execute("""
+            SELECT iddependency, dependency FROM dependenciesreference
+            WHERE iddependency IN ( %s )
+            """ % (', '.join((str(x) for x in dep_ids)),))
+            self._updateReverseDependenciesMetadata(
+                dep_data, index, tuple(cur))
+        index.pop(package_id, None)
+
+        self._setLiveCache("reverseDependenciesMetadata", dep_data)
+        self._setLiveCache("reverseDependenciesIndex", index)
 
     def moveSpmUidsToBranch(self, to_branch):
         """
@@ -10,6 +10,7 @@
     the repository interface.
 
 """
+import binascii
 import collections
 import errno
 import os
@@ -35,6 +36,7 @@ from entropy.db.exceptions import Warning, Error, InterfaceError, \
     InternalError, ProgrammingError, NotSupportedError, LockAcquireError
 from entropy.db.sql import EntropySQLRepository, SQLConnectionWrapper, \
     SQLCursorWrapper
+from entropy.db.depgraph import CompiledDependencyGraph
 
 from entropy.i18n import _
 
@@ -133,15 +135,49 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
     # bump this every time schema changes and databaseStructureUpdate
     # should be triggered
-    _SCHEMA_REVISION = 6
+    _SCHEMA_REVISION = 7
+
+    # tables tracked by checksum(), every write to one of them replaces
+    # its "checksum_generation_<table>" setting with a new random token,
+    # see _bumpChecksumGenerations().
+    _CHECKSUM_TABLES = ("baseinfo", "extrainfo", "packagesignatures",
+                        "dependenciesreference", "dependencies",
+                        "conflicts")
 
     _INSERT_OR_REPLACE = "INSERT OR REPLACE"
     _INSERT_OR_IGNORE = "INSERT OR IGNORE"
     _UPDATE_OR_REPLACE = "UPDATE OR REPLACE"
     _CACHE_SIZE = 8192
 
+    # if True, the "content" and "contentsafety" tables are migrated to
+    # the compact layout, see _migrateContentDirs(). The migration is
+    # not undone when this is turned off again.
+    _CONTENT_DIRS = False
+
+    # if True, atomMatch() and retrieveDependenciesList() use the
+    # compiled dependency graph, see compileDependencyGraph().
+    _DEPENDENCY_GRAPH = False
+
+    # if True, the full-text search indexes are created for repositories
+    # opened with indexing enabled, see _createSearchIndex(). If False,
+    # existing ones are dropped, they slow down insertContent() and
+    # double the size of the repository.
+    _SEARCH_INDEX = False
+
+    # whether the SQLite library supports FTS5 trigrams,
+    # see _isSearchIndexSupported().
+    _search_index_supported = None
+
+    # full-text (trigram) indexes used by _searchIndexQuery(),
+    # index name => (table, column)
+    _SEARCH_INDEXES = {
+        "atom": ("baseinfosearch", "atom"),
+        "description": ("extrainfosearch", "description"),
+        "content": ("contentsearch", "file"),
+    }
+
     SETTING_KEYS = ("arch", "on_delete_cascade", "schema_revision",
-        "_baseinfo_extrainfo_2010")
+        "_baseinfo_extrainfo_2010", "_content_dirs", "_search_index")
 
     class SQLiteProxy(object):
 
@@ -207,6 +243,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         self._rwsem_lock = threading.RLock()
         self._rwsem = None
+        # see _isContentDirs()
+        self._content_dirs = None
 
         self._sqlite = self.ModuleProxy.get()
 
@@ -708,6 +746,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         my = self.Schema()
         self.dropAllIndexes()
+        self._dropSearchIndex()
+        for view in self._listAllViews():
+            self._cursor().execute("DROP VIEW %s" % (view,))
         for table in self._listAllTables():
             try:
                 self._cursor().execute("DROP TABLE %s" % (table,))
@@ -716,6 +757,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 continue
         self._cursor().executescript(my.get_init())
         self.commit()
+        self._content_dirs = None
         self._clearLiveCache("_doesTableExist")
         self._clearLiveCache("_doesColumnInTableExist")
         self._setupInitialSettings()
@@ -739,8 +781,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
     def _removePackage(self, package_id, from_add_package = False):
         """
         Reimplemented from EntropySQLRepository.
-        We must handle on_delete_cascade.
+        We must handle on_delete_cascade and live cache.
         """
+        self._clearLiveCache("dependencyGraph")
         try:
             new_way = self.getSetting("on_delete_cascade")
         except KeyError:
@@ -789,11 +832,14 @@ class EntropySQLiteRepository(EntropySQLRepository):
                     "DELETE FROM needed WHERE idpackage = (?)",
                     (package_id,))
 
+        self._bumpChecksumGenerations(self._CHECKSUM_TABLES)
+
     def _addDependency(self, dependency):
         """
         Reimplemented from EntropySQLRepository.
         """
         self._clearLiveCache("retrieveDependencies")
+        self._clearLiveCache("dependencyGraph")
         return super(EntropySQLiteRepository, self)._addDependency(
             dependency)
 
@@ -809,6 +855,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("searchKeySlotTag")
         self._clearLiveCache("retrieveKeySlotAggregated")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
         return super(EntropySQLiteRepository, self)._addCategory(category)
 
     def setCategory(self, package_id, category):
@@ -829,6 +876,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._cursor().execute("""
             UPDATE baseinfo SET idcategory = (?) WHERE idpackage = (?)
             """, (catid, package_id,))
+        self._bumpChecksumGenerations(("baseinfo",))
 
         self._clearLiveCache("retrieveCategory")
         self._clearLiveCache("searchNameCategory")
@@ -838,6 +886,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("searchKeySlotTag")
         self._clearLiveCache("retrieveKeySlotAggregated")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
 
     def setName(self, package_id, name):
         """
@@ -852,6 +901,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("searchKeySlotTag")
         self._clearLiveCache("retrieveKeySlotAggregated")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
 
     def setDependency(self, iddependency, dependency):
         """
@@ -861,6 +911,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).setDependency(
             iddependency, dependency)
         self._clearLiveCache("retrieveDependencies")
+        self._clearLiveCache("dependencyGraph")
 
     def setAtom(self, package_id, atom):
         """
@@ -871,6 +922,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("searchNameCategory")
         self._clearLiveCache("getStrictScopeData")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
 
     def setSlot(self, package_id, slot):
         """
@@ -885,6 +937,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("retrieveKeySlotAggregated")
         self._clearLiveCache("getStrictScopeData")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
 
     def setRevision(self, package_id, revision):
         """
@@ -897,6 +950,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._clearLiveCache("getVersioningData")
         self._clearLiveCache("getStrictScopeData")
         self._clearLiveCache("getStrictData")
+        self._clearLiveCache("dependencyGraph")
 
     def removeDependencies(self, package_id):
         """
@@ -906,6 +960,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).removeDependencies(
             package_id)
         self._clearLiveCache("retrieveDependencies")
+        self._clearLiveCache("dependencyGraph")
 
     def insertDependencies(self, package_id, depdata):
         """
@@ -915,6 +970,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).insertDependencies(
             package_id, depdata)
         self._clearLiveCache("retrieveDependencies")
+        self._clearLiveCache("dependencyGraph")
 
     def _insertNeededLibs(self, package_id, needed_libs):
         """
@@ -1183,6 +1239,34 @@ class EntropySQLiteRepository(EntropySQLRepository):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def getPackageDataBatch(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle backward compatibility.
+        """
+        package_ids = list(package_ids)
+        if self._isBaseinfoExtrainfo2010():
+            try:
+                return super(EntropySQLiteRepository,
+                             self).getPackageDataBatch(
+                    package_ids, get_content = get_content,
+                    content_insert_formatted = content_insert_formatted,
+                    get_changelog = get_changelog,
+                    get_content_safety = get_content_safety)
+            except OperationalError:
+                # some tables may be missing in older repositories,
+                # getPackageData() takes care of them.
+                pass
+
+        return dict((x, self.getPackageData(
+                    x, get_content = get_content,
+                    content_insert_formatted = content_insert_formatted,
+                    get_changelog = get_changelog,
+                    get_content_safety = get_content_safety))
+                    for x in package_ids)
+
     def retrieveDigest(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1456,6 +1540,187 @@ class EntropySQLiteRepository(EntropySQLRepository):
                     data, [self]))
         return iter_obj(data)
 
+    def _dependencyGraphPath(self):
+        """
+        Return the path to the compiled dependency graph file.
+        """
+        return self._db + ".depgraph"
+
+    def _dependencyGraphKey(self):
+        """
+        Return the key binding the compiled dependency graph to the
+        repository metadata it has been built from: dependencies and
+        conflicts.
+        """
+        checksum = self.checksum(include_dependencies = True)
+        generations = None
+        if self._isBaseinfoExtrainfo2010():
+            generations = self._getChecksumGenerations()
+
+        if generations is not None:
+            conflicts = generations["conflicts"]
+        else:
+            sha = hashlib.sha1()
+            cur = self._cursor().execute("""
+            SELECT idpackage, conflict FROM conflicts
+            ORDER BY idpackage, conflict
+            """)
+            for record in cur:
+                sha.update(const_convert_to_rawstring(repr(record)))
+            conflicts = sha.hexdigest()
+
+        return "%s:%s" % (checksum, conflicts)
+
+    def _dependencyGraph(self):
+        """
+        Return the compiled dependency graph of this repository, or None
+        if it's disabled, not available or out of date.
+        """
+        if not self._DEPENDENCY_GRAPH or self._is_memory():
+            return None
+        if self.directed() or self.cache_policy_none():
+            return None
+
+        graph = self._getLiveCache("dependencyGraph")
+        if graph is None:
+            graph = False
+            path = self._dependencyGraphPath()
+            try:
+                graph = CompiledDependencyGraph(path)
+            except (OSError, IOError) as err:
+                if err.errno != errno.ENOENT:
+                    const_debug_write(
+                        __name__,
+                        "_dependencyGraph: cannot open %s: %s" % (
+                            path, repr(err),))
+            except CompiledDependencyGraph.InvalidGraph as err:
+                const_debug_write(
+                    __name__,
+                    "_dependencyGraph: invalid %s: %s" % (path, err,))
+
+            if graph and graph.checksum() != self._dependencyGraphKey():
+                const_debug_write(
+                    __name__,
+                    "_dependencyGraph: %s is out of date" % (path,))
+                graph.close()
+                graph = False
+            self._setLiveCache("dependencyGraph", graph)
+
+        if not graph:
+            return None
+        return graph
+
+    def compileDependencyGraph(self):
+        """
+        Compile the dependency graph of this repository and store it
+        next to the repository file. The graph is bound to the current
+        repository dependencies and conflicts and it is used by atomMatch() and
+        retrieveDependenciesList() if _DEPENDENCY_GRAPH is True.
+        Dependencies whose match depends on package masking,
+        conditional dependencies and conflicts are still resolved
+        through SQL at runtime.
+
+        @return: path to the compiled graph or None, if the repository is
+            stored in memory
+        @rtype: string
+        @raise IOError: if the graph cannot be written
+        @raise OSError: if the graph cannot be written
+        """
+        if self._is_memory():
+            return None
+
+        package_ids = self.listAllPackageIds()
+        dependencies = self.retrieveDependenciesBatch(
+            package_ids, extended = True, resolve_conditional_deps = False)
+        dependencies = dict((x, list(y)) for x, y in dependencies.items())
+        cur = self._cursor().execute("""
+        SELECT idpackage, conflict FROM conflicts
+        """)
+        for package_id, conflict in cur:
+            dependencies.setdefault(package_id, []).append(
+                ("!" + conflict, CompiledDependencyGraph.CONFLICT))
+
+        atom_match = super(EntropySQLiteRepository, self).atomMatch
+
+        def _matcher(dependency):
+            if dependency.startswith("(") or dependency.startswith("!"):
+                return None
+            package_id, rc = atom_match(
+                dependency, maskFilter = False, useCache = False)
+            if rc != 0:
+                return -1
+
+            # if more than one package has the same version, the result
+            # depends on which of them are masked.
+            package_ids, _rc = atom_match(
+                dependency, multiMatch = True, maskFilter = False,
+                useCache = False)
+            if len(package_ids) > 1:
+                versioning = self.getVersioningData(package_id)
+                for other_id in package_ids:
+                    if other_id == package_id:
+                        continue
+                    if self.getVersioningData(other_id) == versioning:
+                        return None
+            return package_id
+
+        path = self._dependencyGraphPath()
+        CompiledDependencyGraph.build(
+            path, self._dependencyGraphKey(), dependencies, _matcher)
+        self._clearLiveCache("dependencyGraph")
+        return path
+
+    def retrieveDependenciesList(self, package_id, exclude_deptypes = None,
+        resolve_conditional_deps = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the compiled dependency graph, if available.
+        """
+        graph = self._dependencyGraph()
+        data = None
+        if graph is not None:
+            data = graph.dependencies(package_id)
+        if data is None:
+            return super(EntropySQLiteRepository,
+                         self).retrieveDependenciesList(
+                package_id, exclude_deptypes = exclude_deptypes,
+                resolve_conditional_deps = resolve_conditional_deps)
+
+        if exclude_deptypes is not None:
+            excl_set = frozenset(exclude_deptypes)
+            data = [x for x in data if x[1] not in excl_set]
+        data = frozenset(x for x, _x in data)
+
+        if resolve_conditional_deps:
+            return frozenset(entropy.dep.expand_dependencies(data, [self]))
+        return data
+
+    def atomMatch(self, atom, matchSlot = None, multiMatch = False,
+        maskFilter = True, extendedResults = False, useCache = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must use the compiled dependency graph, if available.
+        """
+        if (matchSlot is None) and (not multiMatch) and \
+                (not extendedResults) and atom:
+            graph = self._dependencyGraph()
+            if graph is not None:
+                package_id = graph.match(atom)
+                if package_id == -1:
+                    return -1, 1
+                if package_id is not None:
+                    if not maskFilter:
+                        return package_id, 0
+                    # the best unmasked match is also the best match
+                    # once masked packages are filtered out.
+                    if self.maskFilter(package_id)[0] != -1:
+                        return package_id, 0
+
+        return super(EntropySQLiteRepository, self).atomMatch(
+            atom, matchSlot = matchSlot, multiMatch = multiMatch,
+            maskFilter = maskFilter, extendedResults = extendedResults,
+            useCache = useCache)
+
     def retrieveDesktopMime(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1510,6 +1775,230 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return iter([])
 
+    def insertContent(self, package_id, content, already_formatted = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        search_index = self._isSearchIndex()
+        if not self._isContentDirs() and not search_index:
+            return super(EntropySQLiteRepository, self).insertContent(
+                package_id, content, already_formatted = already_formatted)
+
+        if already_formatted:
+            items = ((x, (y,)) for _package_id, x, y in content)
+        else:
+            items = ((x, (content[x],)) for x in content)
+
+        paths = []
+        if search_index:
+            def _track(_items):
+                for path, data in _items:
+                    paths.append(path)
+                    yield path, data
+            items = _track(items)
+
+        if self._isContentDirs():
+            self._insertContentFiles("contentfiles", package_id, items)
+        else:
+            super(EntropySQLiteRepository, self).insertContent(
+                package_id, ((package_id, x, y) for x, (y,) in items),
+                already_formatted = True)
+
+        if search_index:
+            self._updateContentSearchIndex(package_id, paths)
+
+    def _insertContentSafety(self, package_id, content_safety):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository, self)._insertContentSafety(
+                package_id, content_safety)
+
+        if isinstance(content_safety, dict):
+            items = ((k, (v['mtime'], v['sha256'])) for k, v in
+                     content_safety.items())
+        else:
+            # (path, sha256, mtime) tuples, mtime and sha256 are
+            # swapped in the insert order.
+            items = ((x, (z, y)) for x, y, z in content_safety)
+        self._insertContentFiles("contentsafetyfiles", package_id, items)
+
+    def _insertContentFiles(self, table, package_id, items):
+        """
+        Insert file metadata into the given compact content table,
+        either "contentfiles" or "contentsafetyfiles".
+        Directory identifiers are resolved once per directory, bypassing
+        the triggers of the "content" and "contentsafety" views. Items
+        are consumed in chunks, so that iterators are never fully loaded
+        into memory.
+
+        @param table: the compact content table name
+        @type table: string
+        @param package_id: package indentifier
+        @type package_id: int
+        @param items: iterable of (path, (column, ...)) tuples, columns
+            following the file name in the table
+        @type items: iterable
+        """
+        cursor = self._cursor()
+        dir_ids = {}
+        rows = []
+
+        def _flush():
+            cursor.executemany("""
+            INSERT INTO %s VALUES (%s)
+            """ % (table, ", ".join(["?"] * len(rows[0]))), rows)
+            del rows[:]
+
+        for path, data in items:
+            idx = path.rfind("/") + 1
+            dir_path = path[:idx]
+
+            dir_id = dir_ids.get(dir_path)
+            if dir_id is None:
+                cur = cursor.execute("""
+                SELECT iddir FROM contentdirs WHERE dir = ?
+                """, (dir_path,))
+                row = cur.fetchone()
+                if row is None:
+                    cur = cursor.execute("""
+                    INSERT INTO contentdirs (dir) VALUES (?)
+                    """, (dir_path,))
+                    dir_id = cur.lastrowid
+                else:
+                    dir_id = row[0]
+                dir_ids[dir_path] = dir_id
+
+            rows.append((package_id, dir_id, path[idx:]) + data)
+            if len(rows) >= 1024:
+                _flush()
+        if rows:
+            _flush()
+
+    def setContentSafety(self, package_id, content_safety):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self).setContentSafety(package_id, content_safety)
+        self._cursor().execute("""
+        DELETE FROM contentsafetyfiles WHERE idpackage = ?
+        """, (package_id,))
+        self._insertContentSafety(package_id, content_safety)
+
+    def isFileAvailable(self, path, get_id = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self).isFileAvailable(path, get_id = get_id)
+
+        dir_path, name = self._splitContentPath(path)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage FROM contentfiles, contentdirs
+        WHERE contentdirs.dir = ? AND
+        contentfiles.iddir = contentdirs.iddir AND
+        contentfiles.name = ?""", (dir_path, name,))
+        result = self._cur2frozenset(cur)
+        if get_id:
+            return result
+        elif result:
+            return True
+        return False
+
+    def isFileAvailableBatch(self, paths):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self).isFileAvailableBatch(paths)
+
+        # setup random table name
+        random_str = "%s_%s" % (id(paths), time.time())
+        if const_is_python3():
+            random_str = const_convert_to_rawstring(random_str)
+        randomtable = "fowners%s" % (hashlib.md5(random_str).hexdigest(),)
+
+        self._cursor().executescript("""
+            DROP TABLE IF EXISTS `%s`;
+            CREATE TEMPORARY TABLE `%s` (
+                dir VARCHAR, name VARCHAR, PRIMARY KEY(dir, name) );
+            """ % (randomtable, randomtable,)
+        )
+
+        try:
+            self._cursor().executemany("""
+            INSERT OR REPLACE INTO `%s` VALUES (?, ?)""" % (randomtable,),
+                (self._splitContentPath(x) for x in paths))
+
+            # CROSS JOIN makes SQLite walk the (small) temporary table
+            # first, instead of scanning the whole contentfiles table.
+            cur = self._cursor().execute("""
+            SELECT contentdirs.dir, contentfiles.name, contentfiles.idpackage
+            FROM `%s` CROSS JOIN contentdirs CROSS JOIN contentfiles
+            WHERE contentdirs.dir = `%s`.dir AND
+            contentfiles.iddir = contentdirs.iddir AND
+            contentfiles.name = `%s`.name""" % (
+                    randomtable, randomtable, randomtable,))
+
+            owners = {}
+            for dir_path, name, package_id in cur:
+                obj = owners.setdefault(dir_path + name, set())
+                obj.add(package_id)
+            return dict((x, frozenset(y)) for x, y in owners.items())
+
+        finally:
+            self._cursor().execute('DROP TABLE IF EXISTS `%s`' % (
+                    randomtable,))
+
+    def searchBelongs(self, bfile, like = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if like or not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self).searchBelongs(bfile, like = like)
+
+        dir_path, name = self._splitContentPath(bfile)
+        cur = self._cursor().execute("""
+        SELECT contentfiles.idpackage
+        FROM contentfiles, contentdirs, baseinfo
+        WHERE contentdirs.dir = ? AND
+        contentfiles.iddir = contentdirs.iddir AND
+        contentfiles.name = ? AND
+        contentfiles.idpackage = baseinfo.idpackage""", (dir_path, name,))
+        return self._cur2frozenset(cur)
+
+    def searchContentSafety(self, sfile):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self).searchContentSafety(sfile)
+
+        dir_path, name = self._splitContentPath(sfile)
+        cur = self._cursor().execute("""
+        SELECT contentsafetyfiles.idpackage, contentsafetyfiles.sha256,
+            contentsafetyfiles.mtime
+        FROM contentsafetyfiles, contentdirs
+        WHERE contentdirs.dir = ? AND
+        contentsafetyfiles.iddir = contentdirs.iddir AND
+        contentsafetyfiles.name = ?""", (dir_path, name,))
+        return tuple(({'package_id': x, 'path': sfile, 'sha256': z,
+                       'mtime': m} for x, z, m in cur))
+
     def retrieveChangelog(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1923,14 +2412,34 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 return False
             return True
 
-        if not must_run():
+        def must_migrate_content():
+            # not bound to the schema revision, the compact layout can be
+            # enabled at any time (see _CONTENT_DIRS).
+            return self._CONTENT_DIRS and not self._isContentDirs()
+
+        def must_update_search_index():
+            # not bound to the schema revision either (see _SEARCH_INDEX).
+            if not self._SEARCH_INDEX:
+                return self._isSearchIndex()
+            return self._indexing and not self._isSearchIndex() and \
+                self._isSearchIndexSupported()
+
+        if not must_run() and not must_migrate_content() and \
+                not must_update_search_index():
             return
 
         try:
             with self.exclusive():
-                if not must_run():
-                    return
-                self._databaseSchemaUpdatesUnlocked()
+                if must_run():
+                    self._databaseSchemaUpdatesUnlocked()
+                if must_migrate_content():
+                    self._migrateContentDirs()
+                if must_update_search_index():
+                    if self._SEARCH_INDEX:
+                        self._createSearchIndex()
+                    else:
+                        self._dropSearchIndex()
+                        self._connection().commit()
         except LockAcquireError as err:
             const_debug_write(
                 __name__,
@@ -1985,7 +2494,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._createSettingsTable()
 
         # added on Aug, 2010
-        if not self._doesTableExist("contentsafety"):
+        if not self._doesTableExist("contentsafety") and \
+                not self._isContentDirs():
             self._createContentSafetyTable()
         if not self._doesTableExist('provided_libs'):
             self._createProvidedLibs()
@@ -2006,6 +2516,10 @@ class EntropySQLiteRepository(EntropySQLRepository):
         # added on Sept. 2010, keep forever? ;-)
         self._migrateBaseinfoExtrainfo()
 
+        # added on Oct. 2026
+        if self._getChecksumGenerations() is None:
+            self._setupChecksumGenerations()
+
         self._foreignKeySupport()
 
         self._readonly = old_readonly
@@ -2018,6 +2532,124 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 EntropySQLiteRepository._SCHEMA_REVISION)
             self._connection().commit()
 
+    def _getChecksumGenerations(self):
+        """
+        Return a dict mapping the tables tracked by checksum() to the
+        random token that is replaced every time they are modified, or None
+        if the repository does not track them. The settings cache is
+        bypassed on purpose, tokens are changed at every write.
+        """
+        try:
+            cur = self._cursor().execute("""
+            SELECT setting_name, setting_value FROM settings
+            WHERE setting_name LIKE "checksum_generation_%"
+            """)
+        except Error:
+            return None
+        prefix_len = len("checksum_generation_")
+        generations = dict((x[prefix_len:], y) for x, y in cur)
+        for table in self._CHECKSUM_TABLES:
+            if table not in generations:
+                return None
+        return generations
+
+    def _generationChecksum(self, generations, do_order, strict,
+                            include_signatures, include_dependencies):
+        """
+        Return the checksum() value for the given generation tokens.
+
+        Without do_order, the tokens of the tables checksum() would hash
+        are hashed instead of their content, which is O(1).
+
+        With do_order, the content of the tables is hashed, because the
+        result is compared against other repositories (see
+        alignDatabases()). It is computed once per generation, using the
+        in-memory and the on-disk caches. The on-disk cache is shared by
+        all the processes.
+        """
+        tables = ["baseinfo", "extrainfo"]
+        if include_signatures:
+            tables.append("packagesignatures")
+        if include_dependencies:
+            tables.extend(["dependenciesreference", "dependencies"])
+        flags = "%s_%s_%s_%s" % (
+            do_order, strict, include_signatures, include_dependencies)
+        generation = ",".join(generations[x] for x in tables)
+
+        if not do_order:
+            sha = hashlib.sha1()
+            sha.update(const_convert_to_rawstring(
+                "generation|%s|%s" % (flags, generation)))
+            return sha.hexdigest()
+
+        cache_key = "checksum_%s_%s" % (generation, flags)
+        cached = self._getLiveCache(cache_key)
+        if cached is not None:
+            return cached
+        # avoid memleak with python3.x
+        del cached
+
+        disk_key = None
+        if self._caching:
+            hash_str = "%s|%s|%s" % (self._db, self.name, flags)
+            if const_is_python3():
+                hash_str = hash_str.encode("utf-8")
+            sha = hashlib.sha1()
+            sha.update(hash_str)
+            disk_key = "EntropyRepository/checksum_" + sha.hexdigest()
+
+            cached = self._cacher.pop(disk_key)
+            if isinstance(cached, tuple) and len(cached) == 2 \
+                    and cached[0] == generation:
+                self._setLiveCache(cache_key, cached[1])
+                return cached[1]
+
+        result = self._checksum(do_order, strict, include_signatures,
+                                include_dependencies)
+        self._setLiveCache(cache_key, result)
+        if disk_key is not None:
+            try:
+                self._cacher.save(disk_key, (generation, result))
+            except IOError:
+                # race condition, ignore
+                pass
+        return result
+
+    def _setupChecksumGenerations(self):
+        """
+        Create the "checksum_generation_<table>" settings of the tables
+        tracked by checksum(), see _bumpChecksumGenerations().
+        """
+        generation = self._newChecksumGeneration()
+        self._cursor().executemany("""
+        %s INTO settings VALUES (?, ?)
+        """ % (self._INSERT_OR_REPLACE,),
+        [("checksum_generation_%s" % (x,), generation)
+         for x in self._CHECKSUM_TABLES])
+        self._settings_cache.clear()
+
+    def _newChecksumGeneration(self):
+        """
+        Return a new random checksum generation token. A random token,
+        rather than a counter, is never reused after a rollback, nor by
+        another process.
+        """
+        return const_convert_to_unicode(binascii.hexlify(os.urandom(8)))
+
+    def _bumpChecksumGenerations(self, tables):
+        """
+        Reimplemented from EntropySQLRepository.
+        Replace the "checksum_generation_<table>" settings of the given
+        tables with a new random token. Repositories without them are
+        left alone, checksum() hashes their content.
+        """
+        self._cursor().execute("""
+        UPDATE settings SET setting_value = ?
+        WHERE setting_name IN (%s)
+        """ % (", ".join(["?"] * len(tables)),),
+        [self._newChecksumGeneration()] +
+        ["checksum_generation_%s" % (x,) for x in tables])
+
     def integrity_check(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2064,6 +2696,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         gentle_with_tables = True
         toraw = const_convert_to_rawstring
 
+        # FTS5 shadow tables are created along with their virtual table
+        cur = self._cursor().execute("""
+        SELECT name FROM sqlite_master
+        WHERE type=='table' AND sql LIKE 'CREATE VIRTUAL TABLE%'
+        """)
+        virtual_tables = self._cur2frozenset(cur)
+        shadow_tables = set()
+        for name in virtual_tables:
+            for suffix in ("data", "idx", "content", "docsize", "config"):
+                shadow_tables.add("%s_%s" % (name, suffix))
+
         dumpfile.write(toraw("BEGIN TRANSACTION;\n"))
         cur = self._cursor().execute("""
         SELECT name, type, sql FROM sqlite_master
@@ -2082,10 +2725,15 @@ class EntropySQLiteRepository(EntropySQLRepository):
             )
             if name.startswith("sqlite_"):
                 continue
+            if name in shadow_tables:
+                continue
 
             t_cmd = "CREATE TABLE"
+            v_cmd = "CREATE VIRTUAL TABLE"
             if sql.startswith(t_cmd) and gentle_with_tables:
                 sql = "CREATE TABLE IF NOT EXISTS"+sql[len(t_cmd):]
+            elif sql.startswith(v_cmd) and gentle_with_tables:
+                sql = "CREATE VIRTUAL TABLE IF NOT EXISTS"+sql[len(v_cmd):]
             dumpfile.write(toraw("%s;\n" % sql))
 
             if name in exclude_tables:
@@ -2093,7 +2741,13 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
             cur2 = self._cursor().execute("PRAGMA table_info('%s')" % name)
             cols = [r[1] for r in cur2.fetchall()]
-            q = "SELECT 'INSERT INTO \"%(tbl_name)s\" VALUES("
+            if name in virtual_tables:
+                # rowids are package identifiers
+                cols.insert(0, "rowid")
+                q = "SELECT 'INSERT INTO \"%(tbl_name)s\" (" + \
+                    ", ".join(cols) + ") VALUES("
+            else:
+                q = "SELECT 'INSERT INTO \"%(tbl_name)s\" VALUES("
             q += ", ".join(["'||quote(" + x + ")||'" for x in cols])
             q += ")' FROM '%(tbl_name)s'"
             self._connection().unicode()
@@ -2133,6 +2787,18 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """)
         return self._cur2tuple(cur)
 
+    def _listAllViews(self):
+        """
+        List all available views in this repository database.
+
+        @return: available views
+        @rtype: list
+        """
+        cur = self._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "view"
+        """)
+        return self._cur2tuple(cur)
+
     def mtime(self):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2152,11 +2818,17 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         _baseinfo_extrainfo_2010 = self._isBaseinfoExtrainfo2010()
         if _baseinfo_extrainfo_2010:
-            return super(EntropySQLiteRepository,
-                         self).checksum(
-                do_order = do_order,
-                strict = strict,
-                include_signatures = include_signatures)
+            generations = self._getChecksumGenerations()
+            if generations is None:
+                return super(EntropySQLiteRepository,
+                             self).checksum(
+                    do_order = do_order,
+                    strict = strict,
+                    include_signatures = include_signatures,
+                    include_dependencies = include_dependencies)
+            return self._generationChecksum(
+                generations, do_order, strict, include_signatures,
+                include_dependencies)
 
         # backward compatibility
         # !!! keep aligned !!!
@@ -2172,7 +2844,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         category_order = ""
         license_order = ""
         flags_order = ""
-        depenenciesref_order = ""
+        dependenciesref_order = ""
         dependencies_order = ""
         if do_order:
             package_id_order = "order by idpackage"
@@ -2368,11 +3040,30 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return {}
 
+    def dropContent(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if self._isSearchIndex():
+            self._cursor().execute("DELETE FROM contentsearch")
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository, self).dropContent()
+        self._cursor().executescript("""
+        DELETE FROM contentfiles;
+        DELETE FROM contentsafetyfiles;
+        DELETE FROM contentdirs;
+        """)
+
     def dropContentSafety(self):
         """
         Reimplemented from EntropySQLRepository.
         We must handle backward compatibility.
+        We must handle _content_dirs.
         """
+        if self._isContentDirs():
+            self._cursor().execute("DELETE FROM contentsafetyfiles")
+            return
         try:
             return super(EntropySQLiteRepository,
                          self).dropContentSafety()
@@ -2395,6 +3086,24 @@ class EntropySQLiteRepository(EntropySQLRepository):
             except OperationalError:
                 continue
 
+    def clean(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        super(EntropySQLiteRepository, self).clean()
+        if self._isContentDirs():
+            self._cleanupContentDirs()
+
+    def _cleanupContentDirs(self):
+        """
+        Cleanup "content" directories unused references to save space.
+        """
+        self._cursor().execute("""
+        DELETE FROM contentdirs
+        WHERE iddir NOT IN (SELECT iddir FROM contentfiles)
+        AND iddir NOT IN (SELECT iddir FROM contentsafetyfiles)""")
+
     def createAllIndexes(self):
         """
         Reimplemented from EntropySQLRepository.
@@ -2406,6 +3115,23 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self.__createCategoriesIndex()
             self.__createCompileFlagsIndex()
 
+    def _createContentIndex(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_dirs.
+        """
+        if not self._isContentDirs():
+            return super(EntropySQLiteRepository,
+                         self)._createContentIndex()
+        self._cursor().executescript("""
+            CREATE INDEX IF NOT EXISTS contentfilesindex_couple
+                ON contentfiles ( idpackage );
+            CREATE INDEX IF NOT EXISTS contentfilesindex_file
+                ON contentfiles ( iddir, name );
+            CREATE INDEX IF NOT EXISTS contentsafetyfilesindex_couple
+                ON contentsafetyfiles ( idpackage );
+        """)
+
     def __createCompileFlagsIndex(self):
         try:
             self._cursor().execute("""
@@ -2585,6 +3311,363 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._setSetting("_baseinfo_extrainfo_2010", "1")
         self._connection().commit()
 
+    def _isContentDirs(self):
+        """
+        Return whether the "content" and "contentsafety" metadata are
+        stored using the compact layout (see _migrateContentDirs()).
+        The result is kept until the layout is changed by this instance,
+        since it is checked by every content query. Repositories migrated
+        by others keep working through the "content" and "contentsafety"
+        views.
+        """
+        if self._content_dirs is not None:
+            return self._content_dirs
+        try:
+            self.getSetting("_content_dirs")
+            # extra check to avoid issues with settings table creation
+            # before the actual schema update.
+            content_dirs = self._doesTableExist("contentfiles")
+        except KeyError:
+            content_dirs = False
+        self._content_dirs = content_dirs
+        return content_dirs
+
+    def _migrateContentDirs(self):
+        """
+        Support for compact content tables, migration function.
+        Directory paths are stored once into the "contentdirs" table and
+        referenced by "contentfiles" and "contentsafetyfiles", which
+        only store the file names. "content" and "contentsafety" become
+        views exposing the same columns of the old tables, so that
+        readers and writers do not need to know about the new layout.
+        """
+        if self._isContentDirs():
+            return
+        if not self._doesTableExist("content"):
+            return
+        if not self._doesTableExist("contentsafety"):
+            return
+
+        cur = self._cursor().execute("SELECT 1 FROM content LIMIT 1")
+        if cur.fetchone() is not None:
+            mytxt = "%s: [%s] %s" % (
+                bold(_("ATTENTION")),
+                purple(self.name),
+                red(_("updating repository metadata layout, please wait!")),
+            )
+            self.output(
+                mytxt,
+                importance = 1,
+                level = "warning")
+
+        # the directory part of a path, including the trailing slash,
+        # as done by _splitContentPath().
+        dir_sql = "rtrim(%(file)s, replace(%(file)s, '/', ''))"
+        name_sql = "substr(%%(file)s, length(%s) + 1)" % (dir_sql,)
+
+        self.dropAllIndexes()
+        self._cursor().execute("pragma foreign_keys = OFF").fetchall()
+        self._cursor().executescript("""
+            BEGIN TRANSACTION;
+
+            DROP TABLE IF EXISTS contentdirs;
+            CREATE TABLE contentdirs (
+                iddir INTEGER PRIMARY KEY,
+                dir VARCHAR UNIQUE
+            );
+            DROP TABLE IF EXISTS contentfiles;
+            CREATE TABLE contentfiles (
+                idpackage INTEGER,
+                iddir INTEGER,
+                name VARCHAR,
+                type VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+            DROP TABLE IF EXISTS contentsafetyfiles;
+            CREATE TABLE contentsafetyfiles (
+                idpackage INTEGER,
+                iddir INTEGER,
+                name VARCHAR,
+                mtime FLOAT,
+                sha256 VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+
+            INSERT OR IGNORE INTO contentdirs (dir)
+                SELECT DISTINCT %(content_dir)s FROM content;
+            INSERT OR IGNORE INTO contentdirs (dir)
+                SELECT DISTINCT %(safety_dir)s FROM contentsafety;
+            INSERT INTO contentfiles
+                SELECT content.idpackage, contentdirs.iddir,
+                    substr(content.file, length(contentdirs.dir) + 1),
+                    content.type
+                FROM content, contentdirs
+                WHERE contentdirs.dir = %(content_dir)s
+                ORDER BY content.rowid;
+            INSERT INTO contentsafetyfiles
+                SELECT contentsafety.idpackage, contentdirs.iddir,
+                    substr(contentsafety.file, length(contentdirs.dir) + 1),
+                    contentsafety.mtime, contentsafety.sha256
+                FROM contentsafety, contentdirs
+                WHERE contentdirs.dir = %(safety_dir)s
+                ORDER BY contentsafety.rowid;
+            DROP TABLE content;
+            DROP TABLE contentsafety;
+
+            CREATE VIEW content AS
+                SELECT contentfiles.idpackage AS idpackage,
+                    contentdirs.dir || contentfiles.name AS file,
+                    contentfiles.type AS type
+                FROM contentfiles, contentdirs
+                WHERE contentdirs.iddir = contentfiles.iddir;
+            CREATE VIEW contentsafety AS
+                SELECT contentsafetyfiles.idpackage AS idpackage,
+                    contentdirs.dir || contentsafetyfiles.name AS file,
+                    contentsafetyfiles.mtime AS mtime,
+                    contentsafetyfiles.sha256 AS sha256
+                FROM contentsafetyfiles, contentdirs
+                WHERE contentdirs.iddir = contentsafetyfiles.iddir;
+
+            CREATE TRIGGER content_insert INSTEAD OF INSERT ON content
+            BEGIN
+                INSERT OR IGNORE INTO contentdirs (dir)
+                    VALUES (%(new_dir)s);
+                INSERT INTO contentfiles
+                    SELECT NEW.idpackage, iddir,
+                        substr(NEW.file, length(dir) + 1), NEW.type
+                    FROM contentdirs WHERE dir = %(new_dir)s;
+            END;
+            CREATE TRIGGER content_delete INSTEAD OF DELETE ON content
+            BEGIN
+                DELETE FROM contentfiles
+                WHERE idpackage = OLD.idpackage AND name = %(old_name)s
+                AND iddir IN (
+                    SELECT iddir FROM contentdirs WHERE dir = %(old_dir)s);
+            END;
+            CREATE TRIGGER contentsafety_insert
+                INSTEAD OF INSERT ON contentsafety
+            BEGIN
+                INSERT OR IGNORE INTO contentdirs (dir)
+                    VALUES (%(new_dir)s);
+                INSERT INTO contentsafetyfiles
+                    SELECT NEW.idpackage, iddir,
+                        substr(NEW.file, length(dir) + 1),
+                        NEW.mtime, NEW.sha256
+                    FROM contentdirs WHERE dir = %(new_dir)s;
+            END;
+            CREATE TRIGGER contentsafety_delete
+                INSTEAD OF DELETE ON contentsafety
+            BEGIN
+                DELETE FROM contentsafetyfiles
+                WHERE idpackage = OLD.idpackage AND name = %(old_name)s
+                AND iddir IN (
+                    SELECT iddir FROM contentdirs WHERE dir = %(old_dir)s);
+            END;
+
+            COMMIT;
+        """ % {
+                'content_dir': dir_sql % {'file': "content.file"},
+                'safety_dir': dir_sql % {'file': "contentsafety.file"},
+                'new_dir': dir_sql % {'file': "NEW.file"},
+                'old_dir': dir_sql % {'file': "OLD.file"},
+                'old_name': name_sql % {'file': "OLD.file"},
+                })
+        self._cursor().execute("pragma foreign_keys = ON").fetchall()
+
+        self._content_dirs = None
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        self._setSetting("_content_dirs", "1")
+        self._connection().commit()
+        # recreate indexes
+        self.createAllIndexes()
+
+    def _isSearchIndex(self):
+        """
+        Return whether the full-text search index tables are available
+        (see _createSearchIndex()).
+        """
+        try:
+            self.getSetting("_search_index")
+            # extra check, the index may have been dropped by a
+            # repository export.
+            return self._doesTableExist("baseinfosearch")
+        except KeyError:
+            return False
+
+    def _isSearchIndexSupported(self):
+        """
+        Return whether the SQLite library supports the FTS5 trigram
+        tokenizer used by the full-text search indexes. The result is
+        shared by all the repositories.
+        """
+        supported = EntropySQLiteRepository._search_index_supported
+        if supported is not None:
+            return supported
+
+        try:
+            self._cursor().executescript("""
+            DROP TABLE IF EXISTS temp.fts5_trigram_test;
+            CREATE VIRTUAL TABLE temp.fts5_trigram_test
+                USING fts5(test, tokenize = 'trigram');
+            DROP TABLE temp.fts5_trigram_test;
+            """)
+            supported = True
+        except OperationalError as err:
+            const_debug_write(
+                __name__,
+                "_isSearchIndexSupported: FTS5 trigrams not available: "
+                "%s" % (err,))
+            supported = False
+
+        EntropySQLiteRepository._search_index_supported = supported
+        return supported
+
+    def _createSearchIndex(self):
+        """
+        Create the full-text search index tables, using the trigram
+        tokenizer of the SQLite FTS5 extension. Atoms and descriptions
+        are kept in sync by triggers, file paths are indexed per package
+        by _updateContentSearchIndex(). Nothing is done if the SQLite
+        library does not support FTS5 trigrams.
+        """
+        if not self._isSearchIndexSupported():
+            return
+
+        self._dropSearchIndex()
+        self._cursor().executescript("""
+            BEGIN TRANSACTION;
+
+            CREATE VIRTUAL TABLE baseinfosearch
+                USING fts5(atom, tokenize = 'trigram');
+            CREATE VIRTUAL TABLE extrainfosearch
+                USING fts5(description, tokenize = 'trigram');
+            CREATE VIRTUAL TABLE contentsearch
+                USING fts5(file, tokenize = 'trigram');
+
+            INSERT INTO baseinfosearch (rowid, atom)
+                SELECT idpackage, atom FROM baseinfo;
+            INSERT INTO extrainfosearch (rowid, description)
+                SELECT idpackage, description FROM extrainfo;
+            INSERT INTO contentsearch (rowid, file)
+                SELECT idpackage, group_concat(file, char(10)) FROM content
+                GROUP BY idpackage;
+
+            CREATE TRIGGER baseinfosearch_insert AFTER INSERT ON baseinfo
+            BEGIN
+                DELETE FROM baseinfosearch WHERE rowid = NEW.idpackage;
+                INSERT INTO baseinfosearch (rowid, atom)
+                    VALUES (NEW.idpackage, NEW.atom);
+            END;
+            CREATE TRIGGER baseinfosearch_update
+                AFTER UPDATE OF idpackage, atom ON baseinfo
+            BEGIN
+                DELETE FROM baseinfosearch WHERE rowid = OLD.idpackage;
+                DELETE FROM baseinfosearch WHERE rowid = NEW.idpackage;
+                INSERT INTO baseinfosearch (rowid, atom)
+                    VALUES (NEW.idpackage, NEW.atom);
+            END;
+            CREATE TRIGGER baseinfosearch_delete AFTER DELETE ON baseinfo
+            BEGIN
+                DELETE FROM baseinfosearch WHERE rowid = OLD.idpackage;
+                DELETE FROM contentsearch WHERE rowid = OLD.idpackage;
+            END;
+
+            CREATE TRIGGER extrainfosearch_insert AFTER INSERT ON extrainfo
+            BEGIN
+                DELETE FROM extrainfosearch WHERE rowid = NEW.idpackage;
+                INSERT INTO extrainfosearch (rowid, description)
+                    VALUES (NEW.idpackage, NEW.description);
+            END;
+            CREATE TRIGGER extrainfosearch_update
+                AFTER UPDATE OF idpackage, description ON extrainfo
+            BEGIN
+                DELETE FROM extrainfosearch WHERE rowid = OLD.idpackage;
+                DELETE FROM extrainfosearch WHERE rowid = NEW.idpackage;
+                INSERT INTO extrainfosearch (rowid, description)
+                    VALUES (NEW.idpackage, NEW.description);
+            END;
+            CREATE TRIGGER extrainfosearch_delete AFTER DELETE ON extrainfo
+            BEGIN
+                DELETE FROM extrainfosearch WHERE rowid = OLD.idpackage;
+            END;
+
+            COMMIT;
+        """)
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        self._setSetting("_search_index", "1")
+        self._connection().commit()
+
+    def _dropSearchIndex(self):
+        """
+        Drop the full-text search index tables, if any. Their triggers
+        are dropped as well.
+        """
+        for table, _column in self._SEARCH_INDEXES.values():
+            self._cursor().execute("DROP TABLE IF EXISTS %s" % (table,))
+        for table in ("baseinfosearch", "extrainfosearch"):
+            for event in ("insert", "update", "delete"):
+                self._cursor().execute(
+                    "DROP TRIGGER IF EXISTS %s_%s" % (table, event,))
+        self._clearLiveCache("_doesTableExist")
+
+    def _updateContentSearchIndex(self, package_id, paths):
+        """
+        Add the given file paths of a package to the search index. All
+        the paths of a package are stored into a single, newline
+        separated, document whose rowid is the package identifier.
+        """
+        if not paths:
+            return
+        cur = self._cursor().execute("""
+        SELECT file FROM contentsearch WHERE rowid = ?
+        """, (package_id,))
+        document = cur.fetchone()
+        if document is not None:
+            paths = [document[0]] + paths
+            self._cursor().execute("""
+            DELETE FROM contentsearch WHERE rowid = ?
+            """, (package_id,))
+        self._cursor().execute("""
+        INSERT INTO contentsearch (rowid, file) VALUES (?, ?)
+        """, (package_id, "\n".join(paths),))
+
+    def _searchIndexQuery(self, index, like_keywords):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        if not self._isSearchIndex():
+            return None
+
+        # trigrams can only be used if the pattern contains at least
+        # three consecutive characters that are not wildcards.
+        patterns = []
+        for like_keyword in like_keywords:
+            chunks = like_keyword.replace("_", "%").split("%")
+            if max(len(x) for x in chunks) >= 3:
+                # match substrings, file paths are indexed as a single
+                # document per package.
+                patterns.append("%" + like_keyword + "%")
+        if not patterns:
+            return None
+
+        table, column = self._SEARCH_INDEXES[index]
+        return "SELECT rowid FROM %s WHERE %s" % (
+            table, " AND ".join(["%s LIKE ?" % (column,)] * len(patterns))), \
+            tuple(patterns)
+
+    @staticmethod
+    def _splitContentPath(path):
+        """
+        Split a path into its directory part, including the trailing
+        slash, and its file name, as stored by the compact content tables.
+        """
+        idx = path.rfind("/") + 1
+        return path[:idx], path[idx:]
+
     def _foreignKeySupport(self):
 
         # entropy.qa uses this name, must skip migration
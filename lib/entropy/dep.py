@@ -11,7 +11,10 @@
     This module contains Entropy package dependency manipulation functions.
 
 """
+import collections
 import re
+import functools
+import threading
 from entropy.exceptions import InvalidAtom, EntropyException
 from entropy.const import etpConst, const_cmp
 
@@ -75,30 +78,6 @@ def _pkgsplit(mypkg):
 
     return  (m.group('pn'), m.group('ver'), rev)
 
-def _generic_sorter(inputlist, cmp_func):
-
-    inputs = inputlist[:]
-    if len(inputs) < 2:
-        return inputs
-    max_idx = len(inputs)
-
-    while True:
-        changed = False
-        for idx in range(max_idx):
-            second_idx = idx+1
-            if second_idx == max_idx:
-                continue
-            str_a = inputs[idx]
-            str_b = inputs[second_idx]
-            if cmp_func(str_a, str_b) < 0:
-                inputs[idx] = str_b
-                inputs[second_idx] = str_a
-                changed = True
-        if not changed:
-            break
-
-    return inputs
-
 def isjustname(mypkg):
     """
     Checks to see if the depstring is only the package name (no version parts)
@@ -150,6 +129,57 @@ def catpkgsplit(mydata):
     retval += p_split
     return retval
 
+class _LRUCache(object):
+
+    """
+    Bounded, thread-safe, Least Recently Used cache used to memoize
+    the outcome of dependency string parsing functions.
+    """
+
+    def __init__(self, size):
+        """
+        _LRUCache constructor.
+
+        @param size: maximum number of cached items
+        @type size: int
+        """
+        self._size = size
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default = None):
+        """
+        Return the cached value for key, or default.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        """
+        Cache value for key, evicting the least recently used item if
+        the cache is full.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self._size:
+                self._data.popitem(last = False)
+
+    def clear(self):
+        """
+        Drop all the cached items.
+        """
+        with self._lock:
+            self._data.clear()
+
+_DEP_CACHE_SIZE = 16384
+_dep_getkey_cache = _LRUCache(_DEP_CACHE_SIZE)
+
 def dep_getkey(mydep):
     """
     Return the category/package-name of a depstring.
@@ -165,6 +195,16 @@ def dep_getkey(mydep):
     """
     if not mydep:
         return mydep
+    key = _dep_getkey_cache.get(mydep)
+    if key is None:
+        key = _dep_getkey(mydep)
+        _dep_getkey_cache.set(mydep, key)
+    return key
+
+def _dep_getkey(mydep):
+    """
+    Uncached dep_getkey() implementation.
+    """
     mydep = remove_tag(mydep)
     mydep = remove_usedeps(mydep)
 
@@ -498,6 +538,118 @@ def remove_package_operators(atom):
     """
     return atom.lstrip("><=~")
 
+class ParsedAtom(object):
+
+    """
+    Immutable representation of an atom (or dependency string), split
+    into the components used by the package matching logic.
+    Instances are created by parse_atom(), do not instantiate this class
+    directly.
+
+    Example usage:
+        >>> parsed = parse_atom(">=app-foo/foo-1.2.3:2[bar]")
+        >>> parsed.key, parsed.direction, parsed.version, parsed.slot
+        ('app-foo/foo', '>=', '1.2.3-r0', '2')
+    """
+
+    __slots__ = ("atom", "tag", "usedeps", "slot", "revision", "scan_atom",
+                 "direction", "justname", "stripped_atom", "key",
+                 "category", "name", "version")
+
+    def __init__(self, atom):
+        """
+        ParsedAtom constructor.
+
+        @param atom: atom or dependency string
+        @type atom: string
+        """
+        setter = super(ParsedAtom, self).__setattr__
+        setter("atom", atom)
+        setter("tag", dep_gettag(atom))
+        try:
+            usedeps = dep_getusedeps(atom)
+        except InvalidAtom:
+            usedeps = ()
+        setter("usedeps", usedeps)
+        setter("slot", dep_getslot(atom))
+        setter("revision", dep_get_entropy_revision(atom))
+
+        scan_atom = remove_usedeps(atom)
+        scan_atom = remove_tag(scan_atom)
+        scan_atom = remove_slot(scan_atom)
+        scan_atom = remove_entropy_revision(scan_atom)
+        setter("scan_atom", scan_atom)
+
+        direction = ''
+        justname = True
+        stripped_atom = ''
+        key = ''
+        category = ''
+        name = ''
+        version = ''
+
+        if scan_atom:
+            scan_cpv = dep_getcpv(scan_atom)
+            stripped_atom = scan_cpv
+            wildcard = ""
+            if scan_atom.endswith("*"):
+                wildcard = "*"
+                stripped_atom += wildcard
+            direction = scan_atom[0:-len(stripped_atom)]
+
+            justname = isjustname(scan_cpv)
+            key = stripped_atom
+            data = None
+            if not justname:
+                data = catpkgsplit(scan_cpv)
+                if data is not None:
+                    version = data[2] + wildcard + "-" + data[3]
+                    key = dep_getkey(stripped_atom)
+
+            if justname or data is not None:
+                split_key = key.split("/")
+                if len(split_key) == 2:
+                    category, name = split_key
+                else:
+                    category, name = "null", split_key[0]
+
+        setter("direction", direction)
+        setter("justname", justname)
+        setter("stripped_atom", stripped_atom)
+        setter("key", key)
+        setter("category", category)
+        setter("name", name)
+        setter("version", version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParsedAtom objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ParsedAtom objects are immutable")
+
+    def __repr__(self):
+        return "<ParsedAtom %r>" % (self.atom,)
+
+_parse_atom_cache = _LRUCache(_DEP_CACHE_SIZE)
+
+def parse_atom(atom):
+    """
+    Parse an atom (or dependency string) and return its ParsedAtom
+    object. The outcome is memoized in a bounded LRU cache, so this is
+    the preferred way to extract more than one component from the same
+    atom.
+
+    @param atom: atom or dependency string
+    @type atom: string
+    @return: the parsed atom
+    @rtype: ParsedAtom
+    """
+    parsed = _parse_atom_cache.get(atom)
+    if parsed is None:
+        parsed = ParsedAtom(atom)
+        _parse_atom_cache.set(atom, parsed)
+    return parsed
+
 def compare_versions(ver1, ver2):
     """
     docstring_title
@@ -615,6 +767,94 @@ def compare_versions(ver1, ver2):
         r2 = 0
     return r1 - r2
 
+_version_key_cache = {}
+_VERSION_KEY_CACHE_SIZE = 16384
+_suffix_pad = (suffix_value["p"], 0)
+def version_key(ver):
+    """
+    Return a sort key for the given version string, ordering versions the
+    same way compare_versions() does. The version string is parsed only
+    once and the outcome is memoized in a bounded cache.
+
+    compare_versions() is not a total ordering, so the key differs from it
+    where compare_versions() returns 0 for versions that are not equal:
+      - invalid version strings: compare_versions() returns 0 if the
+        first version is invalid (and 1 if only the second one is),
+        here they sort before any valid version and equal to each other;
+      - suffix numbers that differ as text but not as integers, like
+        "_beta" vs "_beta0", "_beta01" vs "_beta1" or a bare "_p" vs the
+        implicit "_p0" padding ("1_p" vs "1", "1_p_p1" vs "1"):
+        compare_versions() stops at the first of them and returns 0,
+        ignoring the following suffixes and the revision ("1_beta-r2"
+        equals "1_beta0-r1"), here they are compared as integers and the
+        comparison goes on ("1_beta-r2" > "1_beta0-r1").
+    Everything else orders exactly like compare_versions().
+
+    @param ver: version string
+    @type ver: string
+    @return: sort key
+    @rtype: tuple
+    """
+    key = _version_key_cache.get(ver)
+    if key is not None:
+        return key
+
+    match = None
+    if ver:
+        match = ver_regexp.match(ver)
+    if not match:
+        key = (-1,)
+    else:
+        key = (int(match.group(2)), _version_components_key(match.group(3)),
+               match.group(5), _version_suffixes_key(match.group(6)),
+               int(match.group(10) or 0))
+
+    if len(_version_key_cache) >= _VERSION_KEY_CACHE_SIZE:
+        _version_key_cache.clear()
+    _version_key_cache[ver] = key
+    return key
+
+def _version_components_key(components):
+    """
+    Return the sort key of the dot separated version components following
+    the first one. Components with leading zeroes are compared as decimal
+    fractions, and always come before the ones compared as integers.
+    Missing components come before anything else, so that 1.0.0 > 1.0.
+    """
+    key = []
+    for comp in components[1:].split("."):
+        if not comp:
+            break
+        if comp[0] == "0":
+            key.append((0, float("0." + comp)))
+        else:
+            key.append((1, int(comp)))
+    return tuple(key)
+
+def _version_suffixes_key(suffixes):
+    """
+    Return the sort key of the version suffixes (_alpha, _p1, etc).
+    compare_versions() pads the shorter list of suffixes with "_p0", so
+    every non-padding suffix is stored along with the number of padding
+    suffixes preceding it, and the key is terminated by an element that
+    sorts like the padding itself.
+    """
+    key = []
+    pads = 0
+    for suffix in suffixes.split("_")[1:]:
+        name, number = suffix_regexp.match(suffix).groups()
+        value = (suffix_value[name], int(number or 0))
+        if value == _suffix_pad:
+            pads += 1
+            continue
+        if value > _suffix_pad:
+            key.append((1, -pads, value))
+        else:
+            key.append((-1, pads, value))
+        pads = 0
+    key.append((0,))
+    return tuple(key)
+
 tag_regexp = re.compile("^([A-Za-z0-9+_.-]+)?$")
 def is_valid_package_tag(tag):
     """
@@ -703,7 +943,23 @@ def get_newer_version(versions):
     @return: sorted version list
     @rtype: list
     """
-    return _generic_sorter(versions, compare_versions)
+    return sorted(versions, key = version_key, reverse = True)
+
+def _entropy_version_key(ver_data):
+    """
+    Sort key for (version, tag, revision) tuples when at most one tag
+    is involved, see get_entropy_newer_version().
+    """
+    ver, tag, rev = ver_data
+    return version_key(ver), tag, rev
+
+def _entropy_tagged_version_key(ver_data):
+    """
+    Sort key for (version, tag, revision) tuples when all of them are
+    tagged, see get_entropy_newer_version().
+    """
+    ver, tag, rev = ver_data
+    return tag, version_key(ver), rev
 
 def get_entropy_newer_version(versions):
     """
@@ -714,7 +970,17 @@ def get_entropy_newer_version(versions):
     @return: sorted list
     @rtype: list
     """
-    return _generic_sorter(versions, entropy_compare_versions)
+    tags = set(x[1] for x in versions)
+    if len(tags) < 2 or (len(tags) < 3 and "" in tags):
+        sort_key = _entropy_version_key
+    elif "" not in tags:
+        sort_key = _entropy_tagged_version_key
+    else:
+        # tags are compared first only when both packages are tagged,
+        # with untagged and differently tagged packages mixed together
+        # entropy_compare_versions() does not give a total ordering.
+        sort_key = functools.cmp_to_key(entropy_compare_versions)
+    return sorted(versions, key = sort_key, reverse = True)
 
 sha1_re = re.compile(r"(.*)\.([a-f\d]{40})(.*)")
 def get_entropy_package_sha1(package_name):
@@ -1061,7 +1327,7 @@ class DependencyStringParser(object):
         if cur_str:
             subs.append(cur_str.strip())
 
-        return subs
+        return tuple(subs)
 
     def __evaluate_subs(self, iterable):
 
@@ -1074,7 +1340,7 @@ class DependencyStringParser(object):
 
             outcomes = []
             for and_el in iterable:
-                if isinstance(and_el, list):
+                if isinstance(and_el, tuple):
                     outcome = self.__evaluate_subs(and_el)
                     if outcome:
                         outcomes.extend(outcome)
@@ -1092,7 +1358,7 @@ class DependencyStringParser(object):
             if self.__selected_matches:
                 # if there is something to prioritize
                 for or_el in iterable:
-                    if isinstance(or_el, list):
+                    if isinstance(or_el, tuple):
                         outcome = self.__evaluate_subs(or_el)
                         if outcome:
                             difference = set(outcome) - self.__selected_matches
@@ -1109,7 +1375,7 @@ class DependencyStringParser(object):
             # no match using selected_matches priority list, fallback to
             # first available.
             for or_el in iterable:
-                if isinstance(or_el, list):
+                if isinstance(or_el, tuple):
                     outcome = self.__evaluate_subs(or_el)
                     if outcome:
                         return outcome
@@ -1122,7 +1388,7 @@ class DependencyStringParser(object):
 
     def __encode_sub(self, dep):
         """
-        Generate a list of lists and strings from a plain dependency match
+        Generate a tuple of tuples and strings from a plain dependency match
         condition.
         """
         open_bracket = dep.find("(")
@@ -1154,14 +1420,34 @@ class DependencyStringParser(object):
         self.__clear_cache()
         matched = False
         try:
-            matched_deps = self.__evaluate_subs(
-                self.__encode_sub("(" + self.__dep + ")"))
+            matched_deps = self.__evaluate_subs(self.__encode())
             if matched_deps:
                 matched = True
         except DependencyStringParser.MalformedDependency:
             matched_deps = []
         return matched, matched_deps
 
+    def __encode(self):
+        """
+        Return the encoded form of the dependency string (see
+        __encode_sub()), which is memoized across parser instances since
+        it only depends on the dependency string itself.
+        """
+        encoded = _dependency_string_cache.get(self.__dep)
+        if encoded is None:
+            try:
+                encoded = self.__encode_sub("(" + self.__dep + ")")
+            except DependencyStringParser.MalformedDependency:
+                # __encode_sub() never returns an empty tuple
+                encoded = ()
+            _dependency_string_cache.set(self.__dep, encoded)
+
+        if not encoded:
+            raise DependencyStringParser.MalformedDependency()
+        return encoded
+
+_dependency_string_cache = _LRUCache(_DEP_CACHE_SIZE)
+
 
 def expand_dependencies(dependencies, entropy_repository_list,
     selected_matches = None):
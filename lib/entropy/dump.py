@@ -21,11 +21,17 @@
     they must be "pickable". Please read Python Library reference for
     more information.
 
+    Alternatively, SqliteDumpStore keeps all the objects of a dump
+    directory into a single, indexed, SQLite file.
+
 """
 
 import sys
 import os
+import errno
 import time
+import threading
+import sqlite3
 
 from entropy.const import etpConst, const_setup_file, const_is_python3, \
     const_mkstemp
@@ -219,7 +225,7 @@ def serialize_string(myobj):
     """
     if const_is_python3():
         return pickle.dumps(myobj, protocol = COMPAT_PICKLE_PROTOCOL,
-            fix_imports = True, encoding = etpConst['conf_raw_encoding'])
+            fix_imports = True)
     else:
         return pickle.dumps(myobj)
 
@@ -328,3 +334,330 @@ def removeobj(name, dump_dir = None):
         if err.errno not in (errno.ENOENT, errno.ENOTDIR):
             raise
         return False
+
+
+class SqliteDumpStore(object):
+
+    """
+    Single file, indexed, object store. All the objects dumped into a
+    directory are kept inside one SQLite database (see STORE_NAME), instead
+    of one pickle file per object. Writes can be done in atomic batches and
+    the store is kept below a maximum size by evicting the least recently
+    used objects.
+
+    Instances are thread-safe. Use SqliteDumpStore.get() to retrieve the
+    shared instance for a given directory.
+    """
+
+    STORE_NAME = "__dump_store__.db"
+
+    # Default maximum size, in bytes, of the stored objects
+    DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+
+    _STORES = {}
+    _STORES_LOCK = threading.Lock()
+
+    def __init__(self, dump_dir, max_size = None):
+        """
+        SqliteDumpStore constructor.
+
+        @param dump_dir: directory containing the store file
+        @type dump_dir: string
+        @keyword max_size: maximum size of the stored objects, in bytes
+        @type max_size: int
+        """
+        if max_size is None:
+            max_size = SqliteDumpStore.DEFAULT_MAX_SIZE
+        self._dump_dir = dump_dir
+        self._path = os.path.join(dump_dir, SqliteDumpStore.STORE_NAME)
+        self._max_size = max_size
+        self._lock = threading.RLock()
+        self._conn = None
+        self._inode = None
+        self._touched = {}
+        # estimated size of the stored objects, see _evict()
+        self._size = None
+
+    @classmethod
+    def get(cls, dump_dir = None, max_size = None):
+        """
+        Return the shared SqliteDumpStore instance for the given directory.
+
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        @keyword max_size: maximum size of the stored objects, in bytes
+        @type max_size: int
+        @return: the store instance
+        @rtype: SqliteDumpStore
+        """
+        if dump_dir is None:
+            dump_dir = D_DIR
+        with cls._STORES_LOCK:
+            store = cls._STORES.get(dump_dir)
+            if store is None:
+                store = cls(dump_dir, max_size = max_size)
+                cls._STORES[dump_dir] = store
+            elif max_size is not None:
+                store._max_size = max_size
+            return store
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
+        self._inode = None
+        self._size = None
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self._path, timeout = 30.0, check_same_thread = False)
+        try:
+            conn.text_factory = str
+            conn.executescript("""
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS dumps (
+                    name VARCHAR PRIMARY KEY,
+                    data BLOB,
+                    size INTEGER,
+                    mtime FLOAT,
+                    atime FLOAT
+                );
+                CREATE INDEX IF NOT EXISTS dumps_atime ON dumps ( atime );
+            """)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _cursor(self, create = True):
+        """
+        Return a cursor to the store database, (re)opening it if the file
+        has been removed or replaced meanwhile. Must be called with the
+        instance lock held.
+        """
+        try:
+            inode = os.stat(self._path).st_ino
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            inode = None
+
+        if self._conn is not None and inode == self._inode:
+            return self._conn.cursor()
+
+        self._close()
+        if inode is None:
+            if not create:
+                return None
+            my_dump_dir = self._dump_dir
+            d_paths = []
+            while not os.path.isdir(my_dump_dir):
+                d_paths.append(my_dump_dir)
+                my_dump_dir = os.path.dirname(my_dump_dir)
+            for d_path in sorted(d_paths):
+                os.mkdir(d_path)
+                const_setup_file(d_path, E_GID, 0o775)
+
+        try:
+            conn = self._connect()
+        except sqlite3.OperationalError:
+            # locked or unreadable, do not touch it
+            raise
+        except sqlite3.DatabaseError:
+            # corrupted store, start from scratch
+            os.remove(self._path)
+            conn = self._connect()
+
+        if inode is None:
+            const_setup_file(self._path, E_GID, 0o664)
+        self._conn = conn
+        self._inode = os.stat(self._path).st_ino
+        return conn.cursor()
+
+    def dump_many(self, objects):
+        """
+        Atomically dump the given objects to the store.
+
+        @param objects: list of (name, object) tuples
+        @type objects: list
+        @raise EOFError: if objects cannot be serialized
+        @raise IOError: if objects cannot be written
+        """
+        cur_t = time.time()
+        rows = []
+        added_size = 0
+        for name, my_object in objects:
+            data = serialize_string(my_object)
+            rows.append((name, sqlite3.Binary(data), len(data),
+                         cur_t, cur_t))
+            added_size += len(data)
+
+        with self._lock:
+            try:
+                cur = self._cursor()
+                with self._conn:
+                    cur.executemany("""
+                    INSERT OR REPLACE INTO dumps VALUES (?, ?, ?, ?, ?)
+                    """, rows)
+                    self._flush_touched(cur)
+                    self._evict(cur, added_size)
+            except (sqlite3.Error, OSError) as err:
+                self._size = None
+                raise IOError("cannot write to %s: %s" % (
+                    self._path, repr(err)))
+
+    def dump(self, name, my_object):
+        """
+        Dump the given object to the store.
+
+        @param name: name of the object
+        @type name: string
+        @param my_object: object to dump
+        @type my_object: any Python "pickable" object
+        @raise EOFError: if the object cannot be serialized
+        @raise IOError: if the object cannot be written
+        """
+        self.dump_many([(name, my_object)])
+
+    def load(self, name, aging_days = None):
+        """
+        Load an object from the store.
+
+        @param name: name of the object to load
+        @type name: string
+        @keyword aging_days: if int, consider the stored object invalid
+            if older than aging_days.
+        @type aging_days: int
+        @return: object or None
+        @rtype: any Python pickable object or None
+        """
+        with self._lock:
+            try:
+                cur = self._cursor(create = False)
+                if cur is None:
+                    return None
+                cur.execute("""
+                SELECT data, mtime FROM dumps WHERE name = ?
+                """, (name,))
+                row = cur.fetchone()
+            except (sqlite3.Error, OSError):
+                return None
+            if row is None:
+                return None
+
+            data, mtime = row
+            cur_t = time.time()
+            if aging_days is not None:
+                if abs(cur_t - mtime) > (aging_days * 86400):
+                    return None
+            # access time is written together with the next batch
+            self._touched[name] = cur_t
+
+        try:
+            return unserialize_string(bytes(data))
+        except (ValueError, EOFError, IOError,
+            OSError, pickle.UnpicklingError, TypeError,
+            AttributeError, ImportError, SystemError,):
+            return None
+
+    def remove(self, name):
+        """
+        Remove the stored object referenced by its name.
+
+        @param name: object name
+        @type name: string
+        @return: True, if the object has been removed
+        @rtype: bool
+        """
+        with self._lock:
+            try:
+                cur = self._cursor(create = False)
+                if cur is None:
+                    return False
+                with self._conn:
+                    cur.execute("""
+                    DELETE FROM dumps WHERE name = ?
+                    """, (name,))
+                    return cur.rowcount > 0
+            except (sqlite3.Error, OSError):
+                return False
+
+    def remove_prefix(self, prefix):
+        """
+        Remove all the stored objects whose name starts with prefix.
+
+        @param prefix: object name prefix
+        @type prefix: string
+        @return: number of removed objects
+        @rtype: int
+        """
+        with self._lock:
+            try:
+                cur = self._cursor(create = False)
+                if cur is None:
+                    return 0
+                with self._conn:
+                    cur.execute("""
+                    DELETE FROM dumps WHERE substr(name, 1, ?) = ?
+                    """, (len(prefix), prefix))
+                    return cur.rowcount
+            except (sqlite3.Error, OSError):
+                return 0
+
+    def clear(self):
+        """
+        Remove all the stored objects.
+        """
+        with self._lock:
+            self._touched.clear()
+            try:
+                cur = self._cursor(create = False)
+                if cur is None:
+                    return
+                with self._conn:
+                    cur.execute("DELETE FROM dumps")
+                self._size = 0
+            except (sqlite3.Error, OSError):
+                pass
+
+    def _flush_touched(self, cur):
+        if self._touched:
+            touched, self._touched = self._touched, {}
+            cur.executemany("""
+            UPDATE dumps SET atime = ? WHERE name = ?
+            """, [(atime, name) for name, atime in touched.items()])
+
+    def _evict(self, cur, added_size):
+        """
+        Evict the least recently used objects if the store got bigger
+        than its maximum size. The store size is estimated by adding up
+        the size of the written objects, which never underestimates it
+        for the writes done by this instance, and it is read from the
+        database only when the estimate exceeds the maximum size.
+        """
+        if self._size is not None:
+            self._size += added_size
+            if self._size <= self._max_size:
+                return
+
+        cur.execute("SELECT COALESCE(SUM(size), 0) FROM dumps")
+        total_size = cur.fetchone()[0]
+        self._size = total_size
+        if total_size <= self._max_size:
+            return
+
+        # make some room, so that eviction does not happen at every write
+        to_free = total_size - int(self._max_size * 0.9)
+        cur.execute("SELECT name, size FROM dumps ORDER BY atime")
+        names = []
+        for name, size in cur.fetchall():
+            if to_free <= 0:
+                break
+            names.append((name,))
+            to_free -= size
+            total_size -= size
+        cur.executemany("DELETE FROM dumps WHERE name = ?", names)
+        self._size = total_size
@@ -24,6 +24,7 @@ import pty
 import subprocess
 import threading
 import contextlib
+import collections
 import base64
 import ssl
 
@@ -49,6 +50,216 @@ from entropy.misc import ParallelTask
 from entropy.core.settings.base import SystemSettings
 
 
+class HttpConnectionPool(object):
+
+    """
+    Thread-safe pool of idle, persistent HTTP and HTTPS connections,
+    keyed by protocol and host. It is shared among UrlFetcher instances
+    so that downloads from the same mirror reuse the same TCP (and TLS)
+    connection instead of setting up a new one every time.
+    """
+
+    def __init__(self, max_idle = 4):
+        """
+        HttpConnectionPool constructor.
+
+        @keyword max_idle: maximum number of idle connections kept per host
+        @type max_idle: int
+        """
+        self._max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+        Return an idle connection for the given key, if any.
+
+        @param key: connection key
+        @type key: tuple
+        @return: an idle connection object or None
+        @rtype: httplib.HTTPConnection or None
+        """
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                return conns.pop()
+        return None
+
+    def release(self, key, conn):
+        """
+        Give back a connection whose response has been completely read.
+
+        @param key: connection key
+        @type key: tuple
+        @param conn: the connection object
+        @type conn: httplib.HTTPConnection
+        """
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self._max_idle:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for conns in idle:
+            for conn in conns:
+                try:
+                    conn.close()
+                except (socket.error, httplib.HTTPException):
+                    pass
+
+
+class _KeepAliveResponse(object):
+
+    """
+    File-like HTTP response handed out by the keep-alive handlers.
+    The connection goes back to the pool once the response body has been
+    completely read, otherwise it is closed.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._url = url
+        self.code = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self._url
+
+    def getcode(self):
+        return self.code
+
+    def read(self, amt = None):
+        response = self._response
+        if response is None:
+            return b""
+        if amt is None:
+            data = response.read()
+        else:
+            data = response.read(amt)
+        if not data or response.isclosed():
+            self.close()
+        return data
+
+    def readline(self, *args):
+        response = self._response
+        if response is None:
+            return b""
+        return response.readline(*args)
+
+    def close(self):
+        response, self._response = self._response, None
+        if response is None:
+            return
+        if response.isclosed():
+            self._pool.release(self._key, self._conn)
+        else:
+            # unread data would corrupt the next response
+            response.close()
+            self._conn.close()
+
+
+class _KeepAliveHandlerMixin(object):
+
+    """
+    urllib handler mixin that sends requests over pooled connections.
+    """
+
+    def _setup_pool(self, pool, pool_tag):
+        self._pool = pool
+        self._pool_tag = pool_tag
+
+    @staticmethod
+    def _request_attr(req, name):
+        # Python 2.x urllib2 uses getters
+        getter = getattr(req, "get_" + name, None)
+        if getter is not None:
+            return getter()
+        return getattr(req, name)
+
+    def do_open(self, http_class, req, **http_conn_args):
+        if getattr(req, "_tunnel_host", None):
+            # proxy tunnels are not pooled
+            return urlmod.AbstractHTTPHandler.do_open(
+                self, http_class, req, **http_conn_args)
+
+        host = self._request_attr(req, "host")
+        if not host:
+            raise urlmod_error.URLError("no host given")
+        selector = self._request_attr(req, "selector")
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        key = (http_class.__name__, host, self._pool_tag)
+        conn = self._pool.acquire(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = http_class(host, timeout = req.timeout,
+                                  **http_conn_args)
+            else:
+                conn.timeout = req.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(req.timeout)
+            try:
+                conn.request(req.get_method(), selector, req.data, headers)
+                response = conn.getresponse()
+            except (socket.error, httplib.HTTPException) as err:
+                conn.close()
+                conn = None
+                if reused:
+                    # idle connection dropped by the server, retry once
+                    reused = False
+                    continue
+                raise urlmod_error.URLError(err)
+            break
+
+        return _KeepAliveResponse(
+            self._pool, key, conn, response, req.get_full_url())
+
+
+class _KeepAliveHTTPHandler(_KeepAliveHandlerMixin, urlmod.HTTPHandler):
+
+    def __init__(self, pool, pool_tag):
+        urlmod.HTTPHandler.__init__(self)
+        self._setup_pool(pool, pool_tag)
+
+    def http_open(self, req):
+        return self.do_open(httplib.HTTPConnection, req)
+
+
+class _KeepAliveHTTPSHandler(_KeepAliveHandlerMixin, urlmod.HTTPSHandler):
+
+    def __init__(self, pool, pool_tag, context = None):
+        urlmod.HTTPSHandler.__init__(self)
+        self._setup_pool(pool, pool_tag)
+        self._keepalive_context = context
+
+    def https_open(self, req):
+        kwargs = {}
+        if self._keepalive_context is not None:
+            kwargs['context'] = self._keepalive_context
+        return self.do_open(httplib.HTTPSConnection, req, **kwargs)
+
+
 class UrlFetcher(TextInterface):
 
     """
@@ -81,7 +292,7 @@ class UrlFetcher(TextInterface):
                  timeout = None, download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, connection_pool = None):
         """
         Entropy URL downloader constructor.
 
@@ -128,6 +339,9 @@ class UrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword connection_pool: if not None, HTTP and HTTPS downloads are
+            done over the persistent connections kept by the given pool.
+        @type connection_pool: HttpConnectionPool
         """
         self.__supported_uris = {
             'file': self._urllib_download,
@@ -175,6 +389,7 @@ class UrlFetcher(TextInterface):
         self.__http_basic_pwd = http_basic_pwd
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
+        self.__connection_pool = connection_pool
 
         self._init_vars()
         self.__init_urllib()
@@ -186,6 +401,7 @@ class UrlFetcher(TextInterface):
     def __init_urllib(self):
         # this will be moved away soon anyway
         self.__localfile = None
+        self.__opener = None
 
     def _init_vars(self):
         self.__use_md5_checksum = False
@@ -557,6 +773,9 @@ class UrlFetcher(TextInterface):
     def _setup_urllib_proxy(self):
         """
         Setup urllib proxy data
+
+        @return: True, if a proxy has been configured
+        @rtype: bool
         """
         mydict = {}
         proxy_data = self.__system_settings['system']['proxy']
@@ -568,15 +787,46 @@ class UrlFetcher(TextInterface):
             mydict['username'] = proxy_data['username']
             mydict['password'] = proxy_data['password']
             add_proxy_opener(urlmod, mydict)
+            return True
         else:
             # unset
             urlmod._opener = None
+            return False
+
+    def __setup_urllib_opener(self, url_protocol, ssl_context):
+        """
+        Setup the urllib opener using persistent connections, if a
+        connection pool has been provided.
+        """
+        self.__opener = None
+        if self.__connection_pool is None:
+            return
+        if url_protocol not in ("http", "https"):
+            return
+
+        self.__opener = urlmod.build_opener(
+            _KeepAliveHTTPHandler(
+                self.__connection_pool, self.__https_validate_cert),
+            _KeepAliveHTTPSHandler(
+                self.__connection_pool, self.__https_validate_cert,
+                context = ssl_context))
+
+    def __urllib_open(self, request, ssl_context = None):
+        """
+        Open the given urllib request.
+        """
+        if self.__opener is not None:
+            return self.__opener.open(request, None, self.__timeout)
+        if ssl_context is not None:
+            return urlmod.urlopen(request, None, self.__timeout,
+                context = ssl_context)
+        return urlmod.urlopen(request, None, self.__timeout)
 
     def _urllib_download(self):
         """
         urrlib2 based downloader. This is the default for HTTP and FTP urls.
         """
-        self._setup_urllib_proxy()
+        proxy_enabled = self._setup_urllib_proxy()
         self.__setup_urllib_resume_support()
         # we're going to feed the md5 digestor on the way.
         self.__use_md5_checksum = True
@@ -611,24 +861,25 @@ class UrlFetcher(TextInterface):
         else:
             req = url
 
+        ctx = None
+        if url_protocol in ("https") and not self.__https_validate_cert:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+
+        if proxy_enabled:
+            # proxies are handled by the global urllib opener
+            self.__opener = None
+        else:
+            self.__setup_urllib_opener(url_protocol, ctx)
+
         u_agent_error = False
         do_return = False
         while True:
 
             # get file size if available
             try:
-                if url_protocol in ("https") and \
-                    not self.__https_validate_cert:
-
-                    ctx = ssl.create_default_context()
-                    ctx.check_hostname = False
-                    ctx.verify_mode = ssl.CERT_NONE
-
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout,
-                            context=ctx)
-
-                else:
-                    self.__remotefile = urlmod.urlopen(req, None, self.__timeout)
+                self.__remotefile = self.__urllib_open(req, ssl_context = ctx)
             except KeyboardInterrupt:
                 self.__urllib_close(False)
                 raise
@@ -724,8 +975,8 @@ class UrlFetcher(TextInterface):
                     self.__remotefile.close()
                 except:
                     pass
-                self.__remotefile = urlmod.urlopen(
-                    request, None, self.__timeout)
+                self.__remotefile = self.__urllib_open(
+                    request, ssl_context = ctx)
 
             elif self.__startingposition == self.__remotesize:
                 # all fine then!
@@ -1012,7 +1263,7 @@ class MultipleUrlFetcher(TextInterface):
                  download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, max_workers = None):
         """
         @param url_path_list: list of tuples composed by url and
             path to save, for eg. [(url,path_to_save,),...]
@@ -1056,6 +1307,9 @@ class MultipleUrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword max_workers: maximum number of concurrent downloads, if None
+            the value is read from Entropy configuration files.
+        @type max_workers: int
         """
         self._progress_data = {}
         self._url_path_list = url_path_list
@@ -1073,6 +1327,7 @@ class MultipleUrlFetcher(TextInterface):
 
         # important to have a declaration here
         self.__data_transfer = 0
+        self.__transfer_rates = {}
         self.__average = 0
         self.__old_average = 0
         self.__time_remaining_secs = 0
@@ -1087,6 +1342,11 @@ class MultipleUrlFetcher(TextInterface):
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
 
+        if max_workers is None:
+            max_workers = \
+                self.__system_settings['repositories']['download_workers']
+        self.__max_workers = max(1, max_workers)
+
     def __handle_threads_stop(self):
         if self.__stop_threads:
             raise InterruptError("interrupted")
@@ -1096,6 +1356,7 @@ class MultipleUrlFetcher(TextInterface):
         self._progress_data_lock = threading.Lock()
         self.__thread_pool = {}
         self.__download_statuses = {}
+        self.__transfer_rates = {}
         self.__show_progress = False
         self.__stop_threads = False
         self.__first_refreshes = 50
@@ -1135,10 +1396,16 @@ class MultipleUrlFetcher(TextInterface):
         """
         self._init_vars()
 
+        # downloads are executed by a fixed number of workers
+        # consuming a shared queue.
+        max_workers = min(self.__max_workers, len(self._url_path_list))
+
         speed_limit = 0
         dsl = self.__system_settings['repositories']['transfer_limit']
-        if isinstance(dsl, int) and self._url_path_list:
-            speed_limit = dsl/len(self._url_path_list)
+        if isinstance(dsl, int) and max_workers:
+            speed_limit = dsl/max_workers
+
+        connection_pool = HttpConnectionPool(max_idle = max_workers)
 
         class MyFetcher(self.__url_fetcher):
 
@@ -1156,6 +1423,7 @@ class MultipleUrlFetcher(TextInterface):
                 return self.__multiple_fetcher.handle_statistics(*args,
                     **kwargs)
 
+        queue = collections.deque()
         th_id = 0
         for url, path_to_save in self._url_path_list:
             th_id += 1
@@ -1173,18 +1441,26 @@ class MultipleUrlFetcher(TextInterface):
                 post_download_hook = self.__post_download_hook,
                 http_basic_user = self.__http_basic_user,
                 http_basic_pwd = self.__http_basic_pwd,
-                https_validate_cert = self.__https_validate_cert
+                https_validate_cert = self.__https_validate_cert,
+                connection_pool = connection_pool
             )
             downloader.set_id(th_id)
+            queue.append((th_id, downloader))
 
-            def do_download(ds, dth_id, downloader):
+        def do_download(ds, queue):
+            while not self.__stop_threads:
+                try:
+                    dth_id, downloader = queue.popleft()
+                except IndexError:
+                    break
                 ds[dth_id] = downloader.download()
+                self.__transfer_rates[dth_id] = downloader.get_transfer_rate()
 
-            t = ParallelTask(do_download, self.__download_statuses, th_id,
-                downloader)
-            t.name = "UrlFetcher{%s}" % (url,)
+        for worker_id in range(max_workers):
+            t = ParallelTask(do_download, self.__download_statuses, queue)
+            t.name = "MultipleUrlFetcher{%d}" % (worker_id,)
             t.daemon = True
-            self.__thread_pool[th_id] = t
+            self.__thread_pool[worker_id] = t
             t.start()
 
         self._push_progress_to_output(force = True)
@@ -1197,7 +1473,7 @@ class MultipleUrlFetcher(TextInterface):
         try:
             while True:
                 _all_joined = True
-                for th_id, th in self.__thread_pool.items():
+                for worker_id, th in self.__thread_pool.items():
                     th.join(0.3)
                     if th.is_alive():
                         # timeout then
@@ -1207,11 +1483,13 @@ class MultipleUrlFetcher(TextInterface):
         except (SystemExit, KeyboardInterrupt):
             self.__stop_threads = True
             raise
+        finally:
+            connection_pool.close()
 
         if len(self._url_path_list) != len(self.__download_statuses):
             # there has been an error (exception)
             # complete download_statuses with error info
-            for th_id, th in self.__thread_pool.items():
+            for th_id in range(1, len(self._url_path_list) + 1):
                 if th_id not in self.__download_statuses:
                     self.__download_statuses[th_id] = \
                         UrlFetcher.GENERIC_FETCH_ERROR
@@ -1227,6 +1505,17 @@ class MultipleUrlFetcher(TextInterface):
         """
         return self.__data_transfer
 
+    def get_transfer_rates(self):
+        """
+        Return the final transfer rate of every completed download,
+        as returned by UrlFetcher.get_transfer_rate().
+
+        @return: dict containing UrlFetcher.get_id() as key
+            and transfer rate as value
+        @rtype: dict
+        """
+        return self.__transfer_rates.copy()
+
     def get_average(self):
         """
         Get current download percentage.
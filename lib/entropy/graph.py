@@ -13,7 +13,6 @@
     based on Tarjan's.
 
 """
-from entropy.misc import Lifo
 
 class GraphNode(object):
 
@@ -220,6 +219,10 @@ class TopologicalSorter(object):
     """
     This class implements the topological sorting algorithm presented by
     R. E. Tarjan in 1972.
+    Nodes are mapped to integer indexes and the strongly connected
+    components are found iteratively, so that deep dependency chains do not
+    hit the Python recursion limit and the running time is linear in the
+    size of the graph.
     """
 
     def __init__(self, adjacency_map):
@@ -231,69 +234,112 @@ class TopologicalSorter(object):
         """
         object.__init__(self)
         self.__adjacency_map = adjacency_map
-        self.__stack = Lifo()
 
-    def __topological_sort_visit_node(self, node, low, result):
+    def __index_adjacency_map(self):
+        """
+        Map the adjacency map nodes to integer indexes, following the
+        adjacency map iteration order.
+        Return the list of nodes and the list of successor indexes of
+        each node.
+        """
+        nodes = list(self.__adjacency_map.keys())
+        node_index = dict((node, idx) for idx, node in enumerate(nodes))
+        successors = [[node_index[x] for x in self.__adjacency_map[node]] \
+                          for node in nodes]
+        return nodes, successors
+
+    def __strongly_connected_nodes(self, successors):
+        """
+        Find the strongly connected nodes using Tarjan's algorithm.
+        Return the list of components, each component is a list of node
+        indexes, and the component index of each node.
+        """
+        count = len(successors)
+        # "low" of nodes belonging to a found component, it must be
+        # greater than any visit number.
+        done = count
+        visit_num = [-1] * count
+        low = [-1] * count
+        node_component = [-1] * count
+        components = []
+        stack = []
+        stack_pos = [0] * count
+        work_nodes = []
+        work_next = []
+        num = 0
+
+        for root in range(count):
+            if visit_num[root] != -1:
+                continue
+
+            visit_num[root] = num
+            low[root] = num
+            num += 1
+            stack_pos[root] = len(stack)
+            stack.append(root)
+            work_nodes.append(root)
+            work_next.append(0)
+
+            while work_nodes:
+                node = work_nodes[-1]
+                node_successors = successors[node]
+                idx = work_next[-1]
+
+                if idx < len(node_successors):
+                    work_next[-1] = idx + 1
+                    successor = node_successors[idx]
+                    if visit_num[successor] == -1:
+                        # visit successor
+                        visit_num[successor] = num
+                        low[successor] = num
+                        num += 1
+                        stack_pos[successor] = len(stack)
+                        stack.append(successor)
+                        work_nodes.append(successor)
+                        work_next.append(0)
+                    elif low[successor] < low[node]:
+                        low[node] = low[successor]
+                    continue
+
+                # all the successors have been visited
+                work_nodes.pop()
+                work_next.pop()
+
+                if visit_num[node] == low[node]:
+                    pos = stack_pos[node]
+                    component = stack[pos:]
+                    del stack[pos:]
+                    component.reverse()
+                    component_idx = len(components)
+                    for item in component:
+                        low[item] = done
+                        node_component[item] = component_idx
+                    components.append(component)
+
+                if work_nodes:
+                    parent = work_nodes[-1]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+
+        return components, node_component
+
+    def __topological_sort(self, graph, order):
+        """
+        Effectively executes topological sorting on given graph, a list
+        of successor lists indexed by node. Nodes are considered in
+        the given order.
         """
-        Internal method, visits a node ad push to stack.
-        """
-        if node in low:
-            return
-
-        num = len(low)
-        low[node] = num
-        stack_pos = len(self.__stack)
-        self.__stack.push(node)
-
-        for successor in self.__adjacency_map[node]:
-            self.__topological_sort_visit_node(successor, low, result)
-            low[node] = min(low[node], low[successor])
-
-        if num == low[node]:
-            component = tuple()
-            while len(self.__stack) > stack_pos:
-                component += (self.__stack.pop(),)
-            result.append(component)
-            for item in component:
-                low[item] = len(self.__adjacency_map)
-
-    def __strongly_connected_nodes(self):
-        """
-        Find the strongly connected nodes in a adjacency_map using
-        Tarjan's algorithm.
-
-        adjacency_map should be a dictionary mapping node names to
-        lists of successor nodes.
-        """
-        result = []
-        low = {}
-
-        for node in self.__adjacency_map:
-            self.__topological_sort_visit_node(node, low, result)
-
-        return result
-
-
-    def __topological_sort(self, graph):
-        """
-        Effectively executes topological sorting on given graph.
-        """
-
         # initialize count map
-        count = dict((node, 0) for node in graph)
-
-        for node in graph:
-            for successor in graph[node]:
+        count = [0] * len(graph)
+        for node_successors in graph:
+            for successor in node_successors:
                 count[successor] += 1
 
-        ready_stack = Lifo()
-        for node in graph:
-            if count[node] == 0:
-                ready_stack.push(node)
+        ready_stack = [x for x in order if count[x] == 0]
 
         dep_level = 1
         result = {}
-        while ready_stack.is_filled():
+        while ready_stack:
 
             node = ready_stack.pop()
             result[dep_level] = node
@@ -302,7 +348,7 @@ class TopologicalSorter(object):
             for successor in graph[node]:
                 count[successor] -= 1
                 if count[successor] == 0:
-                    ready_stack.push(successor)
+                    ready_stack.append(successor)
 
         return result
 
@@ -323,26 +369,29 @@ class TopologicalSorter(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        # clear stack
-        self.__stack.clear()
-
-        components = self.__strongly_connected_nodes()
-
-        node_component = {}
-        for component in components:
-            for node in component:
-                node_component[node] = component
+        nodes, successors = self.__index_adjacency_map()
+        components, node_component = self.__strongly_connected_nodes(
+            successors)
 
-        component_graph = {}
-        for node in self.__adjacency_map:
+        # components are considered in order of first appearance
+        # in the adjacency map.
+        component_graph = [[] for x in components]
+        component_seen = [False] * len(components)
+        order = []
+        for node, node_successors in enumerate(successors):
             node_c = node_component[node]
-            obj = component_graph.setdefault(node_c, [])
-            for successor in self.__adjacency_map[node]:
+            if not component_seen[node_c]:
+                component_seen[node_c] = True
+                order.append(node_c)
+            obj = component_graph[node_c]
+            for successor in node_successors:
                 successor_c = node_component[successor]
                 if node_c != successor_c:
                     obj.append(successor_c)
 
-        return self.__topological_sort(component_graph)
+        sorted_components = self.__topological_sort(component_graph, order)
+        return dict((x, tuple([nodes[i] for i in components[y]])) \
+                        for x, y in sorted_components.items())
 
 
 class Graph(object):
@@ -20,6 +20,11 @@ import signal
 import errno
 import codecs
 import contextlib
+import re
+import struct
+import binascii
+import bz2
+import zlib
 
 from entropy.const import const_is_python3
 
@@ -30,12 +35,18 @@ else:
     import urllib
     import urllib2
     UrllibBaseHandler = urllib2.BaseHandler
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
 import logging
 import threading
 from collections import deque
 
 from entropy.const import etpConst, const_isunicode, \
-    const_isfileobj, const_convert_log_level, const_setup_file
+    const_isfileobj, const_convert_log_level, const_setup_file, \
+    const_get_cpus, const_convert_to_rawstring
 from entropy.exceptions import EntropyException
 
 import entropy.tools
@@ -471,6 +482,650 @@ class ParallelTask(threading.Thread):
         return self.__rc
 
 
+class _ParallelCompressionJob(object):
+    """
+    Block compression job of ParallelCompressedFile.
+    """
+
+    __slots__ = ("data", "final", "prev", "result", "error", "event")
+
+    def __init__(self, data, final, prev):
+        self.data = data
+        self.final = final
+        # the job submitted before this one, if any
+        self.prev = prev
+        self.result = None
+        self.error = None
+        self.event = threading.Event()
+
+
+class ParallelCompressedFile(object):
+
+    """
+    Write-only file object compressing data in independent blocks through
+    a pool of threads (compression libraries release the GIL while
+    working) and writing the compressed blocks, in order, as a single
+    stream. Subclasses implement the actual compressed format, see
+    ParallelBZ2File and ParallelGzipFile.
+
+        >>> from entropy.misc import ParallelBZ2File
+        >>> with ParallelBZ2File("/tmp/foo.bz2", "wb") as bz_f:
+        ...     bz_f.write(data)
+
+    """
+
+    # compression job class, see _submit()
+    _JOB_CLASS = _ParallelCompressionJob
+
+    def __init__(self, filename = None, mode = "wb", compresslevel = 9,
+                 fileobj = None, threads = None):
+        """
+        ParallelCompressedFile constructor.
+
+        @keyword filename: path to the compressed file
+        @type filename: string
+        @keyword mode: file open mode, only "w" and "wb" are supported
+        @type mode: string
+        @keyword compresslevel: compression level, from 0 to 9
+        @type compresslevel: int
+        @keyword fileobj: file object to write to, instead of filename
+        @type fileobj: file object
+        @keyword threads: number of compression threads, if None,
+            the number of available CPUs is used
+        @type threads: int
+        @raise ValueError: if mode or compresslevel are invalid
+        """
+        if mode not in ("w", "wb"):
+            raise ValueError("unsupported mode: %s" % (mode,))
+        if compresslevel < 0 or compresslevel > 9:
+            raise ValueError("invalid compresslevel: %s" % (compresslevel,))
+        if threads is None:
+            threads = const_get_cpus()
+
+        self._threads = max(1, threads)
+        self._level = compresslevel
+        self._buffer = bytearray()
+        self._offset = 0
+        self._jobs = deque()
+        self._last_job = None
+        self._queue = None
+        self._workers = []
+        self._header_written = False
+        self._closed = False
+
+        if fileobj is None:
+            fileobj = open(filename, "wb")
+            self._extfileobj = False
+        else:
+            if filename is None:
+                filename = getattr(fileobj, "name", None)
+            self._extfileobj = True
+        self._fileobj = fileobj
+        self.name = filename
+        self.mode = "wb"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        """
+        Return whether the file object has been closed.
+        """
+        return self._closed
+
+    def tell(self):
+        """
+        Return the amount of uncompressed data written.
+        """
+        return self._offset
+
+    def flush(self):
+        """
+        Flush the underlying file object. Pending data is not compressed
+        until a block is complete or the file is closed, in order not to
+        alter the compressed stream.
+        """
+        self._fileobj.flush()
+
+    def write(self, data):
+        """
+        Write data to the compressed file.
+
+        @param data: data to write
+        @type data: bytes
+        """
+        if self._closed:
+            raise ValueError("I/O operation on closed file")
+        self._buffer.extend(data)
+        self._offset += len(data)
+        for block in self._split_blocks(False):
+            self._submit(block, False)
+
+    def close(self):
+        """
+        Compress pending data, write the stream trailer and close the
+        underlying file object (if it's not an external one).
+        """
+        if self._closed:
+            return
+        try:
+            blocks = self._split_blocks(True)
+            for idx, block in enumerate(blocks):
+                self._submit(block, idx == len(blocks) - 1)
+            while self._jobs:
+                self._write_job()
+            if not self._header_written:
+                self._write_header()
+            self._write_trailer()
+        finally:
+            self._closed = True
+            for _worker in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            del self._workers[:]
+            self._jobs.clear()
+            self._last_job = None
+            if not self._extfileobj:
+                self._fileobj.close()
+
+    def _worker(self):
+        """
+        Compression thread body.
+        """
+        job = self._queue.get()
+        while job is not None:
+            self._run_job(job)
+            job = self._queue.get()
+
+    def _run_job(self, job):
+        """
+        Run a compression job and signal its completion.
+        """
+        try:
+            job.result = self._compress_job(job)
+        except Exception as err:
+            job.error = err
+        finally:
+            job.data = None
+            job.prev = None
+            job.event.set()
+
+    def _submit(self, block, final):
+        """
+        Schedule the compression of a block, limiting the amount of
+        blocks in memory.
+        """
+        job = self._JOB_CLASS(block, final, self._last_job)
+        self._last_job = job
+        self._jobs.append(job)
+
+        if self._threads < 2:
+            self._run_job(job)
+            self._write_job()
+            return
+
+        if not self._workers:
+            self._queue = Queue()
+            for _idx in range(self._threads):
+                worker = threading.Thread(target = self._worker)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+        self._queue.put(job)
+        while len(self._jobs) > self._threads * 2:
+            self._write_job()
+
+    def _write_job(self):
+        """
+        Wait for the oldest compression job and write its result to the
+        underlying file object.
+        """
+        job = self._jobs.popleft()
+        job.event.wait()
+        if job.error is not None:
+            raise job.error
+        if not self._header_written:
+            self._write_header()
+            self._header_written = True
+        self._write_block(job)
+        job.result = None
+
+    def _split_blocks(self, final):
+        """
+        Remove complete blocks from the buffer and return them. If final
+        is True, the buffer must be emptied.
+        Subclasses have to reimplement this.
+        """
+        raise NotImplementedError()
+
+    def _compress_job(self, job):
+        """
+        Compress the data of a job and return the result, called from
+        a compression thread. Jobs are started in submission order.
+        Subclasses have to reimplement this.
+        """
+        raise NotImplementedError()
+
+    def _write_header(self):
+        """
+        Write the stream header.
+        Subclasses have to reimplement this.
+        """
+        raise NotImplementedError()
+
+    def _write_block(self, job):
+        """
+        Write the result of a compression job.
+        Subclasses have to reimplement this.
+        """
+        raise NotImplementedError()
+
+    def _write_trailer(self):
+        """
+        Write the stream trailer.
+        Subclasses have to reimplement this.
+        """
+        raise NotImplementedError()
+
+
+if const_is_python3():
+    def _bytes_to_int(data):
+        return int.from_bytes(data, "big")
+
+    def _int_to_bytes(value, length):
+        return value.to_bytes(length, "big")
+else:
+    def _bytes_to_int(data):
+        if not data:
+            return 0
+        return int(binascii.hexlify(data), 16)
+
+    def _int_to_bytes(value, length):
+        return binascii.unhexlify("%0*x" % (length * 2, value))
+
+
+def _splice_bits(bits, nbits, value, vbits):
+    """
+    Append vbits bits of value to the nbits pending bits and return
+    a (data, bits, nbits) tuple, where data are the complete bytes
+    and bits, nbits the bits left pending.
+    """
+    acc = (bits << vbits) | value
+    total = nbits + vbits
+    nbytes, rem = divmod(total, 8)
+    data = b""
+    if nbytes:
+        data = _int_to_bytes(acc >> rem, nbytes)
+    return data, acc & ((1 << rem) - 1), rem
+
+
+class _ParallelBZ2Job(_ParallelCompressionJob):
+    """
+    Block compression job of ParallelBZ2File.
+    """
+
+    __slots__ = ("leftover", "split_event", "tail", "crcs")
+
+    def __init__(self, data, final, prev):
+        super(_ParallelBZ2Job, self).__init__(data, final, prev)
+        # input not fitting into this job blocks, see _compress_job()
+        self.leftover = None
+        self.split_event = threading.Event()
+        # bits left pending after this job blocks
+        self.tail = None
+        self.crcs = None
+
+
+class ParallelBZ2File(ParallelCompressedFile):
+
+    """
+    ParallelCompressedFile writing bzip2 files.
+    The input is split exactly where libbz2 would end its blocks, every
+    block is compressed as a separate bzip2 stream and the compressed
+    blocks are bit-concatenated into a single stream. The result is
+    identical to the one of bz2.BZ2File, thus readable by any bzip2
+    decompressor and reproducible (see entropy.tools.apply_entropy_delta).
+
+    Input is handed to the compression threads as it comes; looking for
+    block ends and bit-concatenating blocks happens there as well, in
+    submission order. With less than two threads, data is compressed
+    as a plain libbz2 stream.
+    """
+
+    _JOB_CLASS = _ParallelBZ2Job
+
+    _EOS_MAGIC = 0x177245385090
+    # runs of equal bytes are encoded in pieces of at most 255 bytes
+    _PIECE_RE = re.compile(b"(.)\\1\\1\\1\\1{0,251}", re.DOTALL)
+    _RUN_END_RE = re.compile(b"(.)(?!\\1)", re.DOTALL)
+    _SCAN_SIZE = 65536
+
+    def __init__(self, *args, **kwargs):
+        super(ParallelBZ2File, self).__init__(*args, **kwargs)
+        if self._level < 1:
+            if not self._extfileobj:
+                self._fileobj.close()
+            raise ValueError("invalid compresslevel: %s" % (self._level,))
+        # see libbz2 nblockMAX
+        self._block_max = self._level * 100000 - 19
+        # the first byte index worth looking for a block end at, input
+        # is at most expanded by 5/4 by the run-length encoding.
+        self._split_at = self._block_max * 4 // 5
+        self._bits = 0
+        self._nbits = 0
+        self._crc = 0
+        self._compressor = None
+        if self._threads < 2:
+            self._compressor = bz2.BZ2Compressor(self._level)
+
+    def write(self, data):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        if self._compressor is None:
+            return super(ParallelBZ2File, self).write(data)
+        if self._closed:
+            raise ValueError("I/O operation on closed file")
+        self._offset += len(data)
+        self._fileobj.write(self._compressor.compress(data))
+
+    def close(self):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        if self._compressor is None:
+            return super(ParallelBZ2File, self).close()
+        if self._closed:
+            return
+        try:
+            self._fileobj.write(self._compressor.flush())
+        finally:
+            self._closed = True
+            if not self._extfileobj:
+                self._fileobj.close()
+
+    def _encoded_size(self, data, start, end):
+        """
+        Return the run-length encoded size of data between start
+        and end, which must not split any run.
+        """
+        stripped, pieces = self._PIECE_RE.subn(b"", data[start:end])
+        return len(stripped) + pieces * 5
+
+    def _block_end(self, data, start, delta):
+        """
+        Look for the index of data where libbz2 would end the block
+        starting at the beginning of data.
+        libbz2 run-length encodes runs of 4 to 255 equal bytes into 5
+        bytes and it closes the block as soon as the encoded size
+        reaches the limit, when a new run starts. The new run goes into
+        the next block.
+        Whole chunks of data (ending where a run ends) fitting into the
+        block are skipped, the scan is resumed from start, where the
+        encoded size minus the input size is delta.
+
+        @return: a (end, start, delta) tuple, end is None if the whole
+            data fits in the block or more data is required to find it
+            out, start and delta are where to resume the scan from.
+        @rtype: tuple
+        """
+        size = len(data)
+        block_max = self._block_max
+
+        while True:
+            end = size
+            if start + self._SCAN_SIZE < size:
+                end = self._RUN_END_RE.search(
+                    data, start + self._SCAN_SIZE - 1).end()
+            encoded = self._encoded_size(data, start, end)
+            if start + delta + encoded >= block_max:
+                break
+            if end == size:
+                return None, start, delta
+            delta += encoded - (end - start)
+            start = end
+        scan_start, scan_delta = start, delta
+
+        def _short_run_end(idx, limit):
+            # end of the run of less than 4 bytes containing idx
+            end = idx + 1
+            while end < limit and data[end] == data[idx]:
+                end += 1
+            return end
+
+        def _checked(end):
+            # the block ends at end only if a new run starts there
+            if end < size:
+                return end, 0, 0
+            return None, scan_start, scan_delta
+
+        for match in self._PIECE_RE.finditer(data, start):
+            start, stop = match.span()
+            if start + delta >= block_max:
+                # the block is filled by a byte before this piece
+                return _checked(
+                    _short_run_end(block_max - delta - 1, start))
+            if start + delta + 5 >= block_max:
+                # the block is filled by this piece
+                return _checked(stop)
+            delta += 5 - (stop - start)
+
+        return _checked(_short_run_end(block_max - delta - 1, size))
+
+    def _split_blocks(self, final):
+        """
+        Reimplemented from ParallelCompressedFile.
+        The buffer is handed out in pieces of the maximum block size,
+        block ends are looked for by _compress_job(). The final piece
+        is always returned, even if empty.
+        """
+        blocks = []
+        while len(self._buffer) >= self._block_max:
+            blocks.append(bytes(self._buffer[:self._block_max]))
+            del self._buffer[:self._block_max]
+        if final:
+            blocks.append(bytes(self._buffer))
+            del self._buffer[:]
+        return blocks
+
+    def _split_job(self, job):
+        """
+        Split the input left over by the previous job plus the data of
+        the given job into libbz2 blocks and return them. The input not
+        filling a block is stored into job.leftover, unless the job is
+        the final one.
+        """
+        prev = job.prev
+        if prev is None:
+            data, start, delta = bytearray(), 0, 0
+        else:
+            prev.split_event.wait()
+            if prev.leftover is None:
+                raise IOError("previous bzip2 block failed")
+            data, start, delta = prev.leftover
+            prev.leftover = None
+        data.extend(job.data)
+
+        blocks = []
+        if job.final or len(data) >= self._split_at:
+            end, start, delta = self._block_end(data, start, delta)
+            while end is not None:
+                blocks.append(bytes(data[:end]))
+                del data[:end]
+                end, start, delta = self._block_end(data, 0, 0)
+
+        if job.final:
+            if data:
+                blocks.append(bytes(data))
+        else:
+            job.leftover = (data, start, delta)
+        return blocks
+
+    def _unpack_block(self, stream):
+        """
+        Return a (block_crc, value, nbits) tuple describing the bzip2
+        stream containing a single block, as returned by bz2.compress():
+        a 4 bytes header, the block (starting with its magic and CRC),
+        the end of stream magic, the stream CRC and up to 7 padding bits.
+        The block itself is made of the nbits bits of value.
+        """
+        block_crc = struct.unpack(">I", stream[10:14])[0]
+        tail = _bytes_to_int(stream[-11:])
+        for padding in range(8):
+            value = tail >> padding
+            if value & 0xffffffff != block_crc:
+                continue
+            if (value >> 32) & 0xffffffffffff != self._EOS_MAGIC:
+                continue
+            break
+        else:
+            raise IOError("unexpected bzip2 stream layout")
+
+        trailer_bits = 80 + padding
+        nbits = (len(stream) - 4) * 8 - trailer_bits
+        return block_crc, _bytes_to_int(stream[4:]) >> trailer_bits, nbits
+
+    def _compress_job(self, job):
+        """
+        Reimplemented from ParallelCompressedFile.
+        Blocks are bit-concatenated to the pending bits of the previous
+        job, the ones left pending are stored into job.tail.
+        """
+        prev = job.prev
+        try:
+            blocks = self._split_job(job)
+        finally:
+            job.split_event.set()
+
+        unpacked = [self._unpack_block(bz2.compress(x, self._level))
+                    for x in blocks]
+        del blocks[:]
+
+        bits, nbits = 0, 0
+        if prev is not None:
+            prev.event.wait()
+            if prev.tail is None:
+                raise IOError("previous bzip2 block failed")
+            bits, nbits = prev.tail
+
+        chunks = []
+        job.crcs = []
+        for block_crc, value, vbits in unpacked:
+            data, bits, nbits = _splice_bits(bits, nbits, value, vbits)
+            chunks.append(data)
+            job.crcs.append(block_crc)
+        job.tail = (bits, nbits)
+        return b"".join(chunks)
+
+    def _write_bits(self, value, nbits):
+        """
+        Append nbits bits of value to the stream.
+        """
+        data, self._bits, self._nbits = _splice_bits(
+            self._bits, self._nbits, value, nbits)
+        if data:
+            self._fileobj.write(data)
+
+    def _write_header(self):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        self._fileobj.write(
+            b"BZh" + const_convert_to_rawstring(str(self._level)))
+
+    def _write_block(self, job):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        self._fileobj.write(job.result)
+        self._bits, self._nbits = job.tail
+        for block_crc in job.crcs:
+            self._crc = (((self._crc << 1) | (self._crc >> 31)) \
+                & 0xffffffff) ^ block_crc
+
+    def _write_trailer(self):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        self._write_bits(self._EOS_MAGIC, 48)
+        self._write_bits(self._crc, 32)
+        if self._nbits:
+            self._write_bits(0, 8 - self._nbits)
+
+
+class ParallelGzipFile(ParallelCompressedFile):
+
+    """
+    ParallelCompressedFile writing gzip files.
+    Every block is compressed as a raw deflate stream terminated by
+    a sync flush, so that compressed blocks can be concatenated into
+    a single gzip member, readable by any gzip decompressor.
+    """
+
+    _BLOCK_SIZE = 128 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super(ParallelGzipFile, self).__init__(*args, **kwargs)
+        self._crc = zlib.crc32(b"") & 0xffffffff
+
+    def _split_blocks(self, final):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        blocks = []
+        while len(self._buffer) >= self._BLOCK_SIZE:
+            blocks.append(bytes(self._buffer[:self._BLOCK_SIZE]))
+            del self._buffer[:self._BLOCK_SIZE]
+        if final and self._buffer:
+            blocks.append(bytes(self._buffer))
+            del self._buffer[:]
+        for block in blocks:
+            self._crc = zlib.crc32(block, self._crc) & 0xffffffff
+        return blocks
+
+    def _compress_job(self, job):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        compressor = zlib.compressobj(
+            self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(job.data) + compressor.flush(
+            zlib.Z_SYNC_FLUSH)
+
+    def _write_header(self):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        xfl = b"\000"
+        if self._level == 9:
+            xfl = b"\002"
+        self._fileobj.write(b"\037\213\010\000")
+        self._fileobj.write(struct.pack("<I", int(time.time())))
+        self._fileobj.write(xfl + b"\377")
+
+    def _write_block(self, job):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        self._fileobj.write(job.result)
+
+    def _write_trailer(self):
+        """
+        Reimplemented from ParallelCompressedFile.
+        """
+        compressor = zlib.compressobj(
+            self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._fileobj.write(compressor.flush(zlib.Z_FINISH))
+        self._fileobj.write(struct.pack("<II", self._crc,
+            (self._offset - len(self._buffer)) & 0xffffffff))
+
+
 class ReadersWritersSemaphore(object):
 
     """
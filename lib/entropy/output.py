@@ -1070,4 +1070,5 @@ class TextInterface(object):
         @param title: new application title
         @type title: string
         """
-        xterm_title(title)
+        with TextInterface.OUTPUT_LOCK:
+            xterm_title(title)
@@ -1378,7 +1378,8 @@ Name:    %s
         """
         Compress a file using compressor at opener.
         """
-        f_out = opener(destination_path, "wb")
+        f_out = entropy.tools.parallel_compressor(opener)(
+            destination_path, "wb")
         try:
             with open(file_path, "rb") as f_in:
                 data = f_in.read(8192)
@@ -1547,7 +1548,8 @@ Name:    %s
             eapi2_tmp_dbconn.commit()
 
             # opener = cmethod[0]
-            f_out = cmethod[0](upload_data['dump_path_light'], "wb")
+            f_out = entropy.tools.parallel_compressor(cmethod[0])(
+                upload_data['dump_path_light'], "wb")
             try:
                 eapi2_tmp_dbconn.exportRepository(f_out)
             finally:
@@ -1616,32 +1618,37 @@ Name:    %s
             self._compress_file(uncompressed_changelog,
                 compressed_changelog, bz2.BZ2File)
 
-        for uri in uris:
-
-            crippled_uri = EntropyTransceiver.get_uri_name(uri)
-
-            # EAPI 3
-            if 3 not in disabled_eapis:
+        # EAPI 3
+        if 3 not in disabled_eapis:
+            for uri in uris:
+                crippled_uri = EntropyTransceiver.get_uri_name(uri)
                 self._show_eapi3_upload_messages(crippled_uri, database_path)
 
+        repo_relative = \
+            self._entropy._get_override_remote_repository_relative_path(
+                self._repository_id)
+        if repo_relative is None:
             repo_relative = \
-                self._entropy._get_override_remote_repository_relative_path(
+                self._entropy._get_remote_repository_relative_path(
                     self._repository_id)
-            if repo_relative is None:
-                repo_relative = \
-                    self._entropy._get_remote_repository_relative_path(
-                        self._repository_id)
-            remote_dir = os.path.join(repo_relative,
-                self._settings['repositories']['branch'])
+        remote_dir = os.path.join(repo_relative,
+            self._settings['repositories']['branch'])
+
+        # upload to all the mirrors at the same time
+        uploader = self._mirrors.TransceiverServerHandler(
+            self._entropy, list(uris),
+            [upload_data[x] for x in sorted(upload_data)],
+            critical_files = critical,
+            txc_basedir = remote_dir, repo = self._repository_id
+        )
+        errors, m_fine_uris, m_broken_uris = uploader.go()
 
-            uploader = self._mirrors.TransceiverServerHandler(
-                self._entropy, [uri],
-                [upload_data[x] for x in sorted(upload_data)],
-                critical_files = critical,
-                txc_basedir = remote_dir, repo = self._repository_id
-            )
-            errors, m_fine_uris, m_broken_uris = uploader.go()
-            if errors:
+        for uri in uris:
+
+            crippled_uri = EntropyTransceiver.get_uri_name(uri)
+            uri_broken_uris = set(
+                x for x in m_broken_uris if x[0] == uri)
+            if uri_broken_uris:
                 self._entropy.output(
                     "[repo:%s|%s|%s] %s" % (
                         self._repository_id,
@@ -1656,7 +1663,7 @@ Name:    %s
                 # get reason
                 my_broken_uris = sorted([
                     (EntropyTransceiver.get_uri_name(x_uri),
-                        x_uri_rc) for x_uri, x_uri_rc in m_broken_uris])
+                        x_uri_rc) for x_uri, x_uri_rc in uri_broken_uris])
                 reason = my_broken_uris[0][1]
                 self._entropy.output(
                     blue("%s: %s" % (_("reason"), reason,)),
@@ -1664,7 +1671,7 @@ Name:    %s
                     level = "error",
                     header = blue("    # ")
                 )
-                broken_uris |= m_broken_uris
+                broken_uris |= uri_broken_uris
                 self._mirrors.lock_mirrors_for_download(self._repository_id,
                     True, mirrors = [uri])
                 continue
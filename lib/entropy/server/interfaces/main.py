@@ -14,6 +14,7 @@ import collections
 import copy
 import errno
 import hashlib
+import itertools
 import os
 import re
 import shutil
@@ -1092,6 +1093,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             # disabled by default for now
             'nonfree_packages_dir_support': False,
             'sync_speed_limit': None,
+            'sync_parallel_streams': 1,
             'weak_package_files': False,
             'changelog': True,
             'rss': {
@@ -1202,6 +1204,14 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
                 speed_limit = None
             data['sync_speed_limit'] = speed_limit
 
+        def _syncparallelstreams(line, setting):
+            try:
+                streams = int(setting)
+            except ValueError:
+                return
+            if streams > 0:
+                data['sync_parallel_streams'] = streams
+
         def _weak_package_files(line, setting):
             opt = entropy.tools.setting_to_bool(setting)
             if opt is not None:
@@ -1266,6 +1276,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             # backward compatibility
             'sync-speed-limit': _syncspeedlimit,
             'syncspeedlimit': _syncspeedlimit,
+            'sync-parallel-streams': _syncparallelstreams,
             'weak-package-files': _weak_package_files,
             'changelog': _changelog,
             'rss-feed': _rss_feed,
@@ -1685,6 +1696,10 @@ class Server(Client):
     # Make possible to disable tree updates completely.
     _inhibit_treeupdates = False
 
+    # number of packages whose metadata is kept in memory at the same
+    # time by _iter_package_data()
+    _PACKAGE_DATA_CHUNK_SIZE = 64
+
     def init_singleton(self, default_repository = None, save_repository = False,
             fake_default_repo = False, fake_default_repo_id = None,
             fake_default_repo_desc = None, handle_uninitialized = True,
@@ -2895,12 +2910,39 @@ class Server(Client):
             to_repository_id, ask = ask, pull_deps = pull_dependencies,
             do_copy = True)
 
-    def _move_package(self, package_match, todbconn, new_tag, do_copy):
+    def _iter_package_data(self, package_matches):
+        """
+        Generate (package_match, metadata) tuples for the given package
+        matches, in order. Metadata is fetched through
+        getPackageDataBatch(), in chunks of consecutive packages belonging
+        to the same repository, opened in read-write mode.
+
+        @param package_matches: list of package matches
+        @type package_matches: list
+        @return: generator of (package_match, metadata) tuples
+        @rtype: generator
+        """
+        chunk_size = self._PACKAGE_DATA_CHUNK_SIZE
+        for repository_id, matches in itertools.groupby(
+                package_matches, key = lambda x: x[1]):
+            dbconn = self.open_server_repository(
+                repository_id, read_only = False, no_upload = True)
+            package_ids = [x[0] for x in matches]
+            for idx in range(0, len(package_ids), chunk_size):
+                chunk = package_ids[idx:idx + chunk_size]
+                data = dbconn.getPackageDataBatch(chunk)
+                for package_id in chunk:
+                    yield (package_id, repository_id), data[package_id]
+
+    def _move_package(self, package_match, data, todbconn, new_tag,
+                      do_copy):
         """
         Move a single package from a repository to another.
 
         @param package_match: the package match to move
         @type package_match: tuple
+        @param data: the package metadata, see getPackageData()
+        @type data: dict
         @param todbconn: the destination EntropyRepository object
         @type todbconn: EntropyRepository
         @param new_tag: a package tag to set on the new package
@@ -3062,7 +3104,6 @@ class Server(Client):
             back = True
         )
         # install package into destination db
-        data = dbconn.getPackageData(package_id)
         if new_tag != None:
             data['versiontag'] = new_tag
 
@@ -3315,10 +3356,10 @@ class Server(Client):
                 return switched
 
         package_ids_added = set()
-        for s_package_id, s_repository_id in my_matches:
+        for s_match, s_data in self._iter_package_data(my_matches):
+            s_package_id, _s_repository_id = s_match
             new_package_id = self._move_package(
-                (s_package_id, s_repository_id), todbconn,
-                new_tag, do_copy)
+                s_match, s_data, todbconn, new_tag, do_copy)
             if new_package_id is not None:
                 switched.add(s_package_id)
                 package_ids_added.add(new_package_id)
@@ -3395,8 +3436,11 @@ class Server(Client):
             if orig_fd is not None:
                 os.close(orig_fd)
 
+        package_data = self._iter_package_data(
+            [(x, repository_id) for x, _path in injection_data])
         try:
             for package_id, package_path in injection_data:
+                _match, data = next(package_data)
 
                 tmp_repo_file = None
                 tmp_fd = None
@@ -3419,7 +3463,6 @@ class Server(Client):
                         header = blue(" @@ "),
                         back = True
                     )
-                    data = dbconn.getPackageData(package_id)
                     self._inject_entropy_database_into_package(
                         package_path, data,
                         treeupdates_actions = treeupdates_actions,
@@ -4492,6 +4535,7 @@ class Server(Client):
             repo = self.open_repository(repository_id)
 
             package_ids = repo.listAllPackageIds()
+            dependencies = repo.retrieveDependenciesBatch(package_ids)
             total = len(package_ids)
             missing = {}
             for count, package_id in enumerate(package_ids, 1):
@@ -4504,7 +4548,7 @@ class Server(Client):
                                 count = (count, total),
                                 back = True)
 
-                xdeps = repo.retrieveDependencies(package_id)
+                xdeps = dependencies[package_id]
                 xdeps = [x for x in xdeps if x not in deps_cache]
                 deps_cache.update(xdeps)
 
@@ -4820,9 +4864,11 @@ class Server(Client):
 
                 # filter out packages pointing to multiple slots
                 sure_reverse_package_ids = set()
+                reverse_dependencies = repo.retrieveDependenciesBatch(
+                    reverse_package_ids)
                 for pkg_id in reverse_package_ids:
                     pkg_deps_size = 0
-                    for pkg_dep in repo.retrieveDependencies(pkg_id):
+                    for pkg_dep in reverse_dependencies[pkg_id]:
                         pkg_dep_ids, _rc = repo.atomMatch(
                             pkg_dep, multiMatch = True)
                         if package_id in pkg_dep_ids:
@@ -6082,10 +6128,13 @@ class Server(Client):
 
             size = entropy.tools.get_file_size(path)
             disksize = entropy.tools.get_uncompressed_size(path)
-            md5 = entropy.tools.md5sum(path)
-            sha1 = entropy.tools.sha1(path)
-            sha256 = entropy.tools.sha256(path)
-            sha512 = entropy.tools.sha512(path)
+            digests = entropy.tools.multi_digest(
+                path, ("md5", "sha1", "sha256", "sha512"),
+                parallel = True)
+            md5 = digests['md5']
+            sha1 = digests['sha1']
+            sha256 = digests['sha256']
+            sha512 = digests['sha512']
             gpg = None
             if repo_sec is not None:
                 gpg = self._get_gpg_signature(repo_sec, repository_id, path)
@@ -6540,6 +6589,11 @@ class Server(Client):
             missing_deps = self.__user_filter_out_missing_deps(pkg_repo,
                 dbconn, missing_map, ask)
 
+            package_data = None
+            if bump_packages:
+                package_data = self._iter_package_data(
+                    list(missing_deps.keys()))
+
             for (pkg_id, missing_pkg_repo), missing in missing_deps.items():
                 if pkg_repo != missing_pkg_repo:
                     # with current API, this never happens!
@@ -6552,7 +6606,7 @@ class Server(Client):
                 if bump_packages:
                     # in this case, a new package should be generated, with
                     # bumped revision
-                    pkg_data = dbconn.getPackageData(pkg_id)
+                    _match, pkg_data = next(package_data)
                     # also bump injected packages properly
                     original_injected = pkg_data['injected']
                     pkg_data['injected'] = False
@@ -10,6 +10,7 @@
 
 """
 import os
+import collections
 import shutil
 import time
 import errno
@@ -1467,7 +1468,8 @@ class Server(object):
                 os.remove(expiration_file)
 
 
-    def _sync_run_upload_queue(self, repository_id, uri, upload_queue):
+    def _sync_run_upload_queue(self, repository_id, uri, upload_queue,
+                               concurrent_mirrors = 1):
 
         branch = self._settings['repositories']['branch']
         crippled_uri = EntropyTransceiver.get_uri_name(uri)
@@ -1493,7 +1495,8 @@ class Server(object):
             uploader = self.TransceiverServerHandler(self._entropy, [uri],
                 myqueue, critical_files = myqueue,
                 txc_basedir = remote_dir, copy_herustic_support = True,
-                handlers_data = handlers_data, repo = repository_id)
+                handlers_data = handlers_data, repo = repository_id,
+                concurrent_mirrors = concurrent_mirrors)
 
             xerrors, xm_fine_uris, xm_broken_uris = uploader.go()
             if xerrors:
@@ -1533,6 +1536,59 @@ class Server(object):
         return errors, m_fine_uris, m_broken_uris
 
 
+    def _sync_run_upload_queues(self, repository_id, upload_queues):
+        """
+        Run _sync_run_upload_queue() for every (uri, upload_queue) tuple
+        in upload_queues, uploading to up to
+        TransceiverServerHandler.MAX_PARALLEL_MIRRORS mirrors at the same
+        time.
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param upload_queues: list of (uri, upload_queue) tuples
+        @type upload_queues: list
+        @return: tuple composed by a dict mapping mirror URIs to the
+            _sync_run_upload_queue() return value and a dict mapping mirror
+            URIs to the (exception, exception text lines) tuple of the
+            uploads that raised an exception
+        @rtype: tuple
+        """
+        max_threads = min(len(upload_queues),
+            self.TransceiverServerHandler.MAX_PARALLEL_MIRRORS)
+        queue = collections.deque(upload_queues)
+        results = {}
+        exceptions = {}
+
+        def _upload():
+            while True:
+                try:
+                    uri, upload_queue = queue.popleft()
+                except IndexError:
+                    break
+                try:
+                    results[uri] = self._sync_run_upload_queue(
+                        repository_id, uri, upload_queue,
+                        concurrent_mirrors = max_threads)
+                except Exception as err:
+                    entropy.tools.print_traceback()
+                    exceptions[uri] = (err,
+                        entropy.tools.print_exception(silent = True))
+
+        if max_threads < 2:
+            _upload()
+            return results, exceptions
+
+        workers = []
+        for _idx in range(max_threads):
+            th = ParallelTask(_upload)
+            th.name = "SyncUploadQueue{%d}" % (_idx,)
+            th.daemon = True
+            workers.append(th)
+            th.start()
+        for th in workers:
+            th.join()
+        return results, exceptions
+
     def _sync_run_download_queue(self, repository_id, uri, download_queue):
 
         branch = self._settings['repositories']['branch']
@@ -1712,6 +1768,10 @@ class Server(object):
         mirrors_tainted = False
         mirror_errors = False
         mirrors_errors = False
+        # uploads run for all the mirrors at the same time, once the
+        # other queues have been processed, see _sync_run_upload_queues()
+        upload_queues = []
+        upload_mirror_errors = {}
 
         for uri in self._entropy.remote_packages_mirrors(repository_id):
 
@@ -1829,17 +1889,6 @@ class Server(object):
                 if copy_q:
                     self._sync_run_copy_queue(repository_id, copy_q)
 
-                if upload:
-                    mirrors_tainted = True
-
-                if upload:
-                    d_errors, m_fine_uris, \
-                        m_broken_uris = self._sync_run_upload_queue(
-                            repository_id, uri, upload)
-
-                    if d_errors:
-                        mirror_errors = True
-
                 if download:
                     d_errors, m_fine_uris, \
                         m_broken_uris = self._sync_run_download_queue(
@@ -1847,7 +1896,12 @@ class Server(object):
 
                     if d_errors:
                         mirror_errors = True
-                if not mirror_errors:
+
+                if upload:
+                    mirrors_tainted = True
+                    upload_queues.append((uri, upload))
+                    upload_mirror_errors[uri] = mirror_errors
+                elif not mirror_errors:
                     successfull_mirrors.add(uri)
                 else:
                     mirrors_errors = True
@@ -1894,45 +1948,29 @@ class Server(object):
                 entropy.tools.print_traceback()
                 mirrors_errors = True
                 broken_mirrors.add(uri)
-                self._entropy.output(
-                    "[%s|%s|%s] %s: %s, %s: %s" % (
-                        repository_id,
-                        red(_("sync")),
-                        self._settings['repositories']['branch'],
-                        darkred(_("exception caught")),
-                        Exception,
-                        _("error"),
-                        err,
-                    ),
-                    importance = 1,
-                    level = "error",
-                    header = darkred(" !!! ")
-                )
+                self._show_sync_packages_exception(repository_id, err,
+                    entropy.tools.print_exception(silent = True),
+                    successfull_mirrors)
+                continue
 
-                exc_txt = entropy.tools.print_exception(
-                    silent = True)
-                for line in exc_txt:
-                    self._entropy.output(
-                        repr(line),
-                        importance = 1,
-                        level = "error",
-                        header = darkred(":  ")
-                    )
+        if upload_queues:
+            results, exceptions = self._sync_run_upload_queues(
+                repository_id, upload_queues)
 
-                if len(successfull_mirrors) > 0:
-                    self._entropy.output(
-                        "[%s|%s|%s] %s" % (
-                            repository_id,
-                            red(_("sync")),
-                            self._settings['repositories']['branch'],
-                            darkred(
-                                _("at least one mirror synced properly!")),
-                        ),
-                        importance = 1,
-                        level = "error",
-                        header = darkred(" !!! ")
-                    )
-                continue
+            for uri, upload in upload_queues:
+                if uri in exceptions:
+                    err, exc_txt = exceptions[uri]
+                    mirrors_errors = True
+                    broken_mirrors.add(uri)
+                    self._show_sync_packages_exception(repository_id, err,
+                        exc_txt, successfull_mirrors)
+                    continue
+
+                d_errors, m_fine_uris, m_broken_uris = results[uri]
+                if d_errors or upload_mirror_errors[uri]:
+                    mirrors_errors = True
+                else:
+                    successfull_mirrors.add(uri)
 
         # if at least one server has been synced successfully, move files
         if (len(successfull_mirrors) > 0) and not pretend:
@@ -1945,6 +1983,48 @@ class Server(object):
         return mirrors_tainted, mirrors_errors, successfull_mirrors, \
             broken_mirrors, check_data
 
+    def _show_sync_packages_exception(self, repository_id, err, exc_txt,
+                                      successfull_mirrors):
+        """
+        Show an exception raised while syncing packages to a mirror.
+        """
+        self._entropy.output(
+            "[%s|%s|%s] %s: %s, %s: %s" % (
+                repository_id,
+                red(_("sync")),
+                self._settings['repositories']['branch'],
+                darkred(_("exception caught")),
+                Exception,
+                _("error"),
+                err,
+            ),
+            importance = 1,
+            level = "error",
+            header = darkred(" !!! ")
+        )
+
+        for line in exc_txt:
+            self._entropy.output(
+                repr(line),
+                importance = 1,
+                level = "error",
+                header = darkred(":  ")
+            )
+
+        if len(successfull_mirrors) > 0:
+            self._entropy.output(
+                "[%s|%s|%s] %s" % (
+                    repository_id,
+                    red(_("sync")),
+                    self._settings['repositories']['branch'],
+                    darkred(
+                        _("at least one mirror synced properly!")),
+                ),
+                importance = 1,
+                level = "error",
+                header = darkred(" !!! ")
+            )
+
     def _move_files_over_from_upload(self, repository_id):
 
         upload_dir = self._entropy._get_local_upload_directory(repository_id)
@@ -10,6 +10,8 @@
 
 """
 import os
+import collections
+import threading
 
 from entropy.const import const_isstring, const_isnumber, etpConst
 from entropy.output import darkred, blue, brown, darkgreen, red, bold
@@ -17,15 +19,20 @@ from entropy.transceivers.exceptions import TransceiverConnectionError
 from entropy.i18n import _
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.core.settings.base import SystemSettings
+from entropy.misc import ParallelTask
 from entropy.transceivers import EntropyTransceiver
 from entropy.tools import print_traceback, is_valid_md5, compare_md5, md5sum
 
 class TransceiverServerHandler:
 
+    # maximum number of mirrors synced at the same time
+    MAX_PARALLEL_MIRRORS = 4
+
     def __init__(self, entropy_interface, uris, files_to_upload,
         download = False, remove = False, txc_basedir = None,
         local_basedir = None, critical_files = None,
-        handlers_data = None, repo = None, copy_herustic_support = False):
+        handlers_data = None, repo = None, copy_herustic_support = False,
+        parallel_streams = None, concurrent_mirrors = None):
 
         if critical_files is None:
             critical_files = []
@@ -51,6 +58,18 @@ class TransceiverServerHandler:
 
         # server-side speed limit
         self.speed_limit = srv_set['sync_speed_limit']
+        # number of concurrent file transfers per mirror
+        if parallel_streams is None:
+            parallel_streams = srv_set['sync_parallel_streams']
+        self._parallel_streams = max(1, parallel_streams)
+        # number of mirrors synced at the same time, including the ones
+        # handled by other instances running alongside this one
+        if concurrent_mirrors is None:
+            concurrent_mirrors = min(len(uris), self.MAX_PARALLEL_MIRRORS)
+        self._concurrent_mirrors = max(1, concurrent_mirrors)
+        self._progress_lock = threading.Lock()
+        self._progress_done = 0
+        self._progress_total = 0
         self.download = download
         self.remove = remove
         self.repo = repo
@@ -156,11 +175,82 @@ class TransceiverServerHandler:
 
         return valid_remote_md5 # always valid
 
-    def _transceive(self, uri):
+    def _run_parallel(self, function, args_list, max_threads = None):
+        """
+        Run function once per arguments tuple in args_list, using up to
+        max_threads threads (one per call, if None), and wait for all of
+        them. The first exception raised by a thread is raised again here.
+        """
+        if max_threads is None:
+            max_threads = len(args_list)
+        if len(args_list) == 1 or max_threads < 2:
+            for args in args_list:
+                function(*args)
+            return
+
+        queue = collections.deque(args_list)
+        errors = []
+        def _wrapper():
+            while True:
+                try:
+                    args = queue.popleft()
+                except IndexError:
+                    break
+                try:
+                    function(*args)
+                except Exception as err:
+                    print_traceback()
+                    errors.append(err)
+
+        threads = []
+        for _idx in range(min(max_threads, len(args_list))):
+            th = ParallelTask(_wrapper)
+            th.daemon = True
+            th.start()
+            threads.append(th)
+        for th in threads:
+            th.join()
+        if errors:
+            raise errors[0]
+
+    def _is_concurrent(self):
+        """
+        Return whether more than one transfer runs at the same time.
+        """
+        return self._concurrent_mirrors > 1 or self._parallel_streams > 1
 
-        fine = set()
-        broken = set()
-        fail = False
+    def _update_progress(self):
+        """
+        Account a completed file transfer and, if transfers are
+        concurrent, print the progress aggregated across all the workers.
+        """
+        with self._progress_lock:
+            self._progress_done += 1
+            done, total = self._progress_done, self._progress_total
+
+        if self._is_concurrent():
+            self._entropy.output(
+                "%s: %s/%s" % (
+                    blue(_("transfers completed")),
+                    darkgreen(str(done)),
+                    bold(str(total)),
+                ),
+                importance = 0,
+                level = "info",
+                header = blue(" @@ "),
+                back = True
+            )
+
+    def _transceive_file(self, handler, uri, mypath, counter, maxcount,
+                         remote_dirs, remote_dirs_lock):
+        """
+        Transfer a single file using the given transceiver handler,
+        retrying up to 5 times.
+
+        @return: None if the file has been skipped, otherwise a tuple
+            composed by (done, last return code)
+        @rtype: tuple or None
+        """
         crippled_uri = EntropyTransceiver.get_uri_name(uri)
         action = 'push'
         if self.download:
@@ -168,146 +258,185 @@ class TransceiverServerHandler:
         elif self.remove:
             action = 'remove'
 
+        base_dir = self.txc_basedir
+
+        if isinstance(mypath, tuple):
+            if len(mypath) < 2:
+                return None
+            base_dir, mypath = mypath
+
+        with remote_dirs_lock:
+            if base_dir not in remote_dirs:
+                if not handler.is_dir(base_dir):
+                    handler.makedirs(base_dir)
+                remote_dirs.add(base_dir)
+
+        mypath_fn = os.path.basename(mypath)
+        remote_path = os.path.join(base_dir, mypath_fn)
+
+        syncer = handler.upload
+        myargs = (mypath, remote_path)
+        if self.download:
+            syncer = handler.download
+            local_path = os.path.join(self.local_basedir, mypath_fn)
+            myargs = (remote_path, local_path)
+        elif self.remove:
+            syncer = handler.delete
+            myargs = (remote_path,)
+
+        fallback_syncer, fallback_args = None, None
+        # upload -> remote copy herustic support
+        # if a package file might have been already uploaded
+        # to remote mirror, try to look in other repositories'
+        # package directories if a file, with the same md5 and name
+        # is already available. In this case, use remote copy instead
+        # of upload to save bandwidth.
+        if self._copy_herustic and (syncer == handler.upload):
+            # copy herustic support enabled
+            # we are uploading
+            new_syncer, new_args = self._copy_herustic_support(
+                handler, mypath, base_dir, remote_path)
+            if new_syncer is not None:
+                fallback_syncer, fallback_args = syncer, myargs
+                syncer, myargs = new_syncer, new_args
+                action = "copy"
+
+        tries = 0
+        lastrc = None
+
+        while tries < 5:
+            tries += 1
+            self._entropy.output(
+                "[%s|#%s|(%s/%s)] %s: %s" % (
+                    blue(crippled_uri),
+                    darkgreen(str(tries)),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(action),
+                    red(os.path.basename(mypath)),
+                ),
+                importance = 0,
+                level = "info",
+                header = red(" @@ ")
+            )
+            rc = syncer(*myargs)
+            if (not rc) and (fallback_syncer is not None):
+                # if we have a fallback syncer, try it first
+                # before giving up.
+                rc = fallback_syncer(*fallback_args)
+
+            if rc and not (self.download or self.remove):
+                remote_md5 = handler.get_md5(remote_path)
+                rc = self.handler_verify_upload(mypath, uri,
+                    counter, maxcount, tries, remote_md5 = remote_md5)
+            if rc:
+                self._entropy.output(
+                    "[%s|#%s|(%s/%s)] %s %s: %s" % (
+                                blue(crippled_uri),
+                                darkgreen(str(tries)),
+                                blue(str(counter)),
+                                bold(str(maxcount)),
+                                blue(action),
+                                _("successful"),
+                                red(os.path.basename(mypath)),
+                    ),
+                    importance = 0,
+                    level = "info",
+                    header = darkgreen(" @@ ")
+                )
+                return True, rc
+            else:
+                self._entropy.output(
+                    "[%s|#%s|(%s/%s)] %s %s: %s" % (
+                                blue(crippled_uri),
+                                darkgreen(str(tries)),
+                                blue(str(counter)),
+                                bold(str(maxcount)),
+                                blue(action),
+                                brown(_("failed, retrying")),
+                                red(os.path.basename(mypath)),
+                        ),
+                    importance = 0,
+                    level = "warning",
+                    header = brown(" @@ ")
+                )
+                lastrc = rc
+                continue
+
+        self._entropy.output(
+            "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
+                    blue(crippled_uri),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(action),
+                    darkred("failed, giving up"),
+                    red(os.path.basename(mypath)),
+                    _("error"),
+                    lastrc,
+            ),
+            importance = 1,
+            level = "error",
+            header = darkred(" !!! ")
+        )
+        return False, lastrc
+
+    def _transceive(self, uri):
+
+        fine = set()
+        broken = set()
+        crippled_uri = EntropyTransceiver.get_uri_name(uri)
+
+        maxcount = len(self.myfiles)
+        streams = min(self._parallel_streams, max(1, maxcount))
+
+        # the speed limit is shared among all the concurrent transfers
+        speed_limit = self.speed_limit
+        if const_isnumber(speed_limit) and speed_limit > 0:
+            speed_limit = max(1, speed_limit // (
+                self._concurrent_mirrors * streams))
+
+        transceivers = []
         try:
-            txc = EntropyTransceiver(uri)
-            if const_isnumber(self.speed_limit):
-                txc.set_speed_limit(self.speed_limit)
-            txc.set_output_interface(self._entropy)
+            for stream in range(streams):
+                txc = EntropyTransceiver(uri)
+                if const_isnumber(speed_limit):
+                    txc.set_speed_limit(speed_limit)
+                txc.set_output_interface(self._entropy)
+                if self._is_concurrent():
+                    # per-transfer progress would be garbled
+                    txc.set_silent(True)
+                transceivers.append(txc)
         except TransceiverConnectionError:
             print_traceback()
             return True, fine, broken # issues
 
-        maxcount = len(self.myfiles)
-        counter = 0
+        queue = collections.deque(enumerate(self.myfiles, 1))
+        remote_dirs = set()
+        remote_dirs_lock = threading.Lock()
+        state = {'fail': False}
 
-        with txc as handler:
+        def _stream(txc):
+            with txc as handler:
 
-            for mypath in self.myfiles:
+                while not state['fail']:
 
-                base_dir = self.txc_basedir
+                    try:
+                        counter, mypath = queue.popleft()
+                    except IndexError:
+                        break
 
-                if isinstance(mypath, tuple):
-                    if len(mypath) < 2:
+                    outcome = self._transceive_file(
+                        handler, uri, mypath, counter, maxcount,
+                        remote_dirs, remote_dirs_lock)
+                    if outcome is None:
                         continue
-                    base_dir, mypath = mypath
+                    self._update_progress()
 
-                if not handler.is_dir(base_dir):
-                    handler.makedirs(base_dir)
-
-                mypath_fn = os.path.basename(mypath)
-                remote_path = os.path.join(base_dir, mypath_fn)
-
-                syncer = handler.upload
-                myargs = (mypath, remote_path)
-                if self.download:
-                    syncer = handler.download
-                    local_path = os.path.join(self.local_basedir, mypath_fn)
-                    myargs = (remote_path, local_path)
-                elif self.remove:
-                    syncer = handler.delete
-                    myargs = (remote_path,)
-
-                fallback_syncer, fallback_args = None, None
-                # upload -> remote copy herustic support
-                # if a package file might have been already uploaded
-                # to remote mirror, try to look in other repositories'
-                # package directories if a file, with the same md5 and name
-                # is already available. In this case, use remote copy instead
-                # of upload to save bandwidth.
-                if self._copy_herustic and (syncer == handler.upload):
-                    # copy herustic support enabled
-                    # we are uploading
-                    new_syncer, new_args = self._copy_herustic_support(
-                        handler, mypath, base_dir, remote_path)
-                    if new_syncer is not None:
-                        fallback_syncer, fallback_args = syncer, myargs
-                        syncer, myargs = new_syncer, new_args
-                        action = "copy"
-
-                counter += 1
-                tries = 0
-                done = False
-                lastrc = None
-
-                while tries < 5:
-                    tries += 1
-                    self._entropy.output(
-                        "[%s|#%s|(%s/%s)] %s: %s" % (
-                            blue(crippled_uri),
-                            darkgreen(str(tries)),
-                            blue(str(counter)),
-                            bold(str(maxcount)),
-                            blue(action),
-                            red(os.path.basename(mypath)),
-                        ),
-                        importance = 0,
-                        level = "info",
-                        header = red(" @@ ")
-                    )
-                    rc = syncer(*myargs)
-                    if (not rc) and (fallback_syncer is not None):
-                        # if we have a fallback syncer, try it first
-                        # before giving up.
-                        rc = fallback_syncer(*myargs)
-
-                    if rc and not (self.download or self.remove):
-                        remote_md5 = handler.get_md5(remote_path)
-                        rc = self.handler_verify_upload(mypath, uri,
-                            counter, maxcount, tries, remote_md5 = remote_md5)
-                    if rc:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        _("successful"),
-                                        red(os.path.basename(mypath)),
-                            ),
-                            importance = 0,
-                            level = "info",
-                            header = darkgreen(" @@ ")
-                        )
-                        done = True
+                    done, lastrc = outcome
+                    if done:
                         fine.add(uri)
-                        break
-                    else:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        brown(_("failed, retrying")),
-                                        red(os.path.basename(mypath)),
-                                ),
-                            importance = 0,
-                            level = "warning",
-                            header = brown(" @@ ")
-                        )
-                        lastrc = rc
                         continue
 
-                if not done:
-
-                    self._entropy.output(
-                        "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
-                                blue(crippled_uri),
-                                blue(str(counter)),
-                                bold(str(maxcount)),
-                                blue(action),
-                                darkred("failed, giving up"),
-                                red(os.path.basename(mypath)),
-                                _("error"),
-                                lastrc,
-                        ),
-                        importance = 1,
-                        level = "error",
-                        header = darkred(" !!! ")
-                    )
-
                     if mypath not in self.critical_files:
                         self._entropy.output(
                             "[%s|(%s/%s)] %s: %s, %s..." % (
@@ -324,12 +453,14 @@ class TransceiverServerHandler:
                         )
                         continue
 
-                    fail = True
+                    state['fail'] = True
                     broken.add((uri, lastrc))
                     # next mirror
                     break
 
-        return fail, fine, broken
+        self._run_parallel(_stream, [(txc,) for txc in transceivers])
+
+        return state['fail'], fine, broken
 
     def _copy_herustic_support(self, handler, local_path,
             txc_basedir, remote_path):
@@ -405,6 +536,9 @@ class TransceiverServerHandler:
         elif self.remove:
             action = 'remove'
 
+        self._progress_done = 0
+        self._progress_total = len(self.uris) * len(self.myfiles)
+
         for uri in self.uris:
 
             crippled_uri = EntropyTransceiver.get_uri_name(uri)
@@ -431,7 +565,16 @@ class TransceiverServerHandler:
                 header = blue(" @@ ")
             )
 
-            fail, fine, broken = self._transceive(uri)
+        # one worker per mirror
+        results = {}
+        def _mirror_worker(uri):
+            results[uri] = self._transceive(uri)
+
+        self._run_parallel(_mirror_worker, [(uri,) for uri in self.uris],
+            max_threads = self.MAX_PARALLEL_MIRRORS)
+
+        for uri in self.uris:
+            fail, fine, broken = results[uri]
             fine_uris |= fine
             broken_uris |= broken
             if fail:
@@ -13,7 +13,6 @@ __all__ = ["WebServiceFactory", "WebService"]
 
 import sys
 import os
-import errno
 import json
 import threading
 import hashlib
@@ -816,17 +815,8 @@ class WebService(object):
         Drop all on-disk cache for given method.
         """
         with self._cache_dir_lock:
-            cache_dir = WebService.CACHE_DIR
-            for currentdir, subdirs, files in os.walk(cache_dir):
-                hostile_files = [os.path.join(currentdir, x) for x in \
-                    files if x.startswith(method + "_")]
-                for path in hostile_files:
-                    try:
-                        os.remove(path)
-                    except OSError as err:
-                        # avoid race conditions
-                        if err.errno != errno.ENOENT:
-                            raise
+            self._cacher.clear_cache_prefix(
+                method + "_", cache_dir = WebService.CACHE_DIR)
 
     def _method_cached(self, func_name, params, cache_key = None):
         """
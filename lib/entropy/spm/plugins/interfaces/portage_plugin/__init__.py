@@ -42,6 +42,8 @@ import entropy.dep
 import entropy.tools
 from entropy.spm.plugins.interfaces.portage_plugin import xpak
 from entropy.spm.plugins.interfaces.portage_plugin import xpaktools
+from entropy.spm.plugins.interfaces.portage_plugin.tarindex import \
+    TarballIndex
 
 
 class StdoutSplitter(object):
@@ -1092,7 +1094,7 @@ class PortagePlugin(SpmPlugin):
             os.close(tmp_fd)
             tmp_fd = None
             # cannot use fdopen with tarfile
-            tar = tarfile.open(tmp_file, mode = "w:bz2")
+            tar = entropy.tools.open_compressed_tarfile(tmp_file)
             debug_tar = None
             debug_tmp_file = None
             debug_file_save_path = None
@@ -1110,7 +1112,8 @@ class PortagePlugin(SpmPlugin):
                     prefix = "entropy.spm.Portage.generate_package._debug_tar")
                 os.close(debug_tmp_fd)
                 debug_tmp_fd = None
-                debug_tar = tarfile.open(debug_tmp_file, mode = "w:bz2")
+                debug_tar = entropy.tools.open_compressed_tarfile(
+                    debug_tmp_file)
 
             contents = dblnk.getcontents()
             paths = sorted(contents)
@@ -1399,11 +1402,14 @@ class PortagePlugin(SpmPlugin):
         system_settings = SystemSettings()
 
         # fill package name and version
-        data['digest'] = entropy.tools.md5sum(package_file)
+        digests = entropy.tools.multi_digest(
+            package_file, ("md5", "sha1", "sha256", "sha512"),
+            parallel = True)
+        data['digest'] = digests['md5']
         data['signatures'] = {
-            'sha1': entropy.tools.sha1(package_file),
-            'sha256': entropy.tools.sha256(package_file),
-            'sha512': entropy.tools.sha512(package_file),
+            'sha1': digests['sha1'],
+            'sha256': digests['sha256'],
+            'sha512': digests['sha512'],
             'gpg': None, # GPG signature will be filled later on, if enabled
         }
         data['datecreation'] = str(os.path.getmtime(package_file))
@@ -1417,10 +1423,13 @@ class PortagePlugin(SpmPlugin):
 
         # extract stuff
         xpaktools.extract_xpak(package_file, meta_dir)
+        # the package content is not unpacked, only what is read
+        # through pkg_dir afterwards
+        content_index = TarballIndex(pkg_dir,
+            extract_filter = self._extract_pkg_metadata_extract_filter)
         empty_content = False
         try:
-            entropy.tools.uncompress_tarball(package_file,
-                extract_path = pkg_dir, catch_empty = False)
+            content_index.scan(package_file)
         except tarfile.ReadError:
             empty_content = True
 
@@ -1533,7 +1542,7 @@ class PortagePlugin(SpmPlugin):
         # packages emerge with -B, because for those, we also get the
         # full package_file (not a fake one).
         data['content'] = self._extract_pkg_metadata_content(content_file,
-                package_file, pkg_dir)
+                package_file, pkg_dir, content_index = content_index)
         # There are packages providing no files, even if given package_file
         # is complete (meaning, it contains real file. Not a fake one, like
         # it can happen with "equo rescue spmsync", to make things quicker).
@@ -1544,18 +1553,22 @@ class PortagePlugin(SpmPlugin):
         if data['content'] and empty_content:
             # fake package_file, need to tweak pkg_dir to systemroot
             pkg_dir = etpConst['systemroot'] + os.path.sep
+            content_index = None
 
-        # at this point, pkg_dir must point to a valid "root" directory
-        # because checksums have to be calculated against files being available
-        # in the package. The case above (when using equo rescue spmsync) is
-        # fine too.
+        # at this point, pkg_dir (or content_index) must point to a valid
+        # "root" directory because checksums have to be calculated against
+        # files being available in the package. The case above (when using
+        # equo rescue spmsync) is fine too.
         data['content_safety'] = self._extract_pkg_metadata_content_safety(
-            data['content'], pkg_dir)
-        data['disksize'] = entropy.tools.sum_file_sizes_hardlinks([
-                os.path.join(pkg_dir, x) for x, y in data['content'].items() \
-                    if y == "obj"])
+            data['content'], pkg_dir, content_index = content_index)
+        obj_paths = [x for x, y in data['content'].items() if y == "obj"]
+        if content_index is not None:
+            data['disksize'] = content_index.file_sizes_sum(obj_paths)
+        else:
+            data['disksize'] = entropy.tools.sum_file_sizes_hardlinks([
+                    os.path.join(pkg_dir, x) for x in obj_paths])
         data['provided_libs'] = self._extract_pkg_metadata_provided_libs(
-            pkg_dir, data['content'])
+            pkg_dir, data['content'], content_index = content_index)
 
         needed_elf_file = os.path.join(meta_dir,
             PortagePlugin.xpak_entries['needed.elf.2'])
@@ -1583,7 +1596,7 @@ class PortagePlugin(SpmPlugin):
             data['needed_libs'] = needed_libs
         else:
             needed_libs = self._generate_needed_libs_elf_2(
-                pkg_dir, data['content'])
+                pkg_dir, data['content'], content_index = content_index)
             # deprecated, kept for backward compatibility
             # some PMS like pkgcore don't generate NEEDED.ELF.2
             # generate one ourselves if possible. May generate
@@ -4584,7 +4597,33 @@ class PortagePlugin(SpmPlugin):
         }
         return data
 
-    def _extract_pkg_metadata_content_safety(self, content_data, pkg_dir):
+    def _extract_pkg_metadata_extract_filter(self, path):
+        """
+        Return whether the given package file has to be unpacked in order
+        to extract package metadata (see TarballIndex). Kernel modules are
+        read by modinfo, desktop files by
+        _extract_pkg_metadata_desktop_mime().
+        """
+        if path.endswith(".ko") and path.startswith("/lib/modules/"):
+            return True
+        return path.endswith(".desktop")
+
+    def _extract_pkg_metadata_content_safety(self, content_data, pkg_dir,
+                                             content_index = None):
+
+        if content_index is not None:
+            content_safety = {}
+            for repo_path, ftype in content_data.items():
+                if ftype != "obj":
+                    continue
+                inode = content_index.lookup(repo_path, follow = False)
+                if inode is None or inode.kind != "reg":
+                    continue
+                content_safety[repo_path] = {
+                    'sha256': inode.sha256,
+                    'mtime': inode.mtime,
+                }
+            return content_safety
 
         def is_reg(file_path):
             try:
@@ -4607,7 +4646,7 @@ class PortagePlugin(SpmPlugin):
             for real_path, repo_path in pkg_files)
 
     def _extract_pkg_metadata_content(self, content_file, package_path,
-                                      pkg_dir):
+                                      pkg_dir, content_index = None):
 
         pkg_content = {}
         obj_t = const_convert_to_unicode("obj")
@@ -4654,6 +4693,26 @@ class PortagePlugin(SpmPlugin):
             for datafile, datatype in outcontent:
                 pkg_content[datafile] = datatype
 
+        elif content_index is not None:
+
+            # CONTENTS is not generated when a package is emerged with
+            # portage and the option -B
+            # we have to use the package file and generate content dict,
+            # like the os.walk() below would do on the unpacked one.
+            for item_rel in content_index.paths():
+                inode = content_index.lookup(item_rel, follow = False)
+                if inode is None or inode.kind == "dir":
+                    pkg_content[item_rel] = dir_t
+                    continue
+                if inode.kind == "sym":
+                    target = content_index.lookup(item_rel)
+                    if target is not None and target.kind == "dir":
+                        # os.walk() does not report symlinks to directories
+                        continue
+                    pkg_content[item_rel] = sym_t
+                else:
+                    pkg_content[item_rel] = obj_t
+
         else:
 
             # CONTENTS is not generated when a package is emerged with
@@ -4678,7 +4737,8 @@ class PortagePlugin(SpmPlugin):
 
         return pkg_content
 
-    def _generate_needed_libs_elf_2(self, pkg_dir, content):
+    def _generate_needed_libs_elf_2(self, pkg_dir, content,
+                                    content_index = None):
         """
         Generate NEEDED.ELF.2 metadata by scraping the package
         content directly. For: needed_libs metadata.
@@ -4690,6 +4750,18 @@ class PortagePlugin(SpmPlugin):
                 continue
             obj_dir, obj_name = os.path.split(obj)
 
+            if content_index is not None:
+                inode = content_index.lookup(obj)
+                meta = None
+                if inode is not None:
+                    meta = inode.elf
+                if meta is None:
+                    continue
+                for soname in meta['needed']:
+                    needed_libs.add((obj, meta['soname'], soname,
+                        meta['class'], meta['runpath']))
+                continue
+
             unpack_obj = os.path.join(pkg_dir, obj.lstrip("/"))
             try:
                 os.stat(unpack_obj)
@@ -4761,7 +4833,8 @@ class PortagePlugin(SpmPlugin):
 
         return frozenset(needed_libs)
 
-    def _extract_pkg_metadata_provided_libs(self, pkg_dir, content):
+    def _extract_pkg_metadata_provided_libs(self, pkg_dir, content,
+                                            content_index = None):
 
         # NOTE: this does not take into account changes to environment
         # caused by the installation of the package, if this metadata
@@ -4773,6 +4846,16 @@ class PortagePlugin(SpmPlugin):
                 continue
             obj_dir, obj_name = os.path.split(obj)
 
+            if content_index is not None:
+                inode = content_index.lookup(obj)
+                if inode is None or inode.kind == "dir":
+                    continue
+                elf_meta = inode.elf
+                if elf_meta is not None and elf_meta['soname']:
+                    provided_libs.add(
+                        (elf_meta['soname'], obj, elf_meta['class'],))
+                continue
+
             unpack_obj = os.path.join(pkg_dir, obj.lstrip("/"))
             try:
                 os.stat(unpack_obj)
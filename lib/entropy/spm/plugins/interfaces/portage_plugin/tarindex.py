@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Source Package Manager "Portage" Plugin tarball index}.
+
+"""
+import os
+import sys
+import stat
+import errno
+import hashlib
+import tarfile
+
+from entropy.const import const_isunicode, const_is_python3
+from entropy.exceptions import FileNotFound
+
+import entropy.tools
+
+
+class TarballInode(object):
+
+    """
+    Metadata of a file stored inside a tarball, shared by its hard links.
+    """
+
+    __slots__ = ("kind", "size", "mtime", "linkname", "sha256", "elf")
+
+    def __init__(self, kind, size = 0, mtime = 0.0, linkname = None):
+        # one of "reg", "dir", "sym", "other"
+        self.kind = kind
+        # size reported by lstat()
+        self.size = size
+        self.mtime = mtime
+        self.linkname = linkname
+        self.sha256 = None
+        # entropy.tools.read_elf_metadata() output, None if not an ELF
+        # object or if it has no metadata
+        self.elf = None
+
+
+class _HostInode(object):
+
+    """
+    Metadata of a live filesystem file, reached through an absolute
+    symlink inside the tarball. Same interface of TarballInode.
+    """
+
+    __slots__ = ("_path", "kind", "size", "mtime", "linkname", "ident")
+
+    def __init__(self, path, st):
+        self._path = path
+        if stat.S_ISREG(st.st_mode):
+            self.kind = "reg"
+        elif stat.S_ISDIR(st.st_mode):
+            self.kind = "dir"
+        elif stat.S_ISLNK(st.st_mode):
+            self.kind = "sym"
+        else:
+            self.kind = "other"
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.linkname = None
+        self.ident = (st.st_ino, st.st_dev)
+
+    @property
+    def sha256(self):
+        return entropy.tools.sha256(self._path)
+
+    @property
+    def elf(self):
+        try:
+            if not entropy.tools.is_elf_file(self._path):
+                return None
+            return entropy.tools.read_elf_metadata(self._path)
+        except (IOError, FileNotFound):
+            return None
+
+
+class TarballIndex(object):
+
+    """
+    In-memory index of the content of a tarball, built by reading its
+    members once, without unpacking it. For every regular file, the sha256
+    digest and the ELF metadata are computed out of the member data while
+    it's being read. Only the members accepted by the extract filter are
+    written to disk.
+
+    Paths are resolved like the kernel would do if the tarball were unpacked
+    into a directory: symlinks are followed inside the tarball, absolute
+    symlinks lead to the live filesystem.
+    """
+
+    _READ_SIZE = 1024000
+    _ELF_MAGIC = b"\x7fELF"
+    _MAX_SYMLINKS = 40
+
+    def __init__(self, extract_dir, extract_filter = None):
+        """
+        TarballIndex constructor.
+
+        @param extract_dir: directory where accepted members are unpacked
+        @type extract_dir: string
+        @keyword extract_filter: callable accepting a member path (as
+            returned by paths()) and returning True if the member has to
+            be unpacked
+        @type extract_filter: callable
+        """
+        self._extract_dir = extract_dir
+        self._extract_filter = extract_filter
+        self._inodes = {}
+        self._dirs = set()
+        self._root = TarballInode("dir")
+
+    def _encode(self, name):
+        """
+        Encode a path to the raw file name the kernel would see.
+        """
+        if const_is_python3():
+            return os.fsencode(name)
+        if const_isunicode(name):
+            return name.encode(sys.getfilesystemencoding() or "utf-8")
+        return name
+
+    def _path(self, name):
+        """
+        Return the absolute, normalized path of a tarball member name.
+        Names are kept as provided by tarfile, which matches what
+        os.listdir() returns for the unpacked files.
+        """
+        parts = [x for x in name.split("/") if x not in ("", ".")]
+        if not parts:
+            return None
+        return "/" + "/".join(parts)
+
+    def scan(self, tarball):
+        """
+        Read the given tarball and index its members.
+
+        @param tarball: path to tarball file
+        @type tarball: string
+        @raise tarfile.ReadError: if the tarball is empty or cannot be read
+        """
+        tar = tarfile.open(tarball, "r")
+        try:
+            while True:
+                try:
+                    tarinfo = tar.next()
+                except EOFError:
+                    break
+                # members are not needed, do not waste RAM.
+                del tar.members[:]
+                if tarinfo is None:
+                    break
+                self._add(tar, tarinfo)
+        finally:
+            tar.close()
+
+    def _add(self, tar, tarinfo):
+        """
+        Index a tarball member.
+        """
+        path = self._path(tarinfo.name)
+        if path is None:
+            return
+
+        parent = os.path.dirname(path)
+        while parent not in self._dirs and parent != "/":
+            self._dirs.add(parent)
+            parent = os.path.dirname(parent)
+
+        mtime = float(tarinfo.mtime)
+        extract = self._extract_filter is not None \
+            and self._extract_filter(path)
+
+        if tarinfo.isreg():
+            inode = TarballInode("reg", tarinfo.size, mtime)
+            self._read(tar, tarinfo, inode, extract and path)
+
+        elif tarinfo.islnk():
+            inode = self._inodes.get(self._path(tarinfo.linkname))
+            if inode is None or inode.kind != "reg":
+                return
+            # hard links share the inode, the last mtime applied wins
+            inode.mtime = mtime
+            if extract:
+                self._extract_link(path, inode)
+
+        elif tarinfo.isdir():
+            inode = TarballInode("dir", 0, mtime)
+            self._dirs.add(path)
+
+        elif tarinfo.issym():
+            linkname = tarinfo.linkname
+            inode = TarballInode("sym", len(self._encode(linkname)),
+                mtime, linkname)
+            if extract:
+                self._extract_symlink(path, linkname)
+
+        else:
+            inode = TarballInode("other", 0, mtime)
+
+        self._inodes[path] = inode
+
+    def _extract_path(self, path):
+        """
+        Return the on-disk path of an unpacked member, creating its parent
+        directory.
+        """
+        extract_path = os.path.join(self._extract_dir, path.lstrip("/"))
+        try:
+            os.makedirs(os.path.dirname(extract_path), 0o755)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        return extract_path
+
+    def _read(self, tar, tarinfo, inode, extract_path):
+        """
+        Read a regular file member computing its digest and ELF metadata,
+        unpack it if extract_path is given.
+        """
+        sha = hashlib.sha256()
+        elf_chunks = None
+        out_f = None
+        if extract_path:
+            out_f = open(self._extract_path(extract_path), "wb")
+        f_in = tar.extractfile(tarinfo)
+        try:
+            chunk = f_in.read(self._READ_SIZE)
+            if chunk[:4] == self._ELF_MAGIC:
+                elf_chunks = []
+            while chunk:
+                sha.update(chunk)
+                if elf_chunks is not None:
+                    elf_chunks.append(chunk)
+                if out_f is not None:
+                    out_f.write(chunk)
+                chunk = f_in.read(self._READ_SIZE)
+        finally:
+            f_in.close()
+            if out_f is not None:
+                out_f.close()
+
+        inode.sha256 = sha.hexdigest()
+        if elf_chunks is not None:
+            inode.elf = entropy.tools.read_elf_metadata_buffer(
+                b"".join(elf_chunks))
+
+    def _extract_link(self, path, inode):
+        """
+        Unpack a hard link member by copying its (unpacked) target.
+        """
+        for target, target_inode in self._inodes.items():
+            if target_inode is not inode:
+                continue
+            target_path = os.path.join(self._extract_dir, target.lstrip("/"))
+            if os.path.isfile(target_path):
+                os.link(target_path, self._extract_path(path))
+                return
+
+    def _extract_symlink(self, path, linkname):
+        """
+        Unpack a symlink member.
+        """
+        extract_path = self._extract_path(path)
+        if os.path.lexists(extract_path):
+            os.remove(extract_path)
+        os.symlink(linkname, extract_path)
+
+    def paths(self):
+        """
+        Return the paths of the tarball members, directories leading to
+        them included.
+
+        @return: list of absolute paths
+        @rtype: list
+        """
+        return list(self._dirs.union(self._inodes.keys()))
+
+    def lookup(self, path, follow = True):
+        """
+        Resolve a path and return its inode, like stat() (or lstat(), if
+        follow is False) would do on the unpacked tarball.
+
+        @param path: absolute path
+        @type path: string
+        @keyword follow: follow the last path component if it's a symlink
+        @type follow: bool
+        @return: a TarballInode-like object or None, if the path does not
+            exist
+        @rtype: TarballInode or None
+        """
+        if not const_is_python3():
+            # member names are raw strings
+            path = self._encode(path)
+        parts = [x for x in path.split("/") if x not in ("", ".")]
+        current = []
+        inode = self._root
+        symlinks = 0
+
+        def _dir_inode():
+            # current only contains directories
+            if not current:
+                return self._root
+            return self._inodes.get("/" + "/".join(current), self._root)
+
+        while parts:
+            part = parts.pop(0)
+            if part == "..":
+                if current:
+                    current.pop()
+                inode = _dir_inode()
+                continue
+
+            current.append(part)
+            cur_path = "/" + "/".join(current)
+            inode = self._inodes.get(cur_path)
+            if inode is None:
+                if cur_path not in self._dirs:
+                    return None
+                # directory created while unpacking
+                inode = self._root
+                continue
+
+            if inode.kind == "sym" and (parts or follow):
+                symlinks += 1
+                if symlinks > self._MAX_SYMLINKS:
+                    return None
+                current.pop()
+                target = inode.linkname
+                if target.startswith("/"):
+                    # absolute symlinks point to the live filesystem
+                    return self._host_lookup(
+                        os.path.join(target, *parts), follow)
+                parts = [x for x in target.split("/")
+                         if x not in ("", ".")] + parts
+                inode = _dir_inode()
+                continue
+
+            if parts and inode.kind != "dir":
+                return None
+
+        return inode
+
+    def _host_lookup(self, path, follow):
+        """
+        Resolve a path on the live filesystem.
+        """
+        try:
+            if follow:
+                st = os.stat(path)
+            else:
+                st = os.lstat(path)
+        except OSError:
+            return None
+        return _HostInode(path, st)
+
+    def file_sizes_sum(self, paths):
+        """
+        Return the size sum of the given paths, hard links are considered
+        only once. See entropy.tools.sum_file_sizes_hardlinks().
+
+        @param paths: list of absolute paths
+        @type paths: list
+        @return: summed size in bytes
+        @rtype: int
+        """
+        size = 0
+        inodes = set()
+        for path in paths:
+            inode = self.lookup(path, follow = False)
+            if inode is None:
+                continue
+            ident = getattr(inode, "ident", None) or id(inode)
+            if ident in inodes:
+                continue
+            inodes.add(ident)
+            size += inode.size
+        return size
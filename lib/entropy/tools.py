@@ -33,16 +33,25 @@ import bz2
 import mmap
 import codecs
 import struct
+import threading
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from entropy.output import print_generic
 from entropy.const import etpConst, const_kill_threads, const_islive, \
     const_isunicode, const_convert_to_unicode, const_convert_to_rawstring, \
     const_israwstring, const_secure_config_file, const_is_python3, \
-    const_mkstemp, const_file_readable
+    const_mkstemp, const_file_readable, const_get_cpus
 from entropy.exceptions import FileNotFound, InvalidAtom, DirectoryNotFound
 
 
 _READ_SIZE = 1024000
+# block size used by multi_digest(), a multiple of the page size
+_DIGEST_READ_SIZE = 1 << 20
+# number of blocks multi_digest() can queue up for each hashing thread
+_DIGEST_QUEUE_SIZE = 8
 
 
 def is_root():
@@ -838,6 +847,74 @@ def split_indexable_into_chunks(mystr, chunk_len):
         mylen -= my_chunk_len
     return chunks
 
+def _multi_digest_worker(hash_obj, queue):
+    """
+    multi_digest() hashing thread body, feed hash_obj with the blocks
+    read from queue until None is found.
+    """
+    block = queue.get()
+    while block is not None:
+        hash_obj.update(block)
+        block = queue.get()
+
+def multi_digest(filepath, algorithms, parallel = False):
+    """
+    Calculate the hashes of given file at path reading it only once.
+
+    @param filepath: path to file
+    @type filepath: string
+    @param algorithms: list of hashlib algorithm names (like "md5",
+        "sha1", "sha256", "sha512")
+    @type algorithms: iterable
+    @keyword parallel: if True, every hash is computed by a separate
+        thread while the file is being read, this is worth for large files
+        and more than one algorithm, since hashlib releases the GIL
+    @type parallel: bool
+    @return: dict composed by algorithm name as key and hex digest as value
+    @rtype: dict
+    @raise ValueError: if an algorithm is not supported
+    """
+    hashes = dict((x, hashlib.new(x)) for x in algorithms)
+
+    if not parallel or len(hashes) < 2:
+        hash_objs = list(hashes.values())
+        buf = bytearray(_DIGEST_READ_SIZE)
+        view = memoryview(buf)
+        with open(filepath, "rb", 0) as readfile:
+            count = readfile.readinto(buf)
+            while count:
+                block = view[:count]
+                for hash_obj in hash_objs:
+                    hash_obj.update(block)
+                count = readfile.readinto(buf)
+        return dict((x, y.hexdigest()) for x, y in hashes.items())
+
+    queues = []
+    threads = []
+    for hash_obj in hashes.values():
+        queue = Queue(_DIGEST_QUEUE_SIZE)
+        th = threading.Thread(
+            target = _multi_digest_worker, args = (hash_obj, queue))
+        th.daemon = True
+        th.start()
+        queues.append(queue)
+        threads.append(th)
+
+    try:
+        with open(filepath, "rb", 0) as readfile:
+            block = readfile.read(_DIGEST_READ_SIZE)
+            while block:
+                for queue in queues:
+                    queue.put(block)
+                block = readfile.read(_DIGEST_READ_SIZE)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for th in threads:
+            th.join()
+
+    return dict((x, y.hexdigest()) for x, y in hashes.items())
+
 def md5sum(filepath):
     """
     Calculate md5 hash of given file at path.
@@ -847,13 +924,7 @@ def md5sum(filepath):
     @return: md5 hex digest
     @rtype: string
     """
-    m = hashlib.md5()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return multi_digest(filepath, ("md5",))["md5"]
 
 def sha512(filepath):
     """
@@ -864,13 +935,7 @@ def sha512(filepath):
     @return: SHA512 hex digest
     @rtype: string
     """
-    m = hashlib.sha512()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return multi_digest(filepath, ("sha512",))["sha512"]
 
 def sha256(filepath):
     """
@@ -881,13 +946,7 @@ def sha256(filepath):
     @return: SHA256 hex digest
     @rtype: string
     """
-    m = hashlib.sha256()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return multi_digest(filepath, ("sha256",))["sha256"]
 
 def sha1(filepath):
     """
@@ -898,13 +957,7 @@ def sha1(filepath):
     @return: SHA1 hex digest
     @rtype: string
     """
-    m = hashlib.sha1()
-    with open(filepath, "rb") as readfile:
-        block = readfile.read(_READ_SIZE)
-        while block:
-            m.update(block)
-            block = readfile.read(_READ_SIZE)
-    return m.hexdigest()
+    return multi_digest(filepath, ("sha1",))["sha1"]
 
 def md5sum_directory(directory):
     """
@@ -978,6 +1031,74 @@ def uncompress_file(file_path, destination_path, opener):
             data = f_in.read(_READ_SIZE)
         f_in.close()
 
+def parallel_compressor(opener):
+    """
+    Return the multi-threaded counterpart of the given compressed file
+    opener (bz2.BZ2File or gzip.GzipFile), writing the same compressed
+    format, or opener itself if there is none or if less than two CPUs
+    are available.
+
+    @param opener: compressed file opener
+    @type opener: function
+    @return: compressed file opener
+    @rtype: function
+    """
+    if const_get_cpus() < 2:
+        return opener
+    from entropy.misc import ParallelBZ2File, ParallelGzipFile
+    compressors = {
+        bz2.BZ2File: ParallelBZ2File,
+        gzip.GzipFile: ParallelGzipFile,
+    }
+    return compressors.get(opener, opener)
+
+class _CompressedTarFile(tarfile.TarFile):
+    """
+    tarfile.TarFile writing to a compressed file object, which is closed
+    together with the archive, see open_compressed_tarfile().
+    """
+
+    def close(self):
+        fileobj = self.fileobj
+        try:
+            tarfile.TarFile.close(self)
+        finally:
+            fileobj.close()
+
+def open_compressed_tarfile(dest_file, compressor = "bz2",
+    compress_level = 9):
+    """
+    Open a tarfile.TarFile object for writing at dest_file, compressed
+    through the multi-threaded compressor of the given type. Supported
+    compression types are "bz2" and "gz". Closing the returned object
+    also closes the underlying compressed file.
+
+    @param dest_file: path where to save compressed file
+    @type dest_file: string
+    @keyword compressor: compressor type
+    @type compressor: string
+    @keyword compress_level: compression level, from 1 to 9
+    @type compress_level: int
+    @return: tarfile.TarFile object
+    @rtype: tarfile.TarFile
+    @raise AttributeError: if compressor value is unsupported
+    """
+    openers = {
+        "bz2": bz2.BZ2File,
+        "gz": gzip.GzipFile,
+    }
+    opener = openers.get(compressor)
+    if opener is None:
+        raise AttributeError("invalid compressor specified")
+
+    f_out = parallel_compressor(opener)(dest_file, "wb",
+        compresslevel = compress_level)
+    try:
+        return _CompressedTarFile(fileobj = f_out, mode = "w")
+    except:
+        f_out.close()
+        raise
+
 def compress_file(file_path, destination_path, opener, compress_level = None):
     """
     Compress file at file_path into destination_path (file path) using
@@ -993,6 +1114,7 @@ def compress_file(file_path, destination_path, opener, compress_level = None):
     @keyword compress_level: compression level, from 0 to 9
     @type compress_level: int
     """
+    opener = parallel_compressor(opener)
     with open(file_path, "rb") as f_in:
         f_out = None
         try:
@@ -1030,7 +1152,7 @@ def compress_files(dest_file, files_to_compress, compressor = "bz2"):
     id_strings = {}
     tar = None
     try:
-        tar = tarfile.open(dest_file, "w:%s" % (compressor,))
+        tar = open_compressed_tarfile(dest_file, compressor = compressor)
         for path in files_to_compress:
             exist = os.lstat(path)
             tarinfo = tar.gettarinfo(path, os.path.basename(path))
@@ -1666,6 +1788,47 @@ def remove_entropy_metadata(entropy_package_file, save_path):
 
     return True
 
+def _write_digest_file(filepath, hashfile, digest):
+    """
+    Write the given hex digest of filepath to hashfile, using the
+    "<digest>  <file name>" format.
+    """
+    enc = etpConst['conf_encoding']
+    with codecs.open(hashfile, "w", encoding=enc) as f:
+        fname = os.path.basename(filepath)
+        f.write(digest)
+        f.write("  ")
+        f.write(fname)
+        f.write("\n")
+    return hashfile
+
+_DIGEST_FILE_EXTS = {
+    "md5": "packagesmd5fileext",
+    "sha1": "packagessha1fileext",
+    "sha256": "packagessha256fileext",
+    "sha512": "packagessha512fileext",
+}
+
+def create_digest_files(filepath, algorithms):
+    """
+    Create valid digest files (see create_md5_file(),
+    create_sha1_file(), etc) off filepath, reading it only once.
+
+    @param filepath: file path to read
+    @type filepath: string
+    @param algorithms: list of algorithms among "md5", "sha1", "sha256"
+        and "sha512"
+    @type algorithms: iterable
+    @return: dict composed by algorithm name as key and path to digest
+        file as value
+    @rtype: dict
+    @raise KeyError: if an algorithm is not supported
+    """
+    exts = dict((x, etpConst[_DIGEST_FILE_EXTS[x]]) for x in algorithms)
+    digests = multi_digest(filepath, exts.keys(), parallel = True)
+    return dict((x, _write_digest_file(
+                filepath, filepath + exts[x], digests[x])) for x in exts)
+
 def create_md5_file(filepath):
     """
     Create valid MD5 file off filepath.
@@ -1675,16 +1838,7 @@ def create_md5_file(filepath):
     @return: path to MD5 file
     @rtype: string
     """
-    md5hash = md5sum(filepath)
-    hashfile = filepath+etpConst['packagesmd5fileext']
-    enc = etpConst['conf_encoding']
-    with codecs.open(hashfile, "w", encoding=enc) as f:
-        name = os.path.basename(filepath)
-        f.write(md5hash)
-        f.write("  ")
-        f.write(name)
-        f.write("\n")
-    return hashfile
+    return create_digest_files(filepath, ("md5",))["md5"]
 
 def create_sha512_file(filepath):
     """
@@ -1695,16 +1849,7 @@ def create_sha512_file(filepath):
     @return: path to SHA512 file
     @rtype: string
     """
-    sha512hash = sha512(filepath)
-    hashfile = filepath+etpConst['packagessha512fileext']
-    enc = etpConst['conf_encoding']
-    with codecs.open(hashfile, "w", encoding=enc) as f:
-        fname = os.path.basename(filepath)
-        f.write(sha512hash)
-        f.write("  ")
-        f.write(fname)
-        f.write("\n")
-    return hashfile
+    return create_digest_files(filepath, ("sha512",))["sha512"]
 
 def create_sha256_file(filepath):
     """
@@ -1715,16 +1860,7 @@ def create_sha256_file(filepath):
     @return: path to SHA256 file
     @rtype: string
     """
-    sha256hash = sha256(filepath)
-    hashfile = filepath+etpConst['packagessha256fileext']
-    enc = etpConst['conf_encoding']
-    with codecs.open(hashfile, "w", encoding=enc) as f:
-        fname = os.path.basename(filepath)
-        f.write(sha256hash)
-        f.write("  ")
-        f.write(fname)
-        f.write("\n")
-    return hashfile
+    return create_digest_files(filepath, ("sha256",))["sha256"]
 
 def create_sha1_file(filepath):
     """
@@ -1735,16 +1871,7 @@ def create_sha1_file(filepath):
     @return: path to SHA1 file
     @rtype: string
     """
-    sha1hash = sha1(filepath)
-    hashfile = filepath+etpConst['packagessha1fileext']
-    enc = etpConst['conf_encoding']
-    with codecs.open(hashfile, "w", encoding=enc) as f:
-        fname = os.path.basename(filepath)
-        f.write(sha1hash)
-        f.write("  ")
-        f.write(fname)
-        f.write("\n")
-    return hashfile
+    return create_digest_files(filepath, ("sha1",))["sha1"]
 
 def compare_md5(filepath, checksum):
     """
@@ -2702,47 +2829,204 @@ def resolve_dynamic_library(library, requiring_executable):
 
     return found_path
 
-def read_elf_dynamic_libraries(elf_file):
+_ELF_MAGIC = b"\x7fELF"
+_ELF_PT_LOAD = 1
+_ELF_PT_DYNAMIC = 2
+_ELF_DT_NULL = 0
+_ELF_DT_NEEDED = 1
+_ELF_DT_STRTAB = 5
+_ELF_DT_SONAME = 14
+_ELF_DT_RPATH = 15
+_ELF_DT_RUNPATH = 29
+# per ELF class: e_phoff format and offset, e_phentsize offset,
+# program header format and dynamic entry format.
+_ELF_LAYOUTS = {
+    1: ("I", 28, 42, "IIIIIIII", "iI"),
+    2: ("Q", 32, 54, "IIQQQQQQ", "qQ"),
+}
+_ELF_CACHE = {}
+_ELF_CACHE_SIZE = 8192
+
+def _parse_elf_dynamic(data):
     """
-    Extract NEEDED metadatum from ELF file at path.
+    Parse the ELF header and the dynamic section of the given ELF object
+    buffer (an mmap object is fine).
+
+    @param data: ELF object buffer
+    @type data: mmap or bytes
+    @return: tuple composed by (elf class, soname, rpath, runpath,
+        needed tuple), or None if the buffer is not a valid ELF object
+    @rtype: tuple or None
+    """
+    if len(data) < 64 or data[0:4] != _ELF_MAGIC:
+        return None
+
+    elf_class, elf_data = struct.unpack_from("BB", data, 4)
+    layout = _ELF_LAYOUTS.get(elf_class)
+    if layout is None or elf_data not in (1, 2):
+        return None
+    order = "<" if elf_data == 1 else ">"
+    phoff_fmt, phoff_offset, phent_offset, phdr_fmt, dyn_fmt = layout
+
+    (e_phoff,) = struct.unpack_from(order + phoff_fmt, data, phoff_offset)
+    e_phentsize, e_phnum = struct.unpack_from(
+        order + "HH", data, phent_offset)
+
+    phdr_fmt = order + phdr_fmt
+    if e_phnum and e_phentsize < struct.calcsize(phdr_fmt):
+        return None
+
+    loads = []
+    dynamic = None
+    try:
+        for idx in range(e_phnum):
+            phdr = struct.unpack_from(
+                phdr_fmt, data, e_phoff + idx * e_phentsize)
+            if elf_class == 1:
+                p_type, p_offset, p_vaddr, _x, p_filesz = phdr[:5]
+            else:
+                p_type, _x, p_offset, p_vaddr, _x, p_filesz = phdr[:6]
+            if p_type == _ELF_PT_LOAD:
+                loads.append((p_vaddr, p_offset, p_filesz))
+            elif p_type == _ELF_PT_DYNAMIC:
+                dynamic = (p_offset, p_filesz)
+    except struct.error:
+        return None
+
+    empty = const_convert_to_rawstring("")
+    if dynamic is None:
+        # statically linked
+        return elf_class, empty, empty, empty, ()
+
+    dyn_fmt = order + dyn_fmt
+    dyn_size = struct.calcsize(dyn_fmt)
+    dyn_offset, dyn_filesz = dynamic
+    entries = []
+    strtab = None
+    offset = dyn_offset
+    dyn_end = min(dyn_offset + dyn_filesz, len(data))
+    while offset + dyn_size <= dyn_end:
+        d_tag, d_val = struct.unpack_from(dyn_fmt, data, offset)
+        offset += dyn_size
+        if d_tag == _ELF_DT_NULL:
+            break
+        if d_tag == _ELF_DT_STRTAB:
+            strtab = d_val
+        elif d_tag in (_ELF_DT_NEEDED, _ELF_DT_SONAME,
+                       _ELF_DT_RPATH, _ELF_DT_RUNPATH):
+            entries.append((d_tag, d_val))
+
+    # DT_STRTAB is a virtual address, map it back to a file offset
+    strtab_offset = None
+    if strtab is not None:
+        for p_vaddr, p_offset, p_filesz in loads:
+            if p_vaddr <= strtab < p_vaddr + p_filesz:
+                strtab_offset = strtab - p_vaddr + p_offset
+                break
+    if strtab_offset is None:
+        return elf_class, empty, empty, empty, ()
+
+    def _string(str_offset):
+        start = strtab_offset + str_offset
+        end = data.find(b"\0", start)
+        if end == -1:
+            end = len(data)
+        return data[start:end]
+
+    soname = empty
+    rpath = None
+    runpath = None
+    needed = []
+    for d_tag, d_val in entries:
+        if d_tag == _ELF_DT_NEEDED:
+            needed.append(_string(d_val))
+        elif d_tag == _ELF_DT_SONAME:
+            soname = _string(d_val)
+        elif d_tag == _ELF_DT_RPATH and rpath is None:
+            rpath = _string(d_val)
+        elif d_tag == _ELF_DT_RUNPATH and runpath is None:
+            runpath = _string(d_val)
+
+    return elf_class, soname, rpath or empty, runpath or empty, \
+        tuple(needed)
+
+def _elf_dynamic_strings(metadata):
+    """
+    Convert the strings of _parse_elf_dynamic() metadata to the string
+    type used by the other ELF functions.
+    """
+    if metadata is not None and const_is_python3():
+        elf_class, soname, rpath, runpath, needed = metadata
+        metadata = (
+            elf_class,
+            const_convert_to_unicode(soname),
+            const_convert_to_unicode(rpath),
+            const_convert_to_unicode(runpath),
+            tuple(const_convert_to_unicode(x) for x in needed))
+    return metadata
+
+def _read_elf_dynamic(elf_file):
+    """
+    Read (and cache) the dynamic section metadata of the ELF file at path.
+    Cache entries are keyed by device, inode, mtime and size, so that
+    rewritten files are parsed again.
 
     @param elf_file: path to ELF file
     @type elf_file: string
-    @return: list (set) of strings in NEEDED metadatum
-    @rtype: set
+    @return: see _parse_elf_dynamic()
+    @rtype: tuple or None
+    @raise FileNotFound: if the file cannot be read
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%n", elf_file)
-
-    out = None
     try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf failure")
-        out = proc.stdout.read()
+        with open(elf_file, "rb") as elf_f:
+            st = os.fstat(elf_f.fileno())
+            cache_key = (st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+            cached = _ELF_CACHE.get(cache_key, _ELF_CACHE)
+            if cached is not _ELF_CACHE:
+                return cached
+
+            if st.st_size < 64:
+                metadata = None
+            else:
+                data = mmap.mmap(
+                    elf_f.fileno(), 0, access = mmap.ACCESS_READ)
+                try:
+                    metadata = _parse_elf_dynamic(data)
+                finally:
+                    data.close()
+    except (OSError, IOError, ValueError) as err:
+        raise FileNotFound("cannot read %s: %s" % (elf_file, err,))
 
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
+    metadata = _elf_dynamic_strings(metadata)
+    if len(_ELF_CACHE) >= _ELF_CACHE_SIZE:
+        _ELF_CACHE.clear()
+    _ELF_CACHE[cache_key] = metadata
+    return metadata
 
-    finally:
-        if proc is not None:
-            try:
-                proc.stdout.close()
-            except (OSError, IOError):
-                pass
+def _elf_runpath(rpath, runpath):
+    """
+    Return the RPATH/RUNPATH string in the same format used by scanelf %r.
+    """
+    if rpath and runpath:
+        if rpath == runpath:
+            return runpath
+        return "{%s,%s}" % (rpath, runpath)
+    return runpath or rpath
 
-    outcome = set()
-    if out is not None:
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        for line in out.split("\n"):
-            if line:
-                libs = line.strip().split(" ", -1)[0].split(",")
-                outcome.update(libs)
-    return outcome
+def read_elf_dynamic_libraries(elf_file):
+    """
+    Extract NEEDED metadatum from ELF file at path.
+
+    @param elf_file: path to ELF file
+    @type elf_file: string
+    @return: list (set) of strings in NEEDED metadatum
+    @rtype: set
+    @raise FileNotFound: if the file cannot be read
+    """
+    metadata = _read_elf_dynamic(elf_file)
+    if metadata is None:
+        return set()
+    return set(metadata[4])
 
 def read_elf_metadata(elf_file):
     """
@@ -2753,50 +3037,38 @@ def read_elf_metadata(elf_file):
     @return: dict with "soname", "class", "runpath" and "needed" keys. None if
         no metadata is found.
     @rtype: dict or None
+    @raise FileNotFound: if the file cannot be read
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%M;%S;%r;%n", elf_file)
-
-    out = None
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf failure")
-        out = proc.stdout.read()
+    return _elf_metadata(_read_elf_dynamic(elf_file))
 
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
+def read_elf_metadata_buffer(data):
+    """
+    Extract soname, elf class, runpath and NEEDED metadata from an ELF
+    object already loaded in memory, see read_elf_metadata().
 
-    finally:
-        if proc is not None:
-            try:
-                proc.stdout.close()
-            except (OSError, IOError):
-                pass
+    @param data: ELF object buffer
+    @type data: bytes
+    @return: dict with "soname", "class", "runpath" and "needed" keys. None if
+        no metadata is found.
+    @rtype: dict or None
+    """
+    return _elf_metadata(_elf_dynamic_strings(_parse_elf_dynamic(data)))
 
-    if out is not None:
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        if not out:
-            # no metadata.
-            return None
+def _elf_metadata(metadata):
+    """
+    Build the read_elf_metadata() dict out of _read_elf_dynamic() metadata.
+    """
+    if metadata is None:
+        # no metadata.
+        return None
 
-        for line in out.split("\n"):
-            if line:
-                data = line.strip().split(" ", -1)[0]
-                elfclass_str, soname, runpath, libs = data.split(";")
-                libs = set(libs.split(","))
-                return {
-                    'soname': soname,
-                    'class': elf_class_strtoint(elfclass_str),
-                    'runpath': runpath,
-                    'needed': libs,
-                }
-
-    raise FileNotFound("scanelf failure")
+    elf_class, soname, rpath, runpath, needed = metadata
+    return {
+        'soname': soname,
+        'class': elf_class,
+        'runpath': _elf_runpath(rpath, runpath),
+        'needed': set(needed),
+    }
 
 def read_elf_real_dynamic_libraries(elf_file):
     """
@@ -2925,41 +3197,20 @@ def read_elf_linker_paths(elf_file):
     @type elf_file: string
     @return: list of extracted built-in linker paths.
     @rtype: list
+    @raise FileNotFound: if the file cannot be read
     """
-    proc = None
-    args = ("/usr/bin/scanelf", "-qF", "%r", elf_file)
-    out = None
-
-    try:
-        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
-        exit_st = proc.wait()
-        if exit_st != 0:
-            raise FileNotFound("scanelf error")
-
-        out = proc.stdout.read()
-
-    except (OSError, IOError) as err:
-        if err.errno != errno.ENOENT:
-            raise
-        raise FileNotFound("/usr/bin/scanelf not found")
-
-    finally:
-        if proc is not None:
-            proc.stdout.close()
-
     outcome = []
-    if out is not None:
+    metadata = _read_elf_dynamic(elf_file)
+    if metadata is None:
+        return outcome
 
+    runpath = _elf_runpath(metadata[2], metadata[3])
+    if runpath:
         elf_dir = os.path.dirname(elf_file)
-        if const_is_python3():
-            out = const_convert_to_unicode(out)
-        for line in out.split("\n"):
-            if line:
-                paths = line.strip().split(" ", -1)[0].split(",")
-                for path in paths:
-                    path = path.replace("$ORIGIN", elf_dir)
-                    path = path.replace("${ORIGIN}", elf_dir)
-                    outcome.append(path)
+        for path in runpath.split(","):
+            path = path.replace("$ORIGIN", elf_dir)
+            path = path.replace("${ORIGIN}", elf_dir)
+            outcome.append(path)
 
     return outcome
 
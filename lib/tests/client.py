@@ -13,12 +13,18 @@ import time
 from entropy.client.interfaces import Client
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.client.interfaces.package.actions._triggers import Trigger
+from entropy.client.misc import ConfigProtectTrie
+from entropy.client.orphans import FileOwnershipIndex, \
+    OrphanedFilesScanner
+from entropy.client.mirrors import MirrorStatistics, StatusInterface
 from entropy.cache import EntropyCacher
-from entropy.const import etpConst, const_mkdtemp
+from entropy.const import etpConst, const_mkdtemp, \
+    const_convert_to_rawstring, const_convert_to_unicode
 from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, EntropyPackageException
+import entropy.dump
 import entropy.tools
 import tests._misc as _misc
 
@@ -130,6 +136,55 @@ class EntropyClientTest(unittest.TestCase):
             cacher.stop()
             shutil.rmtree(tmp_dir, True)
 
+    def test_cacher_sqlite_store(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        cacher.start()
+        st_val = EntropyCacher.STORE_BACKEND
+        try:
+            EntropyCacher.STORE_BACKEND = "sqlite"
+            cacher.push("foo/bar", [1, 2, 3], cache_dir = tmp_dir)
+            cacher.save("baz", "foo", cache_dir = tmp_dir)
+            cacher.sync()
+            self.assertEqual(os.listdir(tmp_dir),
+                [entropy.dump.SqliteDumpStore.STORE_NAME])
+            self.assertEqual(cacher.pop("foo/bar", cache_dir = tmp_dir),
+                [1, 2, 3])
+            self.assertEqual(
+                cacher.pop("baz", cache_dir = tmp_dir, aging_days = 1), "foo")
+
+            EntropyCacher.clear_cache_item("foo/bar", cache_dir = tmp_dir)
+            self.assertEqual(cacher.pop("foo/bar", cache_dir = tmp_dir), None)
+            self.assertEqual(cacher.pop("baz", cache_dir = tmp_dir), "foo")
+        finally:
+            EntropyCacher.STORE_BACKEND = st_val
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_cacher_sqlite_store_eviction(self):
+        tmp_dir = const_mkdtemp()
+        store = entropy.dump.SqliteDumpStore(tmp_dir, max_size = 4096)
+        try:
+            for count in range(10):
+                store.dump("foo%d" % (count,), "x" * 1000)
+                # keep the first object in use
+                self.assertEqual(store.load("foo0"), "x" * 1000)
+
+            cur = store._cursor()
+            cur.execute("SELECT SUM(size) FROM dumps")
+            total_size = cur.fetchone()[0]
+            self.assertTrue(total_size <= 4096)
+            self.assertTrue(store._size >= total_size)
+            self.assertEqual(store.load("foo0"), "x" * 1000)
+            self.assertEqual(store.load("foo9"), "x" * 1000)
+            self.assertEqual(store.load("foo1"), None)
+
+            store.clear()
+            self.assertEqual(store._size, 0)
+        finally:
+            store._close()
+            shutil.rmtree(tmp_dir, True)
+
     def test_cacher_push_pop_sync(self):
         cacher = self.Client._cacher
         tmp_dir = const_mkdtemp()
@@ -150,6 +205,176 @@ class EntropyClientTest(unittest.TestCase):
         self.Client.clear_cache()
         self.assertEqual(os.listdir(current_dir), [])
 
+    def test_mirror_statistics(self):
+        tmp_dir = const_mkdtemp()
+        d_dir = entropy.dump.D_DIR
+        stats = MirrorStatistics()
+        try:
+            entropy.dump.D_DIR = tmp_dir
+            stats.clear()
+            mirrors = ["http://a.org/repo", "http://b.org/repo",
+                       "http://c.org/repo"]
+            # no statistics, order is kept
+            self.assertEqual(stats.rank(mirrors), mirrors)
+
+            stats.record_transfer("http://b.org/repo/pkg.tbz2", 1000.0)
+            stats.record_transfer(mirrors[0], 10.0)
+            self.assertEqual(stats.rank(mirrors),
+                [mirrors[1], mirrors[2], mirrors[0]])
+
+            # failures are zero throughput samples
+            for _idx in range(20):
+                stats.record_failure(mirrors[1])
+            self.assertTrue(stats.get_throughput(mirrors[1]) < 10.0)
+            self.assertEqual(stats.rank(mirrors)[-1], mirrors[1])
+            self.assertEqual(stats.get_throughput(mirrors[2]), None)
+
+            stats.save()
+            expected = stats.get_throughput(mirrors[0])
+            stats._stats = None
+            self.assertAlmostEqual(
+                stats.get_throughput(mirrors[0]), expected)
+        finally:
+            stats.clear()
+            stats._stats = None
+            entropy.dump.D_DIR = d_dir
+            shutil.rmtree(tmp_dir, True)
+
+    def test_mirror_status_decay(self):
+        status = StatusInterface()
+        mirror = "http://a.org/repo"
+        try:
+            for _idx in range(5):
+                status.add_failing_mirror(mirror, 5)
+                self.assertFalse(status.is_failing_mirror(mirror))
+            status.add_failing_mirror(mirror, 5)
+            self.assertTrue(status.is_failing_mirror(mirror))
+
+            # mirrors get back in once their failure score decays
+            score = status.get_failing_mirror_status(mirror)
+            status[mirror] = (score, time.time() -
+                StatusInterface.FAILURE_HALF_LIFE * 2)
+            self.assertFalse(status.is_failing_mirror(mirror))
+        finally:
+            status.clear()
+            # drop the recorded failures, without touching the disk
+            stats = MirrorStatistics()
+            stats._stats = None
+            stats._dirty = False
+
+    def _scan_orphans(self, root, owned, files, system_dirs,
+                      symlinks = None):
+        """
+        Create the given files (and symlinks) under root, install a
+        package owning the given paths and return the set of orphaned
+        files found into system_dirs. All the paths are relative to root.
+        """
+        def _path(rel_path):
+            return const_convert_to_unicode(os.path.join(root, rel_path))
+
+        for rel_path in files:
+            path = const_convert_to_rawstring(_path(rel_path))
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(path, "wb") as f_out:
+                f_out.write(const_convert_to_rawstring("x"))
+        for rel_path, target in (symlinks or {}).items():
+            os.symlink(const_convert_to_rawstring(_path(target)),
+                       const_convert_to_rawstring(_path(rel_path)))
+
+        inst_repo = self.Client.installed_repository()
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        data['content'] = dict((_path(x), "obj") for x in owned)
+        data['content_safety'] = {}
+        inst_repo.addPackage(data)
+
+        index = FileOwnershipIndex(inst_repo, {}, index_dir = root)
+        try:
+            self.assertTrue(index.update())
+            scanner = OrphanedFilesScanner(
+                index, [_path(x) for x in system_dirs], [])
+            orphans = set(scanner.scan())
+        finally:
+            index.close()
+        return set(os.path.relpath(x, _path("")) for x in orphans)
+
+    def test_orphans_owned_file(self):
+        root = os.path.realpath(const_mkdtemp())
+        try:
+            orphans = self._scan_orphans(
+                root, ["usr/lib/libfoo.so", "usr/lib/foo/foo.conf"],
+                ["usr/lib/libfoo.so", "usr/lib/foo/foo.conf"],
+                ["usr/lib"])
+            self.assertEqual(orphans, set())
+        finally:
+            shutil.rmtree(root, True)
+
+    def test_orphans_orphaned_file(self):
+        root = os.path.realpath(const_mkdtemp())
+        try:
+            orphans = self._scan_orphans(
+                root, ["usr/lib/libfoo.so", "usr/lib/libzzz.so"],
+                ["usr/lib/libfoo.so", "usr/lib/libfoo.so.1",
+                 "usr/lib/foo/foo.conf", "usr/lib/libzzz.so"],
+                ["usr/lib"])
+            self.assertEqual(orphans, set(["usr/lib/libfoo.so.1",
+                                           "usr/lib/foo/foo.conf"]))
+        finally:
+            shutil.rmtree(root, True)
+
+    def test_orphans_directory_boundary(self):
+        root = os.path.realpath(const_mkdtemp())
+        try:
+            # /usr/lib64/libbar.so does not own /usr/lib/libbar.so and
+            # /usr/lib64 is not nested into /usr/lib.
+            orphans = self._scan_orphans(
+                root, ["usr/lib64/libbar.so", "usr/lib/libfoo.so"],
+                ["usr/lib/libbar.so", "usr/lib/libfoo.so",
+                 "usr/lib64/libbar.so", "usr/lib64/libfoo.so",
+                 "usr/lib.d/orphan"],
+                ["usr/lib", "usr/lib64"])
+            self.assertEqual(orphans, set(["usr/lib/libbar.so",
+                                           "usr/lib64/libfoo.so"]))
+        finally:
+            shutil.rmtree(root, True)
+
+    def test_orphans_symlinked_directory(self):
+        root = os.path.realpath(const_mkdtemp())
+        try:
+            # files are owned through the symlinked directory and the
+            # symlinks are not walked.
+            orphans = self._scan_orphans(
+                root, ["lib/libfoo.so", "usr/share/foo/foo.conf"],
+                ["usr/lib/libfoo.so", "usr/lib/libbar.so",
+                 "usr/share/foo/foo.conf", "usr/share/foo/bar.conf"],
+                ["usr/lib"],
+                symlinks = {"lib": "usr/lib",
+                            "usr/lib/foo": "usr/share/foo"})
+            self.assertEqual(orphans, set(["usr/lib/libbar.so"]))
+        finally:
+            shutil.rmtree(root, True)
+
+    def test_orphans_non_ascii_paths(self):
+        root = os.path.realpath(const_mkdtemp())
+        # utf-8 encoded paths, decoded like the Source Package Manager
+        # does when reading package contents.
+        owned = [const_convert_to_unicode(x) for x in (
+            "usr/share/caf\xc3\xa9/men\xc3\xb9.txt",
+            "usr/share/\xe6\x97\xa5\xe6\x9c\xac/a.txt",
+            "usr/share/z.txt")]
+        orphaned = [const_convert_to_unicode(x) for x in (
+            "usr/share/caf\xc3\xa9/\xc3\xb1.txt",
+            "usr/share/\xe6\x97\xa5\xe6\x9c\xac/b.txt",
+            "usr/share/\xc3\xa9.txt")]
+        try:
+            orphans = self._scan_orphans(
+                root, owned, owned + orphaned, ["usr/share"])
+            self.assertEqual(orphans, set(orphaned))
+        finally:
+            shutil.rmtree(root, True)
+
     def test_contentsafety(self):
         dbconn = self.Client._init_generic_temp_repository(
             self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
@@ -193,6 +418,25 @@ class EntropyClientTest(unittest.TestCase):
             set_mute(False)
         self.assertRaises(RepositoryError, test_load)
 
+    def test_config_protect_trie(self):
+        config_protect = ConfigProtectTrie(
+            ["/etc", "/usr/share/config", "/etc/conf.d"],
+            ["/etc/env.d", "/etc/fonts/fonts.conf"],
+            ["/etc/skipped.conf"])
+        self.assertTrue(config_protect.protected("/etc/make.conf"))
+        self.assertTrue(config_protect.protected("/etc/conf.d/net"))
+        self.assertTrue(config_protect.protected("/usr/share/config/kdm"))
+        self.assertTrue(config_protect.protected("/etc"))
+        self.assertFalse(config_protect.protected("/etc/env.d/00basic"))
+        self.assertFalse(config_protect.protected("/etc/fonts/fonts.conf"))
+        self.assertTrue(config_protect.protected("/etc/fonts/local.conf"))
+        self.assertFalse(config_protect.protected("/etcetera/file"))
+        self.assertFalse(config_protect.protected("/usr/share/doc"))
+        self.assertTrue(config_protect.skipped("/etc/skipped.conf"))
+        self.assertFalse(config_protect.skipped("/etc/make.conf"))
+        self.assertEqual(config_protect.roots(),
+                         ["/etc", "/usr/share/config"])
+
     def test_package_repository(self):
         test_pkg = _misc.get_test_entropy_package()
         # this might fail on 32bit arches
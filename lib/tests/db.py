@@ -581,6 +581,144 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.assertEqual(f_match, self.test_db.atomMatch(atom))
             self.assertEqual(f_match, self.test_db.atomMatch("~"+atom))
 
+    def test_db_match_batch(self):
+
+        test_pkg = _misc.get_test_entropy_package_tag()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+
+        matches = []
+        for package_id in self.test_db.listAllPackageIds():
+            key, slot, _ver, tag, _rev, _atom = self.test_db.getStrictData(
+                package_id)
+            matches.append((key, slot, None))
+            matches.append((key, slot, tag))
+            matches.append((key, None, None))
+            matches.append((key, slot + "foo", None))
+        matches.append(("app-foo/slib", None, None))
+        matches.append(("slib", None, None))
+
+        results = self.test_db.atomMatchBatch(matches)
+        self.assertEqual(set(matches), set(results.keys()))
+        for key, slot, tag in matches:
+            atom = key
+            if tag:
+                atom = key + etpConst['entropytagprefix'] + tag
+            expected = self.test_db.atomMatch(atom, matchSlot = slot,
+                extendedResults = True, useCache = False)[0]
+            self.assertEqual(expected, results[(key, slot, tag)])
+
+    def test_db_package_data_batch(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+        test_pkg = _misc.get_test_entropy_package_tag()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+
+        package_ids = list(self.test_db.listAllPackageIds()) + [9999]
+        for kwargs in ({}, {'content_insert_formatted': True},
+                       {'get_content': False, 'get_changelog': False,
+                        'get_content_safety': False}):
+            results = self.test_db.getPackageDataBatch(package_ids, **kwargs)
+            self.assertEqual(set(package_ids), set(results.keys()))
+            for package_id in package_ids:
+                self.assertEqual(
+                    self.test_db.getPackageData(package_id, **kwargs),
+                    results[package_id])
+
+        for kwargs in ({}, {'extended': True},
+                       {'resolve_conditional_deps': False}):
+            results = self.test_db.retrieveDependenciesBatch(
+                package_ids, **kwargs)
+            for package_id in package_ids:
+                self.assertEqual(
+                    self.test_db.retrieveDependencies(package_id, **kwargs),
+                    results[package_id])
+
+        for kwargs in ({}, {'extended': True, 'formatted': True}):
+            results = self.test_db.retrieveContentBatch(
+                package_ids, **kwargs)
+            for package_id in package_ids:
+                self.assertEqual(
+                    self.test_db.retrieveContent(package_id, **kwargs),
+                    results[package_id])
+
+    def test_db_mask_filter_batch(self):
+
+        test_pkg = _misc.get_test_entropy_package_tag()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+
+        package_ids = self.test_db.listAllPackageIds()
+        keywords = self.test_db.retrieveKeywordsBatch(package_ids)
+        licenses = self.test_db.retrieveLicenseBatch(package_ids)
+        for package_id in package_ids:
+            self.assertEqual(keywords[package_id],
+                self.test_db.retrieveKeywords(package_id))
+            self.assertEqual(licenses[package_id],
+                self.test_db.retrieveLicense(package_id))
+
+        results = self.test_db.maskFilterBatch(package_ids)
+        self.assertEqual(set(package_ids), set(results.keys()))
+        self.Client.ClientSettings()['masking_validation']['cache'].clear()
+        for package_id in package_ids:
+            self.assertEqual(results[package_id],
+                self.test_db.maskFilter(package_id))
+
+        # the on-disk cache must be loaded once and stored on close
+        import entropy.client.interfaces.db as client_db
+        calls = {'load': 0, 'dump': 0}
+        disk = {}
+        def _loadobj(name, *args, **kwargs):
+            calls['load'] += 1
+            return disk.get(name)
+        def _dumpobj(name, obj, *args, **kwargs):
+            calls['dump'] += 1
+            disk[name] = obj
+        orig_loadobj, orig_dumpobj = client_db.loadobj, client_db.dumpobj
+        orig_caching = self.test_db._caching
+        client_db.loadobj, client_db.dumpobj = _loadobj, _dumpobj
+        self.test_db._caching = True
+        validator_cache = self.Client.ClientSettings()[
+            'masking_validation']['cache']
+        try:
+            validator_cache.clear()
+            self.assertEqual(results,
+                self.test_db.maskFilterBatch(package_ids))
+            self.assertEqual(calls, {'load': 1, 'dump': 0})
+
+            # maskFilter() shares the same cache
+            validator_cache.clear()
+            for package_id in package_ids:
+                self.assertEqual(results[package_id],
+                    self.test_db.maskFilter(package_id))
+            self.assertEqual(calls, {'load': 1, 'dump': 0})
+
+            # on-disk cache hits warm up the in-memory cache
+            validator_cache.clear()
+            self.assertEqual(results,
+                self.test_db.maskFilterBatch(package_ids))
+            for package_id in package_ids:
+                self.assertEqual(results[package_id], validator_cache[
+                    (package_id, self.test_db.name, True)])
+            self.assertEqual(calls, {'load': 1, 'dump': 0})
+
+            self.test_db.close()
+            self.assertEqual(calls, {'load': 1, 'dump': 1})
+            self.assertEqual(results, list(disk.values())[0])
+            self.test_db.close()
+            self.assertEqual(calls, {'load': 1, 'dump': 1})
+        finally:
+            client_db.loadobj, client_db.dumpobj = orig_loadobj, orig_dumpobj
+            self.test_db._caching = orig_caching
+
     def test_db_multithread(self):
 
         # insert/compare
@@ -752,6 +890,36 @@ class EntropyRepositoryTest(unittest.TestCase):
         pkg_data = self.test_db.retrieveUnusedPackageIds()
         self.assertEqual(pkg_data, tuple())
 
+    def test_db_reverse_deps_index(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        data['pkg_dependencies'] += ((
+                _misc.get_test_package_atom2(),
+                etpConst['dependency_type_ids']['rdepend_id']),)
+
+        idpackage = self.test_db.addPackage(data)
+        # generate the index, it is then updated incrementally
+        self.assertEqual(frozenset(),
+            self.test_db.retrieveReverseDependencies(idpackage))
+
+        idpackage2 = self.test_db.addPackage(data2)
+        self.assertEqual(frozenset([idpackage]),
+            self.test_db.retrieveReverseDependencies(idpackage2))
+        self.assertEqual((idpackage,),
+            self.test_db.retrieveUnusedPackageIds())
+
+        self.test_db.removePackage(idpackage2)
+        self.assertEqual(frozenset(),
+            self.test_db.retrieveReverseDependencies(idpackage2))
+
+        idpackage2 = self.test_db.addPackage(data2)
+        self.test_db.removePackage(idpackage)
+        self.assertEqual(frozenset(),
+            self.test_db.retrieveReverseDependencies(idpackage2))
+
     def test_similar(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -804,6 +972,212 @@ class EntropyRepositoryTest(unittest.TestCase):
         out = self.test_db.listAllPackageIds(order_by="atom")
         self.assertEqual(out, (1,))
 
+    def test_db_align(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+        test_pkg = _misc.get_test_entropy_package_tag()
+        data2 = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data2)
+
+        data['digest'] = "0" * 32
+        self.test_db2.addPackage(data, package_id = 1)
+        self.test_db2.addPackage(data2, package_id = 3)
+
+        self.assertEqual(
+            self.test_db._sortedDifferences(
+                self.test_db.listAllPackageDigests(),
+                self.test_db2.listAllPackageDigests()),
+            ([3], [2], [1]))
+
+        self.test_db.alignDatabases(self.test_db2, force = True)
+        self.assertEqual(self.test_db.listAllPackageDigests(),
+            self.test_db2.listAllPackageDigests())
+
+    def test_db_checksum_generation(self):
+        generations = self.test_db._getChecksumGenerations()
+        checksum = self.test_db.checksum()
+        ordered_checksum = self.test_db.checksum(do_order = True)
+        self.assertTrue(generations is not None)
+        self.assertEqual(self.test_db.checksum(), checksum)
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+        new_generations = self.test_db._getChecksumGenerations()
+        new_checksum = self.test_db.checksum()
+        self.assertNotEqual(new_generations, generations)
+        self.assertNotEqual(new_checksum, checksum)
+        self.assertEqual(self.test_db.checksum(do_order = True),
+            self.test_db._checksum(True, True, False, False))
+
+        # only the tables hashed by checksum() are taken into account
+        deps_checksum = self.test_db.checksum(include_dependencies = True)
+        self.test_db.insertDependencies(package_id, ["app-misc/foo"])
+        self.assertEqual(self.test_db.checksum(), new_checksum)
+        self.assertNotEqual(
+            self.test_db.checksum(include_dependencies = True),
+            deps_checksum)
+
+        # setters replace the generation of the table they write to
+        self.test_db.setDigest(package_id, "0" * 32)
+        self.assertNotEqual(self.test_db.checksum(), new_checksum)
+        self.assertEqual(self.test_db._getChecksumGenerations()["baseinfo"],
+            new_generations["baseinfo"])
+
+        # generations are never reused, the content hash is
+        self.test_db.removePackage(package_id)
+        self.assertNotEqual(self.test_db.checksum(), checksum)
+        self.assertNotEqual(self.test_db.checksum(), new_checksum)
+        self.assertEqual(self.test_db.checksum(do_order = True),
+                         ordered_checksum)
+
+    def test_file_available_batch(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+        paths = ["/usr/include/zlib.h", "/lib64/libz.so", "/not/there"]
+        self.assertEqual(self.test_db.isFileAvailableBatch(paths), {
+            "/usr/include/zlib.h": frozenset([package_id]),
+            "/lib64/libz.so": frozenset([package_id]),
+        })
+        self.assertEqual(self.test_db.isFileAvailableBatch([]), {})
+
+    def test_content_dirs(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+
+        class CompactRepository(EntropyRepository):
+            _CONTENT_DIRS = True
+
+        compact_db = CompactRepository(readOnly = False, dbFile = ":memory:",
+            name = self.test_db_name, xcache = False, indexing = False)
+        self.assertTrue(compact_db._isContentDirs())
+        compact_id = compact_db.addPackage(data)
+
+        self.assertEqual(
+            sorted(compact_db.retrieveContentIter(compact_id)),
+            sorted(self.test_db.retrieveContentIter(package_id)))
+        self.assertEqual(
+            compact_db.retrieveContentSafety(compact_id),
+            self.test_db.retrieveContentSafety(package_id))
+        self.assertEqual(
+            sorted(compact_db.listAllFiles()),
+            sorted(self.test_db.listAllFiles()))
+
+        paths = ["/usr/include/zlib.h", "/lib64", "/not/there"]
+        self.assertEqual(compact_db.isFileAvailableBatch(paths), {
+            "/usr/include/zlib.h": frozenset([compact_id]),
+            "/lib64": frozenset([compact_id]),
+        })
+        self.assertTrue(compact_db.isFileAvailable("/usr/lib64/libz.a"))
+        self.assertFalse(compact_db.isFileAvailable("/usr/lib64/libz"))
+        self.assertEqual(compact_db.searchBelongs("/lib64/libz.so"),
+                         frozenset([compact_id]))
+        self.assertEqual(compact_db.searchBelongs("/lib64/libz.so%",
+                                                  like = True),
+                         frozenset([compact_id]))
+
+        compact_db.removePackage(compact_id)
+        self.assertEqual(compact_db.listAllFiles(), ())
+        compact_db.clean()
+        cur = compact_db._cursor().execute(
+            "SELECT COUNT(*) FROM contentdirs")
+        self.assertEqual(cur.fetchone()[0], 0)
+        compact_db.close()
+
+    def test_content_dirs_migration(self):
+
+        class CompactRepository(EntropyRepository):
+            _CONTENT_DIRS = True
+
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        plain_db = EntropyRepository(readOnly = False, dbFile = db_path,
+            name = "content_dirs_test", xcache = False, indexing = False)
+        plain_db.initializeRepository()
+        data = self.Spm.extract_package_metadata(_misc.get_test_package())
+        package_id = plain_db.addPackage(data)
+        plain_db.commit()
+        content = sorted(plain_db.retrieveContentIter(package_id))
+        self.assertFalse(plain_db._isContentDirs())
+        plain_db.close()
+
+        # the schema revision is already the current one
+        compact_db = CompactRepository(readOnly = False, dbFile = db_path,
+            name = "content_dirs_test", xcache = False, indexing = False)
+        self.assertTrue(compact_db._isContentDirs())
+        self.assertEqual(
+            sorted(compact_db.retrieveContentIter(package_id)), content)
+        compact_db.close()
+
+        # the compact layout is kept
+        plain_db = EntropyRepository(readOnly = False, dbFile = db_path,
+            name = "content_dirs_test", xcache = False, indexing = False)
+        self.assertTrue(plain_db._isContentDirs())
+        self.assertEqual(
+            sorted(plain_db.retrieveContentIter(package_id)), content)
+        plain_db.close()
+        os.remove(db_path)
+
+    def test_dependency_graph(self):
+
+        class GraphRepository(EntropyRepository):
+            _DEPENDENCY_GRAPH = True
+
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        graph_db = GraphRepository(readOnly = False, dbFile = db_path,
+            name = "graph_test", xcache = False, indexing = False)
+        graph_db.initializeRepository()
+        for test_pkg in (_misc.get_test_package(),
+                         _misc.get_test_entropy_package_tag()):
+            data = self.Spm.extract_package_metadata(test_pkg)
+            graph_db.addPackage(data)
+        graph_db.commit()
+        self.assertTrue(graph_db._dependencyGraph() is None)
+
+        graph_path = graph_db.compileDependencyGraph()
+        self.assertTrue(os.path.isfile(graph_path))
+        self.assertTrue(graph_db._dependencyGraph() is not None)
+
+        sql_db = EntropyRepository(readOnly = True, dbFile = db_path,
+            name = "graph_test_sql", xcache = False, indexing = False)
+        dep_type = etpConst['dependency_type_ids']['bdepend_id']
+        for package_id in graph_db.listAllPackageIds():
+            for kwargs in ({}, {'resolve_conditional_deps': False},
+                           {'exclude_deptypes': [dep_type]}):
+                self.assertEqual(
+                    graph_db.retrieveDependenciesList(package_id, **kwargs),
+                    sql_db.retrieveDependenciesList(package_id, **kwargs))
+            deps = list(sql_db.retrieveDependenciesList(
+                    package_id, resolve_conditional_deps = False))
+            deps.append(graph_db.retrieveAtom(package_id))
+            for dep in deps:
+                for mask_filter in (True, False):
+                    self.assertEqual(
+                        graph_db.atomMatch(dep, maskFilter = mask_filter),
+                        sql_db.atomMatch(dep, maskFilter = mask_filter))
+        sql_db.close()
+
+        # the graph is bound to the repository dependencies
+        graph_db.setDependency(1, "app-misc/foo")
+        graph_db.commit()
+        self.assertTrue(graph_db._dependencyGraph() is None)
+
+        # and conflicts
+        graph_db.compileDependencyGraph()
+        self.assertTrue(graph_db._dependencyGraph() is not None)
+        graph_db.insertConflicts(1, ["app-misc/bar"])
+        graph_db.commit()
+        graph_db.clearCache()
+        self.assertTrue(graph_db._dependencyGraph() is None)
+
+        graph_db.close()
+        os.remove(graph_path)
+        os.remove(db_path)
+
     def test_list_files(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -849,6 +1223,91 @@ class EntropyRepositoryTest(unittest.TestCase):
         out = self.test_db.searchName(_misc.get_test_package_name())
         self.assertEqual(out, frozenset([('sys-libs/zlib-1.2.3-r1', 1)]))
 
+    def test_search_index(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+
+        class SearchIndexRepository(EntropyRepository):
+            _SEARCH_INDEX = True
+
+        index_db = SearchIndexRepository(readOnly = False,
+            dbFile = ":memory:", name = self.test_db_name, xcache = False,
+            indexing = True)
+        index_id = index_db.addPackage(data)
+        if not index_db._isSearchIndex():
+            # FTS5 trigrams not supported by the SQLite library
+            index_db.close()
+            return
+
+        self.assertTrue(index_db._searchIndexQuery(
+                "content", ["%libz%"]) is not None)
+        self.assertTrue(index_db._searchIndexQuery(
+                "content", ["%li%"]) is None)
+
+        for pattern in ("%libz%", "/usr/include/%", "%zlib%.h", "%li%",
+                        "%not_there%"):
+            self.assertEqual(
+                index_db.searchBelongs(pattern, like = True),
+                self.test_db.searchBelongs(pattern, like = True))
+        for keyword in ("zlib", "ZLIB", "libs/z", "nothing"):
+            self.assertEqual(
+                index_db.searchPackages(keyword, just_id = True),
+                self.test_db.searchPackages(keyword, just_id = True))
+        self.assertEqual(
+            index_db.searchName("ZLIB", just_id = True),
+            self.test_db.searchName("ZLIB", just_id = True))
+        description = self.test_db.retrieveDescription(package_id)
+        self.assertEqual(
+            index_db.searchDescription(description.lower(), just_id = True),
+            frozenset([index_id]))
+
+        index_db.removePackage(index_id)
+        self.assertEqual(index_db.searchBelongs("%libz%", like = True),
+                         frozenset())
+        cur = index_db._cursor().execute(
+            "SELECT COUNT(*) FROM contentsearch")
+        self.assertEqual(cur.fetchone()[0], 0)
+        index_db.close()
+
+    def test_search_index_switch(self):
+
+        class SearchIndexRepository(EntropyRepository):
+            _SEARCH_INDEX = True
+
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        plain_db = EntropyRepository(readOnly = False, dbFile = db_path,
+            name = "search_index_test", xcache = False, indexing = True)
+        plain_db.initializeRepository()
+        data = self.Spm.extract_package_metadata(_misc.get_test_package())
+        package_id = plain_db.addPackage(data)
+        plain_db.commit()
+        # opt-in only
+        self.assertFalse(plain_db._isSearchIndex())
+        plain_db.close()
+
+        index_db = SearchIndexRepository(readOnly = False, dbFile = db_path,
+            name = "search_index_test", xcache = False, indexing = True)
+        if not index_db._isSearchIndexSupported():
+            # FTS5 trigrams not supported by the SQLite library
+            index_db.close()
+            os.remove(db_path)
+            return
+        # the schema revision is already the current one
+        self.assertTrue(index_db._isSearchIndex())
+        self.assertEqual(index_db.searchBelongs("%libz%", like = True),
+                         frozenset([package_id]))
+        index_db.close()
+
+        plain_db = EntropyRepository(readOnly = False, dbFile = db_path,
+            name = "search_index_test", xcache = False, indexing = True)
+        self.assertFalse(plain_db._isSearchIndex())
+        self.assertEqual(plain_db.searchBelongs("%libz%", like = True),
+                         frozenset([package_id]))
+        plain_db.close()
+        os.remove(db_path)
+
     def test_db_indexes(self):
         self.test_db.createAllIndexes()
 
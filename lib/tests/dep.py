@@ -11,6 +11,7 @@ import tempfile
 import subprocess
 import shutil
 import stat
+import itertools
 import entropy.dep as et
 
 class DepTest(unittest.TestCase):
@@ -132,6 +133,125 @@ class DepTest(unittest.TestCase):
             ('3.4', '2222', 0), ('1.0', '2222', 1)]
         self.assertEqual(et.get_entropy_newer_version(vers), out_vers)
 
+        vers = [("1.0", "", 1,), ("3.4", "2222", 0,), ("1.0", "2222", 1,),
+            ("3.4", "", 2,)]
+        out_vers = [('3.4', '2222', 0), ('3.4', '', 2), ('1.0', '2222', 1),
+            ('1.0', '', 1)]
+        self.assertEqual(et.get_entropy_newer_version(vers), out_vers)
+
+    def test_version_key(self):
+        vers = ["1", "1.0", "1.0.0", "1.00", "1.01", "1.003", "1.02", "1.1",
+            "1.10", "1.2", "1.2.3", "1.2.3.4.5", "1.2a", "1.2b", "1.3a",
+            "1.2_alpha", "1.2_alpha1", "1.2_alpha_alpha", "1.2_beta2",
+            "1.2_pre", "1.2_rc1", "1.2_rc2", "1.2_p1", "1.2_p2", "1.2-r1",
+            "1.2-r2", "1.2_rc1-r3", "1.2.0_alpha", "1.2_p1_alpha",
+            "1.2_p1_beta2", "1.2_alpha_p1", "1.2_p0_alpha", "1.2_p0_p1",
+            "1.0a_rc3-r2", "2", "10", "999", "9999", "0.5", "0.05", "3.0",
+            "3.0_rc7", "2.6.39", "20100101", "cvs.1.2"]
+        # compare_versions() returns 0 if the first version is invalid
+        invalid_vers = ["", "foo", "1.2_gamma"]
+
+        for ver_a in vers:
+            for ver_b in vers + invalid_vers:
+                cmp_rc = et.compare_versions(ver_a, ver_b)
+                key_a = et.version_key(ver_a)
+                key_b = et.version_key(ver_b)
+                if cmp_rc > 0:
+                    self.assertTrue(key_a > key_b, (ver_a, ver_b))
+                elif cmp_rc < 0:
+                    self.assertTrue(key_a < key_b, (ver_a, ver_b))
+                else:
+                    self.assertEqual(key_a, key_b, (ver_a, ver_b))
+
+    def test_version_key_corpus(self):
+        vers = ["%s%s%s%s" % x for x in itertools.product(
+            ["1", "1.0", "1.00", "1.01", "1.1", "1.10", "1.1.0"],
+            ["", "a"],
+            ["", "_p", "_p0", "_p1", "_pre", "_beta", "_beta0", "_beta01",
+             "_beta1", "_beta_p", "_p_beta"],
+            ["", "-r1"])]
+        vers += ["01", "2", "0.5", "0.05", "cvs.1.2", "1.2_gamma", "foo", ""]
+
+        def _suffix_numbers_differ(ver_a, ver_b):
+            # compare_versions() stops at the first suffix number that
+            # differs as text but not as integer (documented difference).
+            match_a = et.ver_regexp.match(ver_a)
+            match_b = et.ver_regexp.match(ver_b)
+            suffixes_a = match_a.group(6).split("_")[1:]
+            suffixes_b = match_b.group(6).split("_")[1:]
+            for idx in range(max(len(suffixes_a), len(suffixes_b))):
+                s_a, s_b = ("p", "0"), ("p", "0")
+                if idx < len(suffixes_a):
+                    s_a = et.suffix_regexp.match(suffixes_a[idx]).groups()
+                if idx < len(suffixes_b):
+                    s_b = et.suffix_regexp.match(suffixes_b[idx]).groups()
+                if s_a[0] != s_b[0]:
+                    return False
+                if s_a[1] != s_b[1]:
+                    return int(s_a[1] or 0) == int(s_b[1] or 0)
+            return False
+
+        for ver_a in vers:
+            key_a = et.version_key(ver_a)
+            for ver_b in vers:
+                key_b = et.version_key(ver_b)
+                cmp_rc = et.compare_versions(ver_a, ver_b)
+                key_rc = (key_a > key_b) - (key_a < key_b)
+                if cmp_rc > 0:
+                    cmp_rc = 1
+                elif cmp_rc < 0:
+                    cmp_rc = -1
+                if cmp_rc == key_rc:
+                    continue
+
+                # documented differences only
+                self.assertEqual(cmp_rc, 0, (ver_a, ver_b))
+                if not et.ver_regexp.match(ver_a):
+                    self.assertEqual(key_rc, -1, (ver_a, ver_b))
+                    continue
+                self.assertEqual(key_a[:3], key_b[:3], (ver_a, ver_b))
+                self.assertTrue(
+                    _suffix_numbers_differ(ver_a, ver_b), (ver_a, ver_b))
+
+        self.assertEqual(et.compare_versions("1_beta-r2", "1_beta0-r1"), 0)
+        self.assertTrue(
+            et.version_key("1_beta-r2") > et.version_key("1_beta0-r1"))
+        self.assertEqual(et.version_key("1_beta"), et.version_key("1_beta0"))
+        self.assertEqual(et.version_key("1_p"), et.version_key("1"))
+
+    def test_parse_atom(self):
+        parsed = et.parse_atom(">=app-foo/foo-1.2.3:2.3[ciao,-come]#tag~1")
+        self.assertEqual(parsed.key, "app-foo/foo")
+        self.assertEqual(parsed.category, "app-foo")
+        self.assertEqual(parsed.name, "foo")
+        self.assertEqual(parsed.version, "1.2.3-r0")
+        self.assertEqual(parsed.direction, ">=")
+        self.assertEqual(parsed.stripped_atom, "app-foo/foo-1.2.3")
+        self.assertEqual(parsed.slot, "2.3")
+        self.assertEqual(parsed.tag, "tag")
+        self.assertEqual(parsed.usedeps, ("ciao", "-come"))
+        self.assertEqual(parsed.revision, 1)
+        self.assertFalse(parsed.justname)
+
+        parsed = et.parse_atom("=app-foo/foo-1.2*")
+        self.assertEqual(parsed.version, "1.2*-r0")
+        self.assertEqual(parsed.direction, "=")
+        self.assertEqual(parsed.stripped_atom, "app-foo/foo-1.2*")
+
+        parsed = et.parse_atom("foo")
+        self.assertEqual((parsed.category, parsed.name), ("null", "foo"))
+        self.assertTrue(parsed.justname)
+
+        for atom in ("app-foo/foo-1.2.3", "app-foo/foo#2.6-r1",
+                     "<app-foo/foo-1.2.3-r4:1"):
+            parsed = et.parse_atom(atom)
+            self.assertTrue(parsed is et.parse_atom(atom))
+            self.assertEqual(parsed.tag, et.dep_gettag(atom))
+            self.assertEqual(parsed.slot, et.dep_getslot(atom))
+            self.assertEqual(parsed.key, et.dep_getkey(atom))
+
+        self.assertRaises(AttributeError, setattr, parsed, "key", "foo")
+
     def test_create_package_filename(self):
         package_category = "app-foo"
         package_name = "foo"
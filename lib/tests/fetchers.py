@@ -1,14 +1,24 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import shutil
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
+import threading
 import tests._misc as _misc
+from entropy.const import const_is_python3, const_mkdtemp
 from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
 from entropy.output import set_mute
 import entropy.tools
 
+if const_is_python3():
+    import http.server as httpserver
+    import socketserver
+else:
+    import BaseHTTPServer as httpserver
+    import SocketServer as socketserver
+
 class FetchersTest(unittest.TestCase):
 
     def setUp(self):
@@ -47,6 +57,64 @@ class FetchersTest(unittest.TestCase):
         self.assertEqual(rc.pop(1), ck_sum)
         os.remove(path_to_save)
 
+    def test_multiple_urlfetcher_http_fetch(self):
+
+        with open(self._random_file, "rb") as rnd_f:
+            payload = rnd_f.read()
+        ck_f = open(self._random_file_md5, "r")
+        ck_sum = ck_f.readline().strip().split()[0]
+        ck_f.close()
+
+        connections = []
+
+        class Handler(httpserver.BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                connections.append(self.client_address)
+                httpserver.BaseHTTPRequestHandler.setup(self)
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                return
+
+        class Server(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+            daemon_threads = True
+
+        server = Server(("127.0.0.1", 0), Handler)
+        th = threading.Thread(target = server.serve_forever)
+        th.daemon = True
+        th.start()
+
+        tmp_dir = const_mkdtemp()
+        try:
+            url_path_list = []
+            for count in range(8):
+                url = "http://127.0.0.1:%d/random_file.%d" % (
+                    server.server_address[1], count)
+                url_path_list.append(
+                    (url, os.path.join(tmp_dir, "random_file.%d" % (count,))))
+
+            set_mute(True)
+            fetcher = MultipleUrlFetcher(url_path_list,
+                show_speed = False, resume = False, max_workers = 2)
+            rc = fetcher.download()
+            set_mute(False)
+
+            self.assertEqual(rc, dict((x, ck_sum) for x in range(1, 9)))
+            # connections are reused across downloads
+            self.assertTrue(len(connections) <= 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir, True)
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import random
+import unittest
+
+from entropy.graph import Graph
+
+
+class GraphTest(unittest.TestCase):
+
+    def _check_solution(self, edges, solution):
+        """
+        Check that the given Graph.solve() output is made of the strongly
+        connected components of the graph, in topological order.
+        """
+        level_map = {}
+        for level, component in solution.items():
+            for item in component:
+                self.assertFalse(item in level_map)
+                level_map[item] = level
+        self.assertEqual(sorted(level_map.keys()), sorted(edges.keys()))
+
+        for item, deps in edges.items():
+            for dep in deps:
+                # dependencies come later, unless in the same component
+                self.assertTrue(level_map[item] <= level_map[dep])
+
+        # items sharing a level must reach each other
+        reach = {}
+        def reachable(item):
+            if item in reach:
+                return reach[item]
+            seen = set([item])
+            stack = [item]
+            while stack:
+                for dep in edges[stack.pop()]:
+                    if dep not in seen:
+                        seen.add(dep)
+                        stack.append(dep)
+            reach[item] = seen
+            return seen
+
+        for component in solution.values():
+            for item in component[1:]:
+                self.assertTrue(item in reachable(component[0]))
+                self.assertTrue(component[0] in reachable(item))
+
+    def _solve(self, edges):
+        graph = Graph()
+        try:
+            for item, deps in edges.items():
+                graph.add(item, deps)
+            return graph.solve()
+        finally:
+            graph.destroy()
+
+    def test_graph_simple(self):
+        edges = {
+            "a": ["b", "c"],
+            "b": ["c"],
+            "c": [],
+        }
+        solution = self._solve(edges)
+        self.assertEqual(solution, {1: ("a",), 2: ("b",), 3: ("c",)})
+
+    def test_graph_cycle(self):
+        edges = {
+            "a": ["b"],
+            "b": ["c"],
+            "c": ["b", "d"],
+            "d": [],
+        }
+        solution = self._solve(edges)
+        self.assertEqual(len(solution), 3)
+        self.assertEqual(solution[1], ("a",))
+        self.assertEqual(sorted(solution[2]), ["b", "c"])
+        self.assertEqual(solution[3], ("d",))
+
+    def test_graph_random(self):
+        rnd = random.Random(1234)
+        for _count in range(50):
+            size = rnd.randint(1, 80)
+            edges = {}
+            for item in range(size):
+                edges[item] = [x for x in range(size) if rnd.random() < 0.05]
+            self._check_solution(edges, self._solve(edges))
+
+    def test_graph_deep_chain(self):
+        # deeper than the Python recursion limit
+        size = 50000
+        edges = dict((x, [x + 1]) for x in range(size - 1))
+        edges[size - 1] = []
+        solution = self._solve(edges)
+        self.assertEqual(len(solution), size)
+        self.assertEqual(solution[1], (0,))
+        self.assertEqual(solution[size], (size - 1,))
+
+    def test_graph_large_cycles(self):
+        size = 50000
+        edges = dict((x, [x + 1]) for x in range(size - 1))
+        edges[size - 1] = []
+        # close a cycle every 1000 items
+        for item in range(999, size, 1000):
+            edges[item].append(item - 999)
+        solution = self._solve(edges)
+        self.assertEqual(len(solution), size // 1000)
+        for level, component in solution.items():
+            self.assertEqual(len(component), 1000)
+            self.assertEqual(min(component), (level - 1) * 1000)
+
+        # a single, huge, strongly connected component
+        edges[size - 1].append(0)
+        solution = self._solve(edges)
+        self.assertEqual(list(solution.keys()), [1])
+        self.assertEqual(sorted(solution[1]), list(range(size)))
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
@@ -6,9 +6,12 @@ import os
 import unittest
 import tempfile
 import json
+import bz2
+import gzip
+import random
 from entropy.const import const_convert_to_unicode, const_mkstemp
 from entropy.misc import Lifo, TimeScheduled, ParallelTask, EmailSender, \
-    FastRSS, FlockFile
+    FastRSS, FlockFile, ParallelBZ2File, ParallelGzipFile
 
 class MiscTest(unittest.TestCase):
 
@@ -92,6 +95,51 @@ class MiscTest(unittest.TestCase):
         t.join()
         self.assertTrue(self.t_sched_run)
 
+    def _compressible_data(self):
+        rnd = random.Random(0)
+        chunks = []
+        for idx in range(20000):
+            char = chr(rnd.randint(0, 3)).encode("ascii")
+            chunks.append(char * rnd.choice([1, 3, 4, 255, 256, 600]))
+            chunks.append(("%d text\n" % (idx,)).encode("ascii"))
+        return b"".join(chunks)
+
+    def test_parallel_bz2_file(self):
+        data = self._compressible_data()
+        for threads in (1, 2, 3):
+            fd, tmp_path = const_mkstemp()
+            os.close(fd)
+            with ParallelBZ2File(tmp_path, "wb", compresslevel = 1,
+                                 threads = threads) as bz_f:
+                for idx in range(0, len(data), 65536):
+                    bz_f.write(data[idx:idx + 65536])
+                self.assertEqual(bz_f.tell(), len(data))
+            with open(tmp_path, "rb") as bz_f:
+                # must be identical to libbz2 output
+                self.assertEqual(bz_f.read(), bz2.compress(data, 1))
+            os.remove(tmp_path)
+
+        fd, tmp_path = const_mkstemp()
+        os.close(fd)
+        ParallelBZ2File(tmp_path, "wb").close()
+        with open(tmp_path, "rb") as bz_f:
+            self.assertEqual(bz_f.read(), bz2.compress(b""))
+        os.remove(tmp_path)
+
+    def test_parallel_gzip_file(self):
+        data = self._compressible_data()
+        fd, tmp_path = const_mkstemp()
+        os.close(fd)
+        with ParallelGzipFile(tmp_path, "wb", threads = 3) as gz_f:
+            for idx in range(0, len(data), 65536):
+                gz_f.write(data[idx:idx + 65536])
+        gz_f = gzip.GzipFile(tmp_path, "rb")
+        try:
+            self.assertEqual(gz_f.read(), data)
+        finally:
+            gz_f.close()
+        os.remove(tmp_path)
+
     def test_flock_file(self):
         tmp_fd, tmp_path = None, None
         try:
@@ -5,15 +5,51 @@ sys.path.insert(0, '../')
 import unittest
 import os
 import shutil
+import threading
 from entropy.server.interfaces import Server
-from entropy.const import etpConst, initconfig_entropy_constants, etpSys
+from entropy.const import etpConst, initconfig_entropy_constants, etpSys, \
+    const_mkdtemp, const_mkstemp
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
 from entropy.db.cache import EntropyRepositoryCacher
 from entropy.exceptions import RepositoryError
+from entropy.transceivers import EntropyTransceiver
+from entropy.transceivers.uri_handlers.plugins.interfaces.file_plugin import \
+    EntropyFileUriHandler
 import entropy.tools
 import tests._misc as _misc
 
+
+class BarrierUriHandler(EntropyFileUriHandler):
+
+    """
+    EntropyFileUriHandler for barrier:// URIs, uploads are held until
+    all the expected mirrors are uploading.
+    """
+
+    mirrors = 2
+    uploading = set()
+    held = []
+    lock = threading.Lock()
+    event = threading.Event()
+
+    @staticmethod
+    def approve_uri(uri):
+        return uri.startswith("barrier://")
+
+    def _drop_file_protocol(self, uri_str):
+        return uri_str[len("barrier://"):]
+
+    def upload(self, load_path, remote_path):
+        cls = BarrierUriHandler
+        with cls.lock:
+            cls.uploading.add(self._uri)
+            if len(cls.uploading) == cls.mirrors:
+                cls.event.set()
+        cls.held.append(cls.event.wait(10))
+        return EntropyFileUriHandler.upload(self, load_path, remote_path)
+
+
 class EntropyRepositoryTest(unittest.TestCase):
 
     def setUp(self):
@@ -145,6 +181,43 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.Server.repository())
         self.assertNotEqual(None, dbconn.retrieveAtom(1))
 
+    def test_sync_run_upload_queues(self):
+        tmp_dirs = [const_mkdtemp(), const_mkdtemp()]
+        fd, upload_path = const_mkstemp(suffix = etpConst['packagesext'])
+        os.write(fd, b"foo")
+        os.close(fd)
+        rel_dir = os.path.join(etpConst['packagesrelativepath_basedir'],
+            "amd64", "5")
+        rel_path = os.path.join(rel_dir, os.path.basename(upload_path))
+        upload_queue = [(upload_path, rel_path, 3)]
+        uris = ["barrier://" + x for x in tmp_dirs]
+
+        EntropyTransceiver.add_uri_handler(BarrierUriHandler)
+        try:
+            results, exceptions = \
+                self.Server.Mirrors._sync_run_upload_queues(
+                    self.default_repo, [(x, upload_queue) for x in uris])
+        finally:
+            EntropyTransceiver.remove_uri_handler(BarrierUriHandler)
+
+        try:
+            self.assertEqual(exceptions, {})
+            # both mirrors were uploading at the same time
+            self.assertEqual(BarrierUriHandler.held, [True, True])
+            remote_dir = self.Server.complete_remote_package_relative_path(
+                rel_dir, self.default_repo)
+            for uri, tmp_dir in zip(uris, tmp_dirs):
+                errors, fine_uris, broken_uris = results[uri]
+                self.assertFalse(errors)
+                self.assertEqual(fine_uris, set([uri]))
+                self.assertEqual(broken_uris, set())
+                self.assertTrue(os.path.isfile(os.path.join(tmp_dir,
+                    remote_dir, os.path.basename(upload_path))))
+        finally:
+            os.remove(upload_path)
+            for tmp_dir in tmp_dirs:
+                shutil.rmtree(tmp_dir, True)
+
     def test_constant_backup(self):
         const_key = 'foo_foo_foo'
         const_val = set([1, 2, 3])
@@ -165,6 +165,56 @@ class SpmTest(unittest.TestCase):
 
         shutil.rmtree(tmp_path, True)
 
+    def test_tarball_index(self):
+
+        from entropy.spm.plugins.interfaces.portage_plugin.tarindex import \
+            TarballIndex
+
+        # test_pkg3 is a virtual package, with no content
+        for test_pkg in (self.test_pkg, self.test_pkg2):
+            unpack_dir = const_mkdtemp(prefix="test_tarball_index")
+            extract_dir = const_mkdtemp(prefix="test_tarball_index2")
+            et.uncompress_tarball(test_pkg, extract_path = unpack_dir)
+
+            index = TarballIndex(extract_dir,
+                extract_filter = lambda x: x.endswith(".so"))
+            index.scan(test_pkg)
+            self.assertTrue(index.paths())
+
+            for path in index.paths():
+                unpack_path = os.path.join(unpack_dir, path.lstrip("/"))
+                inode = index.lookup(path, follow = False)
+                self.assertNotEqual(inode, None)
+                self.assertEqual(os.path.islink(unpack_path),
+                    inode.kind == "sym")
+
+                inode = index.lookup(path)
+                if inode is None:
+                    self.assertFalse(os.path.exists(unpack_path))
+                    continue
+                self.assertEqual(os.path.isdir(unpack_path),
+                    inode.kind == "dir")
+                if inode.kind != "reg":
+                    continue
+
+                self.assertEqual(inode.sha256, et.sha256(unpack_path))
+                self.assertEqual(inode.mtime,
+                    os.path.getmtime(unpack_path))
+                if et.is_elf_file(unpack_path):
+                    self.assertEqual(inode.elf,
+                        et.read_elf_metadata(unpack_path))
+                else:
+                    self.assertEqual(inode.elf, None)
+
+                extract_path = os.path.join(extract_dir, path.lstrip("/"))
+                if path.endswith(".so") and not os.path.islink(unpack_path):
+                    self.assertEqual(et.sha256(extract_path), inode.sha256)
+                elif not path.endswith(".so"):
+                    self.assertFalse(os.path.lexists(extract_path))
+
+            shutil.rmtree(unpack_dir, True)
+            shutil.rmtree(extract_dir, True)
+
     def test_sets_load(self):
         spm = self.Client.Spm()
         sets = spm.get_package_sets(False)
@@ -4,6 +4,7 @@ import os
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
+import hashlib
 from entropy.const import const_convert_to_rawstring, \
     const_convert_to_unicode, const_mkstemp, const_mkdtemp
 import entropy.tools as et
@@ -248,6 +249,26 @@ class ToolsTest(unittest.TestCase):
         os.remove(tmp_path)
         os.remove(new_path)
 
+    def test_open_compressed_tarfile(self):
+
+        import tarfile
+        for compressor in ("bz2", "gz"):
+            fd, tmp_path = const_mkstemp()
+            os.close(fd)
+            tar = et.open_compressed_tarfile(tmp_path,
+                compressor = compressor)
+            tar.add(self.test_pkg, "foo")
+            tar.close()
+            # the compressed file must be closed too
+            self.assertTrue(tar.fileobj.closed)
+
+            tar = tarfile.open(tmp_path, "r:" + compressor)
+            try:
+                self.assertEqual(tar.getnames(), ["foo"])
+            finally:
+                tar.close()
+            os.remove(tmp_path)
+
     def test_unpack_gzip(self):
         import gzip
         fd, tmp_path = const_mkstemp(suffix = ".gz")
@@ -382,6 +403,34 @@ class ToolsTest(unittest.TestCase):
         os.remove(tmp_path)
         os.remove(sha_path)
 
+    def test_multi_digest(self):
+        fd, tmp_path = const_mkstemp()
+        data = const_convert_to_rawstring("hello") * 300000
+        os.write(fd, data)
+        os.fsync(fd)
+
+        algorithms = ("md5", "sha1", "sha256", "sha512")
+        expected = dict((x, hashlib.new(x, data).hexdigest()) \
+                            for x in algorithms)
+        self.assertEqual(et.multi_digest(tmp_path, algorithms), expected)
+        self.assertEqual(
+            et.multi_digest(tmp_path, algorithms, parallel = True),
+            expected)
+        self.assertEqual(et.sha1(tmp_path), expected["sha1"])
+
+        digest_paths = et.create_digest_files(tmp_path, ("md5", "sha256"))
+        for algorithm, digest_path in digest_paths.items():
+            with open(digest_path, "rb") as digest_f:
+                self.assertEqual(
+                    const_convert_to_rawstring(
+                        expected[algorithm] + "  " + \
+                            os.path.basename(tmp_path) + "\n"),
+                    digest_f.read())
+            os.remove(digest_path)
+
+        os.close(fd)
+        os.remove(tmp_path)
+
     def test_md5string(self):
         mystring = "ciao"
         out_str = et.md5string(mystring)
@@ -544,6 +593,49 @@ class ToolsTest(unittest.TestCase):
         metadata = et.read_elf_linker_paths(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_metadata(self):
+        elf_obj = _misc.get_dl_so_amd_2()
+        known_meta = {
+            'soname': 'libkdb5.so.4',
+            'class': 2,
+            'runpath': '/usr/lib64',
+            'needed': set(['libcom_err.so.2', 'libkrb5.so.3',
+                'libkrb5support.so.0', 'libgssrpc.so.4', 'libk5crypto.so.3',
+                'libc.so.6']),
+        }
+        self.assertEqual(et.read_elf_metadata(elf_obj), known_meta)
+        # served from cache now
+        self.assertEqual(et.read_elf_metadata(elf_obj), known_meta)
+        with open(elf_obj, "rb") as elf_f:
+            self.assertEqual(et.read_elf_metadata_buffer(elf_f.read()),
+                known_meta)
+
+        png_file = _misc.get_png()
+        self.assertEqual(et.read_elf_metadata(png_file), None)
+        with open(png_file, "rb") as png_f:
+            self.assertEqual(et.read_elf_metadata_buffer(png_f.read()), None)
+        self.assertEqual(et.read_elf_dynamic_libraries(png_file), set())
+        self.assertEqual(et.read_elf_linker_paths(png_file), [])
+
+    def test_read_elf_metadata_scanelf_parity(self):
+        scanelf = "/usr/bin/scanelf"
+        if not os.access(scanelf, os.X_OK):
+            return
+        for elf_obj in (_misc.get_dl_so_amd(), _misc.get_dl_so_amd_2(),
+                        _misc.get_test_so_1()):
+            out = subprocess.Popen(
+                (scanelf, "-qF", "%M;%S;%r;%n", elf_obj),
+                stdout = subprocess.PIPE).communicate()[0]
+            out = const_convert_to_unicode(out).strip().split(" ")[0]
+            elfclass_str, soname, runpath, libs = out.split(";")
+            metadata = et.read_elf_metadata(elf_obj)
+            self.assertEqual(metadata['class'],
+                et.elf_class_strtoint(elfclass_str))
+            self.assertEqual(metadata['soname'], soname)
+            self.assertEqual(metadata['runpath'], runpath)
+            self.assertEqual(metadata['needed'],
+                set([x for x in libs.split(",") if x]))
+
     def test_xml_from_dict_extended(self):
         data = {
             "foo": 1,
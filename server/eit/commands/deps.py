@@ -177,12 +177,13 @@ non-permanent way.
             return True
 
         repo = entropy_server.open_repository(repository_id)
+        dependencies = repo.retrieveDependenciesBatch(
+            package_ids, extended = True,
+            resolve_conditional_deps = False)
         for package_id in package_ids:
             atom = repo.retrieveAtom(package_id)
 
-            orig_deps = repo.retrieveDependencies(
-                package_id, extended = True,
-                resolve_conditional_deps = False)
+            orig_deps = dependencies[package_id]
             dep_type_map = dict(orig_deps)
 
             orig_conflicts = ["!%s" % (x,) for x in